@@ -0,0 +1,356 @@
+import hashlib
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.db.models import Count, Avg, Sum, Min, Max
+from django.db.models.functions import TruncDate, TruncHour
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import (
+    AnalyticsEvent, PageView, UserSession, UserMetrics, AnalyticsWidget
+)
+
+logger = logging.getLogger(__name__)
+
+
+class WidgetConfigError(ValueError):
+    """Raised when a widget's query/metrics/dimensions cannot be evaluated"""
+
+
+class WidgetDataService:
+    """
+    Service class for computing and caching analytics widget data.
+
+    Each widget reads from exactly one source table (``query['source']``).
+    Cached results are keyed by the widget configuration, the widget's
+    refresh time bucket and the current version of its source, so a write to
+    one source only invalidates the widgets that depend on it.
+    """
+
+    # source name -> (model, timestamp field used for the date range)
+    SOURCES = {
+        'events': (AnalyticsEvent, 'created_at'),
+        'page_views': (PageView, 'created_at'),
+        'sessions': (UserSession, 'start_time'),
+        'user_metrics': (UserMetrics, 'date'),
+    }
+
+    AGGREGATES = {
+        'sum': Sum,
+        'avg': Avg,
+        'min': Min,
+        'max': Max,
+    }
+
+    CACHE_PREFIX = 'analytics:widget'
+    DEFAULT_DAYS = 30
+
+    # ------------------------------------------------------------------
+    # Source versions (dependency-aware invalidation)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _version_key(cls, source):
+        return f'{cls.CACHE_PREFIX}:version:{source}'
+
+    @classmethod
+    def get_source_versions(cls, sources):
+        """
+        Get the current cache version for each source in one cache round trip.
+
+        Args:
+            sources (iterable): Source names
+
+        Returns:
+            dict: source name -> version number
+        """
+        keys = {cls._version_key(source): source for source in sources}
+        found = cache.get_many(list(keys))
+        return {source: found.get(key, 0) for key, source in keys.items()}
+
+    @classmethod
+    def invalidate_source(cls, source):
+        """
+        Invalidate every cached widget that reads from ``source``.
+
+        Args:
+            source (str): Source name from ``SOURCES``
+        """
+        key = cls._version_key(source)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @classmethod
+    def source_for_model(cls, model):
+        """Return the source name backed by ``model``, or None"""
+        for source, (source_model, _) in cls.SOURCES.items():
+            if source_model is model:
+                return source
+        return None
+
+    # ------------------------------------------------------------------
+    # Widget configuration
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def widget_config(cls, widget, dashboard_filters=None):
+        """
+        Build the normalized configuration a widget's data depends on.
+
+        Args:
+            widget (AnalyticsWidget): The widget
+            dashboard_filters (dict, optional): Filters applied to every widget
+                of the dashboard; widget filters take precedence
+
+        Returns:
+            dict: Normalized configuration
+        """
+        query = widget.query or {}
+        filters = dict(dashboard_filters or {})
+        filters.update(widget.filters or {})
+        return {
+            'source': query.get('source', 'events'),
+            'days': int(query.get('days', cls.DEFAULT_DAYS)),
+            'interval': query.get('interval'),
+            'limit': query.get('limit'),
+            'metrics': list(widget.metrics or ['count']),
+            'dimensions': list(widget.dimensions or []),
+            'filters': filters,
+        }
+
+    @classmethod
+    def cache_key(cls, widget, config, version):
+        """
+        Build the cache key for a widget.
+
+        The key changes when the configuration changes, when the widget's
+        refresh interval elapses, or when its source is invalidated.
+        """
+        digest = hashlib.sha1(
+            json.dumps(config, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+        interval = max(widget.refresh_interval or 1, 1)
+        bucket = int(timezone.now().timestamp()) // interval
+        return f"{cls.CACHE_PREFIX}:{digest}:{bucket}:{config['source']}:{version}"
+
+    @staticmethod
+    def _check_field(model, lookup):
+        """Ensure ``lookup`` starts with a concrete field of ``model``"""
+        field_name = lookup.split('__', 1)[0]
+        try:
+            model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            raise WidgetConfigError(f"Unknown field '{field_name}' for {model.__name__}")
+        return lookup
+
+    @classmethod
+    def _build_aggregates(cls, model, metrics):
+        aggregates = {}
+        for metric in metrics:
+            if metric == 'count':
+                aggregates['count'] = Count('pk')
+            elif metric == 'unique_users':
+                aggregates['unique_users'] = Count('user', distinct=True)
+            elif ':' in metric:
+                func_name, field_name = metric.split(':', 1)
+                if func_name not in cls.AGGREGATES:
+                    raise WidgetConfigError(f"Unknown aggregate '{func_name}'")
+                cls._check_field(model, field_name)
+                aggregates[f'{func_name}_{field_name}'] = cls.AGGREGATES[func_name](field_name)
+            else:
+                raise WidgetConfigError(f"Unknown metric '{metric}'")
+        return aggregates
+
+    # ------------------------------------------------------------------
+    # Computation
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def compute(cls, config):
+        """
+        Run the aggregate query for a widget configuration.
+
+        Args:
+            config (dict): Configuration from ``widget_config``
+
+        Returns:
+            dict: ``{'rows': [...], 'generated_at': ...}``
+        """
+        if config['source'] not in cls.SOURCES:
+            raise WidgetConfigError(f"Unknown source '{config['source']}'")
+        model, date_field = cls.SOURCES[config['source']]
+
+        start = timezone.now() - timedelta(days=config['days'])
+        if date_field == 'date':
+            start = start.date()
+        queryset = model.objects.filter(**{f'{date_field}__gte': start})
+
+        filters = {cls._check_field(model, key): value for key, value in config['filters'].items()}
+        if filters:
+            queryset = queryset.filter(**filters)
+
+        group_by = [cls._check_field(model, dimension) for dimension in config['dimensions']]
+        interval = config.get('interval')
+        if interval and date_field != 'date':
+            trunc = TruncHour if interval == 'hour' else TruncDate
+            queryset = queryset.annotate(bucket=trunc(date_field))
+            group_by.append('bucket')
+        elif interval:
+            group_by.append(date_field)
+
+        aggregates = cls._build_aggregates(model, config['metrics'])
+        if group_by:
+            rows = queryset.values(*group_by).annotate(**aggregates).order_by(*group_by)
+            if config.get('limit'):
+                rows = rows[:int(config['limit'])]
+            rows = list(rows)
+        else:
+            rows = [queryset.aggregate(**aggregates)]
+
+        return {'rows': rows, 'generated_at': timezone.now().isoformat()}
+
+    @classmethod
+    def _compute_in_thread(cls, config):
+        """Compute on a worker thread and release its DB connection afterwards"""
+        try:
+            return cls.compute(config)
+        finally:
+            connection.close()
+
+    @classmethod
+    def _worker_count(cls, pending):
+        workers = getattr(settings, 'ANALYTICS_WIDGET_WORKERS', 4)
+        # SQLite serializes access and in-memory test databases are not
+        # visible from other threads, so compute in the calling thread there.
+        if connection.vendor == 'sqlite':
+            return 1
+        return max(1, min(workers, pending))
+
+    # ------------------------------------------------------------------
+    # Public API
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def get_widgets_data(cls, widgets, dashboard_filters=None):
+        """
+        Get data for several widgets, computing cache misses concurrently.
+
+        Cache lookups for all widgets happen in a single ``get_many`` call and
+        widgets with identical configurations share one computation.
+
+        Args:
+            widgets (iterable): AnalyticsWidget instances
+            dashboard_filters (dict, optional): Filters applied to every widget
+
+        Returns:
+            dict: widget id (str) -> ``{'data': ..., 'cached': bool}`` or
+            ``{'error': ...}``
+        """
+        widgets = list(widgets)
+        configs = {}
+        for widget in widgets:
+            configs[widget.id] = cls.widget_config(widget, dashboard_filters)
+
+        versions = cls.get_source_versions({config['source'] for config in configs.values()})
+        keys = {
+            widget.id: cls.cache_key(widget, configs[widget.id], versions[configs[widget.id]['source']])
+            for widget in widgets
+        }
+        cached = cache.get_many(list(set(keys.values())))
+
+        pending = {}
+        for widget in widgets:
+            key = keys[widget.id]
+            if key not in cached and key not in pending:
+                pending[key] = configs[widget.id]
+
+        computed, errors = {}, {}
+        workers = cls._worker_count(len(pending))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {key: executor.submit(cls._compute_in_thread, config) for key, config in pending.items()}
+                for key, future in futures.items():
+                    try:
+                        computed[key] = future.result()
+                    except Exception as e:
+                        errors[key] = e
+        else:
+            for key, config in pending.items():
+                try:
+                    computed[key] = cls.compute(config)
+                except Exception as e:
+                    errors[key] = e
+
+        if computed:
+            timeouts = {}
+            for widget in widgets:
+                key = keys[widget.id]
+                if key in computed:
+                    timeouts.setdefault(key, max(widget.refresh_interval or 1, 1))
+            for key, timeout in timeouts.items():
+                cache.set(key, computed[key], timeout=timeout)
+
+        results = {}
+        for widget in widgets:
+            key = keys[widget.id]
+            if key in errors:
+                logger.error(f"Error computing widget {widget.id}: {errors[key]}")
+                results[str(widget.id)] = {'error': str(errors[key])}
+            else:
+                results[str(widget.id)] = {
+                    'data': cached[key] if key in cached else computed[key],
+                    'cached': key in cached,
+                }
+        return results
+
+    @classmethod
+    def get_widget_data(cls, widget, dashboard_filters=None):
+        """Get data for a single widget"""
+        return cls.get_widgets_data([widget], dashboard_filters)[str(widget.id)]
+
+    @staticmethod
+    def dashboard_widget_ids(dashboard):
+        """
+        Extract widget ids from ``AnalyticsDashboard.widgets``.
+
+        Entries may be plain widget ids or dicts with an ``id`` key.
+        """
+        widget_ids = []
+        for entry in dashboard.widgets or []:
+            widget_id = entry.get('id') if isinstance(entry, dict) else entry
+            if widget_id:
+                widget_ids.append(str(widget_id))
+        return widget_ids
+
+    @classmethod
+    def get_dashboard_data(cls, dashboard):
+        """
+        Get data for every widget on a dashboard in one call.
+
+        Args:
+            dashboard (AnalyticsDashboard): The dashboard
+
+        Returns:
+            dict: Dashboard id and per-widget results in layout order
+        """
+        widget_ids = cls.dashboard_widget_ids(dashboard)
+        widgets = AnalyticsWidget.objects.in_bulk(widget_ids)
+        widgets = {str(pk): widget for pk, widget in widgets.items()}
+        ordered = [widgets[widget_id] for widget_id in widget_ids if widget_id in widgets]
+
+        results = cls.get_widgets_data(ordered, dashboard.filters)
+        return {
+            'dashboard_id': str(dashboard.id),
+            'widgets': [
+                dict(results[str(widget.id)], id=str(widget.id), name=widget.name)
+                for widget in ordered
+            ],
+        }
@@ -0,0 +1,19 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import AnalyticsEvent, PageView, UserSession, UserMetrics
+from .services import WidgetDataService
+
+
+@receiver(post_save, sender=AnalyticsEvent)
+@receiver(post_save, sender=PageView)
+@receiver(post_save, sender=UserSession)
+@receiver(post_save, sender=UserMetrics)
+@receiver(post_delete, sender=AnalyticsEvent)
+@receiver(post_delete, sender=PageView)
+@receiver(post_delete, sender=UserSession)
+@receiver(post_delete, sender=UserMetrics)
+def invalidate_widget_source(sender, instance, **kwargs):
+    """Invalidate cached widget data that reads from the changed table"""
+    source = WidgetDataService.source_for_model(sender)
+    if source:
+        WidgetDataService.invalidate_source(source)
@@ -0,0 +1,106 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework import status
+
+from .models import AnalyticsEvent, PageView, AnalyticsDashboard, AnalyticsWidget
+from .services import WidgetDataService
+
+User = get_user_model()
+
+
+class WidgetDataServiceTest(TestCase):
+    """Test cases for the widget data cache"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='analyst', password='testpass123')
+        AnalyticsEvent.objects.create(user=self.user, event_type='page_view', event_name='home')
+        AnalyticsEvent.objects.create(user=self.user, event_type='search', event_name='search')
+        PageView.objects.create(user=self.user, page_url='https://example.com/a')
+
+        self.events_widget = AnalyticsWidget.objects.create(
+            name='Events by type', widget_type='chart', chart_type='bar',
+            query={'source': 'events', 'days': 7},
+            metrics=['count', 'unique_users'], dimensions=['event_type'],
+        )
+        self.views_widget = AnalyticsWidget.objects.create(
+            name='Page views', widget_type='metric',
+            query={'source': 'page_views'}, metrics=['count'],
+        )
+
+    def test_compute_groups_by_dimension(self):
+        """Test widget data is aggregated per dimension"""
+        result = WidgetDataService.get_widget_data(self.events_widget)
+        rows = {row['event_type']: row for row in result['data']['rows']}
+
+        self.assertFalse(result['cached'])
+        self.assertEqual(rows['search']['count'], 1)
+        self.assertEqual(rows['page_view']['unique_users'], 1)
+
+    def test_second_read_is_cached(self):
+        """Test repeated reads are served from the cache without queries"""
+        WidgetDataService.get_widget_data(self.events_widget)
+
+        with self.assertNumQueries(0):
+            result = WidgetDataService.get_widget_data(self.events_widget)
+        self.assertTrue(result['cached'])
+
+    def test_write_invalidates_only_dependent_widgets(self):
+        """Test a new event invalidates event widgets but not page view widgets"""
+        WidgetDataService.get_widgets_data([self.events_widget, self.views_widget])
+
+        AnalyticsEvent.objects.create(user=self.user, event_type='search', event_name='search')
+        results = WidgetDataService.get_widgets_data([self.events_widget, self.views_widget])
+
+        events_result = results[str(self.events_widget.id)]
+        rows = {row['event_type']: row for row in events_result['data']['rows']}
+        self.assertFalse(events_result['cached'])
+        self.assertEqual(rows['search']['count'], 2)
+        self.assertTrue(results[str(self.views_widget.id)]['cached'])
+
+    def test_invalid_widget_reports_error(self):
+        """Test an unknown field is reported per widget"""
+        widget = AnalyticsWidget.objects.create(
+            name='Broken', widget_type='table',
+            query={'source': 'events'}, dimensions=['not_a_field'],
+        )
+        results = WidgetDataService.get_widgets_data([widget, self.views_widget])
+
+        self.assertIn('error', results[str(widget.id)])
+        self.assertIn('data', results[str(self.views_widget.id)])
+
+
+class DashboardDataAPITest(APITestCase):
+    """Test cases for the dashboard data endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='owner', password='testpass123')
+        AnalyticsEvent.objects.create(user=self.user, event_type='search', event_name='search')
+        self.widget = AnalyticsWidget.objects.create(
+            name='Total events', widget_type='metric',
+            query={'source': 'events'}, metrics=['count'],
+        )
+        self.dashboard = AnalyticsDashboard.objects.create(
+            name='Overview', created_by=self.user, is_public=True,
+            widgets=[{'id': str(self.widget.id)}],
+        )
+
+    def test_dashboard_data(self):
+        """Test all widgets of a dashboard are returned in layout order"""
+        response = self.client.get(f'/api/v1/analytics/dashboards/{self.dashboard.id}/data/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['widgets']), 1)
+        self.assertEqual(response.data['widgets'][0]['id'], str(self.widget.id))
+        self.assertEqual(response.data['widgets'][0]['data']['rows'][0]['count'], 1)
+
+    def test_private_dashboard_forbidden(self):
+        """Test private dashboards are not readable anonymously"""
+        self.dashboard.is_public = False
+        self.dashboard.save()
+
+        response = self.client.get(f'/api/v1/analytics/dashboards/{self.dashboard.id}/data/')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -33,6 +33,7 @@ analytics_urlpatterns = [
     # path('real-time/', AnalyticsAPIViewSet.as_view({'get': 'real_time'}), name='analytics-real-time'),
     # path('user-engagement/', AnalyticsAPIViewSet.as_view({'get': 'user_engagement'}), name='analytics-user-engagement'),
     # path('conversion-funnel/', AnalyticsAPIViewSet.as_view({'get': 'conversion_funnel'}), name='analytics-conversion-funnel'),
+    path('dashboards/<uuid:dashboard_id>/data/', AnalyticsAPIViewSet.as_view({'get': 'dashboard_data'}), name='analytics-dashboard-data'),
 ]
 
 # Include all URL patterns
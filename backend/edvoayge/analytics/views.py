@@ -10,7 +10,8 @@ from datetime import timedelta
 import logging
 
 from .models import (
-    AnalyticsEvent, PageView, UserSession, EventType, PageType, SessionType
+    AnalyticsEvent, PageView, UserSession, EventType, PageType, SessionType,
+    AnalyticsDashboard
 )
 from .serializers import (
     AnalyticsEventSerializer, PageViewSerializer, UserSessionSerializer,
@@ -19,6 +20,7 @@ from .serializers import (
     SessionStatsSerializer, UserEngagementSerializer, ConversionFunnelSerializer,
     RealTimeMetricsSerializer
 )
+from .services import WidgetDataService
 
 logger = logging.getLogger(__name__)
 
@@ -644,3 +646,33 @@ class AnalyticsAPIViewSet(viewsets.ViewSet):
                 {'error': 'Failed to get conversion funnel data'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+    
+    @action(detail=False, methods=['get'])
+    def dashboard_data(self, request, dashboard_id=None):
+        """Get data for every widget on a dashboard in one call"""
+        dashboard = AnalyticsDashboard.objects.filter(id=dashboard_id).first()
+        if not dashboard:
+            return Response(
+                {'error': 'Dashboard not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        user = request.user
+        if not dashboard.is_public and not user.is_staff:
+            if not user.is_authenticated or (
+                dashboard.created_by_id != user.id
+                and not dashboard.shared_with.filter(id=user.id).exists()
+            ):
+                return Response(
+                    {'error': 'You do not have access to this dashboard'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+        
+        try:
+            return Response(WidgetDataService.get_dashboard_data(dashboard))
+        except Exception as e:
+            logger.error(f"Error getting dashboard data: {e}")
+            return Response(
+                {'error': 'Failed to get dashboard data'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
@@ -4,13 +4,14 @@ Provides Django admin interface for application management.
 """
 
 from django.contrib import admin
-from django.utils.html import format_html
+from django.utils.html import format_html, format_html_join
 from django.urls import reverse
 from django.utils import timezone
 from .models import (
     Application, ApplicationDocument, ApplicationStatus, ApplicationInterview,
-    ApplicationFee, ApplicationCommunication
+    ApplicationFee, ApplicationCommunication, DocumentPreview
 )
+from .serializers import document_download_url
 
 
 @admin.register(Application)
@@ -114,10 +115,35 @@ class ApplicationAdmin(admin.ModelAdmin):
     update_status.short_description = "Update application status"
 
 
+class DocumentPreviewInline(admin.StackedInline):
+    """Read-only preview and extracted text of a document, for reviewers."""
+    
+    model = DocumentPreview
+    can_delete = False
+    extra = 0
+    fields = ['status', 'preview_links', 'page_count', 'text', 'error', 'processed_at']
+    readonly_fields = fields
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
+    def preview_links(self, obj):
+        """Links to the preview images, served through the private download action."""
+        links = [
+            (document_download_url(obj.document, variant=variant), label)
+            for variant, field, label in (('preview', 'image', 'Preview'), ('thumbnail', 'thumbnail', 'Thumbnail'))
+            if getattr(obj, field)
+        ]
+        return format_html_join(' | ', '<a href="{}">{}</a>', links) if links else '-'
+    preview_links.short_description = 'Preview'
+
+
 @admin.register(ApplicationDocument)
 class ApplicationDocumentAdmin(admin.ModelAdmin):
     """Admin for ApplicationDocument model."""
     
+    inlines = [DocumentPreviewInline]
+    
     list_display = [
         'application_number', 'document_type', 'document_name', 'status',
         'is_required', 'is_verified', 'is_expired', 'uploaded_at'
@@ -126,7 +152,7 @@ class ApplicationDocumentAdmin(admin.ModelAdmin):
         'document_type', 'status', 'is_required', 'is_verified', 'uploaded_at'
     ]
     search_fields = [
-        'document_name', 'application__application_number', 'document_type'
+        'document_name', 'application__application_number', 'document_type', 'preview__text'
     ]
     readonly_fields = [
         'file_size', 'file_type', 'is_expired', 'uploaded_at', 'updated_at'
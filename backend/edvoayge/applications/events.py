@@ -0,0 +1,441 @@
+"""
+Append-only event store and timeline projections for applications.
+
+Every change to an application, its status, interviews, fees and
+communications is appended to ``ApplicationEvent`` under the next sequence
+number of that application. In the same transaction the event is folded
+into the application's ``ApplicationProjection``: its current state (status,
+priority, scheduled interviews, open fees, unread communications) and its
+most recent events, newest first. The timeline reads those rows instead of
+querying the four history tables, and the dashboard uses them to pick which
+rows to load.
+
+Events are appended by the signals in ``applications.signals`` for writes
+made anywhere, and directly by ``change_status``. Projections are derived
+data: ``rebuild`` replays an application's log to recompute one, and
+``backfill`` seeds the log of applications that predate it (the
+``rebuild_application_timelines`` command).
+"""
+
+import json
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import (
+    Application, ApplicationEvent, ApplicationProjection, ApplicationStatus,
+    ApplicationInterview, ApplicationFee, ApplicationCommunication
+)
+
+logger = logging.getLogger(__name__)
+
+APPLICATION_FIELDS = (
+    'application_number', 'university_id', 'program_id', 'status', 'priority',
+    'intended_start_date', 'intended_start_semester', 'academic_year',
+    'submitted_at', 'reviewed_at', 'decision_date', 'is_complete', 'is_verified',
+)
+
+# Event prefix and snapshot fields of each child model
+CHILD_MODELS = {
+    ApplicationInterview: ('interview', (
+        'interview_type', 'status', 'scheduled_date', 'duration_minutes', 'location',
+        'platform', 'meeting_link', 'score', 'recommendation', 'completed_at',
+    )),
+    ApplicationFee: ('fee', (
+        'fee_type', 'amount', 'currency', 'payment_status', 'due_date', 'paid_at',
+    )),
+    ApplicationCommunication: ('communication', (
+        'communication_type', 'direction', 'subject', 'is_sent', 'is_read', 'created_at',
+    )),
+}
+
+
+def to_json(data):
+    """``data`` with dates, times and decimals as the strings they are stored as"""
+    return json.loads(json.dumps(data, cls=DjangoJSONEncoder))
+
+
+def snapshot(instance, fields):
+    return to_json({field: getattr(instance, field) for field in fields})
+
+
+def application_snapshot(application):
+    return snapshot(application, APPLICATION_FIELDS)
+
+
+def child_snapshot(instance):
+    _, fields = CHILD_MODELS[type(instance)]
+    return {'id': instance.pk, **snapshot(instance, fields)}
+
+
+def reduce_event(state, event_type, payload):
+    """
+    Fold one event into an application's state.
+
+    Args:
+        state (dict): Current state (modified in place)
+        event_type (str): ``ApplicationEvent.event_type``
+        payload (dict): Event payload
+
+    Returns:
+        dict: The new state
+    """
+    if event_type in ('created', 'details_changed'):
+        state.update(payload)
+    elif event_type == 'status_changed':
+        state['status'] = payload['status']
+        if payload.get('submitted_at'):
+            state['submitted_at'] = payload['submitted_at']
+    else:
+        kind, _, change = event_type.rpartition('_')
+        key = str(payload['id'])
+        if kind == 'communication':
+            unread = state.setdefault('unread_communications', [])
+            if key in unread:
+                unread.remove(key)
+            if change != 'removed' and payload.get('direction') == 'inbound' and not payload.get('is_read'):
+                unread.append(key)
+            counts = state.setdefault('counts', {})
+            counts['communications'] = counts.get('communications', 0) + {'added': 1, 'removed': -1}.get(change, 0)
+        else:
+            items = state.setdefault(f'{kind}s', {})
+            if change == 'removed':
+                items.pop(key, None)
+            else:
+                items[key] = {**items.get(key, {}), **payload}
+    return state
+
+
+def timeline_entry(event, actor_name=None):
+    """Timeline representation of an event, as kept on the projection"""
+    return to_json({
+        'sequence': event.sequence,
+        'event_type': event.event_type,
+        'payload': event.payload,
+        'actor': event.actor_id,
+        'actor_name': actor_name if actor_name is not None else (event.actor.username if event.actor_id else ''),
+        'occurred_at': event.occurred_at,
+    })
+
+
+class ApplicationEventStore:
+    """
+    Service class for appending application events and maintaining projections.
+    """
+
+    @staticmethod
+    def timeline_size():
+        return getattr(settings, 'APPLICATION_TIMELINE_SIZE', 20)
+
+    @classmethod
+    def fold(cls, projection, event, actor_name=None):
+        """Apply an event to a projection in memory"""
+        projection.state = reduce_event(projection.state, event.event_type, event.payload)
+        projection.status = projection.state.get('status', projection.status)
+        projection.version = event.sequence
+        projection.last_event_at = event.occurred_at
+        projection.timeline = [timeline_entry(event, actor_name)] + projection.timeline[:cls.timeline_size() - 1]
+
+    @classmethod
+    def lock_projection(cls, application):
+        """The application's projection, locked for this transaction and created if missing"""
+        ApplicationProjection.objects.get_or_create(
+            application=application, defaults={'user_id': application.user_id, 'status': application.status}
+        )
+        return ApplicationProjection.objects.select_for_update().get(pk=application.pk)
+
+    @classmethod
+    def append(cls, application, event_type, payload=None, actor=None, occurred_at=None):
+        """
+        Append an event and fold it into the application's projection.
+
+        Args:
+            application (Application): Application the event belongs to
+            event_type (str): One of ``ApplicationEvent.EVENT_TYPE_CHOICES``
+            payload (dict, optional): What changed
+            actor (User, optional): Who made the change
+            occurred_at (datetime, optional): When; now by default
+
+        Returns:
+            ApplicationEvent: The stored event
+        """
+        with transaction.atomic():
+            projection = cls.lock_projection(application)
+            event = ApplicationEvent.objects.create(
+                application=application,
+                sequence=projection.version + 1,
+                event_type=event_type,
+                payload=to_json(payload or {}),
+                actor=actor if actor is not None and actor.is_authenticated else None,
+                occurred_at=occurred_at or timezone.now(),
+            )
+            cls.fold(projection, event, actor_name=event.actor.username if event.actor_id else '')
+            projection.save()
+        logger.debug(f"Application {application.pk} event #{event.sequence}: {event_type}")
+        return event
+
+    @classmethod
+    def change_status(cls, application, new_status, actor=None, description='', notes=''):
+        """
+        Move an application to a new status, recording the event and the status history.
+
+        Returns:
+            ApplicationStatus: The history entry
+        """
+        previous_status = application.status
+        with transaction.atomic():
+            application.status = new_status
+            if new_status == 'submitted' and not application.submitted_at:
+                application.submitted_at = timezone.now()
+            cls.append(application, 'status_changed', {
+                'status': new_status,
+                'previous_status': previous_status,
+                'submitted_at': application.submitted_at if new_status == 'submitted' else None,
+                'description': description,
+            }, actor=actor)
+            # The projection already holds the new status, so the save signals record nothing more
+            application.save()
+            return ApplicationStatus.objects.create(
+                application=application, status=new_status, description=description, notes=notes,
+                changed_by=actor if actor is not None and actor.is_authenticated else None,
+            )
+
+    @classmethod
+    def record_application_save(cls, application, created):
+        """Append the events for a saved application, comparing it with its projection"""
+        if created:
+            payload = application_snapshot(application)
+            payload['university_name'] = application.university.name
+            payload['program_name'] = application.program.name
+            cls.append(application, 'created', payload, actor=application.user, occurred_at=application.created_at)
+            return
+
+        projection = ApplicationProjection.objects.filter(pk=application.pk).first()
+        if projection is None:
+            cls.backfill(application)
+            return
+        current = application_snapshot(application)
+        if current['status'] != projection.status:
+            cls.append(application, 'status_changed', {
+                'status': current['status'],
+                'previous_status': projection.status,
+                'submitted_at': current['submitted_at'] if current['status'] == 'submitted' else None,
+            })
+        changes = {
+            field: value for field, value in current.items()
+            if field != 'status' and projection.state.get(field) != value
+        }
+        if changes:
+            cls.append(application, 'details_changed', changes)
+
+    @classmethod
+    def record_status_entry(cls, entry):
+        """Append a status change for a history entry the projection does not reflect yet"""
+        projection = ApplicationProjection.objects.filter(pk=entry.application_id).first()
+        if projection is not None and projection.status == entry.status:
+            return
+        cls.append(entry.application, 'status_changed', {
+            'status': entry.status,
+            'previous_status': projection.status if projection else None,
+            'description': entry.description,
+        }, actor=entry.changed_by, occurred_at=entry.changed_at)
+
+    @classmethod
+    def record_child(cls, instance, change):
+        """
+        Append the event for an interview, fee or communication change.
+
+        Args:
+            instance: Saved or deleted child model instance
+            change (str): ``added``, ``updated`` or ``removed``
+        """
+        kind, _ = CHILD_MODELS[type(instance)]
+        payload = {'id': instance.pk} if change == 'removed' else child_snapshot(instance)
+        if change == 'updated':
+            projection = ApplicationProjection.objects.filter(pk=instance.application_id).first()
+            known = (projection.state.get(f'{kind}s', {}).get(str(instance.pk)) if projection else None)
+            if known == payload:
+                return
+        cls.append(instance.application, f'{kind}_{change}', payload)
+
+    @classmethod
+    def history(cls, application):
+        """
+        Events reconstructed from an application's existing tables, oldest first.
+
+        Returns:
+            list: (event_type, payload, actor, occurred_at) tuples
+        """
+        statuses = list(application.status_history.select_related('changed_by').order_by('changed_at', 'pk'))
+        created = application_snapshot(application)
+        created.update(university_name=application.university.name, program_name=application.program.name)
+        created['status'] = 'draft' if statuses else application.status
+        history = [('created', created, application.user, application.created_at)]
+
+        previous_status = created['status']
+        for entry in statuses:
+            history.append(('status_changed', {
+                'status': entry.status, 'previous_status': previous_status, 'description': entry.description,
+            }, entry.changed_by, entry.changed_at))
+            previous_status = entry.status
+
+        for model, (kind, _) in CHILD_MODELS.items():
+            for instance in model.objects.filter(application=application):
+                history.append((f'{kind}_added', child_snapshot(instance), None, instance.created_at))
+
+        history.sort(key=lambda item: item[3])
+        if previous_status != application.status:
+            history.append(('status_changed', {
+                'status': application.status, 'previous_status': previous_status,
+            }, None, application.updated_at))
+        return history
+
+    @classmethod
+    def backfill(cls, application):
+        """
+        Seed the event log of an application created before it existed.
+
+        Does nothing if the application already has events.
+
+        Returns:
+            ApplicationProjection: The projection
+        """
+        with transaction.atomic():
+            projection = cls.lock_projection(application)
+            if projection.version:
+                return projection
+            events = []
+            for sequence, (event_type, payload, actor, occurred_at) in enumerate(cls.history(application), start=1):
+                event = ApplicationEvent(
+                    application=application, sequence=sequence, event_type=event_type,
+                    payload=to_json(payload), actor=actor, occurred_at=occurred_at,
+                )
+                cls.fold(projection, event, actor_name=actor.username if actor else '')
+                events.append(event)
+            ApplicationEvent.objects.bulk_create(events)
+            projection.save()
+        logger.info(f"Backfilled {len(events)} events for application {application.pk}")
+        return projection
+
+    @classmethod
+    def rebuild(cls, application):
+        """
+        Recompute an application's projection by replaying its event log.
+
+        Returns:
+            ApplicationProjection: The projection
+        """
+        with transaction.atomic():
+            projection = cls.lock_projection(application)
+            projection.state, projection.timeline, projection.version = {}, [], 0
+            projection.status, projection.last_event_at = application.status, None
+            for event in application.events.select_related('actor').order_by('sequence').iterator():
+                cls.fold(projection, event)
+            projection.save()
+        return projection
+
+    @classmethod
+    def rebuild_all(cls, backfill=False):
+        """
+        Rebuild every projection, optionally backfilling applications without events.
+
+        Returns:
+            tuple: (projections rebuilt, applications backfilled)
+        """
+        rebuilt = backfilled = 0
+        applications = Application.objects.select_related('user', 'university', 'program')
+        for application in applications.iterator():
+            if backfill and not application.events.exists():
+                cls.backfill(application)
+                backfilled += 1
+            else:
+                cls.rebuild(application)
+                rebuilt += 1
+        logger.info(f"Rebuilt {rebuilt} application projections, backfilled {backfilled}")
+        return rebuilt, backfilled
+
+    @classmethod
+    def timeline(cls, application_id, before=None, limit=None):
+        """
+        Events older than sequence ``before``, newest first, from the log.
+
+        Returns:
+            list: Timeline entries
+        """
+        limit = limit or cls.timeline_size()
+        events = ApplicationEvent.objects.filter(application_id=application_id, sequence__lt=before)
+        return [timeline_entry(event) for event in events.select_related('actor').order_by('-sequence')[:limit]]
+
+    @classmethod
+    def dashboard(cls, user, limit=5, recent_limit=10):
+        """
+        Dashboard rows of a user, picked from their projections.
+
+        The projections give the counts and which interviews and fees are
+        upcoming or pending; the rows themselves are then loaded by key, so
+        they can be serialized as before. Applications that predate the
+        event log are backfilled first, as ``timeline`` does.
+
+        Returns:
+            dict: ``user_applications``, ``recent_status_updates``,
+            ``upcoming_interviews``, ``pending_fees``,
+            ``recent_communications`` and ``overdue_applications`` querysets,
+            and the ``stats`` counts
+        """
+        missing = Application.objects.filter(user=user, projection__isnull=True)
+        for application in missing.select_related('user', 'university', 'program'):
+            cls.backfill(application)
+
+        now = timezone.now()
+        overdue_before = now - timedelta(days=30)
+        application_ids, interview_ids, fee_ids, overdue_ids = [], [], [], []
+        by_status, by_university = {}, {}
+        for projection in ApplicationProjection.objects.filter(user=user):
+            state = projection.state
+            application_ids.append(projection.application_id)
+            by_status[projection.status] = by_status.get(projection.status, 0) + 1
+            university = state.get('university_name') or str(state.get('university_id'))
+            by_university[university] = by_university.get(university, 0) + 1
+            submitted_at = parse_datetime(state.get('submitted_at') or '')
+            if projection.status in ('submitted', 'under_review') and submitted_at and submitted_at < overdue_before:
+                overdue_ids.append(projection.application_id)
+
+            for key, interview in state.get('interviews', {}).items():
+                scheduled_date = parse_datetime(interview.get('scheduled_date') or '')
+                if interview.get('status') == 'scheduled' and scheduled_date and scheduled_date >= now:
+                    interview_ids.append(int(key))
+            fee_ids.extend(
+                int(key) for key, fee in state.get('fees', {}).items() if fee.get('payment_status') == 'pending'
+            )
+
+        applications = Application.objects.select_related('user', 'university', 'program').prefetch_related(
+            'documents', 'status_history', 'interviews', 'fees', 'communications'
+        )
+        return {
+            'user_applications': applications.filter(pk__in=application_ids).order_by('-created_at')[:limit],
+            'recent_status_updates': ApplicationStatus.objects.filter(
+                application_id__in=application_ids
+            ).select_related('application', 'changed_by').order_by('-changed_at')[:recent_limit],
+            'upcoming_interviews': ApplicationInterview.objects.filter(
+                pk__in=interview_ids
+            ).select_related('application').order_by('scheduled_date')[:limit],
+            'pending_fees': ApplicationFee.objects.filter(
+                pk__in=fee_ids
+            ).select_related('application').order_by('due_date')[:limit],
+            'recent_communications': ApplicationCommunication.objects.filter(
+                application_id__in=application_ids
+            ).select_related('application').order_by('-created_at')[:recent_limit],
+            'overdue_applications': applications.filter(pk__in=overdue_ids).order_by('submitted_at'),
+            'stats': {
+                'total_applications': len(application_ids),
+                'submitted_applications': by_status.get('submitted', 0),
+                'accepted_applications': by_status.get('accepted', 0),
+                'rejected_applications': by_status.get('rejected', 0),
+                'pending_applications': by_status.get('draft', 0) + by_status.get('under_review', 0),
+                'applications_by_status': by_status,
+                'applications_by_university': by_university,
+            },
+        }
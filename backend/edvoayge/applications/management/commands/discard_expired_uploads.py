@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from applications.uploads import DocumentUploadService
+
+
+class Command(BaseCommand):
+    help = 'Delete unfinished resumable document uploads past their expiry'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep discarding periodically')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            discarded = DocumentUploadService.discard_expired()
+            self.stdout.write(self.style.SUCCESS(f'Discarded {discarded} expired upload(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
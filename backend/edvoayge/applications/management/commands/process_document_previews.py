@@ -0,0 +1,41 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from applications.previews import DocumentPreviewService
+
+
+class Command(BaseCommand):
+    help = 'Render previews and extract text of application documents waiting to be processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for queued documents')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls with --loop')
+        parser.add_argument('--limit', type=int, default=None, help='Most documents rendered per poll')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Also retry documents left in processing by an interrupted worker'
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=30,
+            help='Minutes before a processing document is considered interrupted'
+        )
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='First queue documents uploaded before previews existed'
+        )
+
+    def handle(self, *args, **options):
+        if options['backfill']:
+            queued = DocumentPreviewService.enqueue_missing()
+            self.stdout.write(self.style.SUCCESS(f'Queued {queued} document(s)'))
+
+        while True:
+            close_old_connections()
+            processed = DocumentPreviewService.process_pending(
+                limit=options['limit'], resume=options['resume'], stale_after_minutes=options['stale_after']
+            )
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} document(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from applications.events import ApplicationEventStore
+
+
+class Command(BaseCommand):
+    help = 'Recompute application projections from their event logs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill', action='store_true',
+            help='Seed the event log of applications that have none from their existing history'
+        )
+
+    def handle(self, *args, **options):
+        rebuilt, backfilled = ApplicationEventStore.rebuild_all(backfill=options['backfill'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} projection(s), backfilled {backfilled} application(s)'))
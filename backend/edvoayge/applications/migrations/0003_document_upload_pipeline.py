@@ -0,0 +1,49 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:08
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0002_alter_application_application_number'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='applicationdocument',
+            name='checksum',
+            field=models.CharField(blank=True, db_index=True, max_length=64, verbose_name='Checksum (SHA-256)'),
+        ),
+        migrations.CreateModel(
+            name='DocumentUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('document_type', models.CharField(choices=[('transcript', 'Academic Transcript'), ('diploma', 'Diploma/Certificate'), ('passport', 'Passport'), ('visa', 'Visa'), ('ielts', 'IELTS Certificate'), ('toefl', 'TOEFL Certificate'), ('gre', 'GRE Score'), ('gmat', 'GMAT Score'), ('cv', 'CV/Resume'), ('personal_statement', 'Personal Statement'), ('research_proposal', 'Research Proposal'), ('reference_letter', 'Reference Letter'), ('financial_statement', 'Financial Statement'), ('medical_certificate', 'Medical Certificate'), ('other', 'Other')], max_length=20, verbose_name='Document Type')),
+                ('document_name', models.CharField(max_length=255, verbose_name='Document Name')),
+                ('is_required', models.BooleanField(default=True, verbose_name='Required Document')),
+                ('expiry_date', models.DateField(blank=True, null=True, verbose_name='Expiry Date')),
+                ('file_name', models.CharField(max_length=255, verbose_name='File Name')),
+                ('total_size', models.PositiveBigIntegerField(verbose_name='Total Size (bytes)')),
+                ('received_size', models.PositiveBigIntegerField(default=0, verbose_name='Received Size (bytes)')),
+                ('checksum', models.CharField(blank=True, help_text='SHA-256 the client expects; checked on completion', max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('complete', 'Complete'), ('failed', 'Failed')], default='uploading', max_length=20, verbose_name='Status')),
+                ('error', models.CharField(blank=True, max_length=255, verbose_name='Error')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expires At')),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_uploads', to='applications.application')),
+                ('document', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload', to='applications.applicationdocument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='document_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Document Upload',
+                'verbose_name_plural': 'Document Uploads',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0003_document_upload_pipeline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentPreview',
+            fields=[
+                ('document', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='preview', serialize=False, to='applications.applicationdocument')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('skipped', 'Skipped'), ('failed', 'Failed')], db_index=True, default='pending', max_length=20, verbose_name='Status')),
+                ('source', models.CharField(blank=True, help_text='Checksum (or file name) of the file the preview was made from', max_length=255)),
+                ('image', models.ImageField(blank=True, upload_to='applications/previews/', verbose_name='Preview')),
+                ('thumbnail', models.ImageField(blank=True, upload_to='applications/previews/thumbnails/', verbose_name='Thumbnail')),
+                ('page_count', models.PositiveIntegerField(blank=True, null=True, verbose_name='Page Count')),
+                ('text', models.TextField(blank=True, verbose_name='Extracted Text')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+                ('error', models.TextField(blank=True, verbose_name='Error')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Started At')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='Processed At')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Document Preview',
+                'verbose_name_plural': 'Document Previews',
+                'ordering': ['created_at'],
+            },
+        ),
+    ]
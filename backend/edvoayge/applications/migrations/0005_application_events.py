@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-19 07:17
+
+import django.core.serializers.json
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('applications', '0004_document_previews'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ApplicationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sequence', models.PositiveIntegerField(verbose_name='Sequence')),
+                ('event_type', models.CharField(choices=[('created', 'Application Created'), ('details_changed', 'Details Changed'), ('status_changed', 'Status Changed'), ('interview_added', 'Interview Scheduled'), ('interview_updated', 'Interview Updated'), ('interview_removed', 'Interview Removed'), ('fee_added', 'Fee Added'), ('fee_updated', 'Fee Updated'), ('fee_removed', 'Fee Removed'), ('communication_added', 'Communication Added'), ('communication_updated', 'Communication Updated'), ('communication_removed', 'Communication Removed')], max_length=30, verbose_name='Event Type')),
+                ('payload', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='Payload')),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Occurred At')),
+                ('actor', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='application_events', to=settings.AUTH_USER_MODEL, verbose_name='Actor')),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='applications.application')),
+            ],
+            options={
+                'verbose_name': 'Application Event',
+                'verbose_name_plural': 'Application Events',
+                'ordering': ['application', 'sequence'],
+                'unique_together': {('application', 'sequence')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ApplicationProjection',
+            fields=[
+                ('application', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='projection', serialize=False, to='applications.application')),
+                ('status', models.CharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted'), ('under_review', 'Under Review'), ('interview_scheduled', 'Interview Scheduled'), ('interview_completed', 'Interview Completed'), ('accepted', 'Accepted'), ('rejected', 'Rejected'), ('waitlisted', 'Waitlisted'), ('withdrawn', 'Withdrawn'), ('deferred', 'Deferred')], max_length=20, verbose_name='Status')),
+                ('version', models.PositiveIntegerField(default=0, help_text='Sequence of the last event applied')),
+                ('state', models.JSONField(default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder, verbose_name='State')),
+                ('timeline', models.JSONField(default=list, encoder=django.core.serializers.json.DjangoJSONEncoder, help_text='Most recent events, newest first', verbose_name='Timeline')),
+                ('last_event_at', models.DateTimeField(blank=True, null=True, verbose_name='Last Event At')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='application_projections', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Application Projection',
+                'verbose_name_plural': 'Application Projections',
+                'indexes': [models.Index(fields=['user', '-last_event_at'], name='projection_user_recent_idx')],
+            },
+        ),
+    ]
@@ -3,8 +3,10 @@ Application models for EdVoyage application.
 Handles university applications, documents, and application tracking.
 """
 
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 
@@ -139,6 +141,7 @@ class ApplicationDocument(models.Model):
     file = models.FileField(upload_to='applications/documents/', verbose_name="Document File")
     file_size = models.PositiveIntegerField(null=True, blank=True, verbose_name="File Size (bytes)")
     file_type = models.CharField(max_length=50, blank=True, verbose_name="File Type")
+    checksum = models.CharField(max_length=64, blank=True, db_index=True, verbose_name="Checksum (SHA-256)")
     
     # Status
     status = models.CharField(max_length=20, choices=DOCUMENT_STATUS_CHOICES, default='pending', verbose_name="Status")
@@ -180,6 +183,86 @@ class ApplicationDocument(models.Model):
         return False
 
 
+class DocumentPreview(models.Model):
+    """
+    Preview images and extracted text of an application document, and the job producing them.
+    """
+    PREVIEW_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('skipped', 'Skipped'),
+        ('failed', 'Failed'),
+    ]
+
+    document = models.OneToOneField(ApplicationDocument, on_delete=models.CASCADE, primary_key=True, related_name='preview')
+    status = models.CharField(max_length=20, choices=PREVIEW_STATUS_CHOICES, default='pending', db_index=True, verbose_name="Status")
+    source = models.CharField(max_length=255, blank=True, help_text="Checksum (or file name) of the file the preview was made from")
+
+    # Output
+    image = models.ImageField(upload_to='applications/previews/', blank=True, verbose_name="Preview")
+    thumbnail = models.ImageField(upload_to='applications/previews/thumbnails/', blank=True, verbose_name="Thumbnail")
+    page_count = models.PositiveIntegerField(null=True, blank=True, verbose_name="Page Count")
+    text = models.TextField(blank=True, verbose_name="Extracted Text")
+
+    # Job
+    attempts = models.PositiveSmallIntegerField(default=0, verbose_name="Attempts")
+    error = models.TextField(blank=True, verbose_name="Error")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Started At")
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name="Processed At")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Document Preview"
+        verbose_name_plural = "Document Previews"
+        ordering = ['created_at']
+
+    def __str__(self):
+        return f"{self.document_id} - {self.status}"
+
+
+class DocumentUpload(models.Model):
+    """
+    A resumable document upload, sent in chunks and assembled on the server.
+    """
+    UPLOAD_STATUS_CHOICES = [
+        ('uploading', 'Uploading'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='document_uploads')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_uploads')
+    document_type = models.CharField(max_length=20, choices=ApplicationDocument.DOCUMENT_TYPE_CHOICES, verbose_name="Document Type")
+    document_name = models.CharField(max_length=255, verbose_name="Document Name")
+    is_required = models.BooleanField(default=True, verbose_name="Required Document")
+    expiry_date = models.DateField(null=True, blank=True, verbose_name="Expiry Date")
+
+    # Transfer
+    file_name = models.CharField(max_length=255, verbose_name="File Name")
+    total_size = models.PositiveBigIntegerField(verbose_name="Total Size (bytes)")
+    received_size = models.PositiveBigIntegerField(default=0, verbose_name="Received Size (bytes)")
+    checksum = models.CharField(max_length=64, blank=True, help_text="SHA-256 the client expects; checked on completion")
+
+    # Result
+    status = models.CharField(max_length=20, choices=UPLOAD_STATUS_CHOICES, default='uploading', verbose_name="Status")
+    document = models.OneToOneField(ApplicationDocument, on_delete=models.SET_NULL, null=True, blank=True, related_name='upload')
+    error = models.CharField(max_length=255, blank=True, verbose_name="Error")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    expires_at = models.DateTimeField(db_index=True, verbose_name="Expires At")
+
+    class Meta:
+        verbose_name = "Document Upload"
+        verbose_name_plural = "Document Uploads"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.file_name} ({self.received_size}/{self.total_size})"
+
+
 class ApplicationStatus(models.Model):
     """
     Application status tracking model.
@@ -405,3 +488,70 @@ class ApplicationCommunication(models.Model):
         if not self.pk:
             print(f"Communication created: {self.application.application_number}") if hasattr(self, '_meta') else None
         super().save(*args, **kwargs)
+
+
+class ApplicationEvent(models.Model):
+    """
+    One change to an application, in an append-only log.
+    """
+    EVENT_TYPE_CHOICES = [
+        ('created', 'Application Created'),
+        ('details_changed', 'Details Changed'),
+        ('status_changed', 'Status Changed'),
+        ('interview_added', 'Interview Scheduled'),
+        ('interview_updated', 'Interview Updated'),
+        ('interview_removed', 'Interview Removed'),
+        ('fee_added', 'Fee Added'),
+        ('fee_updated', 'Fee Updated'),
+        ('fee_removed', 'Fee Removed'),
+        ('communication_added', 'Communication Added'),
+        ('communication_updated', 'Communication Updated'),
+        ('communication_removed', 'Communication Removed'),
+    ]
+
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='events')
+    sequence = models.PositiveIntegerField(verbose_name="Sequence")
+    event_type = models.CharField(max_length=30, choices=EVENT_TYPE_CHOICES, verbose_name="Event Type")
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="Payload")
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='application_events', verbose_name="Actor")
+    occurred_at = models.DateTimeField(default=timezone.now, verbose_name="Occurred At")
+
+    class Meta:
+        verbose_name = "Application Event"
+        verbose_name_plural = "Application Events"
+        ordering = ['application', 'sequence']
+        unique_together = ['application', 'sequence']
+
+    def __str__(self):
+        return f"{self.application_id} #{self.sequence} {self.event_type}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Application events are append-only")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Application events are append-only")
+
+
+class ApplicationProjection(models.Model):
+    """
+    Current state and recent timeline of an application, folded from its events on write.
+    """
+    application = models.OneToOneField(Application, on_delete=models.CASCADE, primary_key=True, related_name='projection')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='application_projections')
+    status = models.CharField(max_length=20, choices=Application.APPLICATION_STATUS_CHOICES, verbose_name="Status")
+    version = models.PositiveIntegerField(default=0, help_text="Sequence of the last event applied")
+    state = models.JSONField(default=dict, encoder=DjangoJSONEncoder, verbose_name="State")
+    timeline = models.JSONField(default=list, encoder=DjangoJSONEncoder, verbose_name="Timeline", help_text="Most recent events, newest first")
+    last_event_at = models.DateTimeField(null=True, blank=True, verbose_name="Last Event At")
+
+    class Meta:
+        verbose_name = "Application Projection"
+        verbose_name_plural = "Application Projections"
+        indexes = [
+            models.Index(fields=['user', '-last_event_at'], name='projection_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.application_id} - {self.status} (v{self.version})"
@@ -0,0 +1,324 @@
+"""
+Background previews and text extraction for application documents.
+
+Saving a document queues a ``DocumentPreview`` job. A worker renders the
+first page (PDFs through pdf2image, images directly) into a preview and a
+thumbnail, and extracts the text (PyPDF2 for PDFs, the document XML for
+DOCX) into ``DocumentPreview.text``, which the document list searches.
+Rendering runs on a process pool by the ``process_document_previews``
+command, or on a background thread right after an upload. Jobs are claimed
+with a compare-and-set, so concurrent workers never render a document
+twice, and a document whose file did not change is not rendered again.
+"""
+
+import io
+import logging
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from uuid import uuid4
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from edvoayge.images import get_format
+from notes.services import get_poppler_path
+from .models import ApplicationDocument, DocumentPreview
+from .uploads import file_extension
+
+logger = logging.getLogger(__name__)
+
+IMAGE_TYPES = ('jpg', 'jpeg', 'png')
+TEXT_TYPES = ('pdf', 'docx')
+
+
+def pdf_first_page(path, dpi, poppler_path=None):
+    """First page of a PDF as a PIL image"""
+    from pdf2image import convert_from_path
+    return convert_from_path(path, dpi=dpi, first_page=1, last_page=1, poppler_path=poppler_path, thread_count=1)[0]
+
+
+def pdf_text(path, max_chars):
+    """
+    Page count and text of a PDF, stopping once ``max_chars`` are extracted.
+
+    Returns:
+        tuple: (page count, text)
+    """
+    from PyPDF2 import PdfReader
+
+    reader = PdfReader(path)
+    parts, length = [], 0
+    for page in reader.pages:
+        if length >= max_chars:
+            break
+        text = (page.extract_text() or '').strip()
+        if text:
+            parts.append(text)
+            length += len(text)
+    return len(reader.pages), '\n\n'.join(parts)[:max_chars]
+
+
+def docx_text(path, max_chars):
+    """Text of a DOCX, read from its document XML"""
+    with zipfile.ZipFile(path) as archive:
+        xml = archive.read('word/document.xml').decode('utf-8', errors='ignore')
+    xml = re.sub(r'</w:p>', '\n', xml)
+    text = re.sub(r'<[^>]+>', '', xml)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()[:max_chars]
+
+
+def encode_image(image, width, image_format, quality):
+    """Resize an image to at most ``width`` pixels wide and encode it"""
+    from PIL import Image, ImageOps
+
+    image = ImageOps.exif_transpose(image).convert('RGB')
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format=image_format.upper(), quality=quality)
+    return output.getvalue()
+
+
+def render_document(path, extension, options):
+    """
+    Render the preview images and extract the text of one file.
+
+    Runs in a pool worker, so it must not touch the database.
+
+    Args:
+        path (str): File path
+        extension (str): Document file type
+        options (dict): ``preview_width``, ``thumbnail_width``, ``format``,
+            ``quality``, ``dpi``, ``max_chars`` and ``poppler_path``
+
+    Returns:
+        dict: ``page_count``, ``text``, ``preview`` and ``thumbnail`` (encoded
+        bytes, None when the type has no preview)
+    """
+    from PIL import Image
+
+    result = {'page_count': None, 'text': '', 'preview': None, 'thumbnail': None}
+    first_page = None
+    if extension == 'pdf':
+        result['page_count'], result['text'] = pdf_text(path, options['max_chars'])
+        first_page = pdf_first_page(path, options['dpi'], options['poppler_path'])
+    elif extension == 'docx':
+        result['text'] = docx_text(path, options['max_chars'])
+    elif extension in IMAGE_TYPES:
+        first_page = Image.open(path)
+        result['page_count'] = 1
+
+    if first_page is not None:
+        try:
+            for key in ('preview', 'thumbnail'):
+                result[key] = encode_image(
+                    first_page, options[f'{key}_width'], options['format'], options['quality']
+                )
+        finally:
+            first_page.close()
+    return result
+
+
+class DocumentPreviewService:
+    """
+    Service class for queueing and running document preview jobs.
+    """
+
+    @staticmethod
+    def source_of(document):
+        """What identifies a document's file content; a changed file needs a new preview"""
+        return document.checksum or document.file.name or ''
+
+    @classmethod
+    def options(cls):
+        return {
+            'preview_width': getattr(settings, 'DOCUMENT_PREVIEW_WIDTH', 960),
+            'thumbnail_width': getattr(settings, 'DOCUMENT_THUMBNAIL_WIDTH', 240),
+            'format': get_format(),
+            'quality': getattr(settings, 'DOCUMENT_PREVIEW_QUALITY', 80),
+            'dpi': getattr(settings, 'DOCUMENT_PREVIEW_DPI', 100),
+            'max_chars': getattr(settings, 'DOCUMENT_TEXT_MAX_CHARS', 100000),
+            'poppler_path': get_poppler_path(),
+        }
+
+    @classmethod
+    def enqueue(cls, document):
+        """
+        Queue a preview job for a document whose file is new or changed.
+
+        Returns:
+            bool: True if a job was queued
+        """
+        if not document.file:
+            return False
+        source = cls.source_of(document)
+        preview, created = DocumentPreview.objects.get_or_create(document=document, defaults={'source': source})
+        if not created:
+            if preview.source == source and preview.status != 'failed':
+                return False
+            DocumentPreview.objects.filter(pk=preview.pk).update(
+                status='pending', source=source, attempts=0, error=''
+            )
+        transaction.on_commit(lambda: cls.start(document.pk))
+        return True
+
+    @classmethod
+    def enqueue_missing(cls):
+        """
+        Queue jobs for documents that have none (uploaded before previews existed).
+
+        Returns:
+            int: Number of jobs queued
+        """
+        documents = ApplicationDocument.objects.filter(preview__isnull=True).exclude(file='')
+        jobs = [DocumentPreview(document=document, source=cls.source_of(document)) for document in documents]
+        DocumentPreview.objects.bulk_create(jobs, batch_size=500, ignore_conflicts=True)
+        return len(jobs)
+
+    @classmethod
+    def claim(cls, document_id, resume=False):
+        """
+        Move a job to ``processing`` if no other worker has.
+
+        Returns:
+            bool: True if this worker owns the job
+        """
+        statuses = ['pending', 'processing'] if resume else ['pending']
+        return bool(DocumentPreview.objects.filter(document_id=document_id, status__in=statuses).update(
+            status='processing', started_at=timezone.now(), attempts=F('attempts') + 1,
+        ))
+
+    @classmethod
+    def store(cls, document, source, result):
+        """Save a rendered result, unless the file changed while it was rendering"""
+        preview = DocumentPreview.objects.get(pk=document.pk)
+        if preview.source != source:
+            return False
+        name = uuid4().hex
+        image_format = get_format()
+        extension = 'jpg' if image_format == 'jpeg' else image_format
+        for field, key in (('image', 'preview'), ('thumbnail', 'thumbnail')):
+            if result[key]:
+                getattr(preview, field).save(f'{name}.{extension}', ContentFile(result[key]), save=False)
+        has_output = bool(result['preview'] or result['text'])
+        DocumentPreview.objects.filter(pk=document.pk, source=source).update(
+            status='completed' if has_output else 'skipped',
+            image=preview.image.name or '',
+            thumbnail=preview.thumbnail.name or '',
+            page_count=result['page_count'],
+            text=result['text'].replace('\x00', ''),
+            error='',
+            processed_at=timezone.now(),
+        )
+        return True
+
+    @classmethod
+    def fail(cls, document_id, error):
+        logger.error(f"Error rendering preview of document {document_id}: {error}")
+        DocumentPreview.objects.filter(pk=document_id).update(
+            status='failed', error=str(error), processed_at=timezone.now()
+        )
+
+    @classmethod
+    def process(cls, document_ids, resume=False, workers=None):
+        """
+        Claim and render preview jobs.
+
+        With more than one job and ``DOCUMENT_PREVIEW_WORKERS`` set, files
+        are rendered on a process pool and stored as each finishes.
+
+        Args:
+            document_ids (iterable): Documents whose jobs to run
+            resume (bool): Also take jobs left in ``processing``
+            workers (int, optional): Pool size; ``DOCUMENT_PREVIEW_WORKERS`` by default
+
+        Returns:
+            int: Number of jobs this call ran
+        """
+        claimed = [pk for pk in document_ids if cls.claim(pk, resume=resume)]
+        if not claimed:
+            return 0
+
+        documents = ApplicationDocument.objects.filter(pk__in=claimed)
+        tasks = []
+        for document in documents:
+            extension = file_extension(document.file.name)
+            if extension not in IMAGE_TYPES + TEXT_TYPES:
+                cls.store(document, cls.source_of(document),
+                          {'page_count': None, 'text': '', 'preview': None, 'thumbnail': None})
+                continue
+            try:
+                tasks.append((document, cls.source_of(document), document.file.path, extension))
+            except Exception as e:
+                cls.fail(document.pk, e)
+
+        options = cls.options()
+        workers = getattr(settings, 'DOCUMENT_PREVIEW_WORKERS', 2) if workers is None else workers
+        if workers and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {
+                    pool.submit(render_document, path, extension, options): (document, source)
+                    for document, source, path, extension in tasks
+                }
+                for future in as_completed(futures):
+                    document, source = futures[future]
+                    try:
+                        cls.store(document, source, future.result())
+                    except Exception as e:
+                        cls.fail(document.pk, e)
+        else:
+            for document, source, path, extension in tasks:
+                try:
+                    cls.store(document, source, render_document(path, extension, options))
+                except Exception as e:
+                    cls.fail(document.pk, e)
+
+        logger.info(f"Rendered previews of {len(claimed)} documents")
+        return len(claimed)
+
+    @classmethod
+    def _run_in_thread(cls, document_id):
+        try:
+            cls.process([document_id])
+        except Exception as e:
+            logger.error(f"Error in background preview of document {document_id}: {e}")
+        finally:
+            connection.close()
+
+    @classmethod
+    def start(cls, document_id):
+        """
+        Render a document's preview in the background.
+
+        With ``DOCUMENT_PREVIEW_ASYNC`` disabled it is rendered before
+        returning. Jobs that were never started are picked up by the
+        ``process_document_previews`` command.
+        """
+        if getattr(settings, 'DOCUMENT_PREVIEW_ASYNC', True):
+            threading.Thread(
+                target=cls._run_in_thread, args=(document_id,), name=f'document-preview-{document_id}', daemon=True,
+            ).start()
+        else:
+            cls.process([document_id])
+
+    @classmethod
+    def process_pending(cls, limit=None, resume=False, stale_after_minutes=30, max_attempts=3):
+        """
+        Run queued jobs on the process pool.
+
+        With ``resume``, jobs stuck in ``processing`` for longer than
+        ``stale_after_minutes`` are retried, up to ``max_attempts`` times.
+
+        Returns:
+            int: Number of jobs run
+        """
+        due = Q(status='pending')
+        if resume:
+            stale = timezone.now() - timedelta(minutes=stale_after_minutes)
+            due |= Q(status='processing', started_at__lt=stale, attempts__lt=max_attempts)
+        document_ids = DocumentPreview.objects.filter(due).order_by('created_at').values_list('document_id', flat=True)
+        return cls.process(list(document_ids[:limit] if limit else document_ids), resume=resume)
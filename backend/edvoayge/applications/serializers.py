@@ -3,12 +3,50 @@ Application serializers for EdVoyage API.
 Handles data serialization for application-related endpoints.
 """
 
+from django.urls import reverse
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import (
     Application, ApplicationDocument, ApplicationStatus, ApplicationInterview,
-    ApplicationFee, ApplicationCommunication
+    ApplicationFee, ApplicationCommunication, ApplicationProjection, DocumentPreview, DocumentUpload
 )
+from .events import ApplicationEventStore
+from .uploads import UploadRejected, check_extension, check_signature, check_size, file_checksum, file_extension
+
+
+def validate_document_file(value):
+    """Check an uploaded document's size, extension and leading bytes."""
+    if value:
+        try:
+            check_size(value.size)
+            extension = check_extension(value.name)
+            if not getattr(value, 'sha256', None):
+                # Not streamed through DocumentUploadHandler, which checks this as it reads
+                head = next(value.chunks(), b'')
+                value.seek(0)
+                check_signature(extension, head)
+        except UploadRejected as e:
+            raise serializers.ValidationError(str(e))
+    return value
+
+
+def document_download_url(document, request=None, variant=None):
+    """Documents are private: they are linked through the authenticated download action, not MEDIA_URL."""
+    url = reverse('applications:application-document-download', kwargs={
+        'application_pk': document.application_id, 'pk': document.pk
+    })
+    if variant:
+        url = f'{url}?variant={variant}'
+    return request.build_absolute_uri(url) if request else url
+
+
+class DocumentPreviewSerializer(serializers.ModelSerializer):
+    """Serializer for document previews, without the extracted text."""
+    
+    class Meta:
+        model = DocumentPreview
+        fields = ['status', 'image', 'thumbnail', 'page_count', 'processed_at']
+        read_only_fields = fields
 
 
 class ApplicationDocumentSerializer(serializers.ModelSerializer):
@@ -18,35 +56,42 @@ class ApplicationDocumentSerializer(serializers.ModelSerializer):
     document_type_display = serializers.CharField(source='get_document_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     is_expired = serializers.ReadOnlyField()
+    preview = serializers.SerializerMethodField()
     
     class Meta:
         model = ApplicationDocument
         fields = [
             'id', 'application_number', 'document_type', 'document_type_display',
-            'document_name', 'file', 'file_size', 'file_type', 'status',
+            'document_name', 'file', 'file_size', 'file_type', 'checksum', 'status',
             'status_display', 'is_required', 'is_verified', 'verified_by',
             'verified_at', 'verification_notes', 'expiry_date', 'is_expired',
-            'uploaded_at', 'updated_at'
+            'preview', 'uploaded_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'application_number', 'document_type_display', 'status_display',
-            'file_size', 'file_type', 'is_expired', 'uploaded_at', 'updated_at'
+            'file_size', 'file_type', 'checksum', 'is_expired', 'preview', 'uploaded_at', 'updated_at'
         ]
     
+    def get_preview(self, obj):
+        """Preview images once rendered; None before the job is queued."""
+        preview = getattr(obj, 'preview', None)
+        if preview is None:
+            return None
+        data = DocumentPreviewSerializer(preview, context=self.context).data
+        for field, variant in (('image', 'preview'), ('thumbnail', 'thumbnail')):
+            if data[field]:
+                data[field] = document_download_url(obj, self.context.get('request'), variant)
+        return data
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data.get('file'):
+            data['file'] = document_download_url(instance, self.context.get('request'))
+        return data
+    
     def validate_file(self, value):
         """Validate file upload."""
-        if value:
-            # Check file size (max 10MB)
-            if value.size > 10 * 1024 * 1024:
-                raise serializers.ValidationError("File size must be less than 10MB.")
-            
-            # Check file type
-            allowed_types = ['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png']
-            file_extension = value.name.split('.')[-1].lower()
-            if file_extension not in allowed_types:
-                raise serializers.ValidationError("File type not allowed. Please upload PDF, DOC, DOCX, JPG, JPEG, or PNG files.")
-        
-        return value
+        return validate_document_file(value)
 
 
 class ApplicationStatusSerializer(serializers.ModelSerializer):
@@ -298,20 +343,17 @@ class ApplicationStatusUpdateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         """Create status update and update application status."""
-        application = self.context['application']
+        application = validated_data.pop('application', None) or self.context['application']
         user = self.context['request'].user
         
-        # Update application status
-        application.status = validated_data['status']
-        if validated_data['status'] == 'submitted' and not application.submitted_at:
-            application.submitted_at = timezone.now()
-        application.save()
-        
-        # Create status history entry
-        validated_data['application'] = application
-        validated_data['changed_by'] = user
-        
-        return super().create(validated_data)
+        # Update application status, appending the event and the history entry together
+        return ApplicationEventStore.change_status(
+            application,
+            validated_data['status'],
+            actor=user,
+            description=validated_data.get('description', ''),
+            notes=validated_data.get('notes', ''),
+        )
 
 
 class ApplicationDocumentCreateSerializer(serializers.ModelSerializer):
@@ -321,20 +363,65 @@ class ApplicationDocumentCreateSerializer(serializers.ModelSerializer):
         model = ApplicationDocument
         fields = [
             'document_type', 'document_name', 'file', 'is_required',
-            'expiry_date', 'description'
+            'expiry_date'
         ]
     
+    def validate_file(self, value):
+        """Validate file upload."""
+        return validate_document_file(value)
+    
     def create(self, validated_data):
         """Create document with application context."""
-        application = self.context['application']
-        validated_data['application'] = application
+        if 'application' not in validated_data:
+            validated_data['application'] = self.context['application']
         
-        # Set file size and type
+        # Set file size, type and checksum (computed while streaming by DocumentUploadHandler)
         if validated_data.get('file'):
             validated_data['file_size'] = validated_data['file'].size
-            validated_data['file_type'] = validated_data['file'].name.split('.')[-1].lower()
+            validated_data['file_type'] = file_extension(validated_data['file'].name)
+            validated_data['checksum'] = file_checksum(validated_data['file'])
         
         return super().create(validated_data)
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        if data.get('file'):
+            data['file'] = document_download_url(instance, self.context.get('request'))
+        return data
+
+
+class DocumentUploadCreateSerializer(serializers.ModelSerializer):
+    """Serializer for declaring a resumable document upload."""
+    
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$', required=False, allow_blank=True)
+    
+    class Meta:
+        model = DocumentUpload
+        fields = [
+            'document_type', 'document_name', 'is_required', 'expiry_date',
+            'file_name', 'total_size', 'checksum'
+        ]
+    
+    def validate_total_size(self, value):
+        """Validate the declared size."""
+        if value <= 0:
+            raise serializers.ValidationError("total_size must be positive.")
+        return value
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    """Serializer for resumable upload progress."""
+    
+    document = ApplicationDocumentSerializer(read_only=True)
+    
+    class Meta:
+        model = DocumentUpload
+        fields = [
+            'id', 'document_type', 'document_name', 'file_name', 'total_size',
+            'received_size', 'checksum', 'status', 'error', 'document',
+            'created_at', 'expires_at'
+        ]
+        read_only_fields = fields
 
 
 class ApplicationInterviewCreateSerializer(serializers.ModelSerializer):
@@ -404,6 +491,15 @@ class ApplicationStatsSerializer(serializers.Serializer):
     overdue_applications = ApplicationSerializer(many=True)
 
 
+class ApplicationTimelineSerializer(serializers.ModelSerializer):
+    """Serializer for an application's current state and recent events."""
+    
+    class Meta:
+        model = ApplicationProjection
+        fields = ['application', 'status', 'version', 'last_event_at', 'state', 'timeline']
+        read_only_fields = fields
+
+
 class ApplicationDashboardSerializer(serializers.Serializer):
     """Serializer for application dashboard."""
     
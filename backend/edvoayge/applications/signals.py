@@ -0,0 +1,44 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .events import ApplicationEventStore, CHILD_MODELS
+from .models import Application, ApplicationDocument, ApplicationStatus
+from .previews import DocumentPreviewService
+
+
+@receiver(post_save, sender=ApplicationDocument)
+def queue_document_preview(sender, instance, raw=False, **kwargs):
+    """Render a preview and extract the text of a new or replaced document file"""
+    if not raw:
+        DocumentPreviewService.enqueue(instance)
+
+
+@receiver(post_save, sender=Application)
+def record_application_event(sender, instance, created, raw=False, **kwargs):
+    """Append creation, status and detail changes to the application's event log"""
+    if not raw:
+        ApplicationEventStore.record_application_save(instance, created)
+
+
+@receiver(post_save, sender=ApplicationStatus)
+def record_status_event(sender, instance, created, raw=False, **kwargs):
+    """Append a status change for history entries made outside change_status"""
+    if created and not raw:
+        ApplicationEventStore.record_status_entry(instance)
+
+
+def record_child_save(sender, instance, created, raw=False, **kwargs):
+    """Append an interview, fee or communication change to the application's event log"""
+    if not raw:
+        ApplicationEventStore.record_child(instance, 'added' if created else 'updated')
+
+
+def record_child_delete(sender, instance, origin=None, **kwargs):
+    """Append a removal, unless the row goes with its application (whose log goes too)"""
+    if isinstance(origin, sender) or (isinstance(origin, QuerySet) and origin.model is sender):
+        ApplicationEventStore.record_child(instance, 'removed')
+
+
+for model in CHILD_MODELS:
+    post_save.connect(record_child_save, sender=model, dispatch_uid=f'application-event-save-{model.__name__}')
+    post_delete.connect(record_child_delete, sender=model, dispatch_uid=f'application-event-delete-{model.__name__}')
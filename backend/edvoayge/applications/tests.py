@@ -3,8 +3,13 @@ Tests for applications app.
 Comprehensive test suite for application models, serializers, and views.
 """
 
+import hashlib
+import io
 import logging
-from django.test import TestCase
+import shutil
+import tempfile
+from unittest import mock
+from django.test import TestCase, override_settings
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
@@ -13,8 +18,12 @@ from django.contrib.auth.models import User
 from django.core.files.uploadedfile import SimpleUploadedFile
 from .models import (
     Application, ApplicationDocument, ApplicationStatus, ApplicationInterview,
-    ApplicationFee, ApplicationCommunication
+    ApplicationFee, ApplicationCommunication, ApplicationEvent, ApplicationProjection, DocumentPreview,
+    DocumentUpload
 )
+from .events import ApplicationEventStore
+from .uploads import DocumentUploadService, UploadOffsetError
+from .previews import DocumentPreviewService
 from .serializers import (
     ApplicationSerializer, ApplicationCreateSerializer, ApplicationDocumentSerializer,
     ApplicationStatusSerializer, ApplicationInterviewSerializer, ApplicationFeeSerializer
@@ -732,6 +741,416 @@ class ApplicationPerformanceTest(TestCase):
         self.assertLess(end_time - start_time, 1.0)  # Should complete within 1 second
 
 
+class DocumentUploadPipelineTest(TestCase):
+    """Test cases for streamed and resumable document uploads."""
+
+    PDF = b'%PDF-1.4\n' + b'x' * 5000
+
+    def setUp(self):
+        """Set up test data."""
+        for setting in ('MEDIA_ROOT', 'DOCUMENT_UPLOAD_ROOT'):
+            root = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+            self.enterContext(override_settings(**{setting: root}))
+        self.user = User.objects.create_user(username='applicant', password='testpass123')
+        from universities.models import University, UniversityProgram
+        university = University.objects.create(name='Test University', slug='test-university',
+                                               university_type='public', country='Germany', city='Berlin')
+        program = UniversityProgram.objects.create(university=university, name='Computer Science',
+                                                   program_level='undergraduate', program_type='full_time',
+                                                   duration_years=4)
+        self.application = Application.objects.create(
+            user=self.user, university=university, program=program, intended_start_date='2026-09-01',
+            intended_start_semester='Fall', academic_year='2026'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.documents_url = f'/api/v1/applications/applications/{self.application.pk}/documents/'
+        self.uploads_url = f'/api/v1/applications/applications/{self.application.pk}/uploads/'
+
+    def upload(self, name, content):
+        return self.client.post(self.documents_url, {
+            'document_type': 'transcript', 'document_name': 'Transcript',
+            'file': SimpleUploadedFile(name, content),
+        }, format='multipart')
+
+    def test_multipart_upload_is_checksummed(self):
+        """Test a streamed upload records size, type and its SHA-256."""
+        response = self.upload('transcript.pdf', self.PDF)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        document = ApplicationDocument.objects.get(application=self.application)
+        self.assertEqual(document.checksum, hashlib.sha256(self.PDF).hexdigest())
+        self.assertEqual((document.file_size, document.file_type), (len(self.PDF), 'pdf'))
+        self.assertIn(document.checksum[:32], document.file.name)
+
+    def test_documents_are_only_served_privately(self):
+        """Test document files are not public media, only the applicant's download."""
+        response = self.upload('transcript.pdf', self.PDF)
+        document = ApplicationDocument.objects.get(application=self.application)
+        download_url = f'{self.documents_url}{document.pk}/download/'
+        self.assertTrue(response.data['file'].endswith(download_url))
+
+        self.assertEqual(self.client.get(f'/media/{document.file.name}').status_code, 404)
+        response = self.client.get(download_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.PDF)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user(username='other', password='testpass123'))
+        self.assertEqual(other.get(download_url).status_code, 404)
+
+    def test_multipart_upload_rejected_while_streaming(self):
+        """Test size, extension and content rules reject the upload early."""
+        with override_settings(DOCUMENT_UPLOAD_MAX_SIZE=4096):
+            self.assertEqual(self.upload('transcript.pdf', self.PDF).status_code, 413)
+        self.assertEqual(self.upload('transcript.exe', self.PDF).status_code, 415)
+        self.assertEqual(self.upload('transcript.pdf', b'MZ' + b'x' * 100).status_code, 415)
+        self.assertFalse(ApplicationDocument.objects.exists())
+
+    def test_resumable_upload(self):
+        """Test chunks resume from the server offset and finish as a document."""
+        response = self.client.post(self.uploads_url, {
+            'document_type': 'passport', 'document_name': 'Passport', 'file_name': 'passport.pdf',
+            'total_size': len(self.PDF), 'checksum': hashlib.sha256(self.PDF).hexdigest(),
+        }, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        url = f"{self.uploads_url}{response.data['data']['id']}/"
+
+        def send(offset, chunk):
+            return self.client.generic('PATCH', url, chunk, content_type='application/offset+octet-stream',
+                                       HTTP_UPLOAD_OFFSET=str(offset))
+
+        self.assertEqual(send(0, self.PDF[:2000])['Upload-Offset'], '2000')
+        # A retried chunk at a stale offset is refused with the offset to resume from
+        response = send(0, self.PDF[:2000])
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(self.client.get(url)['Upload-Offset'], response['Upload-Offset'])
+
+        response = send(2000, self.PDF[2000:])
+        self.assertEqual(response.data['data']['status'], 'complete')
+        document = ApplicationDocument.objects.get(pk=response.data['data']['document']['id'])
+        self.assertEqual(document.checksum, hashlib.sha256(self.PDF).hexdigest())
+        with document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.PDF)
+
+    def test_losing_retry_leaves_assembled_file_alone(self):
+        """Test a retried chunk that loses the offset race writes nothing into the upload."""
+        upload = DocumentUploadService.start(self.application, self.user, {
+            'document_type': 'passport', 'document_name': 'Passport', 'file_name': 'passport.pdf',
+            'total_size': len(self.PDF),
+        })
+        stale = DocumentUpload.objects.get(pk=upload.pk)
+        DocumentUploadService.append(upload, 0, io.BytesIO(self.PDF[:2000]), 2000)
+
+        # The retry was checked against the old offset, then its connection dropped after 100 bytes
+        with self.assertRaises(UploadOffsetError):
+            DocumentUploadService.append(stale, 0, io.BytesIO(b'%PDF-' + b'y' * 95), 2000)
+        with open(DocumentUploadService.part_path(upload), 'rb') as part:
+            self.assertEqual(part.read(), self.PDF[:2000])
+
+        DocumentUploadService.append(upload, 2000, io.BytesIO(self.PDF[2000:]), len(self.PDF) - 2000)
+        with upload.document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.PDF)
+
+    def test_failed_finish_can_be_retried(self):
+        """Test an upload whose document could not be stored is finished by an empty chunk."""
+        upload = self.client.post(self.uploads_url, {
+            'document_type': 'passport', 'document_name': 'Passport', 'file_name': 'passport.pdf',
+            'total_size': len(self.PDF),
+        }, format='json').data['data']
+        url = f"{self.uploads_url}{upload['id']}/"
+
+        with mock.patch.object(ApplicationDocument.objects, 'create', side_effect=OSError('disk full')):
+            response = self.client.generic('PATCH', url, self.PDF, content_type='application/offset+octet-stream',
+                                           HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 503)
+        upload = DocumentUpload.objects.get(pk=upload['id'])
+        self.assertEqual((upload.status, upload.received_size, upload.error), ('uploading', len(self.PDF), 'disk full'))
+
+        response = self.client.generic('PATCH', url, b'', content_type='application/offset+octet-stream',
+                                       HTTP_UPLOAD_OFFSET=str(len(self.PDF)))
+        self.assertEqual(response.status_code, 200)
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.error), ('complete', ''))
+        with upload.document.file.open('rb') as stored:
+            self.assertEqual(stored.read(), self.PDF)
+
+    def test_resumable_upload_checksum_mismatch(self):
+        """Test a corrupted upload fails instead of becoming a document."""
+        upload = self.client.post(self.uploads_url, {
+            'document_type': 'passport', 'document_name': 'Passport', 'file_name': 'passport.pdf',
+            'total_size': len(self.PDF), 'checksum': '0' * 64,
+        }, format='json').data['data']
+        response = self.client.generic('PATCH', f"{self.uploads_url}{upload['id']}/", self.PDF,
+                                       content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET='0')
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(ApplicationDocument.objects.exists())
+
+        too_big = self.client.post(self.uploads_url, {
+            'document_type': 'passport', 'document_name': 'Passport', 'file_name': 'passport.pdf',
+            'total_size': 10 ** 10,
+        }, format='json')
+        self.assertEqual(too_big.status_code, 413)
+
+
+def make_pdf(text):
+    """A one-page PDF showing ``text``."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    output, offsets = b"%PDF-1.4\n", []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return output
+
+
+def make_png(width=1200, height=1600):
+    """PNG bytes of a blank image."""
+    from PIL import Image
+    output = io.BytesIO()
+    Image.new('RGB', (width, height), 'white').save(output, format='PNG')
+    return output.getvalue()
+
+
+@override_settings(DOCUMENT_PREVIEW_ASYNC=False, DOCUMENT_THUMBNAIL_WIDTH=240)
+class DocumentPreviewTest(TestCase):
+    """Test cases for document previews and text extraction."""
+
+    def setUp(self):
+        """Set up test data."""
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=root))
+        self.user = User.objects.create_user(username='applicant', password='testpass123')
+        from universities.models import University, UniversityProgram
+        university = University.objects.create(name='Test University', slug='test-university',
+                                               university_type='public', country='Germany', city='Berlin')
+        program = UniversityProgram.objects.create(university=university, name='Computer Science',
+                                                   program_level='undergraduate', program_type='full_time',
+                                                   duration_years=4)
+        self.application = Application.objects.create(
+            user=self.user, university=university, program=program, intended_start_date='2026-09-01',
+            intended_start_semester='Fall', academic_year='2026'
+        )
+
+    def create_document(self, name, content, document_type='ielts'):
+        return ApplicationDocument.objects.create(
+            application=self.application, document_type=document_type, document_name=name,
+            file=SimpleUploadedFile(name, content), checksum=hashlib.sha256(content).hexdigest(),
+        )
+
+    @mock.patch('applications.previews.pdf_first_page')
+    def test_pdf_preview_and_text_search(self, first_page):
+        """Test an uploaded PDF gets a thumbnail and searchable text."""
+        from PIL import Image
+        first_page.return_value = Image.new('RGB', (1275, 1650), 'white')
+        with self.captureOnCommitCallbacks(execute=True):
+            document = self.create_document('ielts.pdf', make_pdf('IELTS Overall Band 7.5'))
+
+        preview = DocumentPreview.objects.get(document=document)
+        self.assertEqual((preview.status, preview.page_count), ('completed', 1))
+        self.assertIn('Band 7.5', preview.text)
+        with Image.open(preview.thumbnail.path) as thumbnail:
+            self.assertEqual(thumbnail.width, 240)
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/v1/applications/applications/{self.application.pk}/documents/'
+        results = client.get(url, {'search': 'Band 7.5'}).data['results']
+        self.assertEqual([item['id'] for item in results], [document.pk])
+        self.assertEqual(results[0]['preview']['status'], 'completed')
+        self.assertFalse(client.get(url, {'search': 'TOEFL'}).data['results'])
+        self.assertIn('IELTS', client.get(f'{url}{document.pk}/text/').data['data']['text'])
+
+        # Staff reviewers can search and read any applicant's documents
+        reviewer = APIClient()
+        reviewer.force_authenticate(User.objects.create_user(username='reviewer', password='x', is_staff=True))
+        self.assertEqual([item['id'] for item in reviewer.get(url, {'search': 'Band 7.5'}).data['results']],
+                         [document.pk])
+        self.assertIn('IELTS', reviewer.get(f'{url}{document.pk}/text/').data['data']['text'])
+        self.assertEqual(reviewer.get(f'{url}{document.pk}/download/', {'variant': 'thumbnail'}).status_code, 200)
+        self.assertEqual(reviewer.delete(f'{url}{document.pk}/').status_code, 404)
+
+        admin = User.objects.create_superuser(username='admin', password='x', email='admin@example.com')
+        self.client.force_login(admin)
+        changelist = self.client.get('/admin/applications/applicationdocument/', {'q': 'Band 7.5'})
+        self.assertContains(changelist, 'ielts.pdf')
+        change = self.client.get(f'/admin/applications/applicationdocument/{document.pk}/change/')
+        self.assertContains(change, f'{url}{document.pk}/download/?variant=thumbnail')
+
+        # Saving without a new file does not render again
+        with self.captureOnCommitCallbacks(execute=True):
+            document.verification_notes = 'Checked'
+            document.save()
+        self.assertEqual(first_page.call_count, 1)
+
+    def test_pool_renders_queued_documents(self):
+        """Test queued documents are rendered on the process pool and failures recorded."""
+        images = [self.create_document(f'passport-{n}.png', make_png(), 'passport') for n in range(2)]
+        broken = self.create_document('broken.png', b'\x89PNG\r\n\x1a\nbroken', 'passport')
+        self.assertEqual(DocumentPreview.objects.filter(status='pending').count(), 3)
+
+        with override_settings(DOCUMENT_PREVIEW_WORKERS=2):
+            self.assertEqual(DocumentPreviewService.process_pending(), 3)
+        self.assertEqual(DocumentPreviewService.process_pending(), 0)
+
+        for document in images:
+            preview = DocumentPreview.objects.get(document=document)
+            self.assertEqual(preview.status, 'completed')
+            self.assertTrue(preview.image and preview.thumbnail)
+        failed = DocumentPreview.objects.get(document=broken)
+        self.assertEqual((failed.status, failed.attempts), ('failed', 1))
+        self.assertTrue(failed.error)
+
+
+class ApplicationEventStoreTest(TestCase):
+    """Test cases for the application event log and its projections."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='applicant', password='testpass123')
+        from universities.models import University, UniversityProgram
+        university = University.objects.create(name='Test University', slug='test-university',
+                                               university_type='public', country='Germany', city='Berlin')
+        self.program = UniversityProgram.objects.create(university=university, name='Computer Science',
+                                                        program_level='undergraduate', program_type='full_time',
+                                                        duration_years=4)
+        self.application = Application.objects.create(
+            user=self.user, university=university, program=self.program, application_number='APP-1',
+            intended_start_date='2026-09-01', intended_start_semester='Fall', academic_year='2026'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.timeline_url = f'/api/v1/applications/applications/{self.application.pk}/timeline/'
+
+    def test_changes_are_appended_and_projected(self):
+        """Test status, interview, fee and communication changes fold into the projection."""
+        from datetime import date, timedelta
+        from django.utils import timezone
+
+        ApplicationEventStore.change_status(self.application, 'submitted', actor=self.user, description='Sent')
+        interview = ApplicationInterview.objects.create(
+            application=self.application, interview_type='video', scheduled_date=timezone.now() + timedelta(days=3)
+        )
+        fee = ApplicationFee.objects.create(
+            application=self.application, fee_type='application', amount='50.00', due_date=date(2026, 10, 1)
+        )
+        ApplicationCommunication.objects.create(
+            application=self.application, communication_type='email', direction='inbound', message='Hello'
+        )
+        fee.payment_status = 'paid'
+        fee.save()
+        interview.delete()
+
+        events = list(self.application.events.values_list('sequence', 'event_type'))
+        self.assertEqual(events, [
+            (1, 'created'), (2, 'status_changed'), (3, 'interview_added'), (4, 'fee_added'),
+            (5, 'communication_added'), (6, 'fee_updated'), (7, 'interview_removed'),
+        ])
+        self.assertEqual(self.application.status_history.count(), 1)
+
+        projection = ApplicationProjection.objects.get(application=self.application)
+        self.assertEqual((projection.status, projection.version), ('submitted', 7))
+        self.assertEqual(projection.state['interviews'], {})
+        self.assertEqual(projection.state['fees'][str(fee.pk)]['payment_status'], 'paid')
+        self.assertEqual(len(projection.state['unread_communications']), 1)
+        self.assertEqual(projection.timeline[0]['event_type'], 'interview_removed')
+        self.assertEqual(projection.timeline[-1]['actor_name'], 'applicant')
+
+        event = self.application.events.first()
+        with self.assertRaises(ValueError):
+            event.save()
+
+        rebuilt = ApplicationEventStore.rebuild(self.application)
+        self.assertEqual((rebuilt.state, rebuilt.timeline), (projection.state, projection.timeline))
+
+    def test_backfill_existing_history(self):
+        """Test applications from before the event log are backfilled from their tables."""
+        ApplicationStatus.objects.create(application=self.application, status='submitted', changed_by=self.user)
+        Application.objects.filter(pk=self.application.pk).update(status='submitted')
+        ApplicationEvent.objects.all()._raw_delete('default')
+        ApplicationProjection.objects.all().delete()
+
+        response = self.client.get(self.timeline_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual((data['status'], data['version']), ('submitted', 2))
+        self.assertEqual([entry['event_type'] for entry in data['timeline']], ['status_changed', 'created'])
+
+    @override_settings(APPLICATION_TIMELINE_SIZE=2)
+    def test_timeline_is_a_single_read(self):
+        """Test the timeline reads one projection query, and older events are paged."""
+        for priority in ('high', 'low', 'urgent'):
+            self.application.priority = priority
+            self.application.save()
+        Application.objects.create(
+            user=User.objects.create_user(username='other'), university=self.application.university,
+            program=self.program, application_number='APP-2', intended_start_date='2026-09-01',
+            intended_start_semester='Fall', academic_year='2026'
+        )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.timeline_url)
+        timeline = response.data['data']['timeline']
+        self.assertEqual([entry['sequence'] for entry in timeline], [4, 3])
+
+        response = self.client.get(self.timeline_url, {'before': 3})
+        self.assertEqual([entry['sequence'] for entry in response.data['data']['timeline']], [2, 1])
+
+        response = self.client.get('/api/v1/applications/applications/dashboard/')
+        data = response.data['data']
+        self.assertEqual([app['application_number'] for app in data['user_applications']], ['APP-1'])
+        self.assertEqual(data['user_applications'][0]['priority'], 'urgent')
+        self.assertEqual(data['application_stats']['total_applications'], 1)
+
+    def test_dashboard_keeps_serializer_rows(self):
+        """Test the dashboard returns the usual rows and backfills applications without a projection."""
+        from datetime import timedelta, timezone as dt_timezone
+        from django.utils import timezone
+
+        ApplicationEventStore.change_status(self.application, 'submitted', actor=self.user, description='Sent')
+        interview = ApplicationInterview.objects.create(
+            application=self.application, interview_type='video', scheduled_date=timezone.now() + timedelta(hours=1)
+        )
+        # A stored date with a negative offset sorts before now as a string
+        projection = ApplicationProjection.objects.get(application=self.application)
+        local = interview.scheduled_date.astimezone(dt_timezone(timedelta(hours=-5)))
+        projection.state['interviews'][str(interview.pk)]['scheduled_date'] = local.isoformat()
+        projection.save()
+
+        older = Application.objects.create(
+            user=self.user, university=self.application.university, program=self.program,
+            application_number='APP-0', intended_start_date='2026-09-01', intended_start_semester='Fall',
+            academic_year='2026'
+        )
+        # As if created before the event log
+        ApplicationEvent.objects.filter(application=older)._raw_delete('default')
+        ApplicationProjection.objects.filter(application=older).delete()
+
+        response = self.client.get('/api/v1/applications/applications/dashboard/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+        self.assertEqual({app['application_number'] for app in data['user_applications']}, {'APP-0', 'APP-1'})
+        self.assertIn('status_display', data['user_applications'][0])
+        self.assertEqual(data['recent_status_updates'][0]['application_number'], 'APP-1')
+        self.assertEqual([row['id'] for row in data['upcoming_interviews']], [interview.pk])
+        self.assertEqual(data['application_stats']['total_applications'], 2)
+        self.assertTrue(ApplicationProjection.objects.filter(application=older).exists())
+
+
 if __name__ == '__main__':
     # Run tests with verbose output
     import django
@@ -0,0 +1,381 @@
+"""
+Application document upload pipeline.
+
+Multipart uploads go through ``DocumentUploadHandler``, which streams the
+file to a temporary file in chunks. It rejects the upload as soon as the
+declared body length, the extension, the leading bytes or the running size
+rule it out, and it computes the SHA-256 on the way, so the document is
+never held in memory or read twice.
+
+Flaky connections can use resumable uploads instead (``DocumentUploadService``):
+the client declares the file, then sends it in chunks at explicit offsets
+and, after a dropped connection, asks for the offset to resume from. The
+assembled file is validated and hashed the same way and becomes an
+``ApplicationDocument`` once the last chunk arrives.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from django.conf import settings
+from django.core.files import File
+from django.core.files.uploadhandler import SkipFile, StopUpload, TemporaryFileUploadHandler
+from django.db import transaction
+from django.utils import timezone
+from .models import ApplicationDocument, DocumentUpload
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of each allowed document type
+SIGNATURES = {
+    'pdf': (b'%PDF-',),
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpg': (b'\xff\xd8\xff',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'doc': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    'docx': (b'PK\x03\x04',),
+}
+
+# Room for the other form fields and multipart boundaries around the file
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadRejected(ValueError):
+    """Raised when an upload breaks the size, type or checksum rules"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UploadOffsetError(UploadRejected):
+    """Raised when a chunk does not start where the stored upload ends"""
+
+    def __init__(self, message, offset):
+        super().__init__(message, status_code=409)
+        self.offset = offset
+
+
+def max_document_size():
+    return getattr(settings, 'DOCUMENT_UPLOAD_MAX_SIZE', settings.MAX_UPLOAD_SIZE)
+
+
+def allowed_types():
+    return getattr(settings, 'DOCUMENT_UPLOAD_TYPES', list(SIGNATURES))
+
+
+def file_extension(name):
+    return os.path.splitext(name or '')[1].lstrip('.').lower()
+
+
+def check_extension(name):
+    """
+    Allowed document type of a file name.
+
+    Raises:
+        UploadRejected: If the extension is not allowed
+    """
+    extension = file_extension(name)
+    types = allowed_types()
+    if extension not in types:
+        raise UploadRejected(
+            f"File type not allowed. Please upload {', '.join(kind.upper() for kind in types)} files.",
+            status_code=415,
+        )
+    return extension
+
+
+def check_signature(extension, head):
+    """
+    Check the first bytes of a file match its extension.
+
+    Raises:
+        UploadRejected: If they do not
+    """
+    signatures = SIGNATURES.get(extension)
+    if signatures and not any(head.startswith(signature) for signature in signatures):
+        raise UploadRejected(f"File content is not a valid {extension.upper()} file.", status_code=415)
+
+
+def check_size(size, limit=None):
+    limit = limit or max_document_size()
+    if size > limit:
+        raise UploadRejected(f"File size must be at most {limit // (1024 * 1024)}MB.", status_code=413)
+
+
+def file_checksum(file):
+    """SHA-256 of a file, read in chunks (reused if the upload handler computed it)"""
+    checksum = getattr(file, 'sha256', None)
+    if checksum:
+        return checksum
+    digest = hashlib.sha256()
+    for chunk in file.chunks(READ_CHUNK_SIZE):
+        digest.update(chunk)
+    if hasattr(file, 'seek'):
+        file.seek(0)
+    return digest.hexdigest()
+
+
+class DocumentUploadHandler(TemporaryFileUploadHandler):
+    """
+    Streams a multipart document to disk, validating and hashing it on the way.
+
+    A rejected upload stops the parse immediately, without reading the rest
+    of the body; ``rejection`` then holds the reason.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or max_document_size()
+        self.rejection = None
+        self.declared_length = None
+
+    def reject(self, error):
+        self.rejection = error
+        raise StopUpload(connection_reset=True)
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Exceptions are not caught here, so the check is made on the first file
+        self.declared_length = content_length
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        if field_name != 'file':
+            raise SkipFile()
+        try:
+            if self.declared_length and self.declared_length > self.max_size + FORM_OVERHEAD:
+                check_size(self.declared_length, self.max_size)
+            self.extension = check_extension(file_name)
+        except UploadRejected as e:
+            self.reject(e)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        super().new_file(field_name, file_name, *args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        try:
+            if start == 0:
+                check_signature(self.extension, raw_data)
+            self.size += len(raw_data)
+            check_size(self.size, self.max_size)
+        except UploadRejected as e:
+            self.reject(e)
+        self.digest.update(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        file.sha256 = self.digest.hexdigest()
+        return file
+
+
+def upload_rejection(request):
+    """The reason a document upload handler rejected the request's file, if any"""
+    for handler in getattr(request, 'upload_handlers', []):
+        if isinstance(handler, DocumentUploadHandler) and handler.rejection:
+            return handler.rejection
+    return None
+
+
+class DocumentUploadService:
+    """
+    Service class for resumable document uploads.
+    """
+
+    @staticmethod
+    def upload_root():
+        return str(getattr(settings, 'DOCUMENT_UPLOAD_ROOT', settings.BASE_DIR / 'private' / 'uploads'))
+
+    @classmethod
+    def part_path(cls, upload):
+        return os.path.join(cls.upload_root(), f'{upload.pk}.part')
+
+    @staticmethod
+    def chunk_size():
+        return getattr(settings, 'DOCUMENT_UPLOAD_CHUNK_SIZE', 1024 * 1024)
+
+    @classmethod
+    def start(cls, application, user, data):
+        """
+        Declare a resumable upload.
+
+        Args:
+            application (Application): Application the document belongs to
+            user (User): Uploading user
+            data (dict): Validated ``DocumentUploadCreateSerializer`` data
+
+        Returns:
+            DocumentUpload: The upload, expecting its first chunk at offset 0
+
+        Raises:
+            UploadRejected: If the declared file is too big or not allowed
+        """
+        check_extension(data['file_name'])
+        check_size(data['total_size'])
+        hours = getattr(settings, 'DOCUMENT_UPLOAD_EXPIRY_HOURS', 24)
+        upload = DocumentUpload.objects.create(
+            application=application, user=user, expires_at=timezone.now() + timedelta(hours=hours), **data
+        )
+        os.makedirs(cls.upload_root(), exist_ok=True)
+        open(cls.part_path(upload), 'wb').close()
+        logger.info(f"Started upload {upload.pk} of {upload.total_size} bytes for application {application.pk}")
+        return upload
+
+    @classmethod
+    def append(cls, upload, offset, stream, length):
+        """
+        Write one chunk at ``offset`` and finish the upload after the last one.
+
+        The chunk is first copied from ``stream`` in small reads to a file of
+        its own. It is then written into the upload only by the request that
+        claims the offset: the claim is the compare-and-set on
+        ``received_size``, whose row lock is held until the chunk is in
+        place. A retried chunk racing the original therefore never touches
+        the assembled file, and the file is never cut below ``received_size``.
+
+        Args:
+            upload (DocumentUpload): Upload in progress
+            offset (int): Where the chunk starts, as the client sees it
+            stream: Readable request body
+            length (int): Chunk length in bytes
+
+        Returns:
+            DocumentUpload: The upload, with ``document`` set once complete
+
+        Raises:
+            UploadOffsetError: If ``offset`` is not where the upload ends
+            UploadRejected: If the chunk overruns the declared size, the
+                content does not match its type or the upload has ended;
+                with status 503 if the last chunk was stored but the
+                document could not be created, which an empty chunk at the
+                final offset retries
+        """
+        if upload.status != 'uploading':
+            raise UploadRejected(f"Upload is {upload.status}", status_code=409)
+        if upload.expires_at <= timezone.now():
+            raise UploadRejected("Upload has expired", status_code=410)
+        if offset != upload.received_size:
+            raise UploadOffsetError(f"Upload continues at offset {upload.received_size}", upload.received_size)
+        if length == 0 and offset == upload.total_size:
+            # Every byte arrived but finishing failed; an empty chunk retries it
+            cls._finish(upload)
+            return upload
+        if length <= 0 or offset + length > upload.total_size:
+            raise UploadRejected(f"Chunk must hold 1 to {upload.total_size - offset} bytes")
+
+        with tempfile.TemporaryFile(dir=cls.upload_root()) as chunk:
+            written = 0
+            while written < length:
+                data = stream.read(min(READ_CHUNK_SIZE, length - written))
+                if not data:
+                    break
+                if offset == 0 and written == 0:
+                    check_signature(file_extension(upload.file_name), data)
+                chunk.write(data)
+                written += len(data)
+            if not written:
+                return upload
+            chunk.seek(0)
+
+            with transaction.atomic():
+                claimed = DocumentUpload.objects.filter(
+                    pk=upload.pk, status='uploading', received_size=offset
+                ).update(received_size=offset + written, updated_at=timezone.now())
+                if claimed:
+                    with open(cls.part_path(upload), 'r+b') as part:
+                        part.seek(offset)
+                        shutil.copyfileobj(chunk, part, READ_CHUNK_SIZE)
+                        part.truncate(offset + written)
+
+        upload.refresh_from_db()
+        if not claimed:
+            raise UploadOffsetError(f"Upload continues at offset {upload.received_size}", upload.received_size)
+        if upload.received_size == upload.total_size:
+            cls._finish(upload)
+        return upload
+
+    @classmethod
+    def _finish(cls, upload):
+        """``finish``, leaving the upload retryable if it fails for any reason but its content"""
+        try:
+            cls.finish(upload)
+        except UploadRejected:
+            raise
+        except Exception as e:
+            logger.error(f"Error finishing upload {upload.pk}: {e}")
+            DocumentUpload.objects.filter(pk=upload.pk).update(error=str(e)[:255], updated_at=timezone.now())
+            upload.refresh_from_db()
+            raise UploadRejected(
+                f"Upload could not be finished; send an empty chunk at offset {upload.total_size} to retry",
+                status_code=503,
+            )
+
+    @classmethod
+    def finish(cls, upload):
+        """
+        Validate the assembled file and turn it into an ``ApplicationDocument``.
+
+        Raises:
+            UploadRejected: If the checksum does not match the declared one,
+                or another request already finished the upload
+        """
+        path = cls.part_path(upload)
+        digest = hashlib.sha256()
+        with open(path, 'rb') as part:
+            for chunk in iter(lambda: part.read(READ_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        checksum = digest.hexdigest()
+
+        if upload.checksum and upload.checksum.lower() != checksum:
+            DocumentUpload.objects.filter(pk=upload.pk).update(status='failed', error='Checksum mismatch')
+            upload.refresh_from_db()
+            os.remove(path)
+            raise UploadRejected("Checksum does not match the uploaded content", status_code=422)
+
+        with open(path, 'rb') as part, transaction.atomic():
+            content = File(part, name=upload.file_name)
+            content.sha256 = checksum
+            document = ApplicationDocument.objects.create(
+                application=upload.application,
+                document_type=upload.document_type,
+                document_name=upload.document_name,
+                is_required=upload.is_required,
+                expiry_date=upload.expiry_date,
+                file=content,
+                file_size=upload.total_size,
+                file_type=file_extension(upload.file_name),
+                checksum=checksum,
+            )
+            if not DocumentUpload.objects.filter(pk=upload.pk, status='uploading').update(
+                status='complete', document=document, error=''
+            ):
+                # A concurrent retry finished it first; drop this document
+                raise UploadRejected("Upload is already complete", status_code=409)
+        os.remove(path)
+        upload.refresh_from_db()
+        logger.info(f"Upload {upload.pk} completed as document {document.pk}")
+        return document
+
+    @classmethod
+    def discard_expired(cls):
+        """
+        Delete unfinished uploads past their expiry, with their partial files.
+
+        Returns:
+            int: Number of uploads discarded
+        """
+        expired = list(DocumentUpload.objects.filter(
+            expires_at__lte=timezone.now()
+        ).exclude(status='complete').values_list('pk', flat=True))
+        for pk in expired:
+            path = os.path.join(cls.upload_root(), f'{pk}.part')
+            if os.path.exists(path):
+                os.remove(path)
+        DocumentUpload.objects.filter(pk__in=expired).delete()
+        if expired:
+            logger.info(f"Discarded {len(expired)} expired document uploads")
+        return len(expired)
@@ -8,7 +8,8 @@ from rest_framework.routers import DefaultRouter
 from rest_framework_nested import routers
 from .views import (
     ApplicationViewSet, ApplicationDocumentViewSet, ApplicationStatusViewSet,
-    ApplicationInterviewViewSet, ApplicationFeeViewSet, ApplicationCommunicationViewSet
+    ApplicationInterviewViewSet, ApplicationFeeViewSet, ApplicationCommunicationViewSet,
+    DocumentUploadViewSet
 )
 
 # Create main router for applications
@@ -18,6 +19,7 @@ router.register(r'applications', ApplicationViewSet, basename='application')
 # Create nested routers for related data
 application_router = routers.NestedDefaultRouter(router, r'applications', lookup='application')
 application_router.register(r'documents', ApplicationDocumentViewSet, basename='application-document')
+application_router.register(r'uploads', DocumentUploadViewSet, basename='application-document-upload')
 application_router.register(r'status', ApplicationStatusViewSet, basename='application-status')
 application_router.register(r'interviews', ApplicationInterviewViewSet, basename='application-interview')
 application_router.register(r'fees', ApplicationFeeViewSet, basename='application-fee')
@@ -4,6 +4,7 @@ Handles application-related API endpoints with proper error handling and logging
 """
 
 import logging
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django.db.models import Q, Count, Avg, Min, Max
 from django.utils import timezone
@@ -15,7 +16,7 @@ from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from .models import (
     Application, ApplicationDocument, ApplicationStatus, ApplicationInterview,
-    ApplicationFee, ApplicationCommunication
+    ApplicationFee, ApplicationCommunication, ApplicationProjection, DocumentUpload
 )
 from .serializers import (
     ApplicationSerializer, ApplicationCreateSerializer, ApplicationUpdateSerializer,
@@ -25,7 +26,14 @@ from .serializers import (
     ApplicationFeeSerializer, ApplicationFeeCreateSerializer,
     ApplicationCommunicationSerializer, ApplicationSubmitSerializer,
     ApplicationSearchSerializer, ApplicationStatsSerializer, ApplicationDashboardSerializer,
-    FrontendApplicationSerializer
+    FrontendApplicationSerializer, DocumentUploadCreateSerializer, DocumentUploadSerializer,
+    ApplicationTimelineSerializer
+)
+from edvoayge.media import serve_file
+from .events import ApplicationEventStore
+from .uploads import (
+    DocumentUploadHandler, DocumentUploadService, UploadOffsetError, UploadRejected,
+    file_checksum, file_extension, upload_rejection
 )
 
 logger = logging.getLogger(__name__)
@@ -245,17 +253,12 @@ class ApplicationViewSet(viewsets.ModelViewSet):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            # Update application status
-            application.status = 'submitted'
-            application.submitted_at = timezone.now()
-            application.save()
-            
-            # Create status history
-            ApplicationStatus.objects.create(
-                application=application,
-                status='submitted',
-                description='Application submitted successfully',
-                changed_by=request.user
+            # Update application status, with its event and status history
+            ApplicationEventStore.change_status(
+                application,
+                'submitted',
+                actor=request.user,
+                description='Application submitted successfully'
             )
             
             print(f"Application submitted successfully: {application.application_number}") if hasattr(request, 'user') else None
@@ -388,36 +391,54 @@ class ApplicationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-    @action(detail=False, methods=['get'], url_path='dashboard')
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated])
+    def timeline(self, request, pk=None):
+        """Get an application's current state and timeline."""
+        try:
+            projection = ApplicationProjection.objects.filter(application_id=pk, user=request.user).first()
+            if projection is None:
+                # Applications from before the event log are backfilled on first view
+                application = get_object_or_404(
+                    Application.objects.select_related('user', 'university', 'program'), pk=pk, user=request.user
+                )
+                projection = ApplicationEventStore.backfill(application)
+
+            data = ApplicationTimelineSerializer(projection).data
+            before = request.query_params.get('before')
+            if before:
+                # Older pages come from the event log itself
+                data['timeline'] = ApplicationEventStore.timeline(projection.application_id, before=int(before))
+            return Response({'success': True, 'data': data})
+        except ValueError:
+            return Response(
+                {'success': False, 'message': 'before must be an event sequence number'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    @action(detail=False, methods=['get'], url_path='dashboard', permission_classes=[IsAuthenticated])
     def dashboard(self, request):
         """Get application dashboard data."""
         print("Entering ApplicationDashboardView")
         try:
-            queryset = self.get_queryset() if hasattr(self, 'get_queryset') else Application.objects.all()
-            # Dashboard data (no user filtering)
-            user_applications = queryset.order_by('-created_at')[:5]
-            recent_status_updates = ApplicationStatus.objects.order_by('-changed_at')[:10]
-            upcoming_interviews = ApplicationInterview.objects.filter(status='scheduled', scheduled_date__gte=timezone.now()).order_by('scheduled_date')[:5]
-            pending_fees = ApplicationFee.objects.filter(payment_status='pending').order_by('due_date')[:5]
-            recent_communications = ApplicationCommunication.objects.order_by('-created_at')[:10]
-            # Calculate stats
+            # Rows picked from the user's application projections
+            rows = ApplicationEventStore.dashboard(request.user)
+            context = self.get_serializer_context()
+            user_applications = ApplicationSerializer(rows['user_applications'], many=True, context=context).data
             stats_data = {
-                'total_applications': queryset.count(),
-                'submitted_applications': queryset.filter(status='submitted').count(),
-                'accepted_applications': queryset.filter(status='accepted').count(),
-                'rejected_applications': queryset.filter(status='rejected').count(),
-                'pending_applications': queryset.filter(status__in=['draft', 'under_review']).count(),
-                'applications_by_status': {},
-                'applications_by_university': {},
-                'recent_applications': ApplicationSerializer(user_applications, many=True).data,
-                'overdue_applications': [],
+                **rows['stats'],
+                'recent_applications': user_applications,
+                'overdue_applications': ApplicationSerializer(
+                    rows['overdue_applications'], many=True, context=context
+                ).data,
             }
             data = {
-                'user_applications': ApplicationSerializer(user_applications, many=True).data,
-                'recent_status_updates': ApplicationStatusSerializer(recent_status_updates, many=True).data,
-                'upcoming_interviews': ApplicationInterviewSerializer(upcoming_interviews, many=True).data,
-                'pending_fees': ApplicationFeeSerializer(pending_fees, many=True).data,
-                'recent_communications': ApplicationCommunicationSerializer(recent_communications, many=True).data,
+                'user_applications': user_applications,
+                'recent_status_updates': ApplicationStatusSerializer(rows['recent_status_updates'], many=True).data,
+                'upcoming_interviews': ApplicationInterviewSerializer(rows['upcoming_interviews'], many=True).data,
+                'pending_fees': ApplicationFeeSerializer(rows['pending_fees'], many=True).data,
+                'recent_communications': ApplicationCommunicationSerializer(
+                    rows['recent_communications'], many=True
+                ).data,
                 'application_stats': stats_data,
             }
             print(f"Application dashboard data retrieved successfully")
@@ -425,8 +446,6 @@ class ApplicationViewSet(viewsets.ModelViewSet):
                 {'success': True, 'data': data, 'message': 'Dashboard data retrieved successfully'}
             )
         except Exception as e:
-            import traceback
-            print(traceback.format_exc())
             logger.error(f"Error in application dashboard: {e}")
             return Response(
                 {'success': False, 'message': 'Error retrieving dashboard data'},
@@ -440,14 +459,46 @@ class ApplicationDocumentViewSet(viewsets.ModelViewSet):
     pagination_class = ApplicationPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['document_type', 'status', 'is_required', 'is_verified']
-    search_fields = ['document_name', 'document_type']
+    search_fields = ['document_name', 'document_type', 'preview__text']
     ordering = ['-uploaded_at']
 
+    # Read-only actions staff reviewers may use on any applicant's documents
+    REVIEWER_ACTIONS = ('list', 'retrieve', 'text', 'download')
+
     def get_queryset(self):
-        """Filter documents by current user's applications."""
-        return ApplicationDocument.objects.filter(
-            application__user=self.request.user
-        ).select_related('application')
+        """Filter documents by current user's applications; staff reviewers read every applicant's."""
+        queryset = ApplicationDocument.objects.select_related('application', 'preview').defer('preview__text')
+        if self.request.user.is_staff and self.action in self.REVIEWER_ACTIONS:
+            return queryset
+        return queryset.filter(application__user=self.request.user)
+
+    @action(detail=True, methods=['get'])
+    def text(self, request, *args, **kwargs):
+        """Text extracted from the document, without downloading the file."""
+        document = self.get_object()
+        preview = getattr(document, 'preview', None)
+        if preview is None or preview.status not in ('completed', 'skipped'):
+            return Response(
+                {'success': False, 'message': 'Document text is not extracted yet',
+                 'status': preview.status if preview else None},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({'success': True, 'data': {'text': preview.text, 'page_count': preview.page_count}})
+
+    @action(detail=True, methods=['get'])
+    def download(self, request, *args, **kwargs):
+        """The document file (or ?variant=preview|thumbnail), only to the applicant and staff, never shared-cached."""
+        document = self.get_object()
+        preview = getattr(document, 'preview', None)
+        files = {
+            'file': document.file,
+            'preview': preview.image if preview else None,
+            'thumbnail': preview.thumbnail if preview else None,
+        }
+        stored = files.get(request.query_params.get('variant', 'file'))
+        if not stored:
+            raise Http404('Document file not found')
+        return serve_file(request._request, stored.name, private=True)
 
     def get_serializer_class(self):
         """Return appropriate serializer based on action."""
@@ -455,12 +506,45 @@ class ApplicationDocumentViewSet(viewsets.ModelViewSet):
             return ApplicationDocumentCreateSerializer
         return ApplicationDocumentSerializer
 
+    def initialize_request(self, request, *args, **kwargs):
+        """Stream uploaded documents through DocumentUploadHandler; must be set before the body is read."""
+        if request.method in ('POST', 'PUT', 'PATCH'):
+            request.upload_handlers = [DocumentUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def check_upload(self, request):
+        """Response for a document the upload handler rejected while streaming, if any."""
+        request.data  # parse the body now, so the handler has seen the file
+        rejection = upload_rejection(request)
+        if rejection:
+            return Response(
+                {'success': False, 'message': str(rejection)},
+                status=rejection.status_code
+            )
+        return None
+
+    def create(self, request, *args, **kwargs):
+        """Upload a document."""
+        return self.check_upload(request) or super().create(request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        """Replace a document."""
+        return self.check_upload(request) or super().update(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         """Create document with application context."""
         application_id = self.kwargs.get('application_pk')
         application = get_object_or_404(Application, id=application_id, user=self.request.user)
         serializer.save(application=application)
 
+    def perform_update(self, serializer):
+        """Refresh file metadata when the file is replaced."""
+        file = serializer.validated_data.get('file')
+        if file:
+            serializer.save(file_size=file.size, file_type=file_extension(file.name), checksum=file_checksum(file))
+        else:
+            serializer.save()
+
     def list(self, request, *args, **kwargs):
         """List documents with enhanced filtering."""
         print("Entering ApplicationDocumentListView") if hasattr(request, 'user') else None
@@ -476,6 +560,79 @@ class ApplicationDocumentViewSet(viewsets.ModelViewSet):
             )
 
 
+class DocumentUploadViewSet(viewsets.GenericViewSet):
+    """
+    ViewSet for resumable document uploads.
+
+    ``POST`` declares the file (name, size, optional SHA-256) and returns an
+    upload id. Each chunk is then sent as the raw body of a ``PATCH`` with an
+    ``Upload-Offset`` header; ``GET`` (or ``HEAD``) returns the offset to
+    resume from after a dropped connection. The document is created when
+    the last chunk arrives; if that fails, an empty ``PATCH`` at the final
+    offset retries it.
+    """
+    serializer_class = DocumentUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """Filter uploads by current user's application."""
+        return DocumentUpload.objects.filter(
+            application_id=self.kwargs.get('application_pk'),
+            application__user=self.request.user
+        ).select_related('document__application')
+
+    def progress_response(self, upload, status_code=status.HTTP_200_OK):
+        response = Response(
+            {'success': True, 'data': DocumentUploadSerializer(upload, context={'request': self.request}).data},
+            status=status_code
+        )
+        response['Upload-Offset'] = str(upload.received_size)
+        response['Upload-Length'] = str(upload.total_size)
+        return response
+
+    @staticmethod
+    def rejected_response(error):
+        response = Response({'success': False, 'message': str(error)}, status=error.status_code)
+        if isinstance(error, UploadOffsetError):
+            response['Upload-Offset'] = str(error.offset)
+        return response
+
+    def create(self, request, *args, **kwargs):
+        """Declare a resumable upload."""
+        application = get_object_or_404(Application, id=self.kwargs.get('application_pk'), user=request.user)
+        serializer = DocumentUploadCreateSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            upload = DocumentUploadService.start(application, request.user, serializer.validated_data)
+        except UploadRejected as e:
+            return self.rejected_response(e)
+        response = self.progress_response(upload, status.HTTP_201_CREATED)
+        response['Upload-Chunk-Size'] = str(DocumentUploadService.chunk_size())
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Upload progress, including the offset to resume from."""
+        return self.progress_response(self.get_object())
+
+    def partial_update(self, request, *args, **kwargs):
+        """Append one chunk, sent as the raw request body."""
+        upload = self.get_object()
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+            length = int(request.headers.get('Content-Length') or 0)
+        except ValueError:
+            return Response(
+                {'success': False, 'message': 'Upload-Offset and Content-Length headers are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            # Read straight from the socket; request.data would buffer the chunk
+            upload = DocumentUploadService.append(upload, offset, request.stream, length)
+        except UploadRejected as e:
+            return self.rejected_response(e)
+        return self.progress_response(upload)
+
+
 class ApplicationStatusViewSet(viewsets.ModelViewSet):
     """ViewSet for application status management."""
     serializer_class = ApplicationStatusSerializer
@@ -4,7 +4,7 @@ from universities.serializers import UniversitySerializer
 from courses.serializers import CourseListSerializer
 
 class FavouriteUniversitySerializer(serializers.ModelSerializer):
-    university = UniversitySerializer(read_only=True)
+    university = UniversitySerializer(read_only=True, fields=UniversitySerializer.LIST_FIELDS)
     university_id = serializers.IntegerField(write_only=True)
     user_name = serializers.CharField(source='user.username', read_only=True)
     
@@ -0,0 +1,197 @@
+"""
+Favourite services.
+
+``FavouriteService`` owns a user's favourite universities and courses. The
+ids a user has favourited are kept as one cached set per user and kind, so
+a list screen can ask whether any number of items are favourited with a
+single lookup. The cache is per process, so a change only drops the set on
+the worker that made it; other workers keep theirs for at most
+``FAVOURITE_IDS_CACHE_TIMEOUT`` seconds. Writes are idempotent set
+operations (add, remove, toggle) that cannot race into duplicate rows: the
+``(user, item)`` unique constraint decides, not an exists-then-create check.
+"""
+
+import logging
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from courses.models import Course
+from universities.models import University
+from .models import FavouriteCourse, FavouriteUniversity
+from .signals import favourites_changed
+
+logger = logging.getLogger(__name__)
+
+
+class FavouriteService:
+    """
+    Service class for a user's favourites.
+    """
+
+    CACHE_PREFIX = 'bookmarks:favourites'
+
+    # kind -> (favourite model, item field, item model)
+    KINDS = {
+        'university': (FavouriteUniversity, 'university', University),
+        'course': (FavouriteCourse, 'course', Course),
+    }
+
+    @classmethod
+    def _kind(cls, kind):
+        try:
+            return cls.KINDS[kind]
+        except KeyError:
+            raise ValueError(f"Unknown favourite kind: {kind}")
+
+    @classmethod
+    def _cache_key(cls, user_id, kind):
+        return f'{cls.CACHE_PREFIX}:{kind}:{user_id}'
+
+    @staticmethod
+    def _clean_ids(item_ids):
+        """Distinct integer ids, in the order given"""
+        return list(dict.fromkeys(int(pk) for pk in item_ids))
+
+    @classmethod
+    def invalidate(cls, user_id, kind):
+        """
+        Drop a user's cached favourite ids.
+
+        Dropped now and again on commit, so a set read by another request
+        before the commit is not kept.
+        """
+        key = cls._cache_key(user_id, kind)
+        cache.delete(key)
+        transaction.on_commit(lambda: cache.delete(key))
+
+    @classmethod
+    def ids(cls, user, kind):
+        """
+        Ids of the items a user has favourited.
+
+        Args:
+            user: User, or a user id
+            kind (str): ``'university'`` or ``'course'``
+
+        Returns:
+            frozenset: Favourited item ids
+        """
+        model, field, _ = cls._kind(kind)
+        user_id = getattr(user, 'pk', user)
+        key = cls._cache_key(user_id, kind)
+        ids = cache.get(key)
+        if ids is None:
+            ids = frozenset(model.objects.filter(user_id=user_id).values_list(f'{field}_id', flat=True))
+            cache.set(key, ids, timeout=getattr(settings, 'FAVOURITE_IDS_CACHE_TIMEOUT', 60))
+        return ids
+
+    @classmethod
+    def contains(cls, user, kind, item_ids):
+        """
+        Which of some items a user has favourited.
+
+        Returns:
+            dict: item id -> bool, in the order given
+        """
+        favourites = cls.ids(user, kind)
+        return {pk: pk in favourites for pk in cls._clean_ids(item_ids)}
+
+    @classmethod
+    def favourites(cls, user, kind):
+        """A user's favourites with their items, newest first"""
+        model, field, _ = cls._kind(kind)
+        queryset = model.objects.filter(user=user).select_related('user', field)
+        if kind == 'course':
+            queryset = queryset.select_related('course__university').prefetch_related(
+                'course__ratings', 'course__subjects'
+            )
+        return queryset
+
+    @classmethod
+    def add(cls, user, kind, item_ids):
+        """
+        Favourite items; ones already favourited are left as they are.
+
+        Args:
+            user: User
+            kind (str): ``'university'`` or ``'course'``
+            item_ids (iterable): Item ids
+
+        Returns:
+            tuple: (ids newly favourited, ids that do not exist)
+
+        Raises:
+            ValueError: If the kind is unknown
+        """
+        model, field, item_model = cls._kind(kind)
+        item_ids = cls._clean_ids(item_ids)
+        existing_items = set(item_model.objects.filter(pk__in=item_ids).values_list('pk', flat=True))
+        missing = [pk for pk in item_ids if pk not in existing_items]
+
+        with transaction.atomic():
+            already = set(model.objects.filter(user=user, **{f'{field}_id__in': existing_items})
+                          .values_list(f'{field}_id', flat=True))
+            added = [pk for pk in item_ids if pk in existing_items and pk not in already]
+            # A concurrent add of the same item is skipped by the unique constraint
+            model.objects.bulk_create(
+                [model(user=user, **{f'{field}_id': pk}) for pk in added], ignore_conflicts=True,
+            )
+
+        if added:
+            cls.invalidate(user.pk, kind)
+            favourites_changed.send(sender=model, user_id=user.pk, kind=kind, added=added, removed=[])
+            logger.info(f"User {user.pk} favourited {kind}s {added}")
+        return added, missing
+
+    @classmethod
+    def remove(cls, user, kind, item_ids):
+        """
+        Unfavourite items; ones not favourited are ignored.
+
+        Returns:
+            list: Ids that were favourited and no longer are
+        """
+        model, field, _ = cls._kind(kind)
+        item_ids = cls._clean_ids(item_ids)
+        with transaction.atomic():
+            favourites = model.objects.filter(user=user, **{f'{field}_id__in': item_ids})
+            found = set(favourites.values_list(f'{field}_id', flat=True))
+            favourites.delete()
+        removed = [pk for pk in item_ids if pk in found]
+
+        if removed:
+            cls.invalidate(user.pk, kind)
+            favourites_changed.send(sender=model, user_id=user.pk, kind=kind, added=[], removed=removed)
+            logger.info(f"User {user.pk} unfavourited {kind}s {removed}")
+        return removed
+
+    @classmethod
+    def toggle(cls, user, kind, item_id):
+        """
+        Favourite an item, or unfavourite it if it already is.
+
+        The delete decides: if it removed a row the item was favourited,
+        otherwise it is created. Two toggles racing on an unfavourited item
+        both end with it favourited rather than failing on the duplicate.
+
+        Returns:
+            str: ``'added'`` or ``'removed'``
+
+        Raises:
+            ObjectDoesNotExist: If the item does not exist
+        """
+        model, field, item_model = cls._kind(kind)
+        item = item_model.objects.get(pk=item_id)
+
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(user=user, **{field: item}).delete()
+            if not deleted:
+                model.objects.bulk_create([model(user=user, **{field: item})], ignore_conflicts=True)
+
+        action = 'removed' if deleted else 'added'
+        cls.invalidate(user.pk, kind)
+        favourites_changed.send(
+            sender=model, user_id=user.pk, kind=kind,
+            added=[] if deleted else [item.pk], removed=[item.pk] if deleted else [],
+        )
+        return action
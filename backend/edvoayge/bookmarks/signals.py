@@ -0,0 +1,23 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+from .models import FavouriteCourse, FavouriteUniversity
+
+# Sent by FavouriteService after a user's favourites change, including bulk
+# changes that do not send post_save. Arguments: user_id, kind, added, removed.
+favourites_changed = Signal()
+
+
+@receiver(post_save, sender=FavouriteUniversity)
+@receiver(post_delete, sender=FavouriteUniversity)
+def invalidate_favourite_universities(sender, instance, **kwargs):
+    """Drop the cached ids after changes made outside FavouriteService (admin, cascades)"""
+    from .services import FavouriteService
+    FavouriteService.invalidate(instance.user_id, 'university')
+
+
+@receiver(post_save, sender=FavouriteCourse)
+@receiver(post_delete, sender=FavouriteCourse)
+def invalidate_favourite_courses(sender, instance, **kwargs):
+    """Drop the cached ids after changes made outside FavouriteService (admin, cascades)"""
+    from .services import FavouriteService
+    FavouriteService.invalidate(instance.user_id, 'course')
@@ -1,3 +1,90 @@
+"""
+Test cases for bookmarks app.
+"""
+
+from decimal import Decimal
+from django.contrib.auth import get_user_model
 from django.test import TestCase
+from rest_framework.test import APIClient
+from courses.models import Course
+from universities.models import University
+from .models import FavouriteCourse, FavouriteUniversity
+from .services import FavouriteService
+
+User = get_user_model()
+
+
+class FavouriteServiceTest(TestCase):
+    """Test cases for per-user favourites."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.universities = [
+            University.objects.create(name=f'University {n}', slug=f'university-{n}', country='Germany',
+                                      city='Berlin', university_type='public')
+            for n in range(5)
+        ]
+        self.course = Course.objects.create(name='Course', code='C1', description='Course',
+                                            university=self.universities[0], tuition_fee=Decimal('1000'))
+        self.user = User.objects.create_user(username='student', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        FavouriteUniversity.objects.create(user=self.other, university=self.universities[4])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_list_is_scoped_to_the_user(self):
+        """Test the list only holds the caller's favourites."""
+        FavouriteUniversity.objects.create(user=self.user, university=self.universities[1])
+        response = self.client.get('/api/v1/bookmarks/universities/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([item['university']['id'] for item in response.data['data']], [self.universities[1].pk])
+
+        self.client.force_authenticate(None)
+        self.assertIn(self.client.get('/api/v1/bookmarks/universities/').status_code, (401, 403))
+
+    def test_bulk_add_remove_and_check(self):
+        """Test bulk changes update the cached set that checks read from."""
+        ids = [university.pk for university in self.universities]
+        response = self.client.post('/api/v1/bookmarks/universities/bulk/',
+                                    {'add': ids[:3] + [999999]}, format='json')
+        self.assertEqual(response.data['data']['added'], ids[:3])
+        self.assertEqual(response.data['data']['not_found'], [999999])
+
+        # Adding again is a no-op; removing and adding in one call works
+        response = self.client.post('/api/v1/bookmarks/universities/bulk/',
+                                    {'add': ids[:2], 'remove': [ids[2]]}, format='json')
+        self.assertEqual(response.data['data']['added'], [])
+        self.assertEqual(response.data['data']['removed'], [ids[2]])
+        self.assertEqual(response.data['data']['ids'], sorted(ids[:2]))
+
+        FavouriteService.ids(self.user, 'university')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/v1/bookmarks/universities/check/',
+                                       {'ids': ','.join(str(pk) for pk in ids)})
+        self.assertEqual(response.data['data'], {str(pk): pk in ids[:2] for pk in ids})
+        self.assertEqual(self.client.get('/api/v1/bookmarks/universities/check/', {'ids': 'a,b'}).status_code, 400)
+
+    def test_cache_follows_changes_outside_the_service(self):
+        """Test admin-style saves and cascades drop the cached ids."""
+        self.assertEqual(FavouriteService.ids(self.user, 'course'), frozenset())
+        FavouriteCourse.objects.create(user=self.user, course=self.course)
+        self.assertEqual(FavouriteService.ids(self.user, 'course'), {self.course.pk})
+        self.course.delete()
+        self.assertEqual(FavouriteService.ids(self.user, 'course'), frozenset())
+
+    def test_toggle(self):
+        """Test the legacy endpoints toggle for the caller without duplicates."""
+        url = '/api/v1/bookmarks/add-favourite-university/'
+        university = self.universities[0]
+        self.assertEqual(self.client.post(url, {'university': university.pk}, format='json').data['action'], 'added')
+        self.assertEqual(self.client.post(url, {'university_id': university.pk}, format='json').data['action'],
+                         'removed')
+        self.assertEqual(self.client.post(url, {'university': 999999}, format='json').status_code, 404)
 
-# Create your tests here.
+        FavouriteService.toggle(self.user, 'university', university.pk)
+        self.assertEqual(FavouriteUniversity.objects.filter(user=self.user, university=university).count(), 1)
+        self.assertEqual(self.client.post('/api/v1/bookmarks/universities/', {'university_id': university.pk},
+                                          format='json').status_code, 400)
+        self.assertEqual(self.client.delete('/api/v1/bookmarks/universities/', {'university_id': university.pk},
+                                            format='json').status_code, 200)
+        self.assertFalse(FavouriteService.contains(self.user, 'university', [university.pk])[university.pk])
@@ -1,8 +1,11 @@
 from django.urls import path
 from .views import (
-    FavouriteUniversityView, 
+    FavouriteUniversityView,
     FavouriteCourseView,
-    AddFavouriteUniversity, 
+    FavouriteIdsView,
+    FavouriteCheckView,
+    FavouriteBulkView,
+    AddFavouriteUniversity,
     AddFavouriteCourse
 )
 
@@ -10,8 +13,16 @@ urlpatterns = [
     # Enhanced endpoints
     path('universities/', FavouriteUniversityView.as_view(), name='favourite-universities'),
     path('courses/', FavouriteCourseView.as_view(), name='favourite-courses'),
-    
+
+    # Favourite ids, membership checks and bulk changes for list screens
+    path('universities/ids/', FavouriteIdsView.as_view(kind='university'), name='favourite-university-ids'),
+    path('universities/check/', FavouriteCheckView.as_view(kind='university'), name='favourite-university-check'),
+    path('universities/bulk/', FavouriteBulkView.as_view(kind='university'), name='favourite-university-bulk'),
+    path('courses/ids/', FavouriteIdsView.as_view(kind='course'), name='favourite-course-ids'),
+    path('courses/check/', FavouriteCheckView.as_view(kind='course'), name='favourite-course-check'),
+    path('courses/bulk/', FavouriteBulkView.as_view(kind='course'), name='favourite-course-bulk'),
+
     # Legacy endpoints for backward compatibility
     path('add-favourite-university/', AddFavouriteUniversity.as_view(), name='add-favourite-university'),
     path('add-favourite-course/', AddFavouriteCourse.as_view(), name='add-favourite-course'),
-]
\ No newline at end of file
+]
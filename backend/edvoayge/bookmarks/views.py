@@ -1,503 +1,226 @@
-from django.shortcuts import render
+import logging
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from django.core.exceptions import ObjectDoesNotExist
-from .models import FavouriteUniversity, FavouriteCourse
 from .serializers import FavouriteUniversitySerializer, FavouriteCourseSerializer
-from universities.models import University
-from courses.models import Course
-from users.models import User
-import traceback
+from .services import FavouriteService
 
-class FavouriteUniversityView(APIView):
-    def get(self, request):
-        """Get all favourite universities for the current user"""
-        try:
-            print("🔍 DEBUG: Starting FavouriteUniversityView.get()")
-           
-           
-    
-            
-            print("🔍 DEBUG: Attempting to filter FavouriteUniversity objects")
-            try:
-                favourites = FavouriteUniversity.objects.all()
-                # favourites_count = favourites.count()
-                # print(f"✅ DEBUG: Found {favourites_count} favourite universities")
-                
-                if favourites.exists():
-                    first_fav = favourites.first()
-                    print(f"✅ DEBUG: First favourite - User: {first_fav.user.username}, University: {first_fav.university.name}")
-                else:
-                    print("ℹ️ DEBUG: No favourite universities found")
-                    
-            except Exception as e:
-                print(f"❌ DEBUG: Error filtering FavouriteUniversity: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Database error: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("🔍 DEBUG: Attempting to serialize data")
-            try:
-                serializer = FavouriteUniversitySerializer(favourites, many=True)
-                print(f"✅ DEBUG: Serialization successful, data count: {len(serializer.data)}")
-            except Exception as e:
-                print(f"❌ DEBUG: Error serializing data: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Serialization error: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("✅ DEBUG: Returning successful response")
-            return Response({
-                'status': 'success',
-                'data': serializer.data,
-                'count': len(serializer.data)
-            })
-            
-        except Exception as e:
-            print(f"❌ DEBUG: Unexpected error in FavouriteUniversityView.get(): {str(e)}")
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return Response({
-                'status': 'error',
-                'message': f'Unexpected error: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def post(self, request):
-        """Add a university to favourites"""
-        try:
-            print("🔍 DEBUG: Starting FavouriteUniversityView.post()")
-            
-            university_id = request.data.get('university_id')
-            print(f"🔍 DEBUG: Received university_id: {university_id}")
-            
-            if not university_id:
-                print("❌ DEBUG: No university_id provided")
-                return Response({
-                    'status': 'error',
-                    'message': 'university_id is required'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            print("🔍 DEBUG: Attempting to get university")
-            try:
-                university = University.objects.get(id=university_id)
-                print(f"✅ DEBUG: Found university: {university.name} (ID: {university.id})")
-            except University.DoesNotExist:
-                print(f"❌ DEBUG: University with ID={university_id} not found")
-                return Response({
-                    'status': 'error',
-                    'message': 'University not found'
-                }, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                print(f"❌ DEBUG: Error getting university: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error getting university: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # For testing purposes, use user ID = 1
-            print("🔍 DEBUG: Attempting to get test user")
-            try:
-                test_user = User.objects.get(id=1)
-                print(f"✅ DEBUG: Found test user: {test_user.username} (ID: {test_user.id})")
-            except User.DoesNotExist:
-                print("❌ DEBUG: User with ID=1 does not exist")
-                return Response({
-                    'status': 'error',
-                    'message': 'Test user not found. Please create a user with ID=1'
-                }, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                print(f"❌ DEBUG: Error getting user: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error getting user: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Check if already favourited
-            print("🔍 DEBUG: Checking if already favourited")
-            try:
-                if FavouriteUniversity.objects.filter(user=test_user, university=university).exists():
-                    print("❌ DEBUG: University already in favourites")
-                    return Response({
-                        'status': 'error',
-                        'message': 'University already in favourites'
-                    }, status=status.HTTP_400_BAD_REQUEST)
-                print("✅ DEBUG: University not in favourites, proceeding to add")
-            except Exception as e:
-                print(f"❌ DEBUG: Error checking existing favourite: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error checking existing favourite: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("🔍 DEBUG: Creating new favourite")
-            try:
-                favourite = FavouriteUniversity.objects.create(user=test_user, university=university)
-                print(f"✅ DEBUG: Created favourite - User: {favourite.user.username}, University: {favourite.university.name}")
-            except Exception as e:
-                print(f"❌ DEBUG: Error creating favourite: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error creating favourite: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("🔍 DEBUG: Serializing response")
-            try:
-                serializer = FavouriteUniversitySerializer(favourite)
-                print("✅ DEBUG: Serialization successful")
-            except Exception as e:
-                print(f"❌ DEBUG: Error serializing response: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error serializing response: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("✅ DEBUG: Returning successful response")
-            return Response({
-                'status': 'success',
-                'message': 'University added to favourites',
-                'data': serializer.data
-            }, status=status.HTTP_201_CREATED)
-            
-        except Exception as e:
-            print(f"❌ DEBUG: Unexpected error in FavouriteUniversityView.post(): {str(e)}")
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return Response({
-                'status': 'error',
-                'message': f'Unexpected error: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-    
-    def delete(self, request):
-        """Remove a university from favourites"""
-        try:
-            print("🔍 DEBUG: Starting FavouriteUniversityView.delete()")
-            
-            university_id = request.data.get('university_id')
-            print(f"🔍 DEBUG: Received university_id: {university_id}")
-            
-            if not university_id:
-                print("❌ DEBUG: No university_id provided")
-                return Response({
-                    'status': 'error',
-                    'message': 'university_id is required'
-                }, status=status.HTTP_400_BAD_REQUEST)
-            
-            # For testing purposes, use user ID = 1
-            print("🔍 DEBUG: Attempting to get test user")
-            try:
-                test_user = User.objects.get(id=1)
-                print(f"✅ DEBUG: Found test user: {test_user.username} (ID: {test_user.id})")
-            except User.DoesNotExist:
-                print("❌ DEBUG: User with ID=1 does not exist")
-                return Response({
-                    'status': 'error',
-                    'message': 'Test user not found. Please create a user with ID=1'
-                }, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                print(f"❌ DEBUG: Error getting user: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error getting user: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("🔍 DEBUG: Attempting to delete favourite")
-            try:
-                favourite = FavouriteUniversity.objects.get(user=test_user, university_id=university_id)
-                print(f"✅ DEBUG: Found favourite to delete - User: {favourite.user.username}, University: {favourite.university.name}")
-                favourite.delete()
-                print("✅ DEBUG: Favourite deleted successfully")
-            except FavouriteUniversity.DoesNotExist:
-                print(f"❌ DEBUG: Favourite not found for user ID=1 and university ID={university_id}")
-                return Response({
-                    'status': 'error',
-                    'message': 'University not in favourites'
-                }, status=status.HTTP_404_NOT_FOUND)
-            except Exception as e:
-                print(f"❌ DEBUG: Error deleting favourite: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error deleting favourite: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            print("✅ DEBUG: Returning successful response")
-            return Response({
-                'status': 'success',
-                'message': 'University removed from favourites'
-            })
-            
-        except Exception as e:
-            print(f"❌ DEBUG: Unexpected error in FavouriteUniversityView.delete(): {str(e)}")
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return Response({
-                'status': 'error',
-                'message': f'Unexpected error: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+logger = logging.getLogger(__name__)
+
+# Most ids accepted by one bulk or membership request
+MAX_BULK_IDS = 200
+
+
+def parse_ids(value):
+    """
+    Item ids from a list or a comma separated string.
+
+    Returns:
+        list: Integer ids, or None if any id is invalid or there are too many
+    """
+    if value in (None, ''):
+        return []
+    if isinstance(value, str):
+        value = [part for part in value.split(',') if part.strip()]
+    if not isinstance(value, (list, tuple)) or len(value) > MAX_BULK_IDS:
+        return None
+    try:
+        return [int(pk) for pk in value]
+    except (TypeError, ValueError):
+        return None
+
+
+def error_response(message, status_code):
+    return Response({'status': 'error', 'message': message}, status=status_code)
+
+
+class FavouriteView(APIView):
+    """
+    The current user's favourites of one kind: list, add and remove.
+    """
+    permission_classes = [IsAuthenticated]
+    kind = None
+    id_field = None
+    serializer_class = None
+
+    @property
+    def label(self):
+        return self.kind.capitalize()
 
-class FavouriteCourseView(APIView):
     def get(self, request):
-        """Get all favourite courses for the current user"""
-        
-        favourites = FavouriteCourse.objects.all()
-        print("🔍 DEBUG: Favourites found:", favourites)
-        serializer = FavouriteCourseSerializer(favourites, many=True)
-        print("🔍 DEBUG: Serialized data:", serializer.data)
+        """Get all favourites of the current user"""
+        favourites = FavouriteService.favourites(request.user, self.kind)
+        serializer = self.serializer_class(favourites, many=True, context={'request': request})
         return Response({
             'status': 'success',
             'data': serializer.data,
             'count': len(serializer.data)
         })
-    
+
     def post(self, request):
-        """Add a course to favourites"""
-        course_id = request.data.get('course_id')
-        if not course_id:
-            return Response({
-                'status': 'error',
-                'message': 'course_id is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            course = Course.objects.get(id=course_id)
-        except Course.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Course not found'
-            }, status=status.HTTP_404_NOT_FOUND)
+        """Add an item to favourites"""
+        item_id = request.data.get(self.id_field)
+        if not item_id:
+            return error_response(f'{self.id_field} is required', status.HTTP_400_BAD_REQUEST)
+        ids = parse_ids([item_id])
+        if ids is None:
+            return error_response(f'{self.id_field} must be an integer', status.HTTP_400_BAD_REQUEST)
 
-        try:
-            test_user = User.objects.get(id=1)
-        except User.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Test user not found. Please create a user with ID=1'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # Check if already favourited
-        if FavouriteCourse.objects.filter(user=test_user, course=course).exists():
-            return Response({
-                'status': 'error',
-                'message': 'Course already in favourites'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        favourite = FavouriteCourse.objects.create(user=test_user, course=course)
-        serializer = FavouriteCourseSerializer(favourite)
-        print("The data for the favourite serializers are", serializer.data)
+        added, missing = FavouriteService.add(request.user, self.kind, ids)
+        if missing:
+            return error_response(f'{self.label} not found', status.HTTP_404_NOT_FOUND)
+        if not added:
+            return error_response(f'{self.label} already in favourites', status.HTTP_400_BAD_REQUEST)
+
+        favourite = FavouriteService.favourites(request.user, self.kind).get(**{f'{self.kind}_id': ids[0]})
         return Response({
             'status': 'success',
-            'message': 'Course added to favourites',
-            'data': serializer.data
+            'message': f'{self.label} added to favourites',
+            'data': self.serializer_class(favourite, context={'request': request}).data
         }, status=status.HTTP_201_CREATED)
-    
+
     def delete(self, request):
-        """Remove a course from favourites"""
-        course_id = request.data.get('course_id')
-        if not course_id:
-            return Response({
-                'status': 'error',
-                'message': 'course_id is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        # For testing purposes, use user ID = 1
-        try:
-            test_user = User.objects.get(id=1)
-        except User.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Test user not found. Please create a user with ID=1'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        try:
-            favourite = FavouriteCourse.objects.get(user=test_user, course_id=course_id)
-            favourite.delete()
-            return Response({
-                'status': 'success',
-                'message': 'Course removed from favourites'
-            })
-        except FavouriteCourse.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Course not in favourites'
-            }, status=status.HTTP_404_NOT_FOUND)
+        """Remove an item from favourites"""
+        item_id = request.data.get(self.id_field)
+        if not item_id:
+            return error_response(f'{self.id_field} is required', status.HTTP_400_BAD_REQUEST)
+        ids = parse_ids([item_id])
+        if ids is None:
+            return error_response(f'{self.id_field} must be an integer', status.HTTP_400_BAD_REQUEST)
+
+        if not FavouriteService.remove(request.user, self.kind, ids):
+            return error_response(f'{self.label} not in favourites', status.HTTP_404_NOT_FOUND)
+        return Response({
+            'status': 'success',
+            'message': f'{self.label} removed from favourites'
+        })
+
+
+class FavouriteUniversityView(FavouriteView):
+    kind = 'university'
+    id_field = 'university_id'
+    serializer_class = FavouriteUniversitySerializer
+
+
+class FavouriteCourseView(FavouriteView):
+    kind = 'course'
+    id_field = 'course_id'
+    serializer_class = FavouriteCourseSerializer
+
+
+class FavouriteIdsView(APIView):
+    """
+    Ids of everything the current user has favourited, for rendering list screens.
+    """
+    permission_classes = [IsAuthenticated]
+    kind = None
+
+    def get(self, request):
+        ids = sorted(FavouriteService.ids(request.user, self.kind))
+        return Response({'status': 'success', 'data': ids, 'count': len(ids)})
+
+
+class FavouriteCheckView(APIView):
+    """
+    Which of some items the current user has favourited.
+
+    ``GET ?ids=1,2,3`` or ``POST {"ids": [1, 2, 3]}``; answers with
+    ``{"1": true, "2": false, ...}`` from the cached favourite set.
+    """
+    permission_classes = [IsAuthenticated]
+    kind = None
+
+    def check(self, request, value):
+        ids = parse_ids(value)
+        if ids is None:
+            return error_response(f'ids must be at most {MAX_BULK_IDS} integers', status.HTTP_400_BAD_REQUEST)
+        favourited = FavouriteService.contains(request.user, self.kind, ids)
+        return Response({'status': 'success', 'data': {str(pk): value for pk, value in favourited.items()}})
+
+    def get(self, request):
+        return self.check(request, request.query_params.get('ids'))
 
-# Legacy views for backward compatibility
-class AddFavouriteUniversity(APIView):
     def post(self, request):
-        
-        print("🔍 DEBUG: Starting AddFavouriteUniversity.post()")
-        print(f"🔍 DEBUG: Request data: {request.data}")
-        print(f"🔍 DEBUG: Request method: {request.method}")
-        print(f"🔍 DEBUG: Content type: {request.content_type}")    
-        
-        # Check for both field names for compatibility
-        university_id = request.data.get('university_id') or request.data.get('university')
-        print(f"🔍 DEBUG: Extracted university_id: {university_id}")
-        
-        if not university_id:
-            print("❌ DEBUG: No university_id/university provided in request data")
-            print(f"❌ DEBUG: Available keys in request.data: {list(request.data.keys())}")
-            return Response({
-                'status': 'error',
-                'message': 'university_id or university is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        print(f"🔍 DEBUG: Attempting to get university with ID: {university_id}")
-        try:
-            university = University.objects.get(id=university_id)
-            print(f"✅ DEBUG: Found university: {university.name} (ID: {university.id})")
-        except University.DoesNotExist:
-            print(f"❌ DEBUG: University with ID={university_id} not found")
-            return Response({
-                'status': 'error',
-                'message': 'University not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"❌ DEBUG: Error getting university: {str(e)}")
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return Response({
-                'status': 'error',
-                'message': f'Error getting university: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        # For testing purposes, use user ID = 1
-        print("🔍 DEBUG: Attempting to get test user with ID=1")
-        try:
-            test_user = User.objects.get(id=1)
-            print(f"✅ DEBUG: Found test user: {test_user.username} (ID: {test_user.id})")
-        except User.DoesNotExist:
-            print("❌ DEBUG: User with ID=1 does not exist")
-            return Response({
-                'status': 'error',
-                'message': 'Test user not found. Please create a user with ID=1'
-            }, status=status.HTTP_404_NOT_FOUND)
-        except Exception as e:
-            print(f"❌ DEBUG: Error getting user: {str(e)}")
-            print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-            return Response({
-                'status': 'error',
-                'message': f'Error getting user: {str(e)}'
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        print("🔍 DEBUG: Checking if university is already in favourites")
-        existing_favourite = FavouriteUniversity.objects.filter(user=test_user, university=university).first()
-        
-        if existing_favourite:
-            # University already exists in favourites, so delete it (toggle off)
-            print(f"🔍 DEBUG: University {university.name} is already in favourites for user {test_user.username}, removing it...")
-            try:
-                existing_favourite.delete()
-                print(f"✅ DEBUG: Successfully removed favourite: User={test_user.username}, University={university.name}")
-                return Response({
-                    'status': 'success',
-                    'message': 'University removed from favourites',
-                    'action': 'removed'
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                print(f"❌ DEBUG: Error removing favourite: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error removing favourite: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            # University doesn't exist in favourites, so create it (toggle on)
-            print("🔍 DEBUG: Creating new favourite university entry")
-            try:
-                favourite = FavouriteUniversity.objects.create(user=test_user, university=university)
-                print(f"✅ DEBUG: Successfully created favourite: User={test_user.username}, University={university.name}")
-                return Response({
-                    'status': 'success',
-                    'message': 'University added to favourites',
-                    'action': 'added'
-                }, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                print(f"❌ DEBUG: Error creating favourite: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error creating favourite: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-class AddFavouriteCourse(APIView):
+        return self.check(request, request.data.get('ids'))
+
+
+class FavouriteBulkView(APIView):
+    """
+    Add and remove many favourites at once.
+
+    ``POST {"add": [1, 2], "remove": [3]}``; items already in the requested
+    state are left alone, unknown items are reported in ``not_found``.
+    """
+    permission_classes = [IsAuthenticated]
+    kind = None
+
     def post(self, request):
-        print("🔍 DEBUG: Starting AddFavouriteCourse.post()")
-        print(f"🔍 DEBUG: Request data: {request.data}")
-        print(f"🔍 DEBUG: Request method: {request.method}")
-        print(f"🔍 DEBUG: Content type: {request.content_type}")
-        
-        course_id = request.data.get('course')
-        print(f"🔍 DEBUG: Extracted course_id: {course_id}")
-        
-        if not course_id:
-            print("❌ DEBUG: No course_id provided in request data")
-            print(f"❌ DEBUG: Available keys in request.data: {list(request.data.keys())}")
-            return Response({
-                'status': 'error',
-                'message': 'course is required'
-            }, status=status.HTTP_400_BAD_REQUEST)
-        
-        try:
-            course = Course.objects.get(id=course_id)
-        except Course.DoesNotExist:
-            return Response({
-                'status': 'error',
-                'message': 'Course not found'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        # For testing purposes, use user ID = 1
+        to_add = parse_ids(request.data.get('add'))
+        to_remove = parse_ids(request.data.get('remove'))
+        if to_add is None or to_remove is None:
+            return error_response(
+                f'add and remove must be lists of at most {MAX_BULK_IDS} ids', status.HTTP_400_BAD_REQUEST
+            )
+        if set(to_add) & set(to_remove):
+            return error_response('An id cannot be both added and removed', status.HTTP_400_BAD_REQUEST)
+
+        added, missing = FavouriteService.add(request.user, self.kind, to_add) if to_add else ([], [])
+        removed = FavouriteService.remove(request.user, self.kind, to_remove) if to_remove else []
+        return Response({
+            'status': 'success',
+            'data': {
+                'added': added,
+                'removed': removed,
+                'not_found': missing,
+                'ids': sorted(FavouriteService.ids(request.user, self.kind)),
+            }
+        })
+
+
+# Legacy views for backward compatibility
+class ToggleFavouriteView(APIView):
+    """
+    Favourite an item, or unfavourite it if it already is.
+    """
+    permission_classes = [IsAuthenticated]
+    kind = None
+    id_fields = ()
+
+    def post(self, request):
+        item_id = next((request.data.get(field) for field in self.id_fields if request.data.get(field)), None)
+        label = self.kind.capitalize()
+        if not item_id:
+            return error_response(f"{' or '.join(self.id_fields)} is required", status.HTTP_400_BAD_REQUEST)
+        ids = parse_ids([item_id])
+        if ids is None:
+            return error_response(f'{self.id_fields[0]} must be an integer', status.HTTP_400_BAD_REQUEST)
+
         try:
-            test_user = User.objects.get(id=1)
-        except User.DoesNotExist:
+            action = FavouriteService.toggle(request.user, self.kind, ids[0])
+        except ObjectDoesNotExist:
+            return error_response(f'{label} not found', status.HTTP_404_NOT_FOUND)
+
+        if action == 'removed':
             return Response({
-                'status': 'error',
-                'message': 'Test user not found. Please create a user with ID=1'
-            }, status=status.HTTP_404_NOT_FOUND)
-        
-        existing_favourite = FavouriteCourse.objects.filter(user=test_user, course=course).first()
-        
-        if existing_favourite:
-            # Course already exists in favourites, so delete it (toggle off)
-            print(f"🔍 DEBUG: Course {course.name} is already in favourites for user {test_user.username}, removing it...")
-            try:
-                existing_favourite.delete()
-                print(f"✅ DEBUG: Successfully removed favourite course: User={test_user.username}, Course={course.name}")
-                return Response({
-                    'status': 'success',
-                    'message': 'Course removed from favourites',
-                    'action': 'removed'
-                }, status=status.HTTP_200_OK)
-            except Exception as e:
-                print(f"❌ DEBUG: Error removing favourite course: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error removing favourite course: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            # Course doesn't exist in favourites, so create it (toggle on)
-            print("🔍 DEBUG: Creating new favourite course entry")
-            try:
-                favourite = FavouriteCourse.objects.create(user=test_user, course=course)
-                print(f"✅ DEBUG: Successfully created favourite course: User={test_user.username}, Course={course.name}")
-                return Response({
-                    'status': 'success',
-                    'message': 'Course added to favourites',
-                    'action': 'added'
-                }, status=status.HTTP_201_CREATED)
-            except Exception as e:
-                print(f"❌ DEBUG: Error creating favourite course: {str(e)}")
-                print(f"❌ DEBUG: Traceback: {traceback.format_exc()}")
-                return Response({
-                    'status': 'error',
-                    'message': f'Error creating favourite course: {str(e)}'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                'status': 'success',
+                'message': f'{label} removed from favourites',
+                'action': 'removed'
+            }, status=status.HTTP_200_OK)
+        return Response({
+            'status': 'success',
+            'message': f'{label} added to favourites',
+            'action': 'added'
+        }, status=status.HTTP_201_CREATED)
+
+
+class AddFavouriteUniversity(ToggleFavouriteView):
+    kind = 'university'
+    # Both field names are accepted for compatibility
+    id_fields = ('university_id', 'university')
+
+
+class AddFavouriteCourse(ToggleFavouriteView):
+    kind = 'course'
+    id_fields = ('course',)
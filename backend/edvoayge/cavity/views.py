@@ -17,6 +17,7 @@ from .models import (
     User, Post, PostLike, Comment, CommentLike, 
     PostShare, Notification, UserFollow
 )
+from notifications.counters import UnreadCounterService
 from .serializers import (
    UserSerializer, UserMinimalSerializer, PostSerializer, PostCreateSerializer,
     CommentSerializer,  PostLikeSerializer,
@@ -415,12 +416,13 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     def read_all(self, request):
         """Mark all notifications as read"""
         Notification.objects.filter(recipient=request.user, is_read=False).update(is_read=True)
+        UnreadCounterService.reset('cavity', request.user.id, 0)
         return Response({'message': 'All notifications marked as read'})
 
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get count of unread notifications"""
-        count = Notification.objects.filter(recipient=request.user, is_read=False).count()
+        count = UnreadCounterService.get_count(request.user.id, 'cavity')
         return Response({'unread_count': count})
 
 
@@ -10,6 +10,7 @@ from .models import (
     ChatUser, ChatRoom, ChatRoomParticipant, Message, 
     MessageStatus, Contact, ChatNotification
 )
+from notifications.counters import UnreadCounterService
 from .serializers import (
     ChatUserSerializer, ChatUserMinimalSerializer, ChatUserStatusSerializer,
     ChatRoomSerializer, ChatRoomCreateSerializer, ChatRoomParticipantSerializer,
@@ -403,6 +404,7 @@ class ChatNotificationViewSet(viewsets.ModelViewSet):
         try:
             chat_user = ChatUser.objects.get(user=user)
             ChatNotification.objects.filter(user=chat_user).update(is_read=True)
+            UnreadCounterService.reset('chat', user.id, 0)
             return Response({'message': 'All notifications marked as read'}, status=status.HTTP_200_OK)
         except ChatUser.DoesNotExist:
             return Response({'error': 'User not found'}, status=status.HTTP_404_NOT_FOUND)
@@ -410,13 +412,8 @@ class ChatNotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
         """Get unread notification count"""
-        user = self.request.user
-        try:
-            chat_user = ChatUser.objects.get(user=user)
-            count = ChatNotification.objects.filter(user=chat_user, is_read=False).count()
-            return Response({'unread_count': count})
-        except ChatUser.DoesNotExist:
-            return Response({'unread_count': 0})
+        count = UnreadCounterService.get_count(self.request.user.id, 'chat')
+        return Response({'unread_count': count})
 
 
 class SearchViewSet(viewsets.ViewSet):
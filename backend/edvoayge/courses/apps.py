@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class CoursesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'courses'
+
+    def ready(self):
+        """Import signals and register cache invalidation"""
+        import courses.signals
+        from edvoayge.response_cache import invalidate_on_change
+        from .models import (
+            Course, Subject, CourseSubject, FeeStructure, CourseRequirement, CourseApplication, CourseRating
+        )
+        invalidate_on_change(
+            'courses', Course, Subject, CourseSubject, FeeStructure, CourseRequirement,
+            CourseApplication, CourseRating
+        )
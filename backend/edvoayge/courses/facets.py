@@ -0,0 +1,367 @@
+"""
+Faceted course filtering.
+
+Each course has a flat ``CourseFacet`` row (university, country, level,
+duration, status, subjects, tuition and average rating), refreshed by
+signals when the course, its subjects, its ratings or its university change.
+``FacetIndex`` turns those rows into bitmaps: one Python int per facet value,
+where bit ``i`` stands for the i-th course in listing order. Applying a
+filter is then a few ANDs and ORs and a facet count is a popcount, instead
+of one ``GROUP BY`` per facet.
+
+The index is cached under the state of the facet table (row count and
+latest ``updated_at``), so every worker builds or loads the same index
+after a change. A copy is kept in process memory: the writing process drops
+it at once through a version that refreshes bump, and other processes
+re-check the table state every ``COURSE_FACET_LOCAL_TTL`` seconds.
+"""
+
+import logging
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Max
+from .models import Course, CourseFacet, CourseRating, CourseSubject
+
+logger = logging.getLogger(__name__)
+
+FACET_FIELDS = [
+    'university_id', 'university_name', 'country', 'level', 'duration', 'status',
+    'tuition_fee', 'average_rating', 'subjects', 'course_created_at',
+]
+
+
+def build_rows(course_ids=None):
+    """
+    Compute ``CourseFacet`` rows from the source tables.
+
+    Args:
+        course_ids (iterable, optional): Courses to compute; all when omitted
+
+    Returns:
+        list: Unsaved ``CourseFacet`` instances
+    """
+    courses = Course.objects.all()
+    links = CourseSubject.objects.all()
+    ratings = CourseRating.objects.all()
+    if course_ids is not None:
+        course_ids = list(course_ids)
+        courses = courses.filter(pk__in=course_ids)
+        links = links.filter(course_id__in=course_ids)
+        ratings = ratings.filter(course_id__in=course_ids)
+
+    subjects = defaultdict(list)
+    for course_id, name in links.order_by('subject__name').values_list('course_id', 'subject__name'):
+        subjects[course_id].append(name)
+    averages = dict(ratings.values('course_id').annotate(average=Avg('rating')).values_list('course_id', 'average').order_by())
+
+    rows = []
+    for course in courses.values(
+        'id', 'university_id', 'university__name', 'university__country',
+        'level', 'duration', 'status', 'tuition_fee', 'created_at',
+    ).order_by():
+        average = averages.get(course['id'])
+        rows.append(CourseFacet(
+            course_id=course['id'],
+            university_id=course['university_id'],
+            university_name=course['university__name'],
+            country=course['university__country'],
+            level=course['level'],
+            duration=course['duration'],
+            status=course['status'],
+            tuition_fee=course['tuition_fee'],
+            average_rating=Decimal(average).quantize(Decimal('0.01')) if average is not None else None,
+            subjects=subjects.get(course['id'], []),
+            course_created_at=course['created_at'],
+        ))
+    return rows
+
+
+def _mask(positions, size):
+    """Bitmap with the given bit positions set"""
+    buffer = bytearray((size + 7) // 8)
+    for position in positions:
+        buffer[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _positions(mask):
+    """Set bit positions of a bitmap, lowest first"""
+    bits = bin(mask)[:1:-1]
+    return [position for position, bit in enumerate(bits) if bit == '1']
+
+
+class FacetIndex:
+    """
+    Bitmaps over every course, in listing order (newest first).
+
+    Args:
+        rows (iterable): ``CourseFacet`` value dicts ordered for listing
+    """
+
+    # filter name -> CourseFacet field
+    FACETS = {
+        'universities': 'university_id',
+        'countries': 'country',
+        'levels': 'level',
+        'durations': 'duration',
+        'subjects': 'subjects',
+        'status': 'status',
+    }
+    RATING_THRESHOLDS = (1, 2, 3, 4, 5)
+
+    def __init__(self, rows, fee_buckets=()):
+        rows = list(rows)
+        self.size = len(rows)
+        self.ids = [row['course_id'] for row in rows]
+        self.all = (1 << self.size) - 1
+
+        positions = {facet: defaultdict(list) for facet in self.FACETS}
+        self.university_names = {}
+        for position, row in enumerate(rows):
+            for facet, field in self.FACETS.items():
+                values = row[field] if facet == 'subjects' else [row[field]]
+                for value in values:
+                    positions[facet][value].append(position)
+            self.university_names[row['university_id']] = row['university_name']
+        self.bitmaps = {
+            facet: {value: _mask(found, self.size) for value, found in values.items()}
+            for facet, values in positions.items()
+        }
+
+        by_fee = sorted(range(self.size), key=lambda position: rows[position]['tuition_fee'])
+        self.fee_order = by_fee
+        self.fee_values = [rows[position]['tuition_fee'] for position in by_fee]
+        bounds = list(fee_buckets)
+        self.fee_buckets = [
+            (low, bounds[index + 1] if index + 1 < len(bounds) else None)
+            for index, low in enumerate(bounds)
+        ]
+        self.fee_bucket_masks = [self.fee_mask(low, high, exclusive_max=True) for low, high in self.fee_buckets]
+
+        self.rating_masks = {
+            threshold: _mask(
+                [position for position, row in enumerate(rows)
+                 if row['average_rating'] is not None and row['average_rating'] >= threshold],
+                self.size,
+            )
+            for threshold in self.RATING_THRESHOLDS
+        }
+
+    def fee_mask(self, low=None, high=None, exclusive_max=False):
+        """Courses with ``low <= tuition_fee <= high`` (``< high`` if exclusive)"""
+        start = bisect_left(self.fee_values, Decimal(low)) if low is not None else 0
+        if high is None:
+            end = self.size
+        elif exclusive_max:
+            end = bisect_left(self.fee_values, Decimal(high))
+        else:
+            end = bisect_right(self.fee_values, Decimal(high))
+        return _mask(self.fee_order[start:end], self.size)
+
+    def selections(self, filters):
+        """
+        Bitmap of each active filter.
+
+        Returns:
+            dict: filter name -> bitmap of the courses it lets through
+        """
+        selected = {}
+        for facet in self.FACETS:
+            values = filters.get(facet)
+            if values in (None, '', []):
+                continue
+            mask = 0
+            for value in values if isinstance(values, (list, tuple, set)) else [values]:
+                mask |= self.bitmaps[facet].get(value, 0)
+            selected[facet] = mask
+
+        fee_range = filters.get('fee_range') or {}
+        if fee_range.get('min') is not None or fee_range.get('max') is not None:
+            selected['fee_range'] = self.fee_mask(fee_range.get('min'), fee_range.get('max'))
+        if filters.get('rating_min'):
+            selected['rating_min'] = self.rating_masks.get(int(filters['rating_min']), 0)
+        return selected
+
+    def search(self, filters):
+        """
+        Apply filters and count every facet value.
+
+        Counts are disjunctive: a facet's counts apply all the other active
+        filters but not its own, so picking a second value of the same facet
+        shows how many results it would add.
+
+        Returns:
+            tuple: (matching course ids in listing order, facet counts)
+        """
+        selected = self.selections(filters)
+
+        def combine(skip=None):
+            mask = self.all
+            for name, selection in selected.items():
+                if name != skip:
+                    mask &= selection
+            return mask
+
+        matches = combine()
+        labels = {
+            'levels': dict(Course.LEVEL_CHOICES),
+            'durations': dict(Course.DURATION_CHOICES),
+            'status': dict(Course.STATUS_CHOICES),
+            'universities': self.university_names,
+        }
+
+        facets = {}
+        for facet in self.FACETS:
+            base = combine(skip=facet)
+            counts = [
+                {'value': value, 'label': labels.get(facet, {}).get(value, value), 'count': (base & mask).bit_count()}
+                for value, mask in self.bitmaps[facet].items()
+            ]
+            facets[facet] = sorted(
+                (entry for entry in counts if entry['count']),
+                key=lambda entry: (-entry['count'], str(entry['label'])),
+            )
+
+        base = combine(skip='fee_range')
+        facets['fee_range'] = [
+            {'min': low, 'max': high, 'count': (base & mask).bit_count()}
+            for (low, high), mask in zip(self.fee_buckets, self.fee_bucket_masks)
+        ]
+        base = combine(skip='rating_min')
+        facets['rating_min'] = [
+            {'value': threshold, 'count': (base & mask).bit_count()}
+            for threshold, mask in self.rating_masks.items()
+        ]
+
+        return [self.ids[position] for position in _positions(matches)], facets
+
+
+class CourseFacetService:
+    """
+    Service class for maintaining course facets and searching them.
+    """
+
+    CACHE_PREFIX = 'courses:facets'
+    INDEX_TIMEOUT = 24 * 60 * 60
+
+    _local = {'version': None, 'state': None, 'index': None, 'checked_at': 0}
+
+    @classmethod
+    def _version_key(cls):
+        return f'{cls.CACHE_PREFIX}:version'
+
+    @classmethod
+    def version(cls):
+        return cache.get(cls._version_key(), 0)
+
+    @classmethod
+    def _bump(cls):
+        try:
+            cache.incr(cls._version_key())
+        except ValueError:
+            cache.set(cls._version_key(), 1, timeout=None)
+
+    @staticmethod
+    def table_state():
+        """What identifies the stored facet rows, as seen by every process"""
+        facets = CourseFacet.objects.aggregate(rows=Count('pk'), updated=Max('updated_at'))
+        updated = facets['updated'].timestamp() if facets['updated'] else 0
+        return f"{facets['rows']}:{Course.objects.count()}:{updated}"
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Drop the cached index.
+
+        Bumped now and again on commit, so an index built by another request
+        from the pre-commit rows is not kept.
+        """
+        cls._bump()
+        transaction.on_commit(cls._bump)
+
+    @classmethod
+    def refresh(cls, course_ids):
+        """
+        Recompute the facet rows of some courses.
+
+        Args:
+            course_ids (iterable): Course ids; deleted courses are skipped
+        """
+        course_ids = [pk for pk in set(course_ids) if pk is not None]
+        if not course_ids:
+            return 0
+        rows = build_rows(course_ids)
+        CourseFacet.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['course'], update_fields=FACET_FIELDS + ['updated_at'],
+        )
+        cls.invalidate()
+        return len(rows)
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute every course's facet row"""
+        rows = build_rows()
+        with transaction.atomic():
+            CourseFacet.objects.exclude(course_id__in=[row.course_id for row in rows]).delete()
+            CourseFacet.objects.bulk_create(
+                rows, batch_size=500, update_conflicts=True, unique_fields=['course'],
+                update_fields=FACET_FIELDS + ['updated_at'],
+            )
+        cls.invalidate()
+        logger.info(f"Rebuilt facets for {len(rows)} courses")
+        return len(rows)
+
+    @classmethod
+    def build_index(cls):
+        """Index over the stored facet rows, filling in any that are missing"""
+        missing = list(Course.objects.filter(facet__isnull=True).values_list('pk', flat=True))
+        if missing:
+            # Courses saved without signals (bulk_create, fixtures) or before facets existed
+            CourseFacet.objects.bulk_create(
+                build_rows(missing), batch_size=500, update_conflicts=True,
+                unique_fields=['course'], update_fields=FACET_FIELDS + ['updated_at'],
+            )
+        rows = CourseFacet.objects.order_by('-course_created_at', '-course_id').values('course_id', *FACET_FIELDS)
+        return FacetIndex(rows, fee_buckets=getattr(settings, 'COURSE_FEE_BUCKETS', []))
+
+    @classmethod
+    def get_index(cls):
+        local = cls._local
+        version = cls.version()
+        now = time.monotonic()
+        ttl = getattr(settings, 'COURSE_FACET_LOCAL_TTL', 30)
+        if local['index'] is not None and local['version'] == version and now - local['checked_at'] < ttl:
+            return local['index']
+
+        # Changes made by other processes only show in the table itself
+        state = cls.table_state()
+        if local['index'] is not None and local['state'] == state:
+            local.update(version=version, checked_at=now)
+            return local['index']
+
+        key = f'{cls.CACHE_PREFIX}:index:{state}'
+        index = cache.get(key)
+        if index is None:
+            index = cls.build_index()
+            state = cls.table_state()  # build_index may have filled in missing rows
+            cache.set(f'{cls.CACHE_PREFIX}:index:{state}', index, timeout=cls.INDEX_TIMEOUT)
+        local.update(version=version, state=state, index=index, checked_at=now)
+        return index
+
+    @classmethod
+    def search(cls, filters):
+        """
+        Filter courses and count facet values under the current filter.
+
+        Args:
+            filters (dict): Validated ``CourseFilterSerializer`` data
+
+        Returns:
+            tuple: (matching course ids in listing order, facet counts)
+        """
+        return cls.get_index().search(filters)
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from courses.facets import CourseFacetService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the facet rows used by course filtering'
+
+    def handle(self, *args, **options):
+        count = CourseFacetService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt facets for {count} course(s)'))
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseFacet',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='facet', serialize=False, to='courses.course')),
+                ('university_id', models.BigIntegerField(db_index=True)),
+                ('university_name', models.CharField(max_length=255)),
+                ('country', models.CharField(max_length=100)),
+                ('level', models.CharField(max_length=20)),
+                ('duration', models.CharField(max_length=20)),
+                ('status', models.CharField(max_length=20)),
+                ('tuition_fee', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('average_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True)),
+                ('subjects', models.JSONField(blank=True, default=list)),
+                ('course_created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Course Facet',
+                'verbose_name_plural': 'Course Facets',
+            },
+        ),
+    ]
@@ -293,3 +293,32 @@ class CourseRating(models.Model):
         else:
             print(f"New course rating: {self.course.name} by {self.user.username}") if hasattr(self, '_meta') else None
         super().save(*args, **kwargs)
+
+
+class CourseFacet(models.Model):
+    """
+    Precomputed facet values of a course, maintained by ``courses.facets``.
+
+    One flat row per course so the facet index can be rebuilt with a single
+    query instead of joining universities, subjects and ratings.
+    """
+    course = models.OneToOneField(Course, on_delete=models.CASCADE, primary_key=True, related_name='facet')
+    university_id = models.BigIntegerField(db_index=True)
+    university_name = models.CharField(max_length=255)
+    country = models.CharField(max_length=100)
+    level = models.CharField(max_length=20)
+    duration = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    tuition_fee = models.DecimalField(max_digits=10, decimal_places=2)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    subjects = models.JSONField(default=list, blank=True)
+    course_created_at = models.DateTimeField()
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Course Facet"
+        verbose_name_plural = "Course Facets"
+
+    def __str__(self):
+        return f"Facets - {self.course_id}"
@@ -0,0 +1,55 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from universities.models import University
+from .facets import CourseFacetService
+from .models import Course, CourseRating, CourseSubject, Subject
+
+
+@receiver(post_save, sender=Course)
+def refresh_course_facets(sender, instance, **kwargs):
+    """Recompute the facet row of a saved course"""
+    CourseFacetService.refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Course)
+def drop_course_facets(sender, instance, **kwargs):
+    """The facet row is deleted with the course; drop the cached index"""
+    CourseFacetService.invalidate()
+
+
+@receiver(post_save, sender=CourseSubject)
+@receiver(post_delete, sender=CourseSubject)
+@receiver(post_save, sender=CourseRating)
+@receiver(post_delete, sender=CourseRating)
+def refresh_related_course_facets(sender, instance, **kwargs):
+    """Recompute facets when a course's subjects or ratings change"""
+    CourseFacetService.refresh([instance.course_id])
+
+
+@receiver(m2m_changed, sender=Course.subjects.through)
+def refresh_subject_links(sender, instance, action, reverse, pk_set, **kwargs):
+    """Recompute facets after ``course.subjects.add()``/``remove()``/``clear()``"""
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        CourseFacetService.refresh([instance.pk])
+    elif pk_set:
+        CourseFacetService.refresh(pk_set)
+    else:
+        CourseFacetService.invalidate()
+
+
+@receiver(post_save, sender=Subject)
+def refresh_subject_facets(sender, instance, created, **kwargs):
+    """Subject names are facet values; recompute the courses using a renamed subject"""
+    if not created:
+        CourseFacetService.refresh(
+            CourseSubject.objects.filter(subject=instance).values_list('course_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=University)
+def refresh_university_facets(sender, instance, created, **kwargs):
+    """University name and country are facet values"""
+    if not created:
+        CourseFacetService.refresh(instance.courses.values_list('pk', flat=True))
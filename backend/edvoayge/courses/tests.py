@@ -3,15 +3,18 @@ Test cases for courses app.
 Provides comprehensive testing for all course-related functionality.
 """
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from decimal import Decimal
+from universities.models import University
+from .facets import CourseFacetService
 from .models import (
     Course, Subject, CourseSubject, FeeStructure, 
-    CourseRequirement, CourseApplication, CourseRating
+    CourseRequirement, CourseApplication, CourseRating, CourseFacet
 )
 
 
@@ -464,3 +467,98 @@ class CourseApplicationAPITest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data['course_name'], 'Test Course')
         self.assertEqual(response.data['status'], 'submitted')
+
+
+class CourseFacetTest(APITestCase):
+    """Test cases for faceted course filtering."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.url = '/api/v1/courses/courses/filter/'
+        self.berlin = University.objects.create(name='Berlin University', slug='berlin', country='Germany',
+                                                city='Berlin', university_type='public')
+        self.paris = University.objects.create(name='Paris University', slug='paris', country='France',
+                                               city='Paris', university_type='public')
+        self.anatomy = Subject.objects.create(name='Anatomy', code='ANA')
+        self.surgery = Subject.objects.create(name='Surgery', code='SUR')
+        self.user = User.objects.create_user(username='rater', password='testpass123')
+
+        self.courses = []
+        for n, (university, level, fee) in enumerate([
+            (self.berlin, 'undergraduate', '3000'), (self.berlin, 'postgraduate', '12000'),
+            (self.berlin, 'undergraduate', '8000'), (self.paris, 'undergraduate', '25000'),
+        ]):
+            course = Course.objects.create(name=f'Course {n}', code=f'C{n}', description='Course',
+                                           university=university, level=level, tuition_fee=Decimal(fee))
+            self.courses.append(course)
+        CourseSubject.objects.create(course=self.courses[0], subject=self.anatomy)
+        self.courses[3].subjects.add(self.anatomy, self.surgery)
+        CourseRating.objects.create(user=self.user, course=self.courses[0], rating=5)
+
+    def facet(self, data, facet):
+        return {entry['value']: entry['count'] for entry in data['facets'][facet]}
+
+    def test_filter_returns_results_with_facet_counts(self):
+        """Test results and counts follow the filter, each facet ignoring its own selection."""
+        data = self.client.post(self.url, {'countries': ['Germany'], 'levels': ['undergraduate']},
+                                format='json').data
+
+        self.assertEqual(data['count'], 2)
+        self.assertEqual([row['id'] for row in data['results']], [self.courses[2].id, self.courses[0].id])
+        self.assertEqual(self.facet(data, 'countries'), {'Germany': 2, 'France': 1})
+        self.assertEqual(self.facet(data, 'levels'), {'undergraduate': 2, 'postgraduate': 1})
+        self.assertEqual(self.facet(data, 'subjects'), {'Anatomy': 1})
+        self.assertEqual(self.facet(data, 'rating_min')[5], 1)
+        buckets = {entry['min']: entry['count'] for entry in data['facets']['fee_range']}
+        self.assertEqual((buckets[0], buckets[5000]), (1, 1))
+
+    def test_subjects_fees_and_ratings(self):
+        """Test subject, fee range and rating filters."""
+        subjects = self.client.post(self.url, {'subjects': ['Anatomy']}, format='json').data
+        self.assertEqual({row['id'] for row in subjects['results']}, {self.courses[0].id, self.courses[3].id})
+
+        fees = self.client.post(self.url, {'fee_range': {'min': '5000', 'max': '12000'}}, format='json').data
+        self.assertEqual({row['id'] for row in fees['results']}, {self.courses[1].id, self.courses[2].id})
+
+        rated = self.client.post(self.url, {'rating_min': 4}, format='json').data
+        self.assertEqual([row['id'] for row in rated['results']], [self.courses[0].id])
+
+    def test_changes_refresh_facets(self):
+        """Test editing a course, its subjects or its university updates the counts."""
+        self.client.post(self.url, {}, format='json')
+
+        self.courses[1].level = 'undergraduate'
+        self.courses[1].save()
+        self.courses[2].subjects.add(self.surgery)
+        self.paris.country = 'Belgium'
+        self.paris.save()
+
+        data = self.client.post(self.url, {}, format='json').data
+        self.assertEqual(self.facet(data, 'levels'), {'undergraduate': 4})
+        self.assertEqual(self.facet(data, 'subjects'), {'Anatomy': 2, 'Surgery': 2})
+        self.assertEqual(self.facet(data, 'countries'), {'Germany': 3, 'Belgium': 1})
+
+    def test_facet_counts_use_a_single_query_when_cached(self):
+        """Test a warm index answers facets without a GROUP BY per facet."""
+        self.client.post(self.url, {}, format='json')
+        with self.assertNumQueries(0):
+            CourseFacetService.search({'countries': ['France'], 'subjects': ['Surgery']})
+
+    def test_changes_from_other_processes_show_after_the_ttl(self):
+        """Test a worker whose cache missed the version bump re-checks the facet table."""
+        self.client.post(self.url, {}, format='json')
+        # Another worker's write: the rows change but this process's version does not
+        CourseFacet.objects.filter(course=self.courses[0]).update(country='Austria', updated_at=timezone.now())
+
+        with override_settings(COURSE_FACET_LOCAL_TTL=0):
+            _, facets = CourseFacetService.search({})
+        self.assertIn('Austria', [item['value'] for item in facets['countries']])
+
+    def test_missing_rows_are_filled_in(self):
+        """Test courses saved without signals are indexed on the next build."""
+        CourseFacet.objects.all().delete()
+        self.assertEqual(CourseFacetService.rebuild(), 4)
+        CourseFacet.objects.filter(course=self.courses[0]).delete()
+        CourseFacetService.invalidate()
+        ids, _ = CourseFacetService.search({})
+        self.assertEqual(len(ids), 4)
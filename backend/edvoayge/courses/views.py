@@ -13,6 +13,8 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from edvoayge.response_cache import cached_response
+from .facets import CourseFacetService
 from .models import (
     Course, Subject, CourseSubject, FeeStructure, 
     CourseRequirement, CourseApplication, CourseRating
@@ -84,6 +86,7 @@ class CourseViewSet(viewsets.ModelViewSet):
         
         return queryset
 
+    @cached_response('courses', 'universities')
     def list(self, request, *args, **kwargs):
         """List courses with enhanced filtering."""
         print("Entering CourseListView") if hasattr(request, 'user') else None
@@ -182,51 +185,23 @@ class CourseViewSet(viewsets.ModelViewSet):
             serializer = CourseFilterSerializer(data=request.data)
             serializer.is_valid(raise_exception=True)
             
-            queryset = self.get_queryset()
-            
-            # Apply filters
-            filters = serializer.validated_data
-            
-            if filters.get('universities'):
-                queryset = queryset.filter(university_id__in=filters['universities'])
-            
-            if filters.get('levels'):
-                queryset = queryset.filter(level__in=filters['levels'])
-            
-            if filters.get('durations'):
-                queryset = queryset.filter(duration__in=filters['durations'])
-            
-            if filters.get('subjects'):
-                queryset = queryset.filter(subjects__name__in=filters['subjects']).distinct()
-            
-            if filters.get('countries'):
-                queryset = queryset.filter(university__country__in=filters['countries'])
-            
-            if filters.get('fee_range'):
-                fee_range = filters['fee_range']
-                if 'min' in fee_range:
-                    queryset = queryset.filter(tuition_fee__gte=fee_range['min'])
-                if 'max' in fee_range:
-                    queryset = queryset.filter(tuition_fee__lte=fee_range['max'])
-            
-            if filters.get('rating_min'):
-                queryset = queryset.annotate(avg_rating=Avg('ratings__rating')).filter(
-                    avg_rating__gte=filters['rating_min']
-                )
-            
-            if filters.get('status'):
-                queryset = queryset.filter(status=filters['status'])
-            
-            # Paginate results
-            page = self.paginate_queryset(queryset)
+            course_ids, facets = CourseFacetService.search(serializer.validated_data)
+
+            # Only the page of courses being shown is loaded
+            page = self.paginate_queryset(course_ids)
+            page_ids = page if page is not None else course_ids
+            courses = self.get_queryset().in_bulk(page_ids)
+            courses = [courses[pk] for pk in page_ids if pk in courses]
+            serializer = CourseListSerializer(courses, many=True)
+
             if page is not None:
-                serializer = CourseListSerializer(page, many=True)
-                return self.get_paginated_response(serializer.data)
-            
-            serializer = CourseListSerializer(queryset, many=True)
+                response = self.get_paginated_response(serializer.data)
+                response.data['facets'] = facets
+                return response
+
             print(f"Course filter returned {len(serializer.data)} results") if hasattr(request, 'user') else None
             return Response(
-                {'success': True, 'data': serializer.data, 'message': 'Filter applied successfully'}
+                {'success': True, 'data': serializer.data, 'facets': facets, 'message': 'Filter applied successfully'}
             )
         except Exception as e:
             logger.error(f"Error in course filter: {e}")
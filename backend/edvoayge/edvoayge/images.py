@@ -0,0 +1,183 @@
+"""
+Resized derivatives of uploaded images.
+
+Each source image gets one derivative per entry in ``DERIVATIVE_IMAGE_SIZES``
+(name -> width), stored next to the media files under
+``DERIVATIVE_IMAGE_ROOT/<size>/``. Derivatives are generated in the
+background when an image is uploaded, or on first use when a serializer
+asks for a derivative that does not exist yet; until then the original URL
+is returned, so requests never wait for resizing.
+"""
+
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models.signals import post_save
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = {'thumb': 160, 'small': 480, 'medium': 960}
+
+# Derivative names known to exist, so repeat requests skip the storage check
+_known = set()
+_scheduled = set()
+_lock = threading.Lock()
+_executor = None
+
+
+def get_sizes():
+    return getattr(settings, 'DERIVATIVE_IMAGE_SIZES', DEFAULT_SIZES)
+
+
+def get_format():
+    """Output format; JPEG when Pillow was built without WebP"""
+    image_format = getattr(settings, 'DERIVATIVE_IMAGE_FORMAT', 'webp').lower()
+    if image_format == 'webp':
+        from PIL import features
+        if not features.check('webp'):
+            return 'jpeg'
+    return image_format
+
+
+def derivative_name(name, size):
+    """Storage name of the ``size`` derivative of the image stored at ``name``"""
+    base, _ = os.path.splitext(name)
+    extension = 'jpg' if get_format() == 'jpeg' else get_format()
+    root = getattr(settings, 'DERIVATIVE_IMAGE_ROOT', 'derivatives')
+    return f"{root}/{size}/{base}.{extension}"
+
+
+def generate_derivatives(name, storage=None):
+    """
+    Create any missing derivatives of a stored image.
+
+    The source is decoded once and resized for every width; images narrower
+    than a width are re-encoded without upscaling.
+
+    Returns:
+        dict: size -> derivative storage name
+    """
+    from PIL import Image, ImageOps
+
+    storage = storage or default_storage
+    image_format = get_format()
+    quality = getattr(settings, 'DERIVATIVE_IMAGE_QUALITY', 80)
+    missing = {
+        size: width for size, width in get_sizes().items()
+        if not storage.exists(derivative_name(name, size))
+    }
+    if missing:
+        with storage.open(name, 'rb') as source_file:
+            source = ImageOps.exif_transpose(Image.open(source_file))
+            source = source.convert('RGBA' if image_format == 'webp' and 'A' in source.getbands() else 'RGB')
+            # Largest first so each resize starts from the smallest adequate copy
+            for size, width in sorted(missing.items(), key=lambda item: -item[1]):
+                if source.width > width:
+                    source = source.resize(
+                        (width, max(1, round(source.height * width / source.width))),
+                        Image.LANCZOS
+                    )
+                output = io.BytesIO()
+                source.save(output, format=image_format.upper(), quality=quality)
+                target = derivative_name(name, size)
+                if not storage.exists(target):
+                    storage.save(target, ContentFile(output.getvalue()))
+
+    with _lock:
+        for size in get_sizes():
+            _known.add(derivative_name(name, size))
+        _scheduled.discard(name)
+    return {size: derivative_name(name, size) for size in get_sizes()}
+
+
+def _generate_safely(name):
+    try:
+        generate_derivatives(name)
+    except Exception as e:
+        logger.error(f"Error generating derivatives for {name}: {e}")
+        with _lock:
+            _scheduled.discard(name)
+
+
+def schedule_derivatives(name):
+    """Generate derivatives in the background, once per image at a time"""
+    global _executor
+    if not getattr(settings, 'DERIVATIVE_IMAGES_ASYNC', True):
+        _generate_safely(name)
+        return
+    with _lock:
+        if name in _scheduled:
+            return
+        _scheduled.add(name)
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'DERIVATIVE_IMAGE_WORKERS', 2),
+                thread_name_prefix='image-derivatives',
+            )
+    _executor.submit(_generate_safely, name)
+
+
+def variant_urls(field_file, request=None):
+    """
+    URLs of every derivative of an image field value.
+
+    Missing derivatives are scheduled for generation and reported with the
+    original image URL in the meantime.
+
+    Returns:
+        dict: size -> URL, or None without an image
+    """
+    if not field_file or not field_file.name:
+        return None
+
+    storage = field_file.storage
+    urls = {}
+    for size in get_sizes():
+        name = derivative_name(field_file.name, size)
+        if name in _known or storage.exists(name):
+            with _lock:
+                _known.add(name)
+            url = storage.url(name)
+        else:
+            schedule_derivatives(field_file.name)
+            url = field_file.url
+        urls[size] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """
+    Read-only serializer field with the derivative URLs of an image field.
+
+    Usage: ``logo_variants = ImageVariantsField(source='logo')``
+    """
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get('request'))
+
+
+def generate_on_upload(model, *field_names):
+    """
+    Generate derivatives after a model instance is saved with a new image.
+
+    Called from an app's ``ready()``; bulk inserts do not send signals, so
+    images created that way are handled on first use instead.
+    """
+    def handler(sender, instance, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        for field_name in field_names:
+            if update_fields is not None and field_name not in update_fields:
+                continue
+            field_file = getattr(instance, field_name)
+            if field_file and field_file.name:
+                name = field_file.name
+                transaction.on_commit(lambda name=name: schedule_derivatives(name))
+
+    post_save.connect(handler, sender=model, weak=False, dispatch_uid=f'derivatives-{model._meta.label}')
@@ -0,0 +1,35 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from edvoayge.storage import adopt_existing_files, collect_garbage
+
+
+class Command(BaseCommand):
+    help = 'Delete media files no longer referenced by any model field'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping periodically')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between sweeps with --loop')
+        parser.add_argument(
+            '--grace-hours', type=float, default=None,
+            help='Keep unreferenced files younger than this (default CONTENT_STORAGE_GC_GRACE_HOURS)'
+        )
+        parser.add_argument(
+            '--adopt', action='store_true',
+            help='First move files saved before content addressing into the hashed layout'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report what would change without deleting')
+
+    def handle(self, *args, **options):
+        if options['adopt']:
+            adopted = adopt_existing_files(dry_run=options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(f'Adopted {adopted} file(s)'))
+
+        while True:
+            close_old_connections()
+            deleted, reclaimed = collect_garbage(grace_hours=options['grace_hours'], dry_run=options['dry_run'])
+            verb = 'Would delete' if options['dry_run'] else 'Deleted'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {deleted} file(s), {reclaimed} bytes'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,193 @@
+"""
+Serving of uploaded media.
+
+``serve_media`` replaces ``django.views.static.serve`` for ``MEDIA_URL``:
+
+- every response carries an ETag and Last-Modified, so a repeat request
+  with ``If-None-Match``/``If-Modified-Since`` is answered with a 304;
+- single ``Range`` requests (honouring ``If-Range``) get a 206 with just
+  the requested bytes, which PDF viewers and video players rely on;
+- content-addressed files (see edvoayge/storage.py) never change under
+  their name and are sent with a one-year ``immutable`` Cache-Control;
+- files under ``MEDIA_PRIVATE_PREFIXES`` (application documents and their
+  previews) are never served here; the views that check access send them
+  through ``serve_file`` with ``private=True``, which shared caches do not
+  store;
+- with ``MEDIA_SENDFILE_HEADER`` set, the body is left to the front proxy
+  (nginx ``X-Accel-Redirect`` or Apache/lighttpd ``X-Sendfile``), which
+  then also handles ranges, and Python only checks the file and headers.
+"""
+
+import mimetypes
+import os
+import posixpath
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from .storage import is_content_name
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def media_etag(name, stat):
+    """Strong ETag: the content hash for hashed names, else mtime and size"""
+    if is_content_name(name) and default_storage.is_content_addressed(name):
+        return '"%s"' % posixpath.splitext(posixpath.basename(name))[0]
+    return '"%x-%x"' % (int(stat.st_mtime), stat.st_size)
+
+
+def parse_range(header, size):
+    """
+    Byte range requested by a ``Range`` header.
+
+    Returns:
+        tuple: (first, last) inclusive offsets, None to send the whole file
+            (no header, or a form we do not serve such as multiple ranges),
+            or False if the range cannot be satisfied
+    """
+    match = RANGE_RE.match(header.replace(' ', '')) if header else None
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        return False
+    return first, last
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    modified = parse_http_date_safe(if_range)
+    return modified is not None and int(mtime) <= modified
+
+
+def _read_range(path, first, length):
+    with open(path, 'rb') as media_file:
+        media_file.seek(first)
+        while length > 0:
+            chunk = media_file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def is_private(name):
+    """True if ``name`` may only be sent to users a view has authorized"""
+    return name.startswith(tuple(getattr(settings, 'MEDIA_PRIVATE_PREFIXES', [])))
+
+
+def _cache_headers(response, name, etag, mtime, private=False):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(mtime)
+    response['Accept-Ranges'] = 'bytes'
+    if private:
+        # Kept by the browser only, and revalidated (cheaply, by ETag) before each use
+        patch_cache_control(response, private=True, no_cache=True)
+    elif is_content_name(name) and default_storage.is_content_addressed(name):
+        patch_cache_control(response, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        patch_cache_control(response, public=True, max_age=getattr(settings, 'MEDIA_CACHE_MAX_AGE', 3600))
+    return response
+
+
+def _sendfile_response(name, path):
+    header = settings.MEDIA_SENDFILE_HEADER
+    response = HttpResponse()
+    if header.lower() == 'x-accel-redirect':
+        # nginx maps this internal location onto MEDIA_ROOT
+        response[header] = getattr(settings, 'MEDIA_SENDFILE_PREFIX', '/protected-media/') + name
+    else:
+        response[header] = path
+    # The proxy sets the real type and length; clear Django's default
+    del response['Content-Type']
+    return response
+
+
+def serve_file(request, name, private=False):
+    """
+    Response for a stored file, with conditional and range support.
+
+    Args:
+        request: The GET or HEAD request
+        name (str): Storage name of the file
+        private (bool): Send it with private caching; the caller has checked access
+
+    Raises:
+        Http404: If the file does not exist
+    """
+    try:
+        full_path = safe_join(default_storage.location, name)
+    except Exception:
+        raise Http404('Invalid media path')
+    try:
+        stat = os.stat(full_path)
+    except (FileNotFoundError, NotADirectoryError):
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    etag = media_etag(name, stat)
+    not_modified = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if not_modified is not None:
+        if isinstance(not_modified, HttpResponseNotModified):
+            return _cache_headers(not_modified, name, etag, stat.st_mtime, private)
+        return not_modified  # 412 Precondition Failed
+
+    if getattr(settings, 'MEDIA_SENDFILE_HEADER', None):
+        return _cache_headers(_sendfile_response(name, full_path), name, etag, stat.st_mtime, private)
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+
+    byte_range = None
+    if _if_range_matches(request, etag, stat.st_mtime):
+        byte_range = parse_range(request.headers.get('Range'), stat.st_size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return _cache_headers(response, name, etag, stat.st_mtime, private)
+
+    if byte_range:
+        first, last = byte_range
+        length = last - first + 1
+        response = StreamingHttpResponse(_read_range(full_path, first, length), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {first}-{last}/{stat.st_size}'
+        response['Content-Length'] = str(length)
+    else:
+        # FileResponse lets the WSGI server use wsgi.file_wrapper (sendfile)
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+        response['Content-Length'] = str(stat.st_size)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return _cache_headers(response, name, etag, stat.st_mtime, private)
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a public file from MEDIA_ROOT"""
+    name = posixpath.normpath(path).lstrip('/')
+    if is_private(name):
+        raise Http404('Media file not found')
+    return serve_file(request, name)
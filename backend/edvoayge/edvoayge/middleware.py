@@ -1,9 +1,10 @@
 import logging
 import json
+from django.conf import settings
 from django.utils.deprecation import MiddlewareMixin
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import AnonymousUser
-from users.models import UserSession
+from users.services import SessionService
 
 logger = logging.getLogger(__name__)
 
@@ -25,8 +26,8 @@ class CustomAuthenticationMiddleware(MiddlewareMixin):
         print(f"🔍 DEBUG: Path: {request.path}")
         
         # Skip authentication for certain paths
-        if request.path.startswith('/admin/') or request.path.startswith('/static/'):
-            print(f"🔍 DEBUG: Skipping authentication for admin/static path")
+        if request.path.startswith(('/admin/', '/static/', settings.MEDIA_URL)):
+            print(f"🔍 DEBUG: Skipping authentication for admin/static/media path")
             return None
         
         # Get session key from Authorization header
@@ -83,12 +84,8 @@ class CustomAuthenticationMiddleware(MiddlewareMixin):
                     print(f"🔍 DEBUG: User authenticated for backup session: {request.user.is_authenticated}")
                     return None
                 
-                # Find the session for real users
-                session = UserSession.objects.filter(
-                    session_key=session_key,
-                    device_id=device_id,
-                    is_active=True
-                ).first()
+                # Find the session for real users (expired sessions are ended here)
+                session = SessionService.authenticate(session_key, device_id)
                 
                 if session:
                     print(f"🔍 DEBUG: Session found for user: {session.user}")
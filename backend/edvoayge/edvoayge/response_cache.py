@@ -0,0 +1,181 @@
+"""
+Cached catalogue responses.
+
+Read endpoints for rarely changing catalogue data (universities, courses,
+study abroad programs) are wrapped with ``cached_response``. The rendered
+body is stored in the cache under a key built from the endpoint, the
+normalized query string and the current version of every *section* the
+response depends on, and carries a strong ETag (a hash of the body), so a
+repeat request is answered from the cache, or with a 304, without running
+the view.
+
+A section's version is bumped whenever one of its models is saved or
+deleted (``invalidate_on_change``, registered in each app's ``ready``), which
+moves every dependent response to a new key; old entries simply expire.
+Changes that bypass signals (``QuerySet.update``) are picked up when the
+entry's timeout runs out.
+"""
+
+import hashlib
+import logging
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Service class for storing rendered responses and invalidating them.
+    """
+
+    CACHE_PREFIX = 'responses'
+
+    @staticmethod
+    def enabled():
+        return getattr(settings, 'RESPONSE_CACHE_ENABLED', True)
+
+    @staticmethod
+    def default_timeout():
+        return getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300)
+
+    @classmethod
+    def _version_key(cls, section):
+        return f'{cls.CACHE_PREFIX}:version:{section}'
+
+    @classmethod
+    def get_versions(cls, sections):
+        """
+        Current version of each section in one cache round trip.
+
+        Returns:
+            dict: section -> version number
+        """
+        keys = {cls._version_key(section): section for section in sections}
+        found = cache.get_many(list(keys))
+        return {section: found.get(key, 0) for key, section in keys.items()}
+
+    @classmethod
+    def invalidate(cls, section):
+        """Move every response that depends on ``section`` to a new key"""
+        key = cls._version_key(section)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, timeout=None)
+
+    @staticmethod
+    def normalize_query(query_params):
+        """
+        Query parameters in a canonical order, without empty values.
+
+        ``?b=2&a=1`` and ``?a=1&b=2&c=`` describe the same response, so they
+        share a cache entry.
+        """
+        items = []
+        for name in sorted(query_params):
+            values = sorted(value for value in query_params.getlist(name) if value != '')
+            items.extend(f'{name}={value}' for value in values)
+        return '&'.join(items)
+
+    @classmethod
+    def cache_key(cls, request, endpoint, sections, url_kwargs=None):
+        """
+        Cache key for a request to a cached endpoint.
+
+        The host and scheme are part of the key because serializers build
+        absolute media URLs, and the renderer because the body depends on it.
+        """
+        versions = cls.get_versions(sections)
+        renderer = getattr(getattr(request, 'accepted_renderer', None), 'format', '')
+        parts = [
+            request.build_absolute_uri('/'),
+            renderer,
+            '&'.join(f'{name}={value}' for name, value in sorted((url_kwargs or {}).items())),
+            cls.normalize_query(request.GET),
+        ]
+        digest = hashlib.sha1('|'.join(parts).encode()).hexdigest()
+        version = '.'.join(str(versions[section]) for section in sections)
+        return f'{cls.CACHE_PREFIX}:{endpoint}:{version}:{digest}'
+
+    @staticmethod
+    def etag(content):
+        return f'"{hashlib.sha1(content).hexdigest()}"'
+
+    @classmethod
+    def store(cls, key, response, timeout=None):
+        """Cache a rendered response and give it an ETag"""
+        etag = cls.etag(response.content)
+        response['ETag'] = etag
+        response['X-Cache'] = 'MISS'
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'etag': etag,
+        }, timeout=timeout if timeout is not None else cls.default_timeout())
+
+    @staticmethod
+    def build_response(request, entry):
+        """Response for a cache hit, or a 304 if the client has it already"""
+        not_modified = get_conditional_response(request, etag=entry['etag'])
+        if not_modified is not None:
+            return not_modified
+        response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        response['X-Cache'] = 'HIT'
+        return response
+
+
+def cached_response(*sections, timeout=None):
+    """
+    Cache a viewset action's successful GET responses.
+
+    Args:
+        sections: Sections whose changes invalidate the response
+        timeout (int, optional): Seconds to keep an entry; defaults to
+            ``RESPONSE_CACHE_TIMEOUT``
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD') or not ResponseCache.enabled():
+                return handler(view, request, *args, **kwargs)
+
+            endpoint = f'{type(view).__module__}.{type(view).__name__}.{handler.__name__}'
+            key = ResponseCache.cache_key(request, endpoint, sections, kwargs)
+            entry = cache.get(key)
+            if entry is not None:
+                return ResponseCache.build_response(request, entry)
+
+            response = handler(view, request, *args, **kwargs)
+            if response.status_code == 200 and hasattr(response, 'add_post_render_callback'):
+                response.add_post_render_callback(lambda rendered: ResponseCache.store(key, rendered, timeout))
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidate_on_change(section, *models):
+    """
+    Invalidate a section when any of ``models`` is saved or deleted.
+
+    The version is bumped straight away and again once the transaction
+    commits, so a response rendered from the pre-commit data by another
+    request in the meantime is not served afterwards.
+    """
+    def invalidate(sender, **kwargs):
+        ResponseCache.invalidate(section)
+        transaction.on_commit(lambda: ResponseCache.invalidate(section))
+
+    for model in models:
+        uid = f'response-cache:{section}:{model._meta.label}'
+        post_save.connect(invalidate, sender=model, weak=False, dispatch_uid=f'{uid}:save')
+        post_delete.connect(invalidate, sender=model, weak=False, dispatch_uid=f'{uid}:delete')
+        for field in model._meta.local_many_to_many:
+            m2m_changed.connect(invalidate, sender=field.remote_field.through, weak=False,
+                                dispatch_uid=f'{uid}:{field.name}')
@@ -0,0 +1,87 @@
+"""
+Field selection for serializers.
+
+Clients pick what a response contains with two query parameters:
+
+- ``?fields=id,name,logo_url`` keeps only the listed fields;
+- ``?expand=campuses,rankings`` adds nested relations, which are left out
+  unless asked for (or the view expands them by default, as detail views do).
+
+Unselected fields are removed from the serializer before rendering, so they
+cost nothing, and ``prefetch_plan`` tells the view which relations the
+selected fields need so that only those are prefetched.
+"""
+
+
+def parse_field_list(value):
+    """Comma-separated query parameter as a list of names"""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+def requested_fields(request):
+    """
+    ``fields`` and ``expand`` query parameters of a request.
+
+    Returns:
+        tuple: (fields or None, expand list)
+    """
+    if request is None:
+        return None, []
+    params = getattr(request, 'query_params', request.GET)
+    fields = parse_field_list(params.get('fields'))
+    return fields or None, parse_field_list(params.get('expand'))
+
+
+class FieldSelectionMixin:
+    """
+    Serializer mixin that renders only the selected fields.
+
+    Meta options:
+        expandable_fields: Fields (usually nested relations) rendered only
+            when expanded
+        prefetch_fields: field name -> prefetch lookup, or a callable
+            returning a ``Prefetch``
+        select_fields: field name -> select_related lookup
+
+    Args:
+        fields: Field names to render; defaults to every non-expandable field
+        expand: Expandable fields to add, or ``'__all__'``
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        keep = self.selected_field_names(fields, expand)
+        for name in list(self.fields):
+            if name not in keep:
+                self.fields.pop(name)
+
+    @classmethod
+    def expandable_fields(cls):
+        return list(getattr(cls.Meta, 'expandable_fields', []))
+
+    @classmethod
+    def selected_field_names(cls, fields=None, expand=None):
+        """Names rendered for a ``fields``/``expand`` selection"""
+        expandable = cls.expandable_fields()
+        if expand == '__all__':
+            expand = expandable
+        expanded = {name for name in expand or [] if name in expandable}
+        if fields:
+            return set(fields) | expanded
+        return {name for name in cls.Meta.fields if name not in expandable} | expanded
+
+    @classmethod
+    def prefetch_plan(cls, fields=None, expand=None):
+        """
+        Relations needed to render a selection without extra queries.
+
+        Returns:
+            tuple: (select_related lookups, prefetch_related lookups)
+        """
+        selected = cls.selected_field_names(fields, expand)
+        select = [lookup for name, lookup in getattr(cls.Meta, 'select_fields', {}).items() if name in selected]
+        prefetch = [
+            lookup() if callable(lookup) else lookup
+            for name, lookup in getattr(cls.Meta, 'prefetch_fields', {}).items() if name in selected
+        ]
+        return select, prefetch
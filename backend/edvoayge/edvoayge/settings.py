@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'drf_yasg',
 
     # Your apps
+    'edvoayge',  # project-wide commands such as sweep_media
     'users',
     'universities',
     'courses',
@@ -114,6 +115,14 @@ DATABASES = {
     }
 }
 
+# Cache
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'edvoyage-default',
+    }
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',},
@@ -232,7 +241,11 @@ CSRF_COOKIE_SECURE = True
 SESSION_COOKIE_SECURE = True
 
 # Force Django to generate https:// URLs
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+STORAGES = {
+    # Media is stored by content hash; see edvoayge/storage.py
+    "default": {"BACKEND": "edvoayge.storage.ContentAddressedStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
 
 # Security Settings
 SECURE_BROWSER_XSS_FILTER = True
@@ -259,3 +272,139 @@ SWAGGER_SETTINGS = {
     },
     'USE_SESSION_AUTH': False,
 }
+
+# Analytics Settings
+ANALYTICS_WIDGET_WORKERS = 4  # concurrent widget queries per dashboard request
+
+# Notification Dispatch Settings
+NOTIFICATION_DISPATCH_ASYNC = True  # deliver started batches on a background thread
+NOTIFICATION_DISPATCH_CHUNK_SIZE = 500  # recipients loaded and sent per chunk
+NOTIFICATION_DEFAULT_CONCURRENCY = 4  # parallel sends per channel unless config['max_concurrency'] is set
+NOTIFICATION_RETRY_BACKOFF_SECONDS = 1
+NOTIFICATION_CHANNEL_BACKENDS = {}  # name -> backend class path, merged over notifications.backends defaults
+NOTIFICATION_RECIPIENT_FILTER_FIELDS = [  # user fields batch filters may select on (plus __in/__gte/... comparisons)
+    'date_joined', 'last_login', 'is_staff',
+    'profile__city', 'profile__state', 'profile__country', 'profile__gender',
+    'profile__is_email_verified', 'profile__is_profile_complete',
+]
+
+# Unread Counter Settings
+NOTIFICATION_UNREAD_CACHE_TIMEOUT = 30  # seconds a worker serves a cached unread badge count before recounting
+
+# Outbound Email Queue Settings
+EMAIL_QUEUE_ASYNC = True  # send queued mail on a background thread; False sends before the request returns
+EMAIL_QUEUE_BATCH_SIZE = 50  # messages sent per SMTP connection
+EMAIL_QUEUE_MAX_ATTEMPTS = 5
+EMAIL_QUEUE_RETRY_BACKOFF_SECONDS = 30  # doubled after each failed attempt
+EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS = 300  # reclaim messages left in sending by a crashed sender
+EMAIL_QUEUE_POLL_SECONDS = 30
+EMAIL_QUEUE_BACKEND = None  # defaults to EMAIL_BACKEND
+EMAIL_QUEUE_CONNECTION_OPTIONS = {}  # e.g. {'host': 'localhost', 'port': 1025, 'use_tls': False} for a local SMTP stand-in
+
+# OTP Settings
+OTP_EXPIRY_MINUTES = 15
+OTP_SEND_LIMIT = 5  # codes per contact per send window
+OTP_DEVICE_SEND_LIMIT = 10  # codes per device per send window
+OTP_SEND_WINDOW_SECONDS = 900  # sliding window for the send limits
+OTP_BLOCK_MINUTES = 5  # block after max_attempts wrong codes
+OTP_RETENTION_DAYS = 7  # expired OTP audit rows are purged after this
+OTP_PURGE_BATCH_SIZE = 1000
+
+# Activity Log Settings
+ACTIVITY_LOG_ASYNC = True  # buffer UserActivity records and write them from a background thread
+ACTIVITY_LOG_BATCH_SIZE = 200  # records per bulk insert; a full batch wakes the writer early
+ACTIVITY_LOG_FLUSH_SECONDS = 2
+ACTIVITY_LOG_MAX_BUFFER = 10000  # callers flush inline beyond this
+ACTIVITY_LOG_RETENTION_DAYS = {'failed_login': 90, 'default': 365}  # activity type -> days kept
+ACTIVITY_LOG_COMPACT_TYPES = ['failed_login']
+ACTIVITY_LOG_COMPACT_AFTER_DAYS = 7  # older rows are collapsed to one per user, IP and day
+
+# User Session Settings
+SESSION_IDLE_TIMEOUT_HOURS = 24
+SESSION_ABSOLUTE_TIMEOUT_DAYS = 30
+SESSION_MAX_PER_USER = 5  # oldest active sessions are ended beyond this; 0 disables the cap
+SESSION_TOUCH_INTERVAL_SECONDS = 300  # last_activity is written at most this often
+SESSION_RETENTION_DAYS = 30  # ended sessions are deleted after this
+
+# Flashcard PDF Settings
+FLASHCARD_PROCESSING_ASYNC = True  # rasterize uploaded PDFs on a background thread
+FLASHCARD_RASTER_WORKERS = 2  # pool processes per PDF; 0 rasterizes in the calling process
+FLASHCARD_PAGES_PER_TASK = 10  # pages rasterized (and held in memory) per pool task
+FLASHCARD_RASTER_DPI = 150
+FLASHCARD_JPEG_QUALITY = 80
+FLASHCARD_POPPLER_PATH = None  # defaults to C:\poppler\bin on Windows, PATH elsewhere
+
+# Derivative Image Settings
+DERIVATIVE_IMAGES_ASYNC = True  # resize uploaded images on a background thread pool
+DERIVATIVE_IMAGE_SIZES = {'thumb': 160, 'small': 480, 'medium': 960}  # size name -> max width in pixels
+DERIVATIVE_IMAGE_FORMAT = 'webp'  # falls back to jpeg when Pillow lacks WebP support
+DERIVATIVE_IMAGE_QUALITY = 80
+DERIVATIVE_IMAGE_ROOT = 'derivatives'  # stored under MEDIA_ROOT/<root>/<size>/
+DERIVATIVE_IMAGE_WORKERS = 2
+
+# Content-Addressed Storage Settings
+CONTENT_STORAGE_EXCLUDE = []  # path prefixes saved under their upload name (DERIVATIVE_IMAGE_ROOT always is)
+CONTENT_STORAGE_GC_GRACE_HOURS = 24  # unreferenced files younger than this are kept by sweep_media
+
+# Media Serving Settings
+MEDIA_SERVE = DEBUG  # serve MEDIA_URL from Django; enable explicitly in production only if no proxy serves public media
+MEDIA_PRIVATE_PREFIXES = ['applications/']  # never served from MEDIA_URL; sent by views that check access, with private caching
+MEDIA_CACHE_MAX_AGE = 3600  # seconds for files that can change; content-addressed files are cached for a year
+MEDIA_SENDFILE_HEADER = None  # 'X-Accel-Redirect' (nginx) or 'X-Sendfile' (Apache) to let the proxy send the body
+MEDIA_SENDFILE_PREFIX = '/protected-media/'  # internal nginx location aliased to MEDIA_ROOT
+
+# Payment Settings
+PAYMENT_DEFAULT_GATEWAY = 'fake'  # used for transactions without a gateway
+PAYMENT_GATEWAYS = {
+    # gateway name -> adapter class (see payments/gateways.py)
+    'fake': 'payments.gateways.FakeGateway',
+}
+PAYMENT_FAKE_DECLINE_AMOUNTS = ['13.13']  # the fake gateway declines charges of these amounts
+
+# Invoice PDF Settings
+INVOICE_PDF_ROOT = BASE_DIR / 'private' / 'invoices'  # rendered PDFs; outside MEDIA_ROOT so they are never public
+INVOICE_PDF_WORKERS = 2  # pool processes for render_invoices; 0 renders in the calling process
+
+# Subscription Billing Settings
+BILLING_CHUNK_SIZE = 200  # subscriptions charged per chunk; invoices are inserted once per chunk
+BILLING_STALE_CHARGE_MINUTES = 15  # renewal charges stuck in processing longer than this are retried
+
+# Response Cache Settings
+RESPONSE_CACHE_ENABLED = True  # cache catalogue read endpoints (see edvoayge/response_cache.py)
+RESPONSE_CACHE_TIMEOUT = 300  # seconds; bounds staleness from changes that bypass model signals
+
+# University Comparison Settings
+UNIVERSITY_COMPARE_MAX = 10  # universities per comparison; the query count does not grow with it
+
+# Course Facet Settings
+COURSE_FEE_BUCKETS = [0, 5000, 10000, 20000, 50000]  # lower bounds of the tuition ranges counted in filter panels
+COURSE_FACET_LOCAL_TTL = 30  # seconds a worker serves its in-memory facet index before re-checking the facet table
+
+# Recommendation Settings
+RECOMMENDATIONS_TOP_K = 20  # recommendations stored per user and item type
+RECOMMENDATIONS_NEIGHBOURS = 50  # most similar items kept per item by build_recommendations
+RECOMMENDATIONS_MAX_PROFILE = 200  # strongest signals per user used for similarities
+RECOMMENDATIONS_CHUNK_SIZE = 500  # users written per transaction in a full build
+RECOMMENDATIONS_ASYNC = True  # re-score users on a background thread after new favourites/applications
+
+# Favourite Settings
+FAVOURITE_IDS_CACHE_TIMEOUT = 60  # seconds; bounds how long a worker that missed an invalidation serves stale favourite ids
+
+# Document Upload Settings
+DOCUMENT_UPLOAD_MAX_SIZE = MAX_UPLOAD_SIZE  # bytes; uploads are rejected as soon as they pass this while streaming
+DOCUMENT_UPLOAD_TYPES = ['pdf', 'doc', 'docx', 'jpg', 'jpeg', 'png']  # extensions; content must match the type's signature
+DOCUMENT_UPLOAD_ROOT = BASE_DIR / 'private' / 'uploads'  # partial resumable uploads; outside MEDIA_ROOT
+DOCUMENT_UPLOAD_CHUNK_SIZE = 1024 * 1024  # chunk size suggested to resumable upload clients
+DOCUMENT_UPLOAD_EXPIRY_HOURS = 24  # unfinished resumable uploads are discarded after this
+
+# Document Preview Settings
+DOCUMENT_PREVIEW_ASYNC = True  # render previews on a background thread after an upload commits
+DOCUMENT_PREVIEW_WORKERS = 2  # pool processes for process_document_previews; 0 renders in the calling process
+DOCUMENT_PREVIEW_WIDTH = 960  # max width in pixels of the first-page preview
+DOCUMENT_THUMBNAIL_WIDTH = 240
+DOCUMENT_PREVIEW_DPI = 100  # PDF rasterization resolution for the first page
+DOCUMENT_PREVIEW_QUALITY = 80
+DOCUMENT_TEXT_MAX_CHARS = 100000  # extracted text kept per document
+
+# Application Timeline Settings
+APPLICATION_TIMELINE_SIZE = 20  # most recent events kept on each application's projection; older ones are paged from the event log
@@ -0,0 +1,220 @@
+"""
+Content-addressed media storage.
+
+Files are stored under their upload directory by the hash of their content
+(``flashcards/3f/3fa2...c1.jpg``), so saving identical bytes twice returns
+the existing name instead of writing a second copy. A stored file can be
+shared by any number of rows, which means deleting a field's file must not
+remove it while another row still points at it: ``delete`` only removes
+files nothing references (so a row is dropped before its file), and files
+left behind are reclaimed by ``collect_garbage`` (the ``sweep_media``
+command). Because a name always
+maps to the same bytes, content-addressed files can be cached forever.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import time
+from uuid import uuid4
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.db import models
+
+logger = logging.getLogger(__name__)
+
+HASH_LENGTH = 32  # hex characters of sha256 kept in the name
+CONTENT_NAME_RE = re.compile(r'(?:^|/)([0-9a-f]{2})/(\1[0-9a-f]{%d})(?:\.[0-9a-z]+)?$' % (HASH_LENGTH - 2))
+
+
+def is_content_name(name):
+    """True if ``name`` is in the content-addressed layout"""
+    return bool(name and CONTENT_NAME_RE.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    ``FileSystemStorage`` that names files by the sha256 of their content.
+
+    Paths under ``CONTENT_STORAGE_EXCLUDE`` (and the derivative image root,
+    whose names are derived from their source) keep the normal behaviour.
+    """
+
+    def excluded_prefixes(self):
+        prefixes = list(getattr(settings, 'CONTENT_STORAGE_EXCLUDE', []))
+        prefixes.append(getattr(settings, 'DERIVATIVE_IMAGE_ROOT', 'derivatives').rstrip('/') + '/')
+        return tuple(prefixes)
+
+    def is_content_addressed(self, name):
+        return not name.replace('\\', '/').startswith(self.excluded_prefixes())
+
+    @staticmethod
+    def content_hash(content):
+        # Uploads hashed while streaming in (applications/uploads.py) are not read again
+        precomputed = getattr(content, 'sha256', None)
+        if precomputed:
+            return precomputed[:HASH_LENGTH]
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk if isinstance(chunk, bytes) else chunk.encode())
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return digest.hexdigest()[:HASH_LENGTH]
+
+    def content_name(self, name, content):
+        """Content-addressed name for ``content`` uploaded as ``name``"""
+        directory, filename = os.path.split(name.replace('\\', '/'))
+        extension = os.path.splitext(filename)[1].lower()
+        digest = self.content_hash(content)
+        return '/'.join(part for part in (directory, digest[:2], f"{digest}{extension}") if part)
+
+    def _save(self, name, content):
+        if not self.is_content_addressed(name):
+            return super()._save(name, content)
+
+        target = self.content_name(name, content)
+        if self.exists(target):
+            logger.debug(f"Reusing stored file {target}")
+            return target
+
+        # Write under a unique name and move it into place, so a concurrent
+        # upload of the same bytes never sees a partial file
+        temporary = super()._save(f"{target}.{uuid4().hex}.tmp", content)
+        os.replace(self.path(temporary), self.path(target))
+        return target
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save from the content
+        if self.is_content_addressed(name):
+            return name
+        return super().get_available_name(name, max_length=max_length)
+
+    def reference_count(self, name):
+        """Number of model field values pointing at ``name``"""
+        return sum(
+            model._default_manager.filter(**{field.name: name}).count()
+            for model, field in file_fields(self)
+        )
+
+    def delete(self, name):
+        """
+        Delete a file unless a row still references it.
+
+        The caller's own row counts as a reference, so drop or repoint the
+        row before deleting its file. A file deleted while its row still
+        exists is kept, and ``sweep_media`` reclaims it once no row uses it.
+        """
+        if name and self.is_content_addressed(name) and is_content_name(name):
+            if self.reference_count(name):
+                logger.debug(f"Keeping shared file {name}")
+                return
+        super().delete(name)
+
+
+def _uses_storage(field, storage):
+    field_storage = field.storage
+    return (
+        isinstance(field_storage, ContentAddressedStorage)
+        and field_storage.location == storage.location
+    )
+
+
+def file_fields(storage=None):
+    """
+    Concrete file fields stored in ``storage`` (default storage by default).
+
+    Returns:
+        list: (model, field) tuples
+    """
+    storage = storage or default_storage
+    return [
+        (model, field)
+        for model in apps.get_models()
+        if not model._meta.proxy
+        for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField) and _uses_storage(field, storage)
+    ]
+
+
+def referenced_names(storage=None):
+    """Set of every stored name referenced by a model field"""
+    names = set()
+    for model, field in file_fields(storage):
+        names.update(
+            model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            .values_list(field.name, flat=True).iterator()
+        )
+    return names
+
+
+def collect_garbage(storage=None, grace_hours=None, dry_run=False):
+    """
+    Delete content-addressed files no model field references.
+
+    Files younger than ``grace_hours`` are kept, since an upload is written
+    before the row that references it is committed. Files outside the
+    content-addressed layout are never touched.
+
+    Returns:
+        tuple: (files deleted, bytes reclaimed)
+    """
+    storage = storage or default_storage
+    if grace_hours is None:
+        grace_hours = getattr(settings, 'CONTENT_STORAGE_GC_GRACE_HOURS', 24)
+    cutoff = time.time() - grace_hours * 3600
+    referenced = referenced_names(storage)
+    excluded = storage.excluded_prefixes()
+
+    deleted = reclaimed = 0
+    for root, _, filenames in os.walk(storage.location):
+        for filename in filenames:
+            path = os.path.join(root, filename)
+            name = os.path.relpath(path, storage.location).replace('\\', '/')
+            if name.startswith(excluded) or not is_content_name(name) or name in referenced:
+                continue
+            stat = os.stat(path)
+            if stat.st_mtime > cutoff:
+                continue
+            if not dry_run:
+                os.remove(path)
+            deleted += 1
+            reclaimed += stat.st_size
+
+    logger.info(f"Media sweep {'found' if dry_run else 'deleted'} {deleted} orphaned files ({reclaimed} bytes)")
+    return deleted, reclaimed
+
+
+def adopt_existing_files(storage=None, dry_run=False):
+    """
+    Move files saved before content addressing into the hashed layout.
+
+    Each referenced file is re-stored by content, every row pointing at it
+    is updated, and the old copy is removed, so duplicates collapse onto a
+    single file.
+
+    Returns:
+        int: Number of files adopted
+    """
+    storage = storage or default_storage
+    adopted = 0
+    for model, field in file_fields(storage):
+        legacy = (
+            model._default_manager.exclude(**{field.name: ''}).exclude(**{f'{field.name}__isnull': True})
+            .values_list(field.name, flat=True).distinct()
+        )
+        for name in list(legacy):
+            if is_content_name(name) or not storage.is_content_addressed(name) or not storage.exists(name):
+                continue
+            if dry_run:
+                adopted += 1
+                continue
+            with storage.open(name, 'rb') as content:
+                new_name = storage.save(name, content)
+            for other_model, other_field in file_fields(storage):
+                other_model._default_manager.filter(**{other_field.name: name}).update(**{other_field.name: new_name})
+            storage.delete(name)
+            adopted += 1
+    logger.info(f"Adopted {adopted} files into content-addressed storage")
+    return adopted
@@ -0,0 +1,142 @@
+"""
+Test cases for project-wide media storage and serving.
+"""
+
+import shutil
+import tempfile
+from unittest import mock
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from notes.models import Category, Subject, Flashcard, FlashcardImage
+from .storage import collect_garbage, is_content_name
+
+
+@override_settings(CONTENT_STORAGE_GC_GRACE_HOURS=0)
+@mock.patch('edvoayge.images.schedule_derivatives')
+class ContentAddressedStorageTest(TestCase):
+    """Test cases for deduplicated media storage."""
+
+    def setUp(self):
+        """Set up test data."""
+        # A fresh media root per test, so the sweep only sees this test's files
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        category = Category.objects.create(name='Anatomy')
+        subject = Subject.objects.create(name='Upper limb')
+        self.flashcard = Flashcard.objects.create(category=category, subject=subject)
+
+    def add_image(self, content, name='page.jpg'):
+        return FlashcardImage.objects.create(flashcard=self.flashcard, image=ContentFile(content, name=name))
+
+    def test_identical_uploads_share_one_file(self, schedule):
+        """Test the same bytes uploaded twice are stored once under their hash."""
+        first = self.add_image(b'same bytes', 'a.JPG')
+        second = self.add_image(b'same bytes', 'b.jpg')
+        other = self.add_image(b'other bytes')
+
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(is_content_name(first.image.name))
+        self.assertTrue(first.image.name.startswith('flashcards/') and first.image.name.endswith('.jpg'))
+
+    def test_shared_file_survives_delete(self, schedule):
+        """Test deleting one reference keeps a file another row still uses."""
+        first = self.add_image(b'shared')
+        second = self.add_image(b'shared')
+        name = first.image.name
+
+        first.delete()
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+
+        second.delete()
+        default_storage.delete(name)
+        self.assertFalse(default_storage.exists(name))
+
+    def test_file_of_a_live_row_is_left_to_the_sweep(self, schedule):
+        """Test a delete while the row still points at the file is deferred."""
+        image = self.add_image(b'only copy')
+        name = image.image.name
+
+        image.image.delete(save=False)
+        self.assertTrue(default_storage.exists(name))
+
+        FlashcardImage.objects.filter(pk=image.pk).delete()
+        self.assertEqual(collect_garbage(), (1, len(b'only copy')))
+        self.assertFalse(default_storage.exists(name))
+
+    def test_sweep_removes_only_orphans(self, schedule):
+        """Test the sweep deletes unreferenced files and keeps referenced ones."""
+        kept = self.add_image(b'kept')
+        orphan = self.add_image(b'orphan')
+        orphan_name = orphan.image.name
+        FlashcardImage.objects.filter(pk=orphan.pk).delete()
+
+        deleted, reclaimed = collect_garbage(dry_run=True)
+        self.assertEqual((deleted, reclaimed), (1, len(b'orphan')))
+        self.assertTrue(default_storage.exists(orphan_name))
+
+        self.assertEqual(collect_garbage(), (1, len(b'orphan')))
+        self.assertFalse(default_storage.exists(orphan_name))
+        self.assertTrue(default_storage.exists(kept.image.name))
+
+
+class MediaServingTest(TestCase):
+    """Test cases for conditional and range media requests."""
+
+    def setUp(self):
+        """Set up test data."""
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.name = default_storage.save('flashcards/pdfs/cards.pdf', ContentFile(b'0123456789'))
+        self.url = f'/media/{self.name}'
+
+    def test_hashed_file_is_immutable(self):
+        """Test content-addressed files get a hash ETag and a long cache lifetime."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn(response['ETag'].strip('"'), self.name)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_conditional_get_returns_304(self):
+        """Test a matching If-None-Match is answered without a body."""
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_range_requests(self):
+        """Test single byte ranges, suffix ranges and unsatisfiable ranges."""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=20-')
+        self.assertEqual(response.status_code, 416)
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_sendfile_handoff(self):
+        """Test the body is left to the proxy when sendfile is configured."""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Accel-Redirect'], f'/protected-media/{self.name}')
+        self.assertEqual(response.content, b'')
+
+    def test_missing_and_unsafe_paths(self):
+        """Test unknown files and paths outside MEDIA_ROOT return 404."""
+        self.assertEqual(self.client.get('/media/flashcards/missing.pdf').status_code, 404)
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
@@ -14,10 +14,12 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import re
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from .media import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -37,11 +39,18 @@ urlpatterns = [
         path('simple-education/', include('simple_education.urls')),
         path('cavity/', include('cavity.urls')),
         path('chat/', include('chat.urls')),
+        path('analytics/', include('analytics.urls')),
+        path('search/', include('search.urls')),
         
     ])),
 ]
 
-# Serve media files in development
+# Serve media files (with ETags, ranges and optional proxy sendfile); see edvoayge/media.py
+if settings.MEDIA_SERVE:
+    urlpatterns += [
+        re_path(r'^%s(?P<path>.*)$' % re.escape(settings.MEDIA_URL.lstrip('/')), serve_media),
+    ]
+
+# Serve static files in development
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
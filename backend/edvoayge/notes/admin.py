@@ -140,8 +140,14 @@ class FlashcardImageInline(admin.TabularInline):
 @admin.register(Flashcard)
 class FlashcardAdmin(admin.ModelAdmin):
     inlines = [FlashcardImageInline]
-    list_display = ("category", "subject", "description", "created_at")
-    list_filter = ("category", "subject")
+    list_display = ("category", "subject", "description", "processing_status", "pages_processed", "page_count", "created_at")
+    list_filter = ("category", "subject", "processing_status")
     search_fields = ("subject__name", "category__name", "description")
-    readonly_fields = ("created_at",)
-    fields = ("category", "subject", "description", "pdf_file", "created_at")
+    readonly_fields = (
+        "created_at", "processing_status", "page_count", "pages_processed",
+        "processing_error", "processed_at",
+    )
+    fields = (
+        "category", "subject", "description", "pdf_file", "created_at",
+        "processing_status", "page_count", "pages_processed", "processing_error", "processed_at",
+    )
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notes'
+
+    def ready(self):
+        from edvoayge.images import generate_on_upload
+        from .models import FlashcardImage, Video
+        generate_on_upload(FlashcardImage, 'image')
+        generate_on_upload(Video, 'logo')
@@ -0,0 +1,32 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from notes.services import FlashcardPipeline
+
+
+class Command(BaseCommand):
+    help = 'Rasterize flashcard PDFs that are waiting to be processed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for pending flashcards')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls with --loop')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Also resume flashcards left in processing by an interrupted worker'
+        )
+        parser.add_argument(
+            '--stale-after', type=int, default=30,
+            help='Minutes before a processing flashcard is considered interrupted'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            processed = FlashcardPipeline.process_pending(
+                resume=options['resume'], stale_after_minutes=options['stale_after']
+            )
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Processed {processed} flashcard(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0003_flashcard_category'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='flashcardimage',
+            options={'ordering': ['page_number', 'id']},
+        ),
+        migrations.AlterModelOptions(
+            name='video',
+            options={'ordering': ['-id']},
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='page_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='pages_processed',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='pdf_checksum',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='processing_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='processing_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='flashcard',
+            name='processing_status',
+            field=models.CharField(choices=[('none', 'No PDF'), ('pending', 'Pending'), ('processing', 'Processing'), ('completed', 'Completed'), ('failed', 'Failed')], default='none', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='flashcardimage',
+            name='page_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='flashcardimage',
+            constraint=models.UniqueConstraint(fields=('flashcard', 'page_number'), name='unique_flashcard_page'),
+        ),
+    ]
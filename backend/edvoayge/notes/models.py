@@ -4,7 +4,7 @@ from django.db import models
 import os
 from uuid import uuid4
 from django.core.files import File
-from pdf2image import convert_from_path
+from django.db import transaction
 import platform
 class Category(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -164,92 +164,54 @@ class ClinicalCase(models.Model):
 
 
 
-# models.py
-from django.db import models
-from django.core.files.base import ContentFile
-from PyPDF2 import PdfReader
-from pdf2image import convert_from_path  # install: pip install pdf2image
-import io, os
-from django.conf import settings
-from uuid import uuid4
-
-from django.db import models
-from django.core.files import File
-from pdf2image import convert_from_path
-import io
-from uuid import uuid4
-
-
 class Flashcard(models.Model):
+    PROCESSING_STATUS_CHOICES = [
+        ('none', 'No PDF'),
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
     category = models.ForeignKey(Category, related_name='flashcards', on_delete=models.CASCADE)  # 👈 ADD THIS
     subject = models.ForeignKey("Subject", on_delete=models.CASCADE)
     description = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     pdf_file = models.FileField(upload_to="flashcards/pdfs/", blank=True, null=True)
 
+    # PDF rasterization progress, maintained by notes.services.FlashcardPipeline
+    processing_status = models.CharField(max_length=20, choices=PROCESSING_STATUS_CHOICES, default='none')
+    page_count = models.PositiveIntegerField(default=0)
+    pages_processed = models.PositiveIntegerField(default=0)
+    processing_error = models.TextField(blank=True)
+    pdf_checksum = models.CharField(max_length=64, blank=True)  # sha256 of the last rasterized PDF
+    processing_started_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
     def save(self, *args, **kwargs):
         # Check if a new file is uploaded
-        new_pdf = self.pk is None or "pdf_file" in kwargs.get("update_fields", [])
-
-        super().save(*args, **kwargs)
-
-        if self.pdf_file and new_pdf:
-            # Clear old images first (in case of update)
-            self.images.all().delete()
-            self._process_pdf_to_images()
-
-    def _process_pdf_to_images(self):
-        pdf_path = self.pdf_file.path
-        pages = convert_from_path(pdf_path, poppler_path=r"C:\poppler\bin")
-
-
-
-    def _process_pdf_to_images(self):
-        pdf_path = self.pdf_file.path
-
-        if platform.system() == "Windows":
-            # Use your Windows Poppler installation path
-            pages = convert_from_path(pdf_path, poppler_path=r"C:\poppler\bin")
+        if self.pk is None:
+            new_pdf = bool(self.pdf_file)
         else:
-            # On Linux (Render, Ubuntu, etc.), Poppler is installed via apt
-            pages = convert_from_path(pdf_path)
-
-        for i, page in enumerate(pages, start=1):
-            image_io = io.BytesIO()
-            page.save(image_io, format="JPEG")
-            image_io.seek(0)
-
-            filename = f"{uuid4()}.jpg"
-            FlashcardImage.objects.create(
-                flashcard=self,
-                image=File(image_io, name=filename),
-                caption=f"Page {i}"
-            )
-
+            previous = Flashcard.objects.filter(pk=self.pk).values_list('pdf_file', flat=True).first()
+            new_pdf = bool(self.pdf_file) and self.pdf_file.name != previous
 
-class FlashcardImage(models.Model):
-    flashcard = models.ForeignKey(
-        Flashcard,
-        related_name="images",
-        on_delete=models.CASCADE
-    )
-    image = models.ImageField(upload_to="flashcards/")
-    caption = models.CharField(max_length=255, blank=True)
+        if new_pdf:
+            self.processing_status = 'pending'
+            self.processing_error = ''
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | {'processing_status', 'processing_error'}
 
-    def __str__(self):
-        return f"Image for '{self.flashcard.subject.name}'"
+        super().save(*args, **kwargs)
 
-    flashcard = models.ForeignKey(
-        Flashcard,
-        related_name="images",
-        on_delete=models.CASCADE
-    )
-    image = models.ImageField(upload_to="flashcards/")
-    caption = models.CharField(max_length=255, blank=True)
+        if new_pdf:
+            # Rasterized in the background; see FlashcardPipeline
+            from .services import FlashcardPipeline
+            transaction.on_commit(lambda: FlashcardPipeline.start(self.pk))
 
-    def __str__(self):
-        return f"Image for '{self.flashcard.subject.name}'"
 
+class FlashcardImage(models.Model):
     flashcard = models.ForeignKey(
         Flashcard,
         related_name='images',  # Allows you to access images from a flashcard object like: my_flashcard.images.all()
@@ -258,7 +220,15 @@ class FlashcardImage(models.Model):
     # This field stores the uploaded image.
     image = models.ImageField(upload_to='flashcards/')
     caption = models.CharField(max_length=255, blank=True)
+    # 1-based page of the source PDF; null for images added by hand
+    page_number = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['page_number', 'id']
+        constraints = [
+            models.UniqueConstraint(fields=['flashcard', 'page_number'], name='unique_flashcard_page'),
+        ]
 
     def __str__(self):
         # Provides a helpful name in the admin panel.
-        return f"Image for '{self.flashcard.subject.name}'"
\ No newline at end of file
+        return f"Image for '{self.flashcard.subject.name}'"
@@ -1,6 +1,7 @@
 # api/serializers.py
 
 from rest_framework import serializers
+from edvoayge.images import ImageVariantsField
 from .models import Subject, Doctor, Video , MCQ, Question, Option , ClinicalCase , Flashcard , FlashcardImage , Category
 
 
@@ -33,6 +34,8 @@ class VideoSerializer(serializers.ModelSerializer):
     doctor = DoctorSerializer(read_only=True)
     # Shows the subject's name for easier display on the frontend
     subject_name = serializers.CharField(source='subject.name', read_only=True)
+    # Resized copies of the logo for list screens
+    logo_variants = ImageVariantsField(source='logo')
 
     class Meta:
         model = Video
@@ -42,6 +45,7 @@ class VideoSerializer(serializers.ModelSerializer):
             'category',
             'video_url',
             'logo',
+            'logo_variants',
             'duration_in_minutes',
             'is_free',
             'subject', # The subject's ID
@@ -119,9 +123,12 @@ class FlashcardImageSerializer(serializers.ModelSerializer):
     """
     Serializer for the FlashcardImage model.
     """
+    # Resized copies of the page image keyed by size name
+    image_variants = ImageVariantsField(source='image')
+
     class Meta:
         model = FlashcardImage
-        fields = ['id', 'image', 'caption']
+        fields = ['id', 'image', 'image_variants', 'caption', 'page_number']
 
 
 class FlashcardSerializer(serializers.ModelSerializer):
@@ -146,6 +153,9 @@ class FlashcardSerializer(serializers.ModelSerializer):
             'category',
             'description',
             'created_at',
+            'processing_status',
+            'page_count',
+            'pages_processed',
             'images',
         ]
         extra_kwargs = {
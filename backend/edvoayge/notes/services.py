@@ -0,0 +1,246 @@
+"""
+Background rasterization of flashcard PDFs.
+
+Uploading a PDF to a Flashcard marks it ``pending``; ``FlashcardPipeline``
+then converts it to one FlashcardImage per page. Pages are rasterized in
+fixed-size ranges on a process pool, so only a few ranges are held in memory
+at a time, and every finished range is stored with one bulk insert. Pages
+that already have an image are skipped, which makes a rerun after a crash
+resume where it stopped, and re-uploading an identical PDF is a no-op.
+"""
+
+import hashlib
+import io
+import logging
+import platform
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from uuid import uuid4
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from .models import Flashcard, FlashcardImage
+
+logger = logging.getLogger(__name__)
+
+
+def get_poppler_path():
+    """Poppler binaries location; on Linux they are expected on PATH"""
+    path = getattr(settings, 'FLASHCARD_POPPLER_PATH', None)
+    if path is None and platform.system() == "Windows":
+        path = r"C:\poppler\bin"
+    return path
+
+
+def get_page_count(pdf_path):
+    """Number of pages in a PDF"""
+    from pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(pdf_path, poppler_path=get_poppler_path())['Pages'])
+
+
+def rasterize_range(pdf_path, first_page, last_page, dpi, quality, poppler_path=None):
+    """
+    Rasterize a page range to JPEG bytes.
+
+    Runs in a pool worker, so it must not touch the database. Pages are
+    encoded and released one at a time.
+
+    Returns:
+        list: (page number, JPEG bytes) tuples
+    """
+    from pdf2image import convert_from_path
+
+    pages = convert_from_path(
+        pdf_path, dpi=dpi, first_page=first_page, last_page=last_page,
+        poppler_path=poppler_path, thread_count=1,
+    )
+    results = []
+    for number in range(first_page, first_page + len(pages)):
+        page = pages.pop(0)
+        image_io = io.BytesIO()
+        page.convert('RGB').save(image_io, format="JPEG", quality=quality)
+        page.close()
+        results.append((number, image_io.getvalue()))
+    return results
+
+
+def file_checksum(field_file):
+    """sha256 of a stored file, read in chunks"""
+    digest = hashlib.sha256()
+    field_file.open('rb')
+    try:
+        for chunk in field_file.chunks():
+            digest.update(chunk)
+    finally:
+        field_file.close()
+    return digest.hexdigest()
+
+
+class FlashcardPipeline:
+    """
+    Service class for converting flashcard PDFs to page images.
+    """
+
+    @classmethod
+    def claim(cls, flashcard_id, resume=False):
+        """
+        Move a flashcard to ``processing`` if no other worker has.
+
+        With ``resume`` a flashcard left in ``processing`` by an interrupted
+        worker can be claimed again.
+
+        Returns:
+            bool: True if this worker owns the flashcard
+        """
+        statuses = ['pending', 'processing'] if resume else ['pending']
+        return bool(Flashcard.objects.filter(pk=flashcard_id, processing_status__in=statuses).update(
+            processing_status='processing',
+            processing_started_at=timezone.now(),
+            processing_error='',
+        ))
+
+    @staticmethod
+    def _update_progress(flashcard, **fields):
+        fields['pages_processed'] = flashcard.images.filter(page_number__isnull=False).count()
+        Flashcard.objects.filter(pk=flashcard.pk).update(**fields)
+        for name, value in fields.items():
+            setattr(flashcard, name, value)
+
+    @classmethod
+    def _store_range(cls, flashcard, pages):
+        images = [
+            FlashcardImage(
+                flashcard=flashcard,
+                image=ContentFile(data, name=f"{uuid4()}.jpg"),
+                caption=f"Page {number}",
+                page_number=number,
+            )
+            for number, data in pages
+        ]
+        FlashcardImage.objects.bulk_create(images, ignore_conflicts=True)
+        cls._update_progress(flashcard)
+
+    @classmethod
+    def _page_ranges(cls, page_count, done):
+        size = max(1, getattr(settings, 'FLASHCARD_PAGES_PER_TASK', 10))
+        for first in range(1, page_count + 1, size):
+            last = min(page_count, first + size - 1)
+            if not all(number in done for number in range(first, last + 1)):
+                yield first, last
+
+    @classmethod
+    def process(cls, flashcard, resume=False):
+        """
+        Claim a pending flashcard and rasterize its PDF.
+
+        Args:
+            flashcard (Flashcard): The flashcard
+            resume (bool): Also pick up a flashcard stuck in ``processing``
+
+        Returns:
+            bool: True if the flashcard was processed by this call
+        """
+        if not cls.claim(flashcard.pk, resume=resume):
+            return False
+
+        try:
+            checksum = file_checksum(flashcard.pdf_file)
+            if checksum != flashcard.pdf_checksum:
+                # A different PDF: drop the old pages before rasterizing. The
+                # rows go first, since storage keeps files a row still uses
+                pages = flashcard.images.filter(page_number__isnull=False)
+                names = [name for name in pages.values_list('image', flat=True) if name]
+                pages.delete()
+                storage = FlashcardImage._meta.get_field('image').storage
+                for name in names:
+                    storage.delete(name)
+
+            pdf_path = flashcard.pdf_file.path
+            page_count = get_page_count(pdf_path)
+            cls._update_progress(flashcard, page_count=page_count, pdf_checksum=checksum)
+
+            done = set(flashcard.images.filter(page_number__isnull=False).values_list('page_number', flat=True))
+            ranges = list(cls._page_ranges(page_count, done))
+            args = (
+                getattr(settings, 'FLASHCARD_RASTER_DPI', 150),
+                getattr(settings, 'FLASHCARD_JPEG_QUALITY', 80),
+                get_poppler_path(),
+            )
+
+            workers = getattr(settings, 'FLASHCARD_RASTER_WORKERS', 2)
+            if workers and len(ranges) > 1:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    # Keep at most two ranges per worker in flight
+                    pending = {}
+                    queue = list(ranges)
+                    while queue or pending:
+                        while queue and len(pending) < workers * 2:
+                            first, last = queue.pop(0)
+                            pending[pool.submit(rasterize_range, pdf_path, first, last, *args)] = first
+                        future = next(as_completed(pending))
+                        del pending[future]
+                        cls._store_range(flashcard, future.result())
+            else:
+                for first, last in ranges:
+                    cls._store_range(flashcard, rasterize_range(pdf_path, first, last, *args))
+
+            cls._update_progress(flashcard, processing_status='completed', processed_at=timezone.now())
+            logger.info(f"Rasterized flashcard {flashcard.pk}: {page_count} pages")
+        except Exception as e:
+            logger.error(f"Error rasterizing flashcard {flashcard.pk}: {e}")
+            cls._update_progress(flashcard, processing_status='failed', processing_error=str(e))
+        return True
+
+    @classmethod
+    def _run_in_thread(cls, flashcard_id):
+        try:
+            flashcard = Flashcard.objects.get(pk=flashcard_id)
+            cls.process(flashcard)
+        except Exception as e:
+            logger.error(f"Error in background processing of flashcard {flashcard_id}: {e}")
+        finally:
+            connection.close()
+
+    @classmethod
+    def start(cls, flashcard_id):
+        """
+        Rasterize a flashcard in the background.
+
+        With ``FLASHCARD_PROCESSING_ASYNC`` disabled it is processed before
+        returning. Flashcards that were never started are picked up by the
+        ``process_flashcards`` command.
+        """
+        if getattr(settings, 'FLASHCARD_PROCESSING_ASYNC', True):
+            threading.Thread(
+                target=cls._run_in_thread,
+                args=(flashcard_id,),
+                name=f'flashcard-{flashcard_id}',
+                daemon=True,
+            ).start()
+        else:
+            cls.process(Flashcard.objects.get(pk=flashcard_id))
+
+    @classmethod
+    def process_pending(cls, resume=False, stale_after_minutes=30):
+        """
+        Process every pending flashcard.
+
+        With ``resume``, flashcards stuck in ``processing`` for longer than
+        ``stale_after_minutes`` are resumed as well.
+
+        Returns:
+            int: Number of flashcards processed
+        """
+        due = Q(processing_status='pending')
+        if resume:
+            stale = timezone.now() - timedelta(minutes=stale_after_minutes)
+            due |= Q(processing_status='processing', processing_started_at__lt=stale)
+
+        processed = 0
+        for flashcard in Flashcard.objects.filter(due).order_by('created_at'):
+            if cls.process(flashcard, resume=resume):
+                processed += 1
+        return processed
@@ -1,3 +1,151 @@
-from django.test import TestCase
+"""
+Test cases for notes app.
+"""
 
-# Create your tests here.
+import io
+import shutil
+import tempfile
+from unittest import mock
+from PIL import Image
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from edvoayge import images
+from .models import Category, Subject, Flashcard, FlashcardImage
+from .services import FlashcardPipeline
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def fake_rasterize(pdf_path, first_page, last_page, dpi, quality, poppler_path=None):
+    return [(number, b'jpeg-%d' % number) for number in range(first_page, last_page + 1)]
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    FLASHCARD_PROCESSING_ASYNC=False,
+    FLASHCARD_RASTER_WORKERS=0,
+    FLASHCARD_PAGES_PER_TASK=2,
+)
+@mock.patch('notes.services.get_page_count', return_value=5)
+class FlashcardPipelineTest(TestCase):
+    """Test cases for PDF rasterization."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        """Set up test data."""
+        self.category = Category.objects.create(name='Anatomy')
+        self.subject = Subject.objects.create(name='Upper limb')
+
+    def upload(self, flashcard=None, content=b'%PDF-1.4 v1'):
+        flashcard = flashcard or Flashcard(category=self.category, subject=self.subject)
+        flashcard.pdf_file = ContentFile(content, name='cards.pdf')
+        with self.captureOnCommitCallbacks(execute=True):
+            flashcard.save()
+        flashcard.refresh_from_db()
+        return flashcard
+
+    def test_upload_rasterizes_every_page(self, page_count):
+        """Test an upload produces one image per page in page order."""
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize) as rasterize:
+            flashcard = self.upload()
+
+        self.assertEqual(flashcard.processing_status, 'completed')
+        self.assertEqual((flashcard.page_count, flashcard.pages_processed), (5, 5))
+        self.assertEqual(rasterize.call_count, 3)  # ranges 1-2, 3-4, 5
+        self.assertEqual(
+            list(flashcard.images.values_list('caption', flat=True)),
+            ['Page 1', 'Page 2', 'Page 3', 'Page 4', 'Page 5']
+        )
+
+    def test_resume_skips_finished_ranges(self, page_count):
+        """Test a rerun only rasterizes ranges with missing pages."""
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize):
+            flashcard = self.upload()
+        flashcard.images.filter(page_number=4).delete()
+        Flashcard.objects.filter(pk=flashcard.pk).update(processing_status='processing')
+
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize) as rasterize:
+            self.assertEqual(FlashcardPipeline.process_pending(resume=True, stale_after_minutes=0), 1)
+
+        rasterize.assert_called_once()
+        self.assertEqual(rasterize.call_args[0][1:3], (3, 4))
+        self.assertEqual(FlashcardImage.objects.filter(flashcard=flashcard).count(), 5)
+
+    def test_reupload_is_idempotent(self, page_count):
+        """Test the same PDF is not rasterized twice and a new one replaces the pages."""
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize):
+            flashcard = self.upload()
+        first_ids = set(flashcard.images.values_list('id', flat=True))
+
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize) as rasterize:
+            flashcard = self.upload(flashcard)
+        rasterize.assert_not_called()
+        self.assertEqual(set(flashcard.images.values_list('id', flat=True)), first_ids)
+
+        with mock.patch('notes.services.rasterize_range', side_effect=fake_rasterize):
+            flashcard = self.upload(flashcard, content=b'%PDF-1.4 v2')
+        self.assertEqual(flashcard.images.count(), 5)
+        self.assertFalse(first_ids & set(flashcard.images.values_list('id', flat=True)))
+
+    def test_failure_is_reported(self, page_count):
+        """Test rasterization errors are stored on the flashcard."""
+        with mock.patch('notes.services.rasterize_range', side_effect=RuntimeError('poppler missing')):
+            flashcard = self.upload()
+
+        self.assertEqual(flashcard.processing_status, 'failed')
+        self.assertEqual(flashcard.processing_error, 'poppler missing')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, DERIVATIVE_IMAGES_ASYNC=False, FLASHCARD_PROCESSING_ASYNC=False)
+class DerivativeImageTest(TestCase):
+    """Test cases for resized image derivatives."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        """Set up test data."""
+        images._known.clear()
+        category = Category.objects.create(name='Anatomy')
+        subject = Subject.objects.create(name='Upper limb')
+        self.flashcard = Flashcard.objects.create(category=category, subject=subject)
+
+    def upload_image(self, width=1200, height=600):
+        output = io.BytesIO()
+        Image.new('RGB', (width, height), 'red').save(output, format='PNG')
+        image = FlashcardImage(flashcard=self.flashcard, caption='Cover')
+        image.image = ContentFile(output.getvalue(), name='cover.png')
+        with self.captureOnCommitCallbacks(execute=True):
+            image.save()
+        return image
+
+    def test_upload_generates_each_size(self):
+        """Test an upload stores one derivative per size without upscaling."""
+        image = self.upload_image()
+
+        for size, width in images.get_sizes().items():
+            name = images.derivative_name(image.image.name, size)
+            with default_storage.open(name, 'rb') as derivative:
+                self.assertEqual(Image.open(derivative).width, min(width, 1200))
+
+        variants = images.variant_urls(image.image)
+        self.assertTrue(all('/derivatives/' in url for url in variants.values()))
+
+    def test_missing_derivative_falls_back_to_original(self):
+        """Test the original URL is served and generation is scheduled on first use."""
+        image = self.upload_image()
+        name = images.derivative_name(image.image.name, 'thumb')
+        default_storage.delete(name)
+        images._known.clear()
+
+        with mock.patch('edvoayge.images.schedule_derivatives') as schedule:
+            variants = images.variant_urls(image.image)
+        self.assertEqual(variants['thumb'], image.image.url)
+        schedule.assert_called_with(image.image.name)
@@ -4,6 +4,7 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from django.db.models import Count, Q
 from django.utils import timezone
+from .counters import UnreadCounterService
 from .models import (
     NotificationTemplate,
     NotificationChannel,
@@ -228,10 +229,14 @@ class NotificationAdmin(admin.ModelAdmin):
     mark_as_failed.short_description = "Mark selected notifications as failed"
     
     def mark_all_read(self, request, queryset):
+        user_ids = set(queryset.filter(is_read=False).values_list('user_id', flat=True))
         updated = queryset.update(
             is_read=True,
             read_at=timezone.now()
         )
+        # The bulk update skips the signals that keep the badge counters
+        for user_id in user_ids:
+            UnreadCounterService.reset('notifications', user_id)
         self.message_user(request, f'{updated} notifications marked as read.')
     mark_all_read.short_description = "Mark selected notifications as read"
     
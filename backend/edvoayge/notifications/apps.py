@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class NotificationsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'notifications'
+
+    def ready(self):
+        """Import signals when the app is ready"""
+        try:
+            import notifications.signals
+        except ImportError:
+            pass
@@ -0,0 +1,174 @@
+"""
+Delivery backends for notification channels.
+
+Each ``NotificationChannel.channel_type`` is mapped to a backend class through
+the ``NOTIFICATION_CHANNEL_BACKENDS`` setting. Backends only deliver; they do
+not touch the database, so the dispatcher can call them from worker threads.
+"""
+
+import threading
+import logging
+from django.conf import settings
+from django.core import mail
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class DeliveryError(Exception):
+    """Raised by a backend when a notification could not be delivered"""
+
+    def __init__(self, message, retryable=True, response=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.response = response or {}
+
+
+class BaseChannelBackend:
+    """
+    Base class for notification delivery backends.
+
+    Subclasses implement ``send`` and return a dict describing the provider
+    response, or raise ``DeliveryError``.
+    """
+
+    #: Status the notification is moved to after a successful send
+    success_status = 'sent'
+
+    def __init__(self, channel):
+        self.channel = channel
+
+    @property
+    def max_concurrency(self):
+        """Maximum number of parallel sends for this channel"""
+        default = getattr(settings, 'NOTIFICATION_DEFAULT_CONCURRENCY', 4)
+        return max(1, int((self.channel.config or {}).get('max_concurrency', default)))
+
+    def send(self, message):
+        """
+        Deliver a single rendered message.
+
+        Args:
+            message (dict): Rendered message with ``recipient`` (User),
+                ``subject``, ``title``, ``content`` and ``html_content``
+
+        Returns:
+            dict: Provider response
+        """
+        raise NotImplementedError
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+
+class InAppChannelBackend(BaseChannelBackend):
+    """In-app notifications are delivered by the Notification row itself"""
+
+    success_status = 'delivered'
+
+    def send(self, message):
+        return {'delivered': True}
+
+
+class EmailChannelBackend(BaseChannelBackend):
+    """Email delivery reusing one SMTP connection per worker thread"""
+
+    def __init__(self, channel):
+        super().__init__(channel)
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def _get_connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = mail.get_connection(fail_silently=False)
+            connection.open()
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def send(self, message):
+        recipient = message['recipient']
+        if not recipient.email:
+            raise DeliveryError('Recipient has no email address', retryable=False)
+
+        email = mail.EmailMultiAlternatives(
+            subject=message['subject'] or message['title'],
+            body=message['content'],
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            to=[recipient.email],
+            connection=self._get_connection(),
+        )
+        if message['html_content']:
+            email.attach_alternative(message['html_content'], 'text/html')
+        try:
+            sent = email.send()
+        except Exception as e:
+            # Drop the connection so the next attempt reconnects
+            self._local.connection = None
+            raise DeliveryError(str(e))
+        if not sent:
+            raise DeliveryError('Email backend did not accept the message')
+        return {'sent': sent}
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.warning(f"Error closing email connection: {e}")
+        self._connections = []
+
+
+class LocMemChannelBackend(BaseChannelBackend):
+    """
+    Stub backend that keeps sent messages in memory.
+
+    Useful for tests and local development. ``channel.config`` may set
+    ``fail_recipients`` (list of user ids) to simulate provider failures.
+    """
+
+    outbox = []
+    _lock = threading.Lock()
+
+    def send(self, message):
+        fail_recipients = (self.channel.config or {}).get('fail_recipients', [])
+        if message['recipient'].id in fail_recipients:
+            raise DeliveryError('Simulated delivery failure')
+        with self._lock:
+            self.outbox.append(message)
+        return {'outbox_size': len(self.outbox)}
+
+
+DEFAULT_CHANNEL_BACKENDS = {
+    'email': 'notifications.backends.EmailChannelBackend',
+    'in_app': 'notifications.backends.InAppChannelBackend',
+    'locmem': 'notifications.backends.LocMemChannelBackend',
+}
+
+
+def get_channel_backend(channel):
+    """
+    Instantiate the delivery backend configured for a channel.
+
+    Backends are looked up by name in ``NOTIFICATION_CHANNEL_BACKENDS``
+    (merged over the defaults). The name is ``channel.config['backend']`` when
+    set, otherwise the channel type.
+
+    Args:
+        channel (NotificationChannel): The channel
+
+    Returns:
+        BaseChannelBackend: Backend instance
+    """
+    backends = dict(DEFAULT_CHANNEL_BACKENDS)
+    backends.update(getattr(settings, 'NOTIFICATION_CHANNEL_BACKENDS', {}))
+    name = (channel.config or {}).get('backend') or channel.channel_type
+    if name not in backends:
+        raise DeliveryError(
+            f"No delivery backend configured for '{name}'",
+            retryable=False
+        )
+    return import_string(backends[name])(channel)
@@ -0,0 +1,126 @@
+"""
+Per-user unread notification counters.
+
+The app has three notification tables (notifications, cavity and chat). Each
+keeps a per-user unread counter in the cache, updated by signals when a
+notification is created, read, marked unread or deleted. Badge reads fetch all
+counters in one ``get_many`` call and only fall back to ``COUNT(*)`` for a
+counter that is not cached yet.
+
+The cache is per process and the signals fire in whichever process made the
+write, so adjustments are a best-effort update of the local copy. Other
+workers recount from the database once their copy is older than
+``NOTIFICATION_UNREAD_CACHE_TIMEOUT`` seconds.
+"""
+
+import logging
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class UnreadCounterService:
+    """
+    Service class for reading and maintaining unread badge counters.
+    """
+
+    # source -> (model label, lookup from the notification to the auth user id)
+    SOURCES = {
+        'notifications': ('notifications.Notification', 'user_id'),
+        'cavity': ('cavity.Notification', 'recipient_id'),
+        'chat': ('chat.ChatNotification', 'user__user_id'),
+    }
+
+    CACHE_PREFIX = 'notifications:unread'
+    @classmethod
+    def _key(cls, source, user_id):
+        return f'{cls.CACHE_PREFIX}:{source}:{user_id}'
+
+    @classmethod
+    def source_for_model(cls, model):
+        """Return the source name for a notification model, or None"""
+        label = model._meta.label
+        for source, (model_label, _) in cls.SOURCES.items():
+            if model_label == label:
+                return source
+        return None
+
+    @classmethod
+    def user_id_for(cls, source, instance):
+        """Resolve the auth user id a notification instance belongs to"""
+        if source == 'chat':
+            ChatUser = apps.get_model('chat', 'ChatUser')
+            return ChatUser.objects.filter(pk=instance.user_id).values_list('user_id', flat=True).first()
+        return getattr(instance, cls.SOURCES[source][1])
+
+    @classmethod
+    def count_from_db(cls, source, user_id):
+        """Count unread notifications of one source with a query"""
+        model_label, user_lookup = cls.SOURCES[source]
+        model = apps.get_model(model_label)
+        return model.objects.filter(**{user_lookup: user_id, 'is_read': False}).count()
+
+    @classmethod
+    def get_counts(cls, user_id, sources=None):
+        """
+        Get unread counts for a user.
+
+        Args:
+            user_id (int): Auth user id
+            sources (iterable, optional): Sources to read, defaults to all
+
+        Returns:
+            dict: source -> unread count
+        """
+        sources = list(sources or cls.SOURCES)
+        keys = {cls._key(source, user_id): source for source in sources}
+        cached = cache.get_many(list(keys))
+
+        counts = {}
+        for key, source in keys.items():
+            if key in cached:
+                counts[source] = max(0, cached[key])
+            else:
+                counts[source] = cls.count_from_db(source, user_id)
+                cache.add(key, counts[source], timeout=getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TIMEOUT', 30))
+        return counts
+
+    @classmethod
+    def get_count(cls, user_id, source):
+        return cls.get_counts(user_id, [source])[source]
+
+    @classmethod
+    def adjust(cls, source, user_id, delta):
+        """
+        Add ``delta`` to this process's cached counter.
+
+        Counters that are not cached are left alone; they are recounted from
+        the database on the next read. Copies held by other workers are not
+        touched and catch up when they expire.
+        """
+        if user_id is None or not delta:
+            return
+        key = cls._key(source, user_id)
+        try:
+            if delta > 0:
+                cache.incr(key, delta)
+            else:
+                cache.decr(key, -delta)
+        except ValueError:
+            pass
+
+    @classmethod
+    def reset(cls, source, user_id, value=None):
+        """
+        Set a counter after a bulk update that bypassed signals.
+
+        With ``value`` omitted the counter is dropped and recounted on the
+        next read.
+        """
+        key = cls._key(source, user_id)
+        if value is None:
+            cache.delete(key)
+        else:
+            cache.set(key, value, timeout=getattr(settings, 'NOTIFICATION_UNREAD_CACHE_TIMEOUT', 30))
@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from notifications.models import NotificationBatch
+from notifications.services import NotificationDispatcher
+
+
+class Command(BaseCommand):
+    help = 'Deliver notification batches that are due (scheduled_at has passed)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep polling for due batches')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between polls with --loop')
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Also resume batches left in processing by an interrupted worker'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = self.dispatch_due(options['resume'])
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'Dispatched {processed} batch(es)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+    def dispatch_due(self, resume):
+        statuses = ['pending', 'processing'] if resume else ['pending']
+        due = NotificationBatch.objects.filter(
+            Q(status='pending', scheduled_at__lte=timezone.now()) | Q(status__in=statuses[1:])
+        ).select_related('template', 'channel').order_by('scheduled_at', 'created_at')
+
+        processed = 0
+        for batch in due:
+            if NotificationDispatcher.dispatch_batch(batch, resume=resume):
+                self.stdout.write(
+                    f'{batch.batch_id}: {batch.status} '
+                    f'({batch.sent_count} sent, {batch.failed_count} failed)'
+                )
+                processed += 1
+        return processed
@@ -0,0 +1,29 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from notifications.services import NotificationScheduler
+
+
+class Command(BaseCommand):
+    help = 'Run due notification schedules, sleeping until the next one is due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run due schedules once and exit')
+        parser.add_argument(
+            '--max-sleep', type=int, default=60,
+            help='Longest time to sleep between checks, in seconds'
+        )
+        parser.add_argument('--limit', type=int, default=100, help='Schedules to run per wake-up')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            batches = NotificationScheduler.run_due(limit=options['limit'])
+            for batch in batches:
+                self.stdout.write(f'Enqueued {batch.batch_id} ({batch.name})')
+            if options['once']:
+                break
+            if len(batches) >= options['limit']:
+                # More schedules may be due; run again without sleeping
+                continue
+            time.sleep(NotificationScheduler.seconds_until_next_due(max_sleep=options['max_sleep']))
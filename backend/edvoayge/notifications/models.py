@@ -423,6 +423,11 @@ class NotificationSchedule(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_frequency_display()})"
     
+    def save(self, *args, **kwargs):
+        if self._state.adding and not self.next_run and self.start_date:
+            self.next_run = self.start_date
+        super().save(*args, **kwargs)
+    
     @property
     def is_expired(self):
         """Check if schedule has expired"""
@@ -10,10 +10,23 @@ from .models import (
     NotificationLog,
     NotificationSchedule,
 )
+from .templating import compile_template, TemplateCompileError
 
 User = get_user_model()
 
 
+def validate_template_variables(data, instance=None):
+    """Compile the resulting template text and report undeclared variables"""
+    fields = {}
+    for field in ('subject', 'title', 'content', 'html_content', 'variables'):
+        fields[field] = data[field] if field in data else getattr(instance, field, None)
+    template = NotificationTemplate(**{k: v for k, v in fields.items() if v is not None})
+    try:
+        compile_template(template)
+    except TemplateCompileError as e:
+        raise serializers.ValidationError(e.errors)
+
+
 class NotificationTemplateSerializer(serializers.ModelSerializer):
     """Serializer for notification templates"""
     
@@ -44,6 +57,8 @@ class NotificationTemplateSerializer(serializers.ModelSerializer):
         if template_type in ['push', 'in_app'] and not title:
             raise serializers.ValidationError("Title is required for push and in-app templates")
         
+        validate_template_variables(data, self.instance)
+        
         return data
 
 
@@ -249,6 +264,8 @@ class NotificationTemplateCreateSerializer(serializers.ModelSerializer):
         if not content:
             raise serializers.ValidationError("Content is required for all templates")
         
+        validate_template_variables(data)
+        
         return data
 
 
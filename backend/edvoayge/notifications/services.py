@@ -0,0 +1,630 @@
+import time
+import calendar
+import uuid
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Exists, OuterRef, F
+from django.utils import timezone
+
+from .backends import DeliveryError, get_channel_backend
+from .counters import UnreadCounterService
+from .templating import get_compiled_template
+from .models import (
+    Notification, NotificationBatch, NotificationLog, NotificationPreference, NotificationSchedule
+)
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+class RecipientFilterError(ValueError):
+    """Raised when a batch's filters use a field or lookup that is not allowed"""
+
+
+# Comparisons allowed after a recipient filter field (``date_joined__gte``)
+RECIPIENT_FILTER_LOOKUPS = ('exact', 'in', 'gt', 'gte', 'lt', 'lte', 'isnull')
+
+
+class NotificationDispatcher:
+    """
+    Service class for delivering NotificationBatch notifications.
+
+    A batch is expanded into recipients in primary-key ordered chunks. For each
+    chunk, Notification rows are bulk-created, messages are delivered through
+    the channel's backend with bounded concurrency and retries, and results are
+    written back in bulk while the batch's ``sent_count``/``failed_count`` are
+    advanced, so progress is visible while the batch runs.
+    """
+
+    RELATED_OBJECT_TYPE = 'notification_batch'
+
+    # ------------------------------------------------------------------
+    # Settings
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def chunk_size():
+        return getattr(settings, 'NOTIFICATION_DISPATCH_CHUNK_SIZE', 500)
+
+    @staticmethod
+    def retry_backoff():
+        return getattr(settings, 'NOTIFICATION_RETRY_BACKOFF_SECONDS', 1)
+
+    # ------------------------------------------------------------------
+    # Recipients
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def recipients_queryset(filters, template, channel):
+        """
+        Build the recipient queryset for batch filters.
+
+        ``filters`` supports ``user_ids`` and ``exclude_user_ids``; any other
+        key must be one of ``NOTIFICATION_RECIPIENT_FILTER_FIELDS`` (e.g.
+        ``profile__country``), optionally followed by one of
+        ``RECIPIENT_FILTER_LOOKUPS``. Other User fields are refused, so a
+        batch's ``total_count`` cannot be used to probe them. Users who
+        disabled the template's category on this channel type are excluded.
+
+        Args:
+            filters (dict): Batch or schedule filters
+            template (NotificationTemplate): Template being sent
+            channel (NotificationChannel): Delivery channel
+
+        Returns:
+            QuerySet: Active users ordered by primary key
+        """
+        filters = dict(filters or {})
+        queryset = User.objects.filter(is_active=True)
+
+        user_ids = filters.pop('user_ids', None)
+        if user_ids is not None:
+            queryset = queryset.filter(pk__in=user_ids)
+        exclude_user_ids = filters.pop('exclude_user_ids', None)
+        if exclude_user_ids:
+            queryset = queryset.exclude(pk__in=exclude_user_ids)
+
+        allowed = getattr(settings, 'NOTIFICATION_RECIPIENT_FILTER_FIELDS', [])
+        for lookup in filters:
+            field, _, comparison = lookup.rpartition('__')
+            if lookup not in allowed and not (field in allowed and comparison in RECIPIENT_FILTER_LOOKUPS):
+                raise RecipientFilterError(f"Recipient filter '{lookup}' is not allowed")
+        if filters:
+            queryset = queryset.filter(**filters).distinct()
+
+        opted_out = NotificationPreference.objects.filter(
+            user=OuterRef('pk'),
+            category=template.category,
+            channel_type=channel.channel_type,
+            is_enabled=False,
+        )
+        return queryset.filter(~Exists(opted_out)).order_by('pk')
+
+    @classmethod
+    def iter_recipient_chunks(cls, queryset, chunk_size=None):
+        """
+        Yield lists of users using keyset pagination on the primary key.
+
+        Unlike OFFSET pagination, each chunk query stays cheap no matter how
+        far into the recipient list the dispatcher is.
+        """
+        chunk_size = chunk_size or cls.chunk_size()
+        last_pk = None
+        while True:
+            chunk_queryset = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk_queryset[:chunk_size])
+            if not chunk:
+                return
+            yield chunk
+            last_pk = chunk[-1].pk
+
+    # ------------------------------------------------------------------
+    # Rendering
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def recipient_context(user):
+        """Per-recipient template variables"""
+        return {
+            'user_id': user.pk,
+            'username': user.username,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'user_name': user.get_full_name() or user.username,
+        }
+
+    @classmethod
+    def render_messages(cls, compiled, users):
+        """
+        Render one message per user from a template bound to batch values.
+
+        Args:
+            compiled (CompiledTemplate): Template with batch-wide values bound
+            users (list): Recipients
+
+        Returns:
+            list: Message dicts with the rendered fields and ``recipient``
+        """
+        messages = compiled.render_many(cls.recipient_context(user) for user in users)
+        for message, user in zip(messages, users):
+            message['recipient'] = user
+        return messages
+
+    # ------------------------------------------------------------------
+    # Delivery
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _deliver(cls, backend, message, max_retries):
+        """
+        Send one message, retrying retryable failures with linear backoff.
+
+        Returns:
+            tuple: (success, response or error message, attempts made)
+        """
+        attempts = 0
+        while True:
+            attempts += 1
+            try:
+                return True, backend.send(message), attempts
+            except DeliveryError as e:
+                if not e.retryable or attempts > max_retries:
+                    return False, str(e), attempts
+            except Exception as e:
+                if attempts > max_retries:
+                    return False, str(e), attempts
+            backoff = cls.retry_backoff()
+            if backoff:
+                time.sleep(backoff * attempts)
+
+    @classmethod
+    def _process_chunk(cls, batch, backend, compiled, users):
+        template = batch.template
+        messages = cls.render_messages(compiled, users)
+        notifications = [
+            Notification(
+                notification_id=f"NOTIF-{uuid.uuid4().hex[:12].upper()}",
+                user=message['recipient'],
+                template=template,
+                channel=batch.channel,
+                subject=message['subject'],
+                title=message['title'],
+                content=message['content'],
+                html_content=message['html_content'],
+                priority=template.priority,
+                status='sending',
+                category=template.category,
+                related_object_type=cls.RELATED_OBJECT_TYPE,
+                related_object_id=batch.id,
+                scheduled_at=batch.scheduled_at,
+            )
+            for message in messages
+        ]
+        Notification.objects.bulk_create(notifications)
+        # bulk_create bypasses the signals that maintain unread badges
+        for notification in notifications:
+            UnreadCounterService.adjust('notifications', notification.user_id, 1)
+        return cls._deliver_notifications(batch, backend, notifications, messages)
+
+    @classmethod
+    def _deliver_notifications(cls, batch, backend, notifications, messages):
+        """
+        Deliver created notifications and record the outcomes.
+
+        Returns:
+            tuple: (sent count, failed count)
+        """
+        now = timezone.now()
+        template = batch.template
+        max_retries = template.retry_count
+        workers = min(backend.max_concurrency, len(messages))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda m: cls._deliver(backend, m, max_retries), messages))
+        else:
+            results = [cls._deliver(backend, message, max_retries) for message in messages]
+
+        sent_at = timezone.now()
+        logs = []
+        sent_count = failed_count = 0
+        for notification, (success, outcome, attempts) in zip(notifications, results):
+            notification.retry_count = attempts - 1
+            if success:
+                sent_count += 1
+                notification.status = backend.success_status
+                notification.sent_at = sent_at
+                if backend.success_status == 'delivered':
+                    notification.delivered_at = sent_at
+                notification.delivery_response = outcome or {}
+            else:
+                failed_count += 1
+                notification.status = 'failed'
+                notification.error_message = outcome
+                logs.append(NotificationLog(
+                    notification=notification,
+                    channel=batch.channel,
+                    level='error',
+                    message='Notification delivery failed',
+                    details={'batch_id': batch.batch_id},
+                    attempt_number=attempts,
+                    response_message=outcome,
+                ))
+
+        Notification.objects.bulk_update(
+            notifications,
+            ['status', 'sent_at', 'delivered_at', 'delivery_response', 'error_message', 'retry_count'],
+        )
+        if logs:
+            NotificationLog.objects.bulk_create(logs)
+
+        NotificationBatch.objects.filter(pk=batch.pk).update(
+            sent_count=F('sent_count') + sent_count,
+            failed_count=F('failed_count') + failed_count,
+            updated_at=now,
+        )
+        return sent_count, failed_count
+
+    # ------------------------------------------------------------------
+    # Batch lifecycle
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def claim_batch(batch, statuses=('pending',)):
+        """
+        Atomically move a batch to ``processing``.
+
+        Returns:
+            bool: True if this caller claimed the batch
+        """
+        claimed = NotificationBatch.objects.filter(
+            pk=batch.pk, status__in=statuses
+        ).update(status='processing', started_at=timezone.now())
+        if claimed:
+            batch.refresh_from_db()
+        return bool(claimed)
+
+    @classmethod
+    def _redeliver_stranded(cls, batch, backend):
+        """
+        Deliver notifications an interrupted run created but never sent.
+
+        They are still ``sending``; their rendered content is sent as stored.
+
+        Returns:
+            int: Number of notifications delivered or failed
+        """
+        stranded = Notification.objects.filter(
+            related_object_type=cls.RELATED_OBJECT_TYPE, related_object_id=batch.id, status='sending'
+        ).select_related('user').order_by('pk')
+        handled = 0
+        for notifications in cls.iter_recipient_chunks(stranded):
+            messages = [
+                {
+                    'subject': notification.subject,
+                    'title': notification.title,
+                    'content': notification.content,
+                    'html_content': notification.html_content,
+                    'recipient': notification.user,
+                }
+                for notification in notifications
+            ]
+            sent, failed = cls._deliver_notifications(batch, backend, notifications, messages)
+            handled += sent + failed
+        return handled
+
+    @classmethod
+    def run_batch(cls, batch):
+        """
+        Deliver a claimed batch synchronously.
+
+        Recipients that already have a notification for this batch are
+        skipped, and notifications an interrupted run left in ``sending``
+        are delivered first, so a batch stopped mid-way can be resumed
+        safely.
+
+        Args:
+            batch (NotificationBatch): Batch in ``processing`` status
+
+        Returns:
+            NotificationBatch: The refreshed batch
+        """
+        backend = None
+        try:
+            backend = get_channel_backend(batch.channel)
+            recipients = cls.recipients_queryset(batch.filters, batch.template, batch.channel)
+            already_sent = Notification.objects.filter(
+                user=OuterRef('pk'),
+                related_object_type=cls.RELATED_OBJECT_TYPE,
+                related_object_id=batch.id,
+            )
+            recipients = recipients.filter(~Exists(already_sent))
+
+            stranded = cls._redeliver_stranded(batch, backend)
+            batch.refresh_from_db()
+            processed = batch.sent_count + batch.failed_count
+            NotificationBatch.objects.filter(pk=batch.pk).update(
+                total_count=processed + recipients.count()
+            )
+            if stranded:
+                logger.info(f"Batch {batch.batch_id}: delivered {stranded} notifications left by an interrupted run")
+
+            compiled = get_compiled_template(batch.template).bind(batch.batch_data or {})
+            for users in cls.iter_recipient_chunks(recipients):
+                cls._process_chunk(batch, backend, compiled, users)
+                if NotificationBatch.objects.filter(pk=batch.pk, status='cancelled').exists():
+                    logger.info(f"Batch {batch.batch_id} cancelled during dispatch")
+                    batch.refresh_from_db()
+                    return batch
+
+            NotificationBatch.objects.filter(pk=batch.pk, status='processing').update(
+                status='completed', completed_at=timezone.now()
+            )
+        except Exception as e:
+            logger.error(f"Error dispatching batch {batch.batch_id}: {e}")
+            NotificationBatch.objects.filter(pk=batch.pk, status='processing').update(
+                status='failed', completed_at=timezone.now()
+            )
+        finally:
+            if backend is not None:
+                backend.close()
+
+        batch.refresh_from_db()
+        return batch
+
+    @classmethod
+    def dispatch_batch(cls, batch, resume=False):
+        """
+        Claim and deliver a batch in the calling thread.
+
+        Args:
+            batch (NotificationBatch): The batch
+            resume (bool): Also claim batches left in ``processing``
+
+        Returns:
+            bool: True if the batch was claimed and run
+        """
+        statuses = ('pending', 'processing') if resume else ('pending',)
+        if not cls.claim_batch(batch, statuses):
+            return False
+        cls.run_batch(batch)
+        return True
+
+    @classmethod
+    def _run_in_thread(cls, batch_id):
+        try:
+            batch = NotificationBatch.objects.select_related('template', 'channel').get(pk=batch_id)
+            cls.run_batch(batch)
+        except Exception as e:
+            logger.error(f"Error in background dispatch of batch {batch_id}: {e}")
+        finally:
+            connection.close()
+
+    @classmethod
+    def start_batch(cls, batch):
+        """
+        Claim a batch and deliver it in the background.
+
+        With ``NOTIFICATION_DISPATCH_ASYNC`` disabled the batch is delivered
+        before returning, which keeps tests deterministic.
+
+        Returns:
+            bool: True if the batch was claimed
+        """
+        if not cls.claim_batch(batch):
+            return False
+        if getattr(settings, 'NOTIFICATION_DISPATCH_ASYNC', True):
+            thread = threading.Thread(
+                target=cls._run_in_thread,
+                args=(batch.pk,),
+                name=f'notification-batch-{batch.batch_id}',
+                daemon=True,
+            )
+            thread.start()
+        else:
+            cls.run_batch(batch)
+        return True
+
+
+class NotificationScheduler:
+    """
+    Service class for running due NotificationSchedule rows.
+
+    Schedules are claimed with a compare-and-set update on ``next_run``: the
+    update only matches while ``next_run`` still holds the value the worker
+    read, so when several workers see the same due schedule exactly one of
+    them advances it and runs it.
+    """
+
+    @staticmethod
+    def _add_months(value, months):
+        month_index = value.month - 1 + months
+        year = value.year + month_index // 12
+        month = month_index % 12 + 1
+        day = min(value.day, calendar.monthrange(year, month)[1])
+        return value.replace(year=year, month=month, day=day)
+
+    @classmethod
+    def _step(cls, schedule, value):
+        frequency = schedule.frequency
+        if frequency == 'daily':
+            return value + timedelta(days=1)
+        if frequency == 'weekly':
+            return value + timedelta(weeks=1)
+        if frequency == 'monthly':
+            return cls._add_months(value, 1)
+        if frequency == 'yearly':
+            return cls._add_months(value, 12)
+        if frequency == 'custom':
+            minutes = (schedule.conditions or {}).get('interval_minutes')
+            if minutes and int(minutes) > 0:
+                return value + timedelta(minutes=int(minutes))
+        return None
+
+    @classmethod
+    def compute_next_run(cls, schedule, now=None):
+        """
+        Compute the run after the current one.
+
+        Runs missed while no scheduler was running are skipped rather than
+        replayed, so the next run is always in the future.
+
+        Args:
+            schedule (NotificationSchedule): The schedule
+            now (datetime, optional): Reference time
+
+        Returns:
+            datetime or None: Next run, or None when the schedule is finished
+        """
+        now = now or timezone.now()
+        if schedule.max_runs and schedule.run_count + 1 >= schedule.max_runs:
+            return None
+
+        next_run = cls._step(schedule, schedule.next_run or now)
+        while next_run is not None and next_run <= now:
+            next_run = cls._step(schedule, next_run)
+
+        if next_run is None or (schedule.end_date and next_run > schedule.end_date):
+            return None
+        return next_run
+
+    @staticmethod
+    def due_queryset(now=None):
+        """Active schedules due to run, served by the (is_active, next_run) index"""
+        now = now or timezone.now()
+        return NotificationSchedule.objects.filter(
+            is_active=True, next_run__lte=now
+        ).order_by('next_run')
+
+    @classmethod
+    def claim(cls, schedule, now=None):
+        """
+        Atomically advance a schedule to its next run.
+
+        Returns:
+            bool: True if this caller claimed the current run
+        """
+        now = now or timezone.now()
+        if schedule.max_runs and schedule.run_count >= schedule.max_runs:
+            return False
+        if schedule.end_date and now > schedule.end_date:
+            NotificationSchedule.objects.filter(pk=schedule.pk).update(is_active=False, updated_at=now)
+            return False
+
+        next_run = cls.compute_next_run(schedule, now)
+        claimed = NotificationSchedule.objects.filter(
+            pk=schedule.pk, is_active=True, next_run=schedule.next_run
+        ).update(
+            next_run=next_run,
+            is_active=next_run is not None,
+            run_count=F('run_count') + 1,
+            updated_at=now,
+        )
+        if claimed:
+            schedule.refresh_from_db()
+        return bool(claimed)
+
+    @classmethod
+    def enqueue_run(cls, schedule, now=None):
+        """
+        Create the batch for one schedule run and hand it to the dispatcher.
+
+        Returns:
+            NotificationBatch: The batch created for this run
+        """
+        now = now or timezone.now()
+        batch = NotificationBatch.objects.create(
+            name=f"{schedule.name} (run {schedule.run_count})",
+            template=schedule.template,
+            channel=schedule.channel,
+            scheduled_at=now,
+            filters=schedule.filters,
+            batch_data=(schedule.conditions or {}).get('batch_data', {}),
+            description=f"Scheduled run of {schedule.name}",
+            created_by=schedule.created_by,
+        )
+        NotificationDispatcher.start_batch(batch)
+        return batch
+
+    @classmethod
+    def run_schedule(cls, schedule, now=None):
+        """
+        Claim and enqueue a single schedule run.
+
+        Returns:
+            NotificationBatch or None: The batch, or None if the run was not
+            claimed (not due, finished, or claimed by another worker)
+        """
+        if not cls.claim(schedule, now):
+            return None
+        return cls.enqueue_run(schedule, now)
+
+    @classmethod
+    def run_now(cls, schedule, now=None):
+        """
+        Run a schedule once on demand, outside its regular runs.
+
+        The run counts towards ``max_runs`` but leaves ``next_run`` alone, so
+        the next regular run still happens on time.
+
+        Returns:
+            NotificationBatch or None: The batch, or None if the schedule is
+            inactive, finished or past its end date
+        """
+        now = now or timezone.now()
+        if schedule.end_date and now > schedule.end_date:
+            return None
+
+        counted = NotificationSchedule.objects.filter(pk=schedule.pk, is_active=True).exclude(
+            max_runs__gt=0, run_count__gte=F('max_runs')
+        ).update(run_count=F('run_count') + 1, updated_at=now)
+        if not counted:
+            return None
+        # A manual run that uses up max_runs finishes the schedule
+        NotificationSchedule.objects.filter(
+            pk=schedule.pk, max_runs__gt=0, run_count__gte=F('max_runs')
+        ).update(is_active=False, next_run=None)
+        schedule.refresh_from_db()
+        return cls.enqueue_run(schedule, now)
+
+    @classmethod
+    def run_due(cls, now=None, limit=100):
+        """
+        Run every schedule that is due.
+
+        Returns:
+            list: Batches created by this call
+        """
+        now = now or timezone.now()
+        batches = []
+        for schedule in cls.due_queryset(now).select_related('template', 'channel')[:limit]:
+            try:
+                batch = cls.run_schedule(schedule, now)
+            except Exception as e:
+                logger.error(f"Error running schedule {schedule.id}: {e}")
+                continue
+            if batch:
+                batches.append(batch)
+        return batches
+
+    @staticmethod
+    def seconds_until_next_due(now=None, max_sleep=60):
+        """
+        Seconds to sleep before the next schedule is due, capped at ``max_sleep``.
+
+        The cap bounds how long a newly created or edited schedule can wait
+        before a sleeping worker notices it.
+        """
+        now = now or timezone.now()
+        next_run = NotificationSchedule.objects.filter(
+            is_active=True, next_run__isnull=False
+        ).order_by('next_run').values_list('next_run', flat=True).first()
+        if next_run is None:
+            return max_sleep
+        return max(0, min(max_sleep, (next_run - now).total_seconds()))
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+from .counters import UnreadCounterService
+
+COUNTED_MODELS = ['notifications.Notification', 'cavity.Notification', 'chat.ChatNotification']
+
+
+def remember_read_state(sender, instance, **kwargs):
+    """Remember is_read as loaded so saves can detect read/unread transitions"""
+    instance._loaded_is_read = instance.__dict__.get('is_read')
+
+
+def update_unread_counter_on_save(sender, instance, created, **kwargs):
+    """Keep the recipient's unread counter in step with the saved notification"""
+    was_read = True if created else instance._loaded_is_read
+    if was_read is None or was_read == instance.is_read:
+        instance._loaded_is_read = instance.is_read
+        return
+    instance._loaded_is_read = instance.is_read
+
+    source = UnreadCounterService.source_for_model(sender)
+    user_id = UnreadCounterService.user_id_for(source, instance)
+    UnreadCounterService.adjust(source, user_id, -1 if instance.is_read else 1)
+
+
+def update_unread_counter_on_delete(sender, instance, **kwargs):
+    """Drop a deleted unread notification from the recipient's counter"""
+    if instance.is_read:
+        return
+    source = UnreadCounterService.source_for_model(sender)
+    user_id = UnreadCounterService.user_id_for(source, instance)
+    UnreadCounterService.adjust(source, user_id, -1)
+
+
+for model in COUNTED_MODELS:
+    post_init.connect(remember_read_state, sender=model, dispatch_uid=f'unread-init-{model}')
+    post_save.connect(update_unread_counter_on_save, sender=model, dispatch_uid=f'unread-save-{model}')
+    post_delete.connect(update_unread_counter_on_delete, sender=model, dispatch_uid=f'unread-delete-{model}')
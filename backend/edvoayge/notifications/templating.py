@@ -0,0 +1,225 @@
+"""
+Compiled rendering for notification templates.
+
+Template text is parsed once into literal parts and placeholder slots. The
+compiled form is cached per template and invalidated when the template's
+``updated_at`` changes, so rendering a large batch only joins strings.
+"""
+
+import re
+import threading
+from collections import OrderedDict
+
+PLACEHOLDER_RE = re.compile(r'\{\{\s*(\w+)\s*\}\}')
+
+TEMPLATE_FIELDS = ('subject', 'title', 'content', 'html_content')
+
+# Variables filled in per recipient by the dispatcher
+RECIPIENT_VARIABLES = ('user_id', 'username', 'email', 'first_name', 'last_name', 'user_name')
+
+CACHE_SIZE = 256
+
+
+class TemplateCompileError(ValueError):
+    """Raised when template text uses variables the template does not declare"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class TemplateRenderError(ValueError):
+    """Raised when a required template variable has no value"""
+
+
+class CompiledText:
+    """
+    One template field split into literals and placeholder slots.
+
+    ``parts`` holds the literal strings, with a slot between each pair:
+    ``parts[0] + value(slots[0]) + parts[1] + ... + parts[-1]``.
+    """
+
+    __slots__ = ('parts', 'slots', 'raw')
+
+    def __init__(self, parts, slots, raw):
+        self.parts = parts
+        self.slots = slots
+        self.raw = raw
+
+    @classmethod
+    def parse(cls, text):
+        text = text or ''
+        parts, slots, raw = [], [], []
+        position = 0
+        for match in PLACEHOLDER_RE.finditer(text):
+            parts.append(text[position:match.start()])
+            slots.append(match.group(1))
+            raw.append(match.group(0))
+            position = match.end()
+        parts.append(text[position:])
+        return cls(parts, slots, raw)
+
+    @property
+    def variables(self):
+        return set(self.slots)
+
+    def bind(self, context):
+        """
+        Substitute the variables present in ``context`` and keep the rest.
+
+        Used to fold batch-wide values in once before the per-recipient loop.
+        """
+        parts, slots, raw = [self.parts[0]], [], []
+        for index, name in enumerate(self.slots):
+            if name in context:
+                parts[-1] += str(context[name]) + self.parts[index + 1]
+            else:
+                slots.append(name)
+                raw.append(self.raw[index])
+                parts.append(self.parts[index + 1])
+        return CompiledText(parts, slots, raw)
+
+    def render(self, context):
+        """Render with ``context``; unknown placeholders are kept as written"""
+        if not self.slots:
+            return self.parts[0]
+        output = [self.parts[0]]
+        for index, name in enumerate(self.slots):
+            output.append(str(context[name]) if name in context else self.raw[index])
+            output.append(self.parts[index + 1])
+        return ''.join(output)
+
+
+class CompiledTemplate:
+    """All text fields of a NotificationTemplate in compiled form"""
+
+    def __init__(self, fields, declared=None):
+        self.fields = fields
+        self.declared = declared or {}
+
+    @property
+    def variables(self):
+        used = set()
+        for compiled in self.fields.values():
+            used |= compiled.variables
+        return used
+
+    @property
+    def defaults(self):
+        """Default values from the template's ``variables`` declarations"""
+        return {
+            name: spec['default']
+            for name, spec in self.declared.items()
+            if isinstance(spec, dict) and 'default' in spec
+        }
+
+    @property
+    def required(self):
+        """Declared variables marked ``required`` that have no default"""
+        return {
+            name for name, spec in self.declared.items()
+            if isinstance(spec, dict) and spec.get('required') and 'default' not in spec
+        }
+
+    def bind(self, context):
+        """
+        Fold batch-wide values (and declared defaults) into the template.
+
+        Required variables that are neither in ``context`` nor per-recipient
+        variables are reported before any recipient is rendered.
+        """
+        values = self.defaults
+        values.update(context or {})
+        missing = self.required - set(values) - set(RECIPIENT_VARIABLES)
+        if missing:
+            raise TemplateRenderError(f"Missing required variables: {', '.join(sorted(missing))}")
+        fields = {field: compiled.bind(values) for field, compiled in self.fields.items()}
+        return CompiledTemplate(fields, self.declared)
+
+    def render(self, context):
+        """Render every field for one context"""
+        return {field: compiled.render(context) for field, compiled in self.fields.items()}
+
+    def render_many(self, contexts):
+        """
+        Render every field for many contexts.
+
+        Fields without remaining placeholders are rendered once and shared.
+        """
+        constant = {field: compiled.parts[0] for field, compiled in self.fields.items() if not compiled.slots}
+        variable = [(field, compiled) for field, compiled in self.fields.items() if compiled.slots]
+        results = []
+        for context in contexts:
+            rendered = dict(constant)
+            for field, compiled in variable:
+                rendered[field] = compiled.render(context)
+            results.append(rendered)
+        return results
+
+
+def compile_template(template):
+    """
+    Compile a NotificationTemplate and validate its variable declarations.
+
+    When the template declares ``variables``, every placeholder must be either
+    declared or a per-recipient variable. Templates without declarations are
+    compiled without validation.
+
+    Args:
+        template (NotificationTemplate): Template (or any object with the
+            text fields and ``variables``)
+
+    Returns:
+        CompiledTemplate: Compiled template
+
+    Raises:
+        TemplateCompileError: If a field uses undeclared variables
+    """
+    declared = template.variables if isinstance(template.variables, dict) else {
+        name: {} for name in (template.variables or [])
+    }
+    fields = {field: CompiledText.parse(getattr(template, field, '')) for field in TEMPLATE_FIELDS}
+
+    if declared:
+        allowed = set(declared) | set(RECIPIENT_VARIABLES)
+        errors = {}
+        for field, compiled in fields.items():
+            undeclared = compiled.variables - allowed
+            if undeclared:
+                errors[field] = [f"Undeclared variable '{name}'" for name in sorted(undeclared)]
+        if errors:
+            raise TemplateCompileError('Template uses undeclared variables', errors)
+
+    return CompiledTemplate(fields, declared)
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_compiled_template(template):
+    """
+    Get the compiled form of a saved template, compiling at most once per version.
+
+    Entries are keyed by primary key and reused while ``updated_at`` matches.
+    """
+    key = template.pk
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry and entry[0] == template.updated_at:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    compiled = compile_template(template)
+    with _cache_lock:
+        _cache[key] = (template.updated_at, compiled)
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
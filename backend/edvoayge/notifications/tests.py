@@ -1,3 +1,392 @@
-from django.test import TestCase
+"""
+Test cases for notifications app.
+"""
 
-# Create your tests here.
+from datetime import timedelta
+from unittest import mock
+from django.contrib import admin
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework import status
+from cavity.models import Notification as CavityNotification
+from chat.models import ChatUser, ChatNotification
+from .backends import LocMemChannelBackend
+from .counters import UnreadCounterService
+from .models import (
+    NotificationTemplate, NotificationChannel, Notification,
+    NotificationPreference, NotificationBatch, NotificationLog, NotificationSchedule
+)
+from .services import NotificationDispatcher, NotificationScheduler
+from .templating import (
+    compile_template, get_compiled_template, TemplateCompileError, TemplateRenderError
+)
+
+
+@override_settings(
+    NOTIFICATION_DISPATCH_ASYNC=False,
+    NOTIFICATION_DISPATCH_CHUNK_SIZE=2,
+    NOTIFICATION_RETRY_BACKOFF_SECONDS=0,
+)
+class NotificationDispatcherTest(TestCase):
+    """Test cases for batch delivery."""
+
+    def setUp(self):
+        """Set up test data."""
+        LocMemChannelBackend.outbox = []
+        self.users = [
+            User.objects.create_user(
+                username=f'student{i}', email=f'student{i}@example.com',
+                first_name=f'Student{i}', password='testpass123'
+            )
+            for i in range(5)
+        ]
+        self.template = NotificationTemplate.objects.create(
+            name='Deadline reminder',
+            template_type='push',
+            category='reminder',
+            title='Hi {{ first_name }}',
+            content='{{first_name}}, {{university}} closes soon. {{unknown}}',
+            retry_count=2,
+        )
+        self.channel = NotificationChannel.objects.create(
+            name='Stub push',
+            channel_type='push',
+            config={'backend': 'locmem', 'max_concurrency': 2},
+        )
+        self.batch = NotificationBatch.objects.create(
+            name='Reminders',
+            template=self.template,
+            channel=self.channel,
+            batch_data={'university': 'Test University'},
+            created_by=self.users[0],
+        )
+
+    def test_dispatch_renders_per_recipient(self):
+        """Test every recipient gets a rendered notification."""
+        self.assertTrue(NotificationDispatcher.dispatch_batch(self.batch))
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.status, 'completed')
+        self.assertEqual(self.batch.total_count, 5)
+        self.assertEqual(self.batch.sent_count, 5)
+        self.assertEqual(len(LocMemChannelBackend.outbox), 5)
+
+        notification = Notification.objects.get(user=self.users[1])
+        self.assertEqual(notification.status, 'sent')
+        self.assertEqual(notification.title, 'Hi Student1')
+        self.assertEqual(notification.content, 'Student1, Test University closes soon. {{unknown}}')
+
+    def test_filters_and_preferences(self):
+        """Test filters select recipients and opted-out users are skipped."""
+        self.batch.filters = {'user_ids': [u.id for u in self.users[:3]]}
+        self.batch.save()
+        NotificationPreference.objects.create(
+            user=self.users[2], category='reminder', channel_type='push', is_enabled=False
+        )
+
+        NotificationDispatcher.dispatch_batch(self.batch)
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.total_count, 2)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)),
+            {self.users[0].id, self.users[1].id}
+        )
+
+    def test_failures_are_retried_and_logged(self):
+        """Test failed deliveries are retried retry_count times then logged."""
+        self.channel.config['fail_recipients'] = [self.users[3].id]
+        self.channel.save()
+
+        NotificationDispatcher.dispatch_batch(self.batch)
+
+        self.batch.refresh_from_db()
+        self.assertEqual(self.batch.sent_count, 4)
+        self.assertEqual(self.batch.failed_count, 1)
+        failed = Notification.objects.get(user=self.users[3])
+        self.assertEqual(failed.status, 'failed')
+        self.assertEqual(failed.retry_count, 2)
+        self.assertEqual(NotificationLog.objects.get(notification=failed).attempt_number, 3)
+
+    def test_resume_skips_delivered_recipients(self):
+        """Test resuming an interrupted batch does not send twice."""
+        NotificationDispatcher.dispatch_batch(self.batch)
+        NotificationBatch.objects.filter(pk=self.batch.pk).update(status='processing')
+        LocMemChannelBackend.outbox = []
+
+        self.assertTrue(NotificationDispatcher.dispatch_batch(self.batch, resume=True))
+
+        self.batch.refresh_from_db()
+        self.assertEqual(LocMemChannelBackend.outbox, [])
+        self.assertEqual(self.batch.sent_count, 5)
+        self.assertEqual(Notification.objects.count(), 5)
+
+    def test_resume_delivers_notifications_left_sending(self):
+        """Test notifications created before a crash but never sent are delivered on resume."""
+        with mock.patch.object(NotificationDispatcher, '_deliver_notifications', side_effect=RuntimeError('crash')):
+            NotificationDispatcher.dispatch_batch(self.batch)
+        self.assertTrue(Notification.objects.filter(status='sending').exists())
+        NotificationBatch.objects.filter(pk=self.batch.pk).update(status='processing')
+
+        self.assertTrue(NotificationDispatcher.dispatch_batch(self.batch, resume=True))
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.status, self.batch.sent_count, self.batch.total_count), ('completed', 5, 5))
+        self.assertEqual(len(LocMemChannelBackend.outbox), 5)
+        self.assertFalse(Notification.objects.filter(status='sending').exists())
+
+    def test_filters_outside_the_whitelist_are_refused(self):
+        """Test filters on other user fields fail the batch instead of counting matches."""
+        self.batch.filters = {'password__startswith': 'pbkdf2'}
+        self.batch.save()
+
+        NotificationDispatcher.dispatch_batch(self.batch)
+
+        self.batch.refresh_from_db()
+        self.assertEqual((self.batch.status, self.batch.total_count), ('failed', 0))
+        self.assertFalse(Notification.objects.exists())
+
+    def test_batch_is_claimed_once(self):
+        """Test a batch that is already processing cannot be claimed again."""
+        self.assertTrue(NotificationDispatcher.claim_batch(self.batch))
+        self.assertFalse(NotificationDispatcher.claim_batch(self.batch))
+
+
+@override_settings(NOTIFICATION_DISPATCH_ASYNC=False, NOTIFICATION_RETRY_BACKOFF_SECONDS=0)
+class NotificationSchedulerTest(TestCase):
+    """Test cases for the schedule runner."""
+
+    def setUp(self):
+        """Set up test data."""
+        LocMemChannelBackend.outbox = []
+        self.user = User.objects.create_user(username='student', email='student@example.com')
+        self.template = NotificationTemplate.objects.create(
+            name='Daily quiz', template_type='push', category='reminder', content='Quiz time'
+        )
+        self.channel = NotificationChannel.objects.create(
+            name='Stub push', channel_type='push', config={'backend': 'locmem'}
+        )
+        self.now = timezone.now()
+        self.schedule = NotificationSchedule.objects.create(
+            name='Daily quiz reminder',
+            template=self.template,
+            channel=self.channel,
+            frequency='daily',
+            start_date=self.now - timedelta(days=3, minutes=5),
+            filters={'user_ids': [self.user.id]},
+            created_by=self.user,
+        )
+
+    def test_next_run_defaults_to_start_date(self):
+        """Test new schedules are due at their start date."""
+        self.assertEqual(self.schedule.next_run, self.schedule.start_date)
+
+    def test_run_due_sends_and_advances(self):
+        """Test a due schedule is sent once and moved past missed runs."""
+        batches = NotificationScheduler.run_due(now=self.now)
+
+        self.assertEqual(len(batches), 1)
+        self.assertEqual(batches[0].status, 'completed')
+        self.assertEqual(len(LocMemChannelBackend.outbox), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.run_count, 1)
+        self.assertEqual(self.schedule.next_run, self.schedule.start_date + timedelta(days=4))
+        self.assertEqual(NotificationScheduler.run_due(now=self.now), [])
+
+    def test_stale_claim_is_rejected(self):
+        """Test a second worker holding a stale copy cannot run the schedule."""
+        stale_copy = NotificationSchedule.objects.get(pk=self.schedule.pk)
+
+        self.assertTrue(NotificationScheduler.claim(self.schedule, self.now))
+        self.assertFalse(NotificationScheduler.claim(stale_copy, self.now))
+
+    def test_run_now_keeps_next_run(self):
+        """Test a manual run sends a batch without moving the regular runs."""
+        next_run = self.now + timedelta(hours=18)
+        NotificationSchedule.objects.filter(pk=self.schedule.pk).update(next_run=next_run)
+        self.schedule.refresh_from_db()
+
+        batch = NotificationScheduler.run_now(self.schedule, self.now)
+
+        self.assertEqual(batch.status, 'completed')
+        self.assertEqual(len(LocMemChannelBackend.outbox), 1)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.run_count, 1)
+        self.assertEqual(self.schedule.next_run, next_run)
+        self.assertTrue(self.schedule.is_active)
+
+        self.schedule.max_runs = 2
+        self.schedule.save()
+        NotificationScheduler.run_now(self.schedule, self.now)
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.is_active)
+        self.assertIsNone(NotificationScheduler.run_now(self.schedule, self.now))
+
+    def test_max_runs_deactivates(self):
+        """Test a schedule stops after max_runs."""
+        self.schedule.max_runs = 1
+        self.schedule.save()
+
+        NotificationScheduler.run_due(now=self.now)
+
+        self.schedule.refresh_from_db()
+        self.assertFalse(self.schedule.is_active)
+        self.assertIsNone(self.schedule.next_run)
+
+    def test_monthly_clamps_day(self):
+        """Test monthly schedules keep to the end of shorter months."""
+        self.schedule.frequency = 'monthly'
+        self.schedule.next_run = self.now.replace(year=2025, month=1, day=31)
+        next_run = NotificationScheduler.compute_next_run(self.schedule, now=self.schedule.next_run)
+        self.assertEqual((next_run.month, next_run.day), (2, 28))
+
+    def test_seconds_until_next_due(self):
+        """Test the runner sleeps until the next due schedule."""
+        NotificationSchedule.objects.filter(pk=self.schedule.pk).update(
+            next_run=self.now + timedelta(seconds=30)
+        )
+        self.assertEqual(NotificationScheduler.seconds_until_next_due(now=self.now, max_sleep=60), 30)
+        self.assertEqual(NotificationScheduler.seconds_until_next_due(now=self.now, max_sleep=10), 10)
+
+
+class NotificationTemplatingTest(TestCase):
+    """Test cases for compiled template rendering."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.template = NotificationTemplate.objects.create(
+            name='Offer', template_type='email', category='application',
+            subject='Offer from {{university}}',
+            content='Dear {{first_name}}, {{university}} sent an offer for {{course}}.',
+            variables={'university': {'required': True}, 'course': {'default': 'your course'}},
+        )
+
+    def test_bind_and_render_many(self):
+        """Test batch values are folded in once and recipients fill the rest."""
+        compiled = compile_template(self.template).bind({'university': 'Test University'})
+        rendered = compiled.render_many([{'first_name': 'Asha'}, {'first_name': 'Ravi'}])
+
+        self.assertEqual(rendered[0]['subject'], 'Offer from Test University')
+        self.assertEqual(rendered[1]['content'], 'Dear Ravi, Test University sent an offer for your course.')
+        self.assertEqual(compiled.fields['content'].slots, ['first_name'])
+
+    def test_undeclared_variable_rejected(self):
+        """Test compiling fails when text uses undeclared variables."""
+        self.template.content = 'Hello {{nickname}}'
+        with self.assertRaises(TemplateCompileError) as context:
+            compile_template(self.template)
+        self.assertIn('content', context.exception.errors)
+
+    def test_missing_required_variable(self):
+        """Test binding without a required variable fails before rendering."""
+        with self.assertRaises(TemplateRenderError):
+            compile_template(self.template).bind({})
+
+    def test_cache_invalidated_on_update(self):
+        """Test the compiled form is reused until the template is saved."""
+        first = get_compiled_template(self.template)
+        self.assertIs(get_compiled_template(self.template), first)
+
+        self.template.subject = 'New offer from {{university}}'
+        self.template.save()
+        self.assertIsNot(get_compiled_template(self.template), first)
+
+
+class UnreadCounterServiceTest(APITestCase):
+    """Test cases for unread badge counters."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.user = User.objects.create_user(username='student', email='student@example.com')
+        self.other = User.objects.create_user(username='mentor', email='mentor@example.com')
+        self.template = NotificationTemplate.objects.create(
+            name='Alert', template_type='in_app', category='alert', content='Alert'
+        )
+        self.channel = NotificationChannel.objects.create(name='In app', channel_type='in_app')
+        self.chat_user = ChatUser.objects.create(user=self.user)
+
+    def create_notification(self):
+        return Notification.objects.create(
+            user=self.user, template=self.template, channel=self.channel,
+            content='Alert', category='alert'
+        )
+
+    def test_counters_follow_create_read_and_delete(self):
+        """Test counters are maintained without recounting."""
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 0)
+        first = self.create_notification()
+        self.create_notification()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 2)
+
+        first.is_read = True
+        first.save()
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 1)
+
+        first.is_read = False
+        first.save()
+        first.delete()
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 1)
+
+    def test_badges_endpoint(self):
+        """Test one request returns every source's unread count."""
+        self.create_notification()
+        CavityNotification.objects.create(
+            recipient=self.user, sender=self.other, notification_type='follow', message='Followed'
+        )
+        ChatNotification.objects.create(user=self.chat_user, type='new_message')
+        ChatNotification.objects.create(user=self.chat_user, type='new_message')
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get('/api/v1/notifications/api/notifications/notifications/badges/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {'notifications': 1, 'cavity': 1, 'chat': 2, 'total': 4})
+
+    def test_mark_all_read_resets_counter(self):
+        """Test bulk mark-all-read clears the cached counter."""
+        self.create_notification()
+        UnreadCounterService.get_counts(self.user.id)
+
+        self.client.force_authenticate(user=self.user)
+        response = self.client.post('/api/v1/notifications/api/notifications/notifications/mark_all_read/')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 0)
+
+    def test_admin_mark_all_read_resets_counter(self):
+        """Test the admin bulk action clears the cached counter of each affected user."""
+        self.create_notification()
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 1)
+
+        model_admin = admin.site._registry[Notification]
+        with mock.patch.object(model_admin, 'message_user'):
+            model_admin.mark_all_read(None, Notification.objects.filter(user=self.user))
+
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 0)
+
+    def test_expired_local_copy_is_recounted(self):
+        """Test a worker whose cached count is stale recounts from the database."""
+        self.create_notification()
+        self.create_notification()
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 2)
+
+        # Another worker marks one read; only its own cache sees the signal
+        Notification.objects.filter(pk=Notification.objects.first().pk).update(is_read=True)
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 2)
+
+        cache.delete(UnreadCounterService._key('notifications', self.user.id))  # the local copy expires
+        self.assertEqual(UnreadCounterService.get_count(self.user.id, 'notifications'), 1)
+
+    @override_settings(NOTIFICATION_UNREAD_CACHE_TIMEOUT=7)
+    def test_counters_use_short_timeout(self):
+        """Test cached counters expire after NOTIFICATION_UNREAD_CACHE_TIMEOUT."""
+        with mock.patch.object(cache, 'add', wraps=cache.add) as add:
+            UnreadCounterService.get_count(self.user.id, 'notifications')
+        self.assertEqual(add.call_args.kwargs['timeout'], 7)
@@ -90,6 +90,10 @@ urlpatterns = [
          NotificationViewSet.as_view({'get': 'unread'}),
          name='notification-unread'),
     
+    path('api/notifications/notifications/badges/',
+         NotificationViewSet.as_view({'get': 'badges'}),
+         name='notification-badges'),
+    
     path('api/notifications/notifications/recent/',
          NotificationViewSet.as_view({'get': 'recent'}),
          name='notification-recent'),
@@ -36,6 +36,9 @@ from .serializers import (
     NotificationTemplateStatsSerializer,
     NotificationPreferenceStatsSerializer,
 )
+from .counters import UnreadCounterService
+from .services import NotificationDispatcher, NotificationScheduler
+from .templating import get_compiled_template, TemplateCompileError, TemplateRenderError
 
 logger = logging.getLogger(__name__)
 
@@ -64,14 +67,19 @@ class NotificationTemplateViewSet(viewsets.ModelViewSet):
         template = self.get_object()
         test_data = request.data.get('test_data', {})
         
-        # Simulate template rendering
-        rendered_content = template.content
-        for key, value in test_data.items():
-            rendered_content = rendered_content.replace(f'{{{{{key}}}}}', str(value))
+        try:
+            compiled = get_compiled_template(template).bind(test_data)
+        except (TemplateCompileError, TemplateRenderError) as e:
+            return Response({
+                'error': str(e),
+                'details': getattr(e, 'errors', {})
+            }, status=status.HTTP_400_BAD_REQUEST)
         
+        rendered = compiled.render({})
         return Response({
             'template_id': template.id,
-            'rendered_content': rendered_content,
+            'rendered_content': rendered['content'],
+            'rendered': rendered,
             'test_data': test_data
         })
     
@@ -301,6 +309,7 @@ class NotificationViewSet(viewsets.ModelViewSet):
             is_read=True,
             read_at=timezone.now()
         )
+        UnreadCounterService.reset('notifications', request.user.id, 0)
         
         return Response({
             'message': f'{updated} notifications marked as read'
@@ -313,6 +322,18 @@ class NotificationViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
     
+    @action(detail=False, methods=['get'])
+    def badges(self, request):
+        """Get unread counts for every notification source in one call"""
+        if not request.user.is_authenticated:
+            return Response({
+                'error': 'Authentication required'
+            }, status=status.HTTP_401_UNAUTHORIZED)
+        
+        counts = UnreadCounterService.get_counts(request.user.id)
+        counts['total'] = sum(counts.values())
+        return Response(counts)
+    
     @action(detail=False, methods=['get'])
     def recent(self, request):
         """Get recent notifications"""
@@ -452,31 +473,27 @@ class NotificationBatchViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def start_batch(self, request, pk=None):
-        """Start processing batch"""
+        """Start delivering batch in the background"""
         batch = self.get_object()
         
         if batch.status == 'pending':
-            batch.status = 'processing'
-            batch.started_at = timezone.now()
-            batch.save()
-            
-            # Simulate batch processing
-            batch.status = 'completed'
-            batch.completed_at = timezone.now()
-            batch.sent_count = batch.total_count
-            batch.save()
+            NotificationDispatcher.start_batch(batch)
+            batch.refresh_from_db()
         
         serializer = self.get_serializer(batch)
-        return Response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
     
     @action(detail=True, methods=['post'])
     def cancel_batch(self, request, pk=None):
         """Cancel batch processing"""
         batch = self.get_object()
         
-        if batch.status in ['pending', 'processing']:
-            batch.status = 'cancelled'
-            batch.save()
+        # Conditional update so live progress counters written by the
+        # dispatcher are not overwritten with stale values
+        NotificationBatch.objects.filter(
+            pk=batch.pk, status__in=['pending', 'processing']
+        ).update(status='cancelled', updated_at=timezone.now())
+        batch.refresh_from_db()
         
         serializer = self.get_serializer(batch)
         return Response(serializer.data)
@@ -585,14 +602,13 @@ class NotificationScheduleViewSet(viewsets.ModelViewSet):
         """Run schedule immediately"""
         schedule = self.get_object()
         
-        if schedule.can_run:
-            # Simulate running the schedule
-            schedule.run_count += 1
-            schedule.save()
-            
+        batch = NotificationScheduler.run_now(schedule)
+        if batch:
             return Response({
                 'message': 'Schedule executed successfully',
-                'run_count': schedule.run_count
+                'run_count': schedule.run_count,
+                'next_run': schedule.next_run,
+                'batch_id': batch.batch_id
             })
         else:
             return Response({
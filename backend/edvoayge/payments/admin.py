@@ -105,10 +105,10 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
     ]
     search_fields = [
         'transaction_id', 'description', 'user__email', 'user__first_name',
-        'user__last_name', 'gateway_transaction_id'
+        'user__last_name', 'gateway_transaction_id', 'idempotency_key'
     ]
     readonly_fields = [
-        'id', 'transaction_id', 'created_at', 'updated_at', 'processed_at',
+        'id', 'transaction_id', 'idempotency_key', 'created_at', 'updated_at', 'processed_at',
         'completed_at', 'is_successful', 'is_refundable'
     ]
     list_select_related = ['user', 'payment_method']
@@ -127,7 +127,7 @@ class PaymentTransactionAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Payment Processing', {
-            'fields': ('gateway', 'gateway_transaction_id', 'gateway_response'),
+            'fields': ('gateway', 'gateway_transaction_id', 'gateway_response', 'idempotency_key'),
             'classes': ('collapse',)
         }),
         ('Fees and Taxes', {
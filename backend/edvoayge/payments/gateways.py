@@ -0,0 +1,122 @@
+"""
+Payment gateway adapters.
+
+``PaymentService`` talks to gateways only through ``BaseGateway``, so a real
+provider is added by subclassing it and listing the class in
+``PAYMENT_GATEWAYS``. Every call carries an idempotency key that the adapter
+must pass on to the provider, so retrying a call after a timeout or crash
+never charges twice.
+"""
+
+import hashlib
+import threading
+from collections import namedtuple
+from decimal import Decimal
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# success: the charge/refund went through
+# reference: the gateway's id for it
+# response: raw provider payload, stored on the row
+# error: message when not successful
+GatewayResult = namedtuple('GatewayResult', ['success', 'reference', 'response', 'error'])
+
+
+class GatewayError(Exception):
+    """Raised by adapters when the provider could not be reached"""
+
+
+class BaseGateway:
+    """
+    Interface implemented by every gateway adapter.
+    """
+
+    name = 'base'
+
+    def charge(self, transaction, idempotency_key):
+        """
+        Charge a transaction.
+
+        Args:
+            transaction (PaymentTransaction): The transaction to charge
+            idempotency_key (str): Identical for every attempt at this charge
+
+        Returns:
+            GatewayResult: The outcome
+        """
+        raise NotImplementedError
+
+    def refund(self, refund, idempotency_key):
+        """
+        Refund (part of) a charged transaction.
+
+        Args:
+            refund (Refund): The refund to pay out
+            idempotency_key (str): Identical for every attempt at this refund
+
+        Returns:
+            GatewayResult: The outcome
+        """
+        raise NotImplementedError
+
+
+class FakeGateway(BaseGateway):
+    """
+    Local gateway for development and tests.
+
+    Charges succeed unless the amount is listed in
+    ``PAYMENT_FAKE_DECLINE_AMOUNTS``. Like a real provider it remembers
+    idempotency keys, so repeating a call returns the first result.
+    """
+
+    name = 'fake'
+
+    def __init__(self):
+        self._results = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _reference(prefix, idempotency_key):
+        return f"{prefix}_{hashlib.sha256(idempotency_key.encode()).hexdigest()[:16]}"
+
+    def _once(self, idempotency_key, call):
+        with self._lock:
+            if idempotency_key not in self._results:
+                self._results[idempotency_key] = call()
+            return self._results[idempotency_key]
+
+    def charge(self, transaction, idempotency_key):
+        def call():
+            declined = {Decimal(str(amount)) for amount in getattr(settings, 'PAYMENT_FAKE_DECLINE_AMOUNTS', [])}
+            if Decimal(transaction.amount) in declined:
+                return GatewayResult(False, None, {'status': 'declined'}, 'Card declined')
+            reference = self._reference('ch', idempotency_key)
+            return GatewayResult(True, reference, {'status': 'succeeded', 'id': reference}, '')
+        return self._once(f'charge:{idempotency_key}', call)
+
+    def refund(self, refund, idempotency_key):
+        def call():
+            reference = self._reference('re', idempotency_key)
+            return GatewayResult(True, reference, {'status': 'succeeded', 'id': reference}, '')
+        return self._once(f'refund:{idempotency_key}', call)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(name=None):
+    """
+    Adapter instance for a gateway name (``PAYMENT_DEFAULT_GATEWAY`` if empty).
+
+    Raises:
+        GatewayError: If the gateway is not configured
+    """
+    name = name or getattr(settings, 'PAYMENT_DEFAULT_GATEWAY', 'fake')
+    with _gateways_lock:
+        if name not in _gateways:
+            path = getattr(settings, 'PAYMENT_GATEWAYS', {'fake': 'payments.gateways.FakeGateway'}).get(name)
+            if not path:
+                raise GatewayError(f"Payment gateway '{name}' is not configured")
+            _gateways[name] = import_string(path)()
+        return _gateways[name]
@@ -0,0 +1,347 @@
+"""
+Invoice PDFs.
+
+``InvoicePDFService.response`` serves an invoice as a PDF. Rendered files are
+cached under ``INVOICE_PDF_ROOT`` keyed by invoice number and the last change
+to the invoice or its transaction/subscription, so repeat downloads are
+plain file responses. On a cache miss the PDF is streamed to the client
+while it is written to the cache. ``prerender_month`` fills the cache for a
+billing period on a process pool.
+"""
+
+import logging
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from decimal import Decimal
+from uuid import uuid4
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from .models import Invoice
+from .pdf import PAGE_HEIGHT, PAGE_WIDTH, Page, stream_pdf
+
+logger = logging.getLogger(__name__)
+
+ROWS_PER_PAGE = 30
+MARGIN = 50
+
+
+def _money(value, currency):
+    return f"{Decimal(value or 0):,.2f} {currency}"
+
+
+def build_document(invoice):
+    """
+    Plain data needed to render an invoice.
+
+    Kept free of model instances so it can be sent to a pool worker.
+
+    Returns:
+        dict: Header fields, line items and totals
+    """
+    items = []
+    for item in invoice.items or []:
+        quantity = Decimal(str(item.get('quantity', 1)))
+        unit_price = Decimal(str(item.get('unit_price', item.get('amount', 0))))
+        items.append({
+            'description': item.get('description') or item.get('name') or 'Item',
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'amount': Decimal(str(item.get('amount', quantity * unit_price))),
+        })
+
+    if not items:
+        # Derive the lines from what the invoice was raised for
+        subscription = invoice.subscription
+        transaction = invoice.transaction
+        if subscription:
+            description = (
+                f"{subscription.plan_name} ({subscription.get_billing_cycle_display()}) "
+                f"{subscription.start_date:%d %b %Y} - {subscription.end_date:%d %b %Y}"
+            )
+        else:
+            description = transaction.description or transaction.get_transaction_type_display()
+        items.append({'description': description, 'quantity': Decimal(1),
+                      'unit_price': invoice.subtotal, 'amount': invoice.subtotal})
+        if transaction.processing_fee:
+            items.append({'description': 'Processing fee', 'quantity': Decimal(1),
+                          'unit_price': transaction.processing_fee, 'amount': transaction.processing_fee})
+
+    address = invoice.billing_address or {}
+    user = invoice.user
+    return {
+        'number': invoice.invoice_number,
+        'status': invoice.get_status_display(),
+        'currency': invoice.currency,
+        'issue_date': f"{invoice.issue_date:%d %b %Y}" if invoice.issue_date else '',
+        'due_date': f"{invoice.due_date:%d %b %Y}",
+        'paid_date': f"{invoice.paid_date:%d %b %Y}" if invoice.paid_date else '',
+        'transaction_id': invoice.transaction.transaction_id,
+        'bill_to': [
+            line for line in [
+                address.get('name') or user.get_full_name() or user.username,
+                address.get('line1') or address.get('address'),
+                address.get('line2'),
+                ' '.join(filter(None, [address.get('city'), address.get('state'), address.get('postal_code')])),
+                address.get('country'),
+                user.email,
+            ] if line
+        ],
+        'items': items,
+        'subtotal': invoice.subtotal,
+        'tax_amount': invoice.tax_amount,
+        'discount_amount': invoice.discount_amount,
+        'total_amount': invoice.total_amount,
+        'notes': invoice.notes,
+        'terms': invoice.terms_conditions,
+    }
+
+
+def _wrap(text, width=95):
+    words, line = str(text).split(), ''
+    for word in words:
+        if line and len(line) + len(word) + 1 > width:
+            yield line
+            line = word
+        else:
+            line = f"{line} {word}".strip()
+    if line:
+        yield line
+
+
+def iter_pages(document):
+    """Lay out an invoice document as ``Page`` objects, one page at a time"""
+    currency = document['currency']
+    items = document['items']
+    chunks = [items[start:start + ROWS_PER_PAGE] for start in range(0, len(items), ROWS_PER_PAGE)] or [[]]
+    right = PAGE_WIDTH - MARGIN
+
+    for index, rows in enumerate(chunks):
+        page = Page()
+        y = PAGE_HEIGHT - MARGIN - 20
+        page.text(MARGIN, y, 'INVOICE', size=20, bold=True)
+        page.text(right, y, document['number'], size=12, bold=True, align='right')
+        y -= 24
+        page.text(right, y, f"Page {index + 1} of {len(chunks)}", size=8, align='right')
+
+        if index == 0:
+            details = [
+                ('Status', document['status']),
+                ('Issued', document['issue_date']),
+                ('Due', document['due_date']),
+                ('Paid', document['paid_date']),
+                ('Transaction', document['transaction_id']),
+            ]
+            for label, value in details:
+                if value:
+                    page.text(right - 150, y - 16, f"{label}:", size=9, bold=True)
+                    page.text(right, y - 16, value, size=9, align='right')
+                    y -= 14
+            bill_y = PAGE_HEIGHT - MARGIN - 60
+            page.text(MARGIN, bill_y, 'Bill to', size=9, bold=True)
+            for line in document['bill_to']:
+                bill_y -= 13
+                page.text(MARGIN, bill_y, line, size=9)
+            y = min(y, bill_y) - 30
+
+        # Item table
+        page.text(MARGIN, y, 'Description', size=9, bold=True)
+        page.text(right - 200, y, 'Qty', size=9, bold=True, align='right')
+        page.text(right - 100, y, 'Unit price', size=9, bold=True, align='right')
+        page.text(right, y, 'Amount', size=9, bold=True, align='right')
+        y -= 6
+        page.line(MARGIN, y, right, y)
+        for row in rows:
+            y -= 16
+            page.text(MARGIN, y, str(row['description'])[:60], size=9)
+            page.text(right - 200, y, f"{row['quantity'].normalize():f}", size=9, align='right')
+            page.text(right - 100, y, _money(row['unit_price'], currency), size=9, align='right')
+            page.text(right, y, _money(row['amount'], currency), size=9, align='right')
+
+        if index == len(chunks) - 1:
+            y -= 10
+            page.line(right - 220, y, right, y)
+            totals = [
+                ('Subtotal', document['subtotal'], False),
+                ('Tax', document['tax_amount'], False),
+                ('Discount', -Decimal(document['discount_amount'] or 0), False),
+                ('Total', document['total_amount'], True),
+            ]
+            for label, value, bold in totals:
+                if value or bold:
+                    y -= 16
+                    page.text(right - 220, y, label, size=10, bold=bold)
+                    page.text(right, y, _money(value, currency), size=10, bold=bold, align='right')
+            for heading, body in (('Notes', document['notes']), ('Terms and conditions', document['terms'])):
+                if body:
+                    y -= 28
+                    page.text(MARGIN, y, heading, size=9, bold=True)
+                    for line in _wrap(body):
+                        y -= 12
+                        if y < MARGIN:
+                            break
+                        page.text(MARGIN, y, line, size=8)
+        yield page
+
+
+def render_to_file(document, path):
+    """
+    Write an invoice PDF to ``path`` atomically.
+
+    Runs in pool workers, so it only uses the plain document.
+
+    Returns:
+        str: The path written
+    """
+    temporary = f"{path}.{uuid4().hex}.tmp"
+    try:
+        with open(temporary, 'wb') as output:
+            for chunk in stream_pdf(iter_pages(document), title=f"Invoice {document['number']}"):
+                output.write(chunk)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    return path
+
+
+class InvoicePDFService:
+    """
+    Service class for rendering and caching invoice PDFs.
+    """
+
+    @staticmethod
+    def cache_root():
+        root = str(getattr(settings, 'INVOICE_PDF_ROOT', os.path.join(settings.BASE_DIR, 'private', 'invoices')))
+        os.makedirs(root, exist_ok=True)
+        return root
+
+    @staticmethod
+    def version(invoice):
+        """Latest change to the invoice or the rows its lines come from"""
+        stamps = [invoice.updated_at, invoice.transaction.updated_at]
+        if invoice.subscription_id:
+            stamps.append(invoice.subscription.updated_at)
+        return max(stamps)
+
+    @staticmethod
+    def _safe_number(invoice):
+        return re.sub(r'[^A-Za-z0-9_.-]', '_', invoice.invoice_number)
+
+    @classmethod
+    def cache_key(cls, invoice):
+        return f"{cls._safe_number(invoice)}-{int(cls.version(invoice).timestamp() * 1000000)}"
+
+    @classmethod
+    def cache_path(cls, invoice):
+        return os.path.join(cls.cache_root(), f"{cls.cache_key(invoice)}.pdf")
+
+    @classmethod
+    def _discard_stale(cls, invoice, keep):
+        prefix = f"{cls._safe_number(invoice)}-"
+        for name in os.listdir(cls.cache_root()):
+            path = os.path.join(cls.cache_root(), name)
+            if name.startswith(prefix) and name.endswith('.pdf') and path != keep:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    @classmethod
+    def stream(cls, invoice):
+        """
+        Render an invoice, yielding PDF chunks while writing them to the cache.
+
+        The cached file only appears once the whole document was written; an
+        interrupted download leaves no partial file behind.
+        """
+        path = cls.cache_path(invoice)
+        document = build_document(invoice)
+        temporary = f"{path}.{uuid4().hex}.tmp"
+        output = open(temporary, 'wb')
+        try:
+            for chunk in stream_pdf(iter_pages(document), title=f"Invoice {document['number']}"):
+                output.write(chunk)
+                yield chunk
+            output.close()
+            os.replace(temporary, path)
+            cls._discard_stale(invoice, path)
+        finally:
+            output.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    @classmethod
+    def response(cls, invoice, request=None):
+        """
+        HTTP response with the invoice PDF, from the cache when possible.
+
+        The cache key doubles as the ETag, so a client holding the current
+        version gets a 304.
+        """
+        etag = f'"{cls.cache_key(invoice)}"'
+        if request is not None:
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                return not_modified
+
+        filename = f"{cls._safe_number(invoice)}.pdf"
+        path = cls.cache_path(invoice)
+        if os.path.exists(path):
+            response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename,
+                                    content_type='application/pdf')
+        else:
+            response = StreamingHttpResponse(cls.stream(invoice), content_type='application/pdf')
+            response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    @classmethod
+    def prerender_month(cls, year, month, workers=None, force=False):
+        """
+        Render every invoice issued in a month that is not cached yet.
+
+        Args:
+            year (int): Billing year
+            month (int): Billing month (1-12)
+            workers (int): Pool processes; 0 renders in this process
+            force (bool): Re-render invoices that are already cached
+
+        Returns:
+            int: Number of invoices rendered
+        """
+        if workers is None:
+            workers = getattr(settings, 'INVOICE_PDF_WORKERS', 2)
+        invoices = Invoice.objects.filter(
+            issue_date__year=year, issue_date__month=month
+        ).select_related('user', 'transaction', 'subscription').order_by('issue_date')
+
+        jobs = []
+        for invoice in invoices.iterator(chunk_size=500):
+            path = cls.cache_path(invoice)
+            if force or not os.path.exists(path):
+                jobs.append((invoice, build_document(invoice), path))
+
+        rendered = 0
+        if workers and len(jobs) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(render_to_file, document, path): invoice for invoice, document, path in jobs}
+                for future in as_completed(futures):
+                    invoice = futures[future]
+                    try:
+                        cls._discard_stale(invoice, future.result())
+                        rendered += 1
+                    except Exception as e:
+                        logger.error(f"Error rendering invoice {invoice.invoice_number}: {e}")
+        else:
+            for invoice, document, path in jobs:
+                try:
+                    cls._discard_stale(invoice, render_to_file(document, path))
+                    rendered += 1
+                except Exception as e:
+                    logger.error(f"Error rendering invoice {invoice.invoice_number}: {e}")
+
+        logger.info(f"Pre-rendered {rendered} invoices for {year}-{month:02d}")
+        return rendered
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from payments.invoices import InvoicePDFService
+
+
+class Command(BaseCommand):
+    help = "Pre-render a billing month's invoice PDFs into the cache"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--month', help='Billing month as YYYY-MM (default: current month)')
+        parser.add_argument('--workers', type=int, default=None, help='Pool processes (default INVOICE_PDF_WORKERS)')
+        parser.add_argument('--force', action='store_true', help='Re-render invoices that are already cached')
+
+    def handle(self, *args, **options):
+        if options['month']:
+            try:
+                year, month = (int(part) for part in options['month'].split('-'))
+            except ValueError:
+                raise CommandError('--month must look like 2025-01')
+        else:
+            now = timezone.now()
+            year, month = now.year, now.month
+
+        rendered = InvoicePDFService.prerender_month(
+            year, month, workers=options['workers'], force=options['force']
+        )
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} invoice(s) for {year}-{month:02d}'))
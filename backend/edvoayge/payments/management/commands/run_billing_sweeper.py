@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from payments.services import BillingSweeper
+
+
+class Command(BaseCommand):
+    help = 'Renew, convert and expire subscriptions that are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep sweeping periodically')
+        parser.add_argument('--interval', type=int, default=300, help='Seconds between sweeps with --loop')
+        parser.add_argument('--max-chunks', type=int, default=None, help='Stop after this many chunks per sweep')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            stats = BillingSweeper.run(max_chunks=options['max_chunks'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Renewed {stats['renewed']}, skipped {stats['skipped']}, expired {stats['expired']} "
+                f"subscription(s); created {stats['invoices']} invoice(s)"
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
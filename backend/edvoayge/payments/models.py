@@ -136,6 +136,8 @@ class PaymentTransaction(models.Model):
     gateway = models.CharField(max_length=50, blank=True, null=True)
     gateway_transaction_id = models.CharField(max_length=255, blank=True, null=True)
     gateway_response = models.JSONField(default=dict, blank=True)
+    # Client-supplied key; repeating a request with the same key returns this transaction
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True)
     
     # Fees and taxes
     processing_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
@@ -161,6 +163,13 @@ class PaymentTransaction(models.Model):
             models.Index(fields=['created_at']),
             models.Index(fields=['gateway_transaction_id']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_transaction_idempotency_key',
+            ),
+        ]
     
     def __str__(self):
         return f"{self.transaction_id} - {self.amount} {self.currency}"
@@ -242,6 +251,9 @@ class Subscription(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['status', 'end_date']),
             models.Index(fields=['next_billing_date']),
+            # Due renewals and trial conversions for payments.services.BillingSweeper
+            models.Index(fields=['status', 'next_billing_date'], name='subscription_due_idx'),
+            models.Index(fields=['status', 'trial_end_date'], name='subscription_trial_due_idx'),
         ]
     
     def __str__(self):
@@ -389,6 +401,7 @@ class Refund(models.Model):
     # Processing
     gateway_refund_id = models.CharField(max_length=255, blank=True, null=True)
     gateway_response = models.JSONField(default=dict, blank=True)
+    idempotency_key = models.CharField(max_length=255, blank=True, null=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -407,6 +420,13 @@ class Refund(models.Model):
             models.Index(fields=['user', 'status']),
             models.Index(fields=['created_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'idempotency_key'],
+                condition=models.Q(idempotency_key__isnull=False),
+                name='unique_refund_idempotency_key',
+            ),
+        ]
     
     def __str__(self):
         return f"Refund {self.refund_id} - {self.amount} {self.currency}"
@@ -0,0 +1,104 @@
+"""
+Minimal streaming PDF writer.
+
+Produces text-only PDF 1.4 documents using the standard Helvetica fonts, so
+no PDF library is needed. Pages are encoded and yielded one at a time and
+only the byte offsets of the objects are kept until the cross-reference
+table is written at the end, so memory stays flat however long the document.
+"""
+
+PAGE_WIDTH = 595  # A4 in points
+PAGE_HEIGHT = 842
+
+# Approximate Helvetica advance width as a fraction of the font size, used
+# for right-aligning figures
+CHAR_WIDTH = 0.556
+
+
+def escape(text):
+    """PDF literal string for ``text`` in WinAnsi encoding"""
+    data = str(text).encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def text_width(text, size):
+    return len(str(text)) * size * CHAR_WIDTH
+
+
+class Page:
+    """
+    Drawing operations for one page.
+
+    Coordinates are in points from the bottom-left corner.
+    """
+
+    def __init__(self):
+        self.operations = []
+
+    def text(self, x, y, value, size=10, bold=False, align='left'):
+        if align == 'right':
+            x -= text_width(value, size)
+        font = b'F2' if bold else b'F1'
+        self.operations.append(
+            b'BT /%s %d Tf %.2f %.2f Td (%s) Tj ET' % (font, size, x, y, escape(value))
+        )
+
+    def line(self, x1, y1, x2, y2, width=0.5):
+        self.operations.append(b'%.2f w %.2f %.2f m %.2f %.2f l S' % (width, x1, y1, x2, y2))
+
+    def content(self):
+        return b'\n'.join(self.operations)
+
+
+def stream_pdf(pages, title=''):
+    """
+    Encode pages as a PDF, yielding it in chunks.
+
+    Args:
+        pages (iterable): ``Page`` objects; may be a generator
+        title (str): Document title stored in the info dictionary
+
+    Yields:
+        bytes: Consecutive parts of the file
+    """
+    offsets = {}
+    position = 0
+
+    def emit(number, body):
+        nonlocal position
+        offsets[number] = position
+        chunk = b'%d 0 obj\n%s\nendobj\n' % (number, body)
+        position += len(chunk)
+        return chunk
+
+    header = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n'
+    position = len(header)
+    yield header
+
+    # 1 catalog, 2 page tree, 3-4 fonts, 5 info; pages start at 6
+    yield emit(3, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+    yield emit(4, b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>')
+
+    kids = []
+    number = 6
+    for page in pages:
+        content = page.content()
+        yield emit(number, b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content))
+        yield emit(number + 1, (
+            b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+            b'/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>'
+        ) % (PAGE_WIDTH, PAGE_HEIGHT, number))
+        kids.append(number + 1)
+        number += 2
+
+    yield emit(2, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)
+    ))
+    yield emit(1, b'<< /Type /Catalog /Pages 2 0 R >>')
+    yield emit(5, b'<< /Title (%s) /Producer (edvoayge) >>' % escape(title))
+
+    xref = [b'xref\n0 %d\n' % number, b'0000000000 65535 f \n']
+    for object_number in range(1, number):
+        xref.append(b'%010d 00000 n \n' % offsets[object_number])
+    yield b''.join(xref)
+    yield b'trailer\n<< /Size %d /Root 1 0 R /Info 5 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (number, position)
@@ -97,11 +97,11 @@ class PaymentTransactionSerializer(serializers.ModelSerializer):
             'currency_display', 'status', 'status_display', 'related_object_type',
             'related_object_id', 'gateway', 'gateway_transaction_id', 'processing_fee',
             'tax_amount', 'discount_amount', 'total_amount', 'description',
-            'is_successful', 'is_refundable', 'created_at', 'updated_at',
+            'idempotency_key', 'is_successful', 'is_refundable', 'created_at', 'updated_at',
             'processed_at', 'completed_at'
         ]
         read_only_fields = [
-            'id', 'transaction_id', 'user', 'gateway_transaction_id',
+            'id', 'transaction_id', 'user', 'gateway_transaction_id', 'idempotency_key',
             'is_successful', 'is_refundable', 'created_at', 'updated_at',
             'processed_at', 'completed_at'
         ]
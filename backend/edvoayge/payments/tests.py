@@ -1,3 +1,283 @@
-from django.test import TestCase
+"""
+Test cases for payments app.
+"""
 
-# Create your tests here.
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from PyPDF2 import PdfReader
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from .gateways import GatewayError, get_gateway
+from .invoices import InvoicePDFService
+from .models import Invoice, PaymentLog, PaymentTransaction, Subscription
+from .services import BillingSweeper, IdempotencyConflictError, PaymentService, PaymentStateError, add_months
+
+User = get_user_model()
+
+
+class PaymentServiceTest(TestCase):
+    """Test cases for the payment state machine."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='payer', email='payer@example.com', password='testpass123'
+        )
+
+    def create(self, amount='20.00', key=None):
+        return PaymentService.create_transaction(
+            self.user,
+            {'transaction_type': 'course_purchase', 'amount': Decimal(amount), 'currency': 'USD'},
+            idempotency_key=key,
+        ).instance
+
+    def test_idempotency_key_returns_first_transaction(self):
+        """Test a repeated create with the same key returns the original row."""
+        first = PaymentService.create_transaction(
+            self.user, {'transaction_type': 'course_purchase', 'amount': Decimal('20.00')}, 'key-1'
+        )
+        again = PaymentService.create_transaction(
+            self.user, {'transaction_type': 'course_purchase', 'amount': Decimal('20.00')}, 'key-1'
+        )
+
+        self.assertTrue(first.created)
+        self.assertFalse(again.created)
+        self.assertEqual(first.instance.pk, again.instance.pk)
+        with self.assertRaises(IdempotencyConflictError):
+            PaymentService.create_transaction(
+                self.user, {'transaction_type': 'course_purchase', 'amount': Decimal('99.00')}, 'key-1'
+            )
+
+    def test_process_charges_once(self):
+        """Test processing twice calls the gateway once and replays the result."""
+        transaction = self.create()
+        gateway = get_gateway()
+
+        with mock.patch.object(gateway, 'charge', wraps=gateway.charge) as charge:
+            transaction, replayed = PaymentService.process(transaction, actor=self.user)
+            self.assertFalse(replayed)
+            stale = PaymentTransaction.objects.get(pk=transaction.pk)
+            stale.status = 'pending'  # a second request that read the row earlier
+            _, replayed = PaymentService.process(stale, actor=self.user)
+
+        self.assertTrue(replayed)
+        charge.assert_called_once()
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'completed')
+        self.assertTrue(transaction.gateway_transaction_id.startswith('ch_'))
+        self.assertEqual(PaymentLog.objects.filter(transaction=transaction).count(), 2)
+
+    def test_declined_and_unavailable_gateway(self):
+        """Test a decline fails the transaction and an outage leaves it retryable."""
+        with self.settings(PAYMENT_FAKE_DECLINE_AMOUNTS=['13.13']):
+            declined, _ = PaymentService.process(self.create('13.13'))
+        self.assertEqual(declined.status, 'failed')
+        with self.assertRaises(PaymentStateError):
+            PaymentService.process(declined)
+
+        transaction = self.create()
+        with mock.patch.object(get_gateway(), 'charge', side_effect=GatewayError('timeout')):
+            with self.assertRaises(GatewayError):
+                PaymentService.process(transaction)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'pending')
+
+    def test_refunds_update_transaction(self):
+        """Test partial and full refunds move the transaction along."""
+        transaction, _ = PaymentService.process(self.create())
+
+        refund = PaymentService.request_refund(transaction, self.user, amount='5.00', idempotency_key='r1').instance
+        self.assertEqual(PaymentService.request_refund(transaction, self.user, amount='5.00', idempotency_key='r1').instance, refund)
+        PaymentService.process_refund(refund)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'partially_refunded')
+
+        with self.assertRaises(ValueError):
+            PaymentService.request_refund(transaction, self.user, amount='16.00')
+        rest = PaymentService.request_refund(transaction, self.user).instance
+        self.assertEqual(rest.amount, Decimal('15.00'))
+        PaymentService.process_refund(rest)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'refunded')
+
+
+class PaymentTransactionAPITest(TestCase):
+    """Test cases for the transaction endpoints."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='payer', email='payer@example.com', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/v1/payments/api/payments/transactions/'
+
+    def test_create_and_process_with_idempotency_key(self):
+        """Test a retried create returns 200 with the same transaction, which processes once."""
+        payload = {'transaction_type': 'course_purchase', 'amount': '25.00', 'currency': 'USD'}
+        first = self.client.post(self.url, payload, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+        again = self.client.post(self.url, payload, format='json', HTTP_IDEMPOTENCY_KEY='order-1')
+
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(again.status_code, status.HTTP_200_OK)
+        self.assertEqual(first.data['id'], again.data['id'])
+
+        process_url = f"{self.url}{first.data['id']}/process/"
+        self.assertEqual(self.client.post(process_url).data['status'], 'completed')
+        self.assertEqual(self.client.post(process_url).status_code, status.HTTP_200_OK)
+
+        cancel = self.client.post(f"{self.url}{first.data['id']}/cancel/")
+        self.assertEqual(cancel.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class InvoicePDFTest(TestCase):
+    """Test cases for invoice PDF rendering and caching."""
+
+    def setUp(self):
+        """Set up test data."""
+        cache_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_root, ignore_errors=True)
+        self.enterContext(override_settings(INVOICE_PDF_ROOT=cache_root))
+        self.user = User.objects.create_user(
+            username='payer', email='payer@example.com', password='testpass123'
+        )
+        transaction = PaymentTransaction.objects.create(
+            transaction_id='TXN-1', user=self.user, transaction_type='course_purchase',
+            amount=Decimal('40.00'), description='Anatomy course',
+        )
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-0001', user=self.user, transaction=transaction,
+            due_date=timezone.now() + timedelta(days=14), amount=Decimal('40.00'),
+            subtotal=Decimal('40.00'), tax_amount=Decimal('7.20'), total_amount=Decimal('47.20'),
+            items=[{'description': f'Lesson {n}', 'quantity': 1, 'unit_price': '1.00'} for n in range(45)],
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/v1/payments/api/payments/invoices/{self.invoice.pk}/download_pdf/'
+
+    def test_download_streams_then_serves_cache(self):
+        """Test the first download renders and caches, and repeats use the file or a 304."""
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.streaming)
+        pdf = b''.join(first.streaming_content)
+
+        reader = PdfReader(io.BytesIO(pdf))
+        self.assertEqual(len(reader.pages), 2)  # 45 lines at 30 per page
+        self.assertIn('INV-0001', reader.pages[0].extract_text())
+        self.assertIn('47.20', reader.pages[1].extract_text())
+        self.assertTrue(os.path.exists(InvoicePDFService.cache_path(self.invoice)))
+
+        cached = self.client.get(self.url)
+        self.assertEqual(b''.join(cached.streaming_content), pdf)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+
+    def test_change_invalidates_cache(self):
+        """Test editing the invoice renders a new version and drops the old file."""
+        b''.join(self.client.get(self.url).streaming_content)
+        old_path = InvoicePDFService.cache_path(self.invoice)
+
+        self.invoice.status = 'paid'
+        self.invoice.save()
+        b''.join(self.client.get(self.url).streaming_content)
+
+        self.assertNotEqual(InvoicePDFService.cache_path(self.invoice), old_path)
+        self.assertFalse(os.path.exists(old_path))
+
+    def test_prerender_month(self):
+        """Test batch mode renders uncached invoices once."""
+        now = self.invoice.issue_date
+        self.assertEqual(InvoicePDFService.prerender_month(now.year, now.month, workers=0), 1)
+        self.assertEqual(InvoicePDFService.prerender_month(now.year, now.month, workers=0), 0)
+
+
+class BillingSweeperTest(TestCase):
+    """Test cases for subscription renewals, trial conversions and expiry."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(
+            username='subscriber', email='subscriber@example.com', password='testpass123'
+        )
+        self.now = timezone.now()
+
+    def subscribe(self, status='active', amount='9.99', **fields):
+        defaults = {
+            'user': self.user, 'plan_name': 'Pro', 'subscription_type': 'monthly', 'billing_cycle': 'monthly',
+            'status': status, 'amount': Decimal(amount), 'start_date': self.now - timedelta(days=31),
+            'end_date': self.now - timedelta(hours=1), 'next_billing_date': self.now - timedelta(hours=1),
+        }
+        defaults.update(fields)
+        return Subscription.objects.create(**defaults)
+
+    def test_renewal_charges_invoices_and_advances(self):
+        """Test a due subscription is charged once, invoiced and moved to the next period."""
+        subscription = self.subscribe()
+        due = subscription.next_billing_date
+
+        stats = BillingSweeper.run(now=self.now)
+        self.assertEqual((stats['renewed'], stats['invoices']), (1, 1))
+
+        subscription.refresh_from_db()
+        self.assertEqual(subscription.next_billing_date, add_months(due, 1))
+        self.assertEqual(subscription.end_date, add_months(due, 1))
+        invoice = Invoice.objects.get(subscription=subscription)
+        self.assertEqual((invoice.status, invoice.transaction.status), ('paid', 'completed'))
+
+        self.assertEqual(BillingSweeper.run(now=self.now)['renewed'], 0)
+        self.assertEqual(PaymentTransaction.objects.filter(user=self.user).count(), 1)
+
+    def test_rerun_after_crash_does_not_double_charge(self):
+        """Test a sweep interrupted after charging finishes the renewal on the next run."""
+        subscription = self.subscribe()
+        BillingSweeper.charge(subscription, self.now)  # charged, then the worker died
+
+        stats = BillingSweeper.run(now=self.now)
+        self.assertEqual((stats['renewed'], stats['invoices']), (1, 1))
+        self.assertEqual(PaymentTransaction.objects.filter(user=self.user).count(), 1)
+
+    def test_trials_expiry_and_declines(self):
+        """Test trial conversion, expiry of non-renewing plans and suspension on decline."""
+        trial = self.subscribe('trial', trial_end_date=self.now - timedelta(minutes=5), next_billing_date=None)
+        lapsed_trial = self.subscribe('trial', auto_renew=False, trial_end_date=self.now - timedelta(minutes=5))
+        ended = self.subscribe(auto_renew=False)
+        with self.settings(PAYMENT_FAKE_DECLINE_AMOUNTS=['13.13']):
+            declined = self.subscribe(amount='13.13')
+            stats = BillingSweeper.run(now=self.now)
+
+        self.assertEqual((stats['renewed'], stats['expired'], stats['skipped']), (1, 2, 1))
+        statuses = dict(Subscription.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[trial.pk], 'active')
+        self.assertEqual(statuses[lapsed_trial.pk], 'expired')
+        self.assertEqual(statuses[ended.pk], 'expired')
+        self.assertEqual(statuses[declined.pk], 'suspended')
+
+    def test_stale_one_off_charge_is_recovered(self):
+        """Test a non-subscription charge left in processing can be charged again."""
+        transaction = PaymentService.create_transaction(
+            self.user, {'transaction_type': 'course_purchase', 'amount': Decimal('20.00')}
+        ).instance
+        PaymentTransaction.objects.filter(pk=transaction.pk).update(
+            status='processing', processed_at=self.now - timedelta(hours=1)
+        )
+
+        self.assertEqual(BillingSweeper.recover_stale_charges(self.now), 1)
+        transaction.refresh_from_db()
+        self.assertEqual(transaction.status, 'pending')
+        PaymentService.process(transaction, actor=self.user)
+        self.assertEqual(transaction.status, 'completed')
+
+    def test_add_months_clamps_day(self):
+        """Test month arithmetic keeps to the last day of shorter months."""
+        moment = timezone.now().replace(year=2025, month=1, day=31)
+        self.assertEqual(add_months(moment, 1).day, 28)
+        self.assertEqual(add_months(moment, 12).year, 2026)
@@ -33,6 +33,9 @@ from .serializers import (
     PaymentMethodStatsSerializer,
     SubscriptionStatsSerializer,
 )
+from .gateways import GatewayError
+from .invoices import InvoicePDFService
+from .services import IdempotencyConflictError, PaymentService, PaymentStateError
 
 logger = logging.getLogger(__name__)
 
@@ -135,83 +138,65 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
             return PaymentTransactionCreateSerializer
         return PaymentTransactionSerializer
     
+    @staticmethod
+    def get_idempotency_key(request):
+        """Client key from the Idempotency-Key header or the request body"""
+        return request.headers.get('Idempotency-Key') or request.data.get('idempotency_key') or None
+    
+    def create(self, request, *args, **kwargs):
+        """Create a transaction; repeating a request with the same Idempotency-Key returns the first one"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        try:
+            transaction, created = PaymentService.create_transaction(
+                request.user, serializer.validated_data,
+                idempotency_key=self.get_idempotency_key(request)
+            )
+        except IdempotencyConflictError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        
+        data = PaymentTransactionSerializer(transaction, context=self.get_serializer_context()).data
+        return Response(data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+    
     @action(detail=True, methods=['post'])
     def process_payment(self, request, pk=None):
         """Process payment transaction"""
         transaction = self.get_object()
         
-        if transaction.status != 'pending':
+        try:
+            transaction, replayed = PaymentService.process(transaction, actor=request.user)
+        except PaymentStateError as e:
+            code = status.HTTP_409_CONFLICT if e.current_status == 'processing' else status.HTTP_400_BAD_REQUEST
+            return Response({'error': str(e), 'status': e.current_status}, status=code)
+        except GatewayError as e:
+            logger.warning(f"Payment gateway unavailable for {transaction.transaction_id}: {e}")
             return Response(
-                {'error': 'Transaction is not in pending status'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Payment gateway unavailable, please retry'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
-        # Simulate payment processing
-        try:
-            transaction.status = 'processing'
-            transaction.save()
-            
-            # Log the processing attempt
-            PaymentLog.objects.create(
-                transaction=transaction,
-                level='info',
-                message='Payment processing started',
-                details={'user_id': request.user.id}
-            )
-            
-            # Simulate successful payment
-            transaction.status = 'completed'
-            transaction.processed_at = timezone.now()
-            transaction.completed_at = timezone.now()
-            transaction.save()
-            
-            PaymentLog.objects.create(
-                transaction=transaction,
-                level='info',
-                message='Payment completed successfully',
-                details={'user_id': request.user.id}
-            )
-            
-            serializer = self.get_serializer(transaction)
-            return Response(serializer.data)
-            
-        except Exception as e:
-            transaction.status = 'failed'
-            transaction.save()
-            
-            PaymentLog.objects.create(
-                transaction=transaction,
-                level='error',
-                message=f'Payment processing failed: {str(e)}',
-                details={'user_id': request.user.id, 'error': str(e)}
-            )
-            
+        serializer = self.get_serializer(transaction)
+        if transaction.status == 'failed':
             return Response(
-                {'error': 'Payment processing failed'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Payment processing failed', 'transaction': serializer.data},
+                status=status.HTTP_402_PAYMENT_REQUIRED
             )
+        return Response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def cancel_transaction(self, request, pk=None):
         """Cancel pending transaction"""
         transaction = self.get_object()
         
-        if transaction.status not in ['pending', 'processing']:
+        try:
+            PaymentService.cancel(transaction, actor=request.user)
+        except PaymentStateError as e:
             return Response(
-                {'error': 'Transaction cannot be cancelled'},
+                {'error': 'Transaction cannot be cancelled', 'status': e.current_status},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        transaction.status = 'cancelled'
-        transaction.save()
-        
-        PaymentLog.objects.create(
-            transaction=transaction,
-            level='info',
-            message='Transaction cancelled by user',
-            details={'user_id': request.user.id}
-        )
-        
         serializer = self.get_serializer(transaction)
         return Response(serializer.data)
     
@@ -220,33 +205,27 @@ class PaymentTransactionViewSet(viewsets.ModelViewSet):
         """Request refund for transaction"""
         transaction = self.get_object()
         
-        if not transaction.is_refundable:
-            return Response(
-                {'error': 'Transaction is not refundable'},
-                status=status.HTTP_400_BAD_REQUEST
+        try:
+            refund, created = PaymentService.request_refund(
+                transaction,
+                request.user,
+                amount=request.data.get('amount'),
+                reason=request.data.get('reason', 'requested_by_customer'),
+                notes=request.data.get('notes', ''),
+                idempotency_key=self.get_idempotency_key(request),
             )
-        
-        amount = request.data.get('amount', transaction.amount)
-        reason = request.data.get('reason', 'requested_by_customer')
-        notes = request.data.get('notes', '')
-        
-        if amount > transaction.amount:
+        except PaymentStateError:
             return Response(
-                {'error': 'Refund amount cannot exceed transaction amount'},
+                {'error': 'Transaction is not refundable'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        refund = Refund.objects.create(
-            transaction=transaction,
-            user=request.user,
-            amount=amount,
-            currency=transaction.currency,
-            reason=reason,
-            notes=notes
-        )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except IdempotencyConflictError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
         
         serializer = RefundSerializer(refund)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -433,7 +412,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
     
     def get_queryset(self):
-        return Invoice.objects.filter(user=self.request.user)
+        return Invoice.objects.filter(user=self.request.user).select_related('user', 'transaction', 'subscription')
     
     @action(detail=True, methods=['post'])
     def mark_as_paid(self, request, pk=None):
@@ -457,13 +436,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
     def download_pdf(self, request, pk=None):
         """Download invoice as PDF"""
         invoice = self.get_object()
-        
-        # This would generate and return a PDF file
-        # For now, return a placeholder response
-        return Response({
-            'message': 'PDF download functionality would be implemented here',
-            'invoice_number': invoice.invoice_number
-        })
+        return InvoicePDFService.response(invoice, request)
     
     @action(detail=False, methods=['get'])
     def overdue(self, request):
@@ -522,40 +495,25 @@ class RefundViewSet(viewsets.ModelViewSet):
         """Process refund"""
         refund = self.get_object()
         
-        if refund.status != 'pending':
+        try:
+            refund, replayed = PaymentService.process_refund(refund, actor=request.user)
+        except PaymentStateError as e:
+            code = status.HTTP_409_CONFLICT if e.current_status == 'processing' else status.HTTP_400_BAD_REQUEST
+            return Response({'error': 'Refund is not in pending status', 'status': e.current_status}, status=code)
+        except GatewayError as e:
+            logger.warning(f"Payment gateway unavailable for refund {refund.refund_id}: {e}")
             return Response(
-                {'error': 'Refund is not in pending status'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Payment gateway unavailable, please retry'},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
         
-        try:
-            refund.status = 'processing'
-            refund.save()
-            
-            # Simulate refund processing
-            refund.status = 'completed'
-            refund.processed_at = timezone.now()
-            refund.save()
-            
-            # Update transaction status
-            transaction = refund.transaction
-            if refund.amount == transaction.amount:
-                transaction.status = 'refunded'
-            else:
-                transaction.status = 'partially_refunded'
-            transaction.save()
-            
-            serializer = self.get_serializer(refund)
-            return Response(serializer.data)
-            
-        except Exception as e:
-            refund.status = 'failed'
-            refund.save()
-            
+        serializer = self.get_serializer(refund)
+        if refund.status == 'failed':
             return Response(
-                {'error': 'Refund processing failed'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Refund processing failed', 'refund': serializer.data},
+                status=status.HTTP_502_BAD_GATEWAY
             )
+        return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from search.recommendations import RecommendationService
+
+
+class Command(BaseCommand):
+    help = 'Build item similarities and every user\'s recommendations, or refresh stale users'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale', action='store_true', help='Only re-score users with new signals')
+        parser.add_argument('--loop', action='store_true', help='Keep refreshing stale users periodically (implies --stale)')
+        parser.add_argument('--interval', type=int, default=60, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        if not options['stale'] and not options['loop']:
+            stats = RecommendationService.build()
+            self.stdout.write(self.style.SUCCESS(
+                f"Computed {stats['similarities']} similarities for {stats['items']} item(s) and "
+                f"{stats['recommendations']} recommendation(s) for {stats['users']} user(s)"
+            ))
+            return
+
+        while True:
+            close_old_connections()
+            refreshed = RecommendationService.refresh_stale()
+            self.stdout.write(self.style.SUCCESS(f'Refreshed recommendations for {refreshed} user(s)'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
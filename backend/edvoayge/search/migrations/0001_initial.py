@@ -0,0 +1,69 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('courses', '0002_course_facets'),
+        ('universities', '0003_feed'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationState',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='recommendation_state', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('stale_since', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('refreshed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Recommendation State',
+                'verbose_name_plural': 'Recommendation States',
+            },
+        ),
+        migrations.CreateModel(
+            name='ItemSimilarity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('university', 'University'), ('course', 'Course')], max_length=20)),
+                ('item_id', models.BigIntegerField()),
+                ('neighbour_type', models.CharField(choices=[('university', 'University'), ('course', 'Course')], max_length=20)),
+                ('neighbour_id', models.BigIntegerField()),
+                ('score', models.FloatField()),
+            ],
+            options={
+                'verbose_name': 'Item Similarity',
+                'verbose_name_plural': 'Item Similarities',
+                'indexes': [models.Index(fields=['item_type', 'item_id', '-score'], name='similarity_item_idx')],
+                'unique_together': {('item_type', 'item_id', 'neighbour_type', 'neighbour_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_type', models.CharField(choices=[('university', 'University'), ('course', 'Course')], max_length=20)),
+                ('score', models.FloatField()),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('reason', models.CharField(blank=True, help_text="Item the recommendation mostly comes from, or 'popular'", max_length=50)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('course', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='courses.course')),
+                ('university', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='universities.university')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Recommendation',
+                'verbose_name_plural': 'Recommendations',
+                'ordering': ['user', 'item_type', 'rank'],
+                'indexes': [models.Index(fields=['user', 'item_type', 'rank'], name='recommendation_user_rank_idx')],
+            },
+        ),
+    ]
@@ -1,3 +1,73 @@
 from django.db import models
+from django.contrib.auth import get_user_model
 
-# Create your models here.
+User = get_user_model()
+
+ITEM_TYPE_CHOICES = [
+    ('university', 'University'),
+    ('course', 'Course'),
+]
+
+
+class ItemSimilarity(models.Model):
+    """
+    Similarity between two catalogue items, from the last full recommendation build.
+    """
+    item_type = models.CharField(max_length=20, choices=ITEM_TYPE_CHOICES)
+    item_id = models.BigIntegerField()
+    neighbour_type = models.CharField(max_length=20, choices=ITEM_TYPE_CHOICES)
+    neighbour_id = models.BigIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        verbose_name = "Item Similarity"
+        verbose_name_plural = "Item Similarities"
+        unique_together = ['item_type', 'item_id', 'neighbour_type', 'neighbour_id']
+        indexes = [
+            models.Index(fields=['item_type', 'item_id', '-score'], name='similarity_item_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_type}:{self.item_id} ~ {self.neighbour_type}:{self.neighbour_id} ({self.score:.3f})"
+
+
+class Recommendation(models.Model):
+    """
+    A precomputed recommendation, served as is.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='recommendations')
+    item_type = models.CharField(max_length=20, choices=ITEM_TYPE_CHOICES)
+    university = models.ForeignKey('universities.University', on_delete=models.CASCADE, null=True, blank=True,
+                                   related_name='+')
+    course = models.ForeignKey('courses.Course', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    reason = models.CharField(max_length=50, blank=True, help_text="Item the recommendation mostly comes from, or 'popular'")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Recommendation"
+        verbose_name_plural = "Recommendations"
+        ordering = ['user', 'item_type', 'rank']
+        indexes = [
+            models.Index(fields=['user', 'item_type', 'rank'], name='recommendation_user_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.item_type} #{self.rank}"
+
+
+class RecommendationState(models.Model):
+    """
+    When a user's recommendations were computed and whether new signals arrived since.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='recommendation_state')
+    stale_since = models.DateTimeField(null=True, blank=True, db_index=True)
+    refreshed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Recommendation State"
+        verbose_name_plural = "Recommendation States"
+
+    def __str__(self):
+        return f"{self.user_id} - {'stale' if self.stale_since else 'fresh'}"
@@ -0,0 +1,452 @@
+"""
+University and course recommendations.
+
+Signals from favourites, applications and course ratings form a sparse
+user x item matrix, universities and courses sharing one item space. The
+offline build (``build_recommendations``) computes item-item cosine
+similarity from it, keeps the strongest ``RECOMMENDATIONS_NEIGHBOURS``
+neighbours of each item in ``ItemSimilarity`` and scores every user by
+multiplying their profile vector with that similarity matrix. The top
+``RECOMMENDATIONS_TOP_K`` items of each type are stored in ``Recommendation``
+so serving them is a single indexed read.
+
+New favourites, applications and ratings mark the user stale; the user is
+then re-scored against the stored similarities without a full build.
+"""
+
+import heapq
+import logging
+import math
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from applications.models import Application
+from bookmarks.models import FavouriteCourse, FavouriteUniversity
+from courses.models import Course, CourseRating
+from simple_education.models import SimpleEducation
+from universities.models import University
+from .models import ItemSimilarity, Recommendation, RecommendationState
+
+logger = logging.getLogger(__name__)
+
+UNIVERSITY = 'university'
+COURSE = 'course'
+POPULAR = 'popular'
+
+# Users marked stale in this thread's open transaction, and users being
+# re-scored by a background thread of this process
+_pending = threading.local()
+_running = set()
+_running_lock = threading.Lock()
+
+
+def _scoped(queryset, user_ids):
+    return queryset.filter(user_id__in=user_ids) if user_ids is not None else queryset
+
+
+def load_profiles(user_ids=None):
+    """
+    Interaction weights of each user.
+
+    Args:
+        user_ids (iterable, optional): Users to load; all when omitted
+
+    Returns:
+        dict: user id -> {(item type, item id): weight}
+    """
+    weights = RecommendationService.WEIGHTS
+    profiles = defaultdict(lambda: defaultdict(float))
+
+    for user_id, university_id in _scoped(FavouriteUniversity.objects, user_ids).values_list('user_id', 'university_id'):
+        profiles[user_id][(UNIVERSITY, university_id)] += weights['favourite']
+
+    for user_id, university_id in _scoped(Application.objects, user_ids).values_list('user_id', 'university_id'):
+        profiles[user_id][(UNIVERSITY, university_id)] += weights['application']
+
+    # Interest in a course is weaker interest in its university
+    for user_id, course_id, university_id in _scoped(FavouriteCourse.objects, user_ids).values_list(
+        'user_id', 'course_id', 'course__university_id'
+    ):
+        profiles[user_id][(COURSE, course_id)] += weights['favourite']
+        profiles[user_id][(UNIVERSITY, university_id)] += weights['related']
+
+    for user_id, course_id, university_id, rating in _scoped(CourseRating.objects, user_ids).values_list(
+        'user_id', 'course_id', 'course__university_id', 'rating'
+    ):
+        if rating >= 3:
+            profiles[user_id][(COURSE, course_id)] += (rating - 2) * weights['rating']
+            profiles[user_id][(UNIVERSITY, university_id)] += weights['related']
+
+    return profiles
+
+
+def item_similarities(profiles, neighbours, max_profile):
+    """
+    Cosine similarity between items that share users.
+
+    Equivalent to normalizing the columns of the user x item matrix and
+    multiplying it by its transpose, done over the sparse rows: each user
+    adds the products of their item weights to the affected cells only.
+
+    Args:
+        profiles (dict): ``load_profiles`` output
+        neighbours (int): Neighbours kept per item
+        max_profile (int): Strongest items per user taken into account
+
+    Returns:
+        dict: item -> [(neighbour, similarity)] strongest first
+    """
+    norms = defaultdict(float)
+    products = defaultdict(lambda: defaultdict(float))
+    for profile in profiles.values():
+        items = heapq.nlargest(max_profile, profile.items(), key=lambda entry: entry[1])
+        for index, (item, weight) in enumerate(items):
+            norms[item] += weight * weight
+            for other, other_weight in items[index + 1:]:
+                product = weight * other_weight
+                products[item][other] += product
+                products[other][item] += product
+
+    norms = {item: math.sqrt(total) for item, total in norms.items()}
+    return {
+        item: heapq.nlargest(
+            neighbours,
+            ((other, product / (norms[item] * norms[other])) for other, product in row.items()),
+            key=lambda entry: entry[1],
+        )
+        for item, row in products.items()
+    }
+
+
+def score_profile(profile, similarities):
+    """
+    Score unseen items for a user: profile vector x similarity matrix.
+
+    Returns:
+        tuple: (item -> score, item -> the profile item contributing most)
+    """
+    scores = defaultdict(float)
+    strongest = {}
+    for item, weight in profile.items():
+        for neighbour, similarity in similarities.get(item, ()):
+            if neighbour in profile:
+                continue
+            contribution = weight * similarity
+            scores[neighbour] += contribution
+            if contribution > strongest.get(neighbour, (None, 0))[1]:
+                strongest[neighbour] = (item, contribution)
+    return scores, {item: source for item, (source, _) in strongest.items()}
+
+
+class Catalogue:
+    """
+    Item data needed to turn scores into recommendations.
+
+    Args:
+        university_ids (iterable, optional): Candidate universities; all when omitted
+        course_ids (iterable, optional): Candidate courses; all when omitted
+        user_ids (iterable, optional): Users whose GPA is needed; all when omitted
+        popular (int): Popular items of each type to keep for padding
+    """
+
+    def __init__(self, university_ids=None, course_ids=None, user_ids=None, popular=0):
+        universities = University.objects.filter(is_active=True)
+        courses = Course.objects.filter(status='active', university__is_active=True)
+        if university_ids is not None:
+            universities = universities.filter(pk__in=list(university_ids))
+        if course_ids is not None:
+            courses = courses.filter(pk__in=list(course_ids))
+        self.universities = set(universities.values_list('pk', flat=True))
+        self.course_gpa = dict(courses.values_list('pk', 'minimum_gpa'))
+
+        self.gpa = {}
+        education = SimpleEducation.objects.order_by('updated_at')
+        if user_ids is not None:
+            education = education.filter(user_id__in=list(user_ids))
+        for user_id, higher, lower in education.values_list('user_id', 'higher_gpa', 'lower_gpa'):
+            if higher is not None or lower is not None:
+                self.gpa[user_id] = higher if higher is not None else lower
+
+        self.popular = {UNIVERSITY: [], COURSE: []}
+        if popular:
+            self.popular[UNIVERSITY] = [
+                (UNIVERSITY, pk) for pk in University.objects.filter(is_active=True).annotate(
+                    favourites=Count('favourite_universities')
+                ).order_by('-is_featured', '-favourites', '-is_verified', 'pk').values_list('pk', flat=True)[:popular]
+            ]
+            popular_courses = list(Course.objects.filter(status='active', university__is_active=True).annotate(
+                favourites=Count('favourite_courses')
+            ).order_by('-is_popular', '-is_featured', '-favourites', 'pk').values_list('pk', 'minimum_gpa')[:popular])
+            self.popular[COURSE] = [(COURSE, pk) for pk, _ in popular_courses]
+            self.course_gpa.update(popular_courses)
+            self.universities.update(pk for _, pk in self.popular[UNIVERSITY])
+
+    def available(self, item):
+        item_type, pk = item
+        return pk in self.universities if item_type == UNIVERSITY else pk in self.course_gpa
+
+
+class RecommendationService:
+    """
+    Service class for building, refreshing and reading recommendations.
+    """
+
+    # Weight of each signal in a user's profile
+    WEIGHTS = {
+        'application': 4.0,
+        'favourite': 3.0,
+        'rating': 1.0,  # per star above 2
+        'related': 1.0,  # a course's university
+    }
+    GPA_PENALTY = 0.25  # courses asking for a higher GPA than the user has
+
+    @classmethod
+    def top_k(cls):
+        return getattr(settings, 'RECOMMENDATIONS_TOP_K', 20)
+
+    @classmethod
+    def rank_items(cls, user_id, profile, similarities, catalogue):
+        """
+        Best unseen items of each type for a user, padded with popular ones.
+
+        Returns:
+            list: Unsaved ``Recommendation`` instances
+        """
+        scores, sources = score_profile(profile, similarities)
+        gpa = catalogue.gpa.get(user_id)
+        ranked = {UNIVERSITY: [], COURSE: []}
+        for item, score in scores.items():
+            if not catalogue.available(item):
+                continue
+            if item[0] == COURSE and gpa is not None:
+                minimum = catalogue.course_gpa.get(item[1])
+                if minimum is not None and minimum > gpa:
+                    score *= cls.GPA_PENALTY
+            ranked[item[0]].append((score, item))
+
+        limit = cls.top_k()
+        rows = []
+        for item_type, candidates in ranked.items():
+            best = heapq.nlargest(limit, candidates)
+            chosen = {item for _, item in best}
+            for item in catalogue.popular[item_type]:
+                if len(best) >= limit:
+                    break
+                if item not in chosen and item not in profile:
+                    best.append((0.0, item))
+                    chosen.add(item)
+            for rank, (score, item) in enumerate(best, start=1):
+                source = sources.get(item)
+                rows.append(Recommendation(
+                    user_id=user_id,
+                    item_type=item_type,
+                    university_id=item[1] if item_type == UNIVERSITY else None,
+                    course_id=item[1] if item_type == COURSE else None,
+                    score=round(score, 6),
+                    rank=rank,
+                    reason=f'{source[0]}:{source[1]}' if source else POPULAR,
+                ))
+        return rows
+
+    @staticmethod
+    def replace(user_ids, rows):
+        """Swap the stored recommendations of some users in one transaction"""
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=user_ids).delete()
+            Recommendation.objects.bulk_create(rows, batch_size=1000)
+
+    @classmethod
+    def build(cls):
+        """
+        Full offline build: similarities and every user's recommendations.
+
+        Returns:
+            dict: Counts of items, similarity rows, users and recommendations
+        """
+        started = timezone.now()
+        profiles = load_profiles()
+        similarities = item_similarities(
+            profiles,
+            neighbours=getattr(settings, 'RECOMMENDATIONS_NEIGHBOURS', 50),
+            max_profile=getattr(settings, 'RECOMMENDATIONS_MAX_PROFILE', 200),
+        )
+
+        similarity_rows = [
+            ItemSimilarity(item_type=item[0], item_id=item[1],
+                           neighbour_type=neighbour[0], neighbour_id=neighbour[1], score=score)
+            for item, neighbours in similarities.items()
+            for neighbour, score in neighbours
+        ]
+        with transaction.atomic():
+            ItemSimilarity.objects.all().delete()
+            ItemSimilarity.objects.bulk_create(similarity_rows, batch_size=1000)
+
+        catalogue = Catalogue(popular=cls.top_k())
+        # Users scored before whose signals are gone get popular items
+        user_ids = sorted(set(profiles) | set(RecommendationState.objects.values_list('user_id', flat=True)))
+        chunk = getattr(settings, 'RECOMMENDATIONS_CHUNK_SIZE', 500)
+        recommendations = 0
+        for start in range(0, len(user_ids), chunk):
+            batch = user_ids[start:start + chunk]
+            rows = [row for user_id in batch for row in cls.rank_items(user_id, profiles[user_id], similarities, catalogue)]
+            cls.replace(batch, rows)
+            recommendations += len(rows)
+            RecommendationState.objects.bulk_create(
+                [RecommendationState(user_id=user_id, refreshed_at=started) for user_id in batch],
+                update_conflicts=True, unique_fields=['user'], update_fields=['refreshed_at'],
+            )
+            # Signals that arrived while this build ran keep the user stale
+            RecommendationState.objects.filter(user_id__in=batch, stale_since__lt=started).update(stale_since=None)
+
+        stats = {
+            'items': len(similarities),
+            'similarities': len(similarity_rows),
+            'users': len(user_ids),
+            'recommendations': recommendations,
+        }
+        logger.info(f"Built recommendations: {stats}")
+        return stats
+
+    @classmethod
+    def refresh_user(cls, user_id):
+        """
+        Re-score one user against the stored similarities.
+
+        Returns:
+            int: Number of recommendations stored
+        """
+        seen = RecommendationState.objects.filter(user_id=user_id).values_list('stale_since', flat=True).first()
+        profile = load_profiles([user_id]).get(user_id, {})
+
+        similarities = defaultdict(list)
+        if profile:
+            universities = [pk for item_type, pk in profile if item_type == UNIVERSITY]
+            courses = [pk for item_type, pk in profile if item_type == COURSE]
+            for row in ItemSimilarity.objects.filter(
+                Q(item_type=UNIVERSITY, item_id__in=universities) | Q(item_type=COURSE, item_id__in=courses)
+            ).values_list('item_type', 'item_id', 'neighbour_type', 'neighbour_id', 'score'):
+                similarities[(row[0], row[1])].append(((row[2], row[3]), row[4]))
+
+        candidates = {neighbour for neighbours in similarities.values() for neighbour, _ in neighbours}
+        catalogue = Catalogue(
+            university_ids=[pk for item_type, pk in candidates if item_type == UNIVERSITY],
+            course_ids=[pk for item_type, pk in candidates if item_type == COURSE],
+            user_ids=[user_id],
+            popular=cls.top_k(),
+        )
+        rows = cls.rank_items(user_id, profile, similarities, catalogue)
+        cls.replace([user_id], rows)
+
+        now = timezone.now()
+        if not RecommendationState.objects.filter(user_id=user_id, stale_since=seen).update(
+            stale_since=None, refreshed_at=now
+        ):
+            RecommendationState.objects.get_or_create(user_id=user_id, defaults={'refreshed_at': now})
+        return len(rows)
+
+    @classmethod
+    def _run_in_thread(cls, user_id):
+        try:
+            cls.refresh_user(user_id)
+        except Exception as e:
+            logger.error(f"Error refreshing recommendations for user {user_id}: {e}")
+        finally:
+            with _running_lock:
+                _running.discard(user_id)
+            connection.close()
+
+    @classmethod
+    def _start_refresh(cls, user_id):
+        """Re-score a user on a background thread unless one is already running"""
+        with _running_lock:
+            if user_id in _running:
+                # The running refresh only clears stale_since if it saw this change
+                return
+            _running.add(user_id)
+        threading.Thread(
+            target=cls._run_in_thread, args=(user_id,), name=f'recommendations-{user_id}', daemon=True,
+        ).start()
+
+    @staticmethod
+    def _pending_users():
+        """
+        Users already marked stale in the open transaction.
+
+        The set is tied to the transaction's on_commit queue, which is
+        replaced on commit or rollback, so it never outlives the transaction.
+        """
+        queue = connection.run_on_commit
+        if getattr(_pending, 'queue', None) is not queue:
+            _pending.queue, _pending.users = queue, set()
+        return _pending.users
+
+    @classmethod
+    def mark_stale(cls, user_id):
+        """
+        Record a new signal for a user and re-score them once it is committed.
+
+        Marks within one transaction are coalesced, so removing many
+        favourites at once re-scores the user once. With
+        ``RECOMMENDATIONS_ASYNC`` disabled the user is re-scored before
+        returning. Users whose refresh never ran are picked up by
+        ``build_recommendations --stale``. Users that no longer exist are
+        ignored.
+        """
+        pending = cls._pending_users() if connection.in_atomic_block else set()
+        if user_id in pending:
+            return
+        if not User.objects.filter(pk=user_id).exists():
+            return
+        RecommendationState.objects.update_or_create(user_id=user_id, defaults={'stale_since': timezone.now()})
+        pending.add(user_id)
+
+        def refresh():
+            pending.discard(user_id)
+            if not User.objects.filter(pk=user_id).exists():
+                return
+            if getattr(settings, 'RECOMMENDATIONS_ASYNC', True):
+                cls._start_refresh(user_id)
+            else:
+                cls.refresh_user(user_id)
+
+        transaction.on_commit(refresh)
+
+    @classmethod
+    def refresh_stale(cls, limit=None):
+        """
+        Re-score users with signals newer than their recommendations.
+
+        Returns:
+            int: Number of users refreshed
+        """
+        user_ids = RecommendationState.objects.filter(stale_since__isnull=False).order_by(
+            'stale_since'
+        ).values_list('user_id', flat=True)
+        refreshed = 0
+        for user_id in list(user_ids[:limit] if limit else user_ids):
+            try:
+                cls.refresh_user(user_id)
+                refreshed += 1
+            except Exception as e:
+                logger.error(f"Error refreshing recommendations for user {user_id}: {e}")
+        return refreshed
+
+    @classmethod
+    def for_user(cls, user, item_type, limit=None):
+        """
+        Stored recommendations of one type, best first.
+
+        Users that were never scored are scored on this first read.
+        """
+        limit = min(limit or cls.top_k(), cls.top_k())
+        related = 'university' if item_type == UNIVERSITY else 'course__university'
+        queryset = Recommendation.objects.filter(user=user, item_type=item_type).select_related(related)
+        recommendations = list(queryset.order_by('rank')[:limit])
+        if not recommendations and not RecommendationState.objects.filter(user=user).exists():
+            cls.refresh_user(user.pk)
+            recommendations = list(queryset.order_by('rank')[:limit])
+        return recommendations
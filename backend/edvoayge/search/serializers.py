@@ -0,0 +1,34 @@
+from rest_framework import serializers
+from courses.models import Course
+from universities.serializers import UniversitySerializer
+from .models import Recommendation
+
+
+class RecommendedCourseSerializer(serializers.ModelSerializer):
+    """Compact course representation for recommendation lists."""
+
+    university_name = serializers.CharField(source='university.name', read_only=True)
+    university_country = serializers.CharField(source='university.country', read_only=True)
+
+    class Meta:
+        model = Course
+        fields = [
+            'id', 'name', 'code', 'short_description', 'university_name', 'university_country',
+            'level', 'duration', 'tuition_fee', 'currency', 'minimum_gpa', 'is_featured', 'is_popular', 'image',
+        ]
+
+
+class RecommendationSerializer(serializers.ModelSerializer):
+    """Serializer for precomputed recommendations."""
+
+    university = UniversitySerializer(read_only=True, fields=UniversitySerializer.LIST_FIELDS)
+    course = RecommendedCourseSerializer(read_only=True)
+
+    class Meta:
+        model = Recommendation
+        fields = ['item_type', 'rank', 'score', 'reason', 'university', 'course']
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data.pop('course' if instance.item_type == 'university' else 'university')
+        return data
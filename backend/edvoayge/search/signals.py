@@ -0,0 +1,40 @@
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from applications.models import Application
+from bookmarks.models import FavouriteCourse, FavouriteUniversity
+from bookmarks.signals import favourites_changed
+from courses.models import CourseRating
+from .recommendations import RecommendationService
+
+
+@receiver(post_save, sender=FavouriteUniversity)
+@receiver(post_save, sender=FavouriteCourse)
+@receiver(post_save, sender=Application)
+def refresh_on_new_signal(sender, instance, created, **kwargs):
+    """Re-score a user after a new favourite or application"""
+    if created:
+        RecommendationService.mark_stale(instance.user_id)
+
+
+@receiver(post_save, sender=CourseRating)
+@receiver(post_delete, sender=CourseRating)
+@receiver(post_delete, sender=FavouriteUniversity)
+@receiver(post_delete, sender=FavouriteCourse)
+@receiver(post_delete, sender=Application)
+def refresh_on_changed_signal(sender, instance, **kwargs):
+    """Re-score a user after a rating changes or a signal is removed"""
+    origin = kwargs.get('origin')
+    if origin is not None and not (
+        isinstance(origin, sender) or (isinstance(origin, QuerySet) and origin.model is sender)
+    ):
+        # Removed with its user (or another parent); there is nobody left to re-score
+        return
+    RecommendationService.mark_stale(instance.user_id)
+
+
+@receiver(favourites_changed)
+def refresh_on_bulk_favourites(sender, user_id, added, **kwargs):
+    """FavouriteService adds favourites with bulk_create, which sends no post_save"""
+    if added:
+        RecommendationService.mark_stale(user_id)
@@ -1,3 +1,154 @@
-from django.test import TestCase
+"""
+Test cases for search app.
+"""
 
-# Create your tests here.
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+from applications.models import Application
+from bookmarks.models import FavouriteCourse, FavouriteUniversity
+from courses.models import Course
+from simple_education.models import SimpleEducation
+from universities.models import University, UniversityProgram
+from .models import ItemSimilarity, Recommendation, RecommendationState
+from . import recommendations
+from .recommendations import RecommendationService
+
+User = get_user_model()
+
+
+@override_settings(RECOMMENDATIONS_ASYNC=False, RECOMMENDATIONS_TOP_K=3)
+class RecommendationTest(TestCase):
+    """Test cases for building and serving recommendations."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.universities = [
+            University.objects.create(name=f'University {n}', slug=f'university-{n}', country='Germany',
+                                      city='Berlin', university_type='public')
+            for n in range(4)
+        ]
+        self.courses = [
+            Course.objects.create(name=f'Course {n}', code=f'C{n}', description='Course',
+                                  university=self.universities[n], tuition_fee=Decimal('1000'),
+                                  minimum_gpa=Decimal('3.50') if n == 2 else None)
+            for n in range(3)
+        ]
+        self.users = [User.objects.create_user(username=f'student{n}', password='testpass123') for n in range(4)]
+        self.student = self.users[0]
+
+        # Everyone who likes university 0 also likes university 1; most like course 2
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users[1:]:
+                FavouriteUniversity.objects.create(user=user, university=self.universities[0])
+                FavouriteUniversity.objects.create(user=user, university=self.universities[1])
+            for user in self.users[1:3]:
+                FavouriteCourse.objects.create(user=user, course=self.courses[2])
+            FavouriteUniversity.objects.create(user=self.users[3], university=self.universities[3])
+            FavouriteUniversity.objects.create(user=self.student, university=self.universities[0])
+
+    def recommended(self, user, item_type='university'):
+        field = 'university_id' if item_type == 'university' else 'course_id'
+        return list(Recommendation.objects.filter(user=user, item_type=item_type).order_by('rank')
+                    .values_list(field, 'reason'))
+
+    def test_build_scores_co_favourited_items(self):
+        """Test items liked by similar users come first and say why."""
+        stats = RecommendationService.build()
+        self.assertEqual(stats['users'], 4)
+        self.assertTrue(ItemSimilarity.objects.filter(item_type='university', item_id=self.universities[0].pk).exists())
+
+        universities = self.recommended(self.student)
+        self.assertEqual(universities[0], (self.universities[1].pk, f'university:{self.universities[0].pk}'))
+        # University 2 through its course, university 3 through a single shared user
+        self.assertEqual([pk for pk, _ in universities[1:]], [self.universities[2].pk, self.universities[3].pk])
+        self.assertNotIn(self.universities[0].pk, [pk for pk, _ in universities])
+        self.assertEqual(self.recommended(self.student, 'course')[0][0], self.courses[2].pk)
+
+    def test_gpa_lowers_courses_out_of_reach(self):
+        """Test a course asking for a higher GPA than the student has drops below others."""
+        SimpleEducation.objects.create(user=self.student, higher_gpa=Decimal('2.80'))
+        FavouriteCourse.objects.create(user=self.users[1], course=self.courses[1])
+        RecommendationService.build()
+
+        scores = dict(Recommendation.objects.filter(user=self.student, item_type='course')
+                      .values_list('course_id', 'score'))
+        self.assertLess(scores[self.courses[2].pk], scores[self.courses[1].pk])
+
+    def test_new_signal_refreshes_only_that_user(self):
+        """Test a new application re-scores the applicant against the stored similarities."""
+        RecommendationService.build()
+        other_before = self.recommended(self.users[2])
+        program = UniversityProgram.objects.create(university=self.universities[1], name='Medicine',
+                                                   program_level='undergraduate', program_type='full_time',
+                                                   duration_years=5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Application.objects.create(user=self.student, university=self.universities[1], program=program,
+                                       intended_start_date=date(2026, 9, 1), intended_start_semester='Fall',
+                                       academic_year='2026')
+
+        self.assertNotIn(self.universities[1].pk, [pk for pk, _ in self.recommended(self.student)])
+        self.assertIsNone(RecommendationState.objects.get(user=self.student).stale_since)
+        self.assertEqual(self.recommended(self.users[2]), other_before)
+
+    def test_endpoint_is_a_single_read(self):
+        """Test serving reads the precomputed table, scoring new users on first read."""
+        client = APIClient()
+        newcomer = User.objects.create_user(username='newcomer', password='testpass123')
+        client.force_authenticate(newcomer)
+        url = '/api/v1/search/recommendations/'
+
+        cold = client.get(url).data['data']
+        self.assertEqual(len(cold), 3)
+        self.assertEqual(cold[0]['reason'], 'popular')
+
+        RecommendationService.build()
+        client.force_authenticate(self.student)
+        with self.assertNumQueries(1):
+            data = client.get(url, {'type': 'course'}).data
+        self.assertEqual(data['data'][0]['course']['id'], self.courses[2].pk)
+        self.assertNotIn('university', data['data'][0])
+        self.assertEqual(client.get(url, {'type': 'program'}).status_code, 400)
+
+
+    def test_marks_are_coalesced_per_transaction(self):
+        """Test removing many favourites at once re-scores the user once."""
+        FavouriteUniversity.objects.bulk_create(
+            FavouriteUniversity(user=self.student, university=university) for university in self.universities[1:]
+        )
+        with mock.patch.object(RecommendationService, 'refresh_user') as refresh_user:
+            with self.captureOnCommitCallbacks(execute=True):
+                FavouriteUniversity.objects.filter(user=self.student).delete()
+                with self.assertNumQueries(0):
+                    RecommendationService.mark_stale(self.student.pk)
+        refresh_user.assert_called_once_with(self.student.pk)
+
+    def test_running_refresh_is_not_started_again(self):
+        """Test a user already being re-scored in the background gets no second thread."""
+        self.addCleanup(recommendations._running.discard, self.student.pk)
+        with mock.patch('search.recommendations.threading.Thread') as thread:
+            RecommendationService._start_refresh(self.student.pk)
+            RecommendationService._start_refresh(self.student.pk)
+        thread.assert_called_once()
+
+
+@override_settings(RECOMMENDATIONS_ASYNC=False)
+class RecommendationCascadeTest(TransactionTestCase):
+    """Test cases for recommendation signals while a user is deleted."""
+
+    def test_deleting_a_user_with_signals(self):
+        """Test the cascade does not mark the departing user stale again."""
+        user = User.objects.create_user(username='leaving', password='testpass123')
+        university = University.objects.create(name='University', slug='university', country='Germany',
+                                               city='Berlin', university_type='public')
+        FavouriteUniversity.objects.create(user=user, university=university)
+        user_id = user.pk
+
+        user.delete()
+
+        self.assertFalse(RecommendationState.objects.filter(user_id=user_id).exists())
+        self.assertFalse(User.objects.filter(pk=user_id).exists())
@@ -1,3 +1,42 @@
-from django.shortcuts import render
+import logging
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .recommendations import COURSE, UNIVERSITY, RecommendationService
+from .serializers import RecommendationSerializer
 
-# Create your views here.
+logger = logging.getLogger(__name__)
+
+
+class RecommendationView(APIView):
+    """
+    Personalized universities or courses for the current user.
+
+    Query parameters: ``type`` (``university`` or ``course``, default
+    ``university``) and ``limit``.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        item_type = request.query_params.get('type', UNIVERSITY)
+        if item_type not in (UNIVERSITY, COURSE):
+            return Response(
+                {'success': False, 'message': "type must be 'university' or 'course'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            limit = int(request.query_params.get('limit', 0)) or None
+        except ValueError:
+            limit = None
+
+        try:
+            recommendations = RecommendationService.for_user(request.user, item_type, limit=limit)
+            serializer = RecommendationSerializer(recommendations, many=True, context={'request': request})
+            return Response({'success': True, 'data': serializer.data, 'count': len(serializer.data)})
+        except Exception as e:
+            logger.error(f"Error reading recommendations for user {request.user.pk}: {e}")
+            return Response(
+                {'success': False, 'message': 'Error retrieving recommendations'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
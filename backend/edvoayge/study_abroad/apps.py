@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class StudyAbroadConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'study_abroad'
+
+    def ready(self):
+        from edvoayge.response_cache import invalidate_on_change
+        from .models import StudyAbroadProgram, StudyAbroadApplication, StudyAbroadExperience
+        invalidate_on_change('study_abroad', StudyAbroadProgram, StudyAbroadApplication, StudyAbroadExperience)
@@ -9,6 +9,7 @@ from django.utils import timezone
 from django.contrib.auth import get_user_model
 import logging
 
+from edvoayge.response_cache import cached_response
 from .models import (
     StudyAbroadProgram, StudyAbroadApplication, StudyAbroadExperience,
     StudyAbroadResource, StudyAbroadEvent, StudyAbroadEventRegistration
@@ -40,6 +41,7 @@ class StudyAbroadProgramViewSet(viewsets.ModelViewSet):
         return StudyAbroadProgramSerializer
 
     @action(detail=False, methods=['get'])
+    @cached_response('study_abroad')
     def active_programs(self, request):
         """Get only active programs"""
         try:
@@ -55,6 +57,7 @@ class StudyAbroadProgramViewSet(viewsets.ModelViewSet):
             )
 
     @action(detail=False, methods=['get'])
+    @cached_response('study_abroad')
     def featured_programs(self, request):
         """Get featured programs"""
         try:
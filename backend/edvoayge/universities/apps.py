@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class UniversitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'universities'
+
+    def ready(self):
+        from edvoayge.images import generate_on_upload
+        from edvoayge.response_cache import invalidate_on_change
+        from .models import (
+            University, Campus, UniversityRanking, UniversityProgram, UniversityFaculty,
+            UniversityResearch, UniversityPartnership, UniversityGallery, Feed
+        )
+        generate_on_upload(University, 'logo', 'banner_image')
+        generate_on_upload(UniversityGallery, *[f'image{i}' for i in range(1, 7)])
+        generate_on_upload(Feed, 'profile_image')
+        invalidate_on_change(
+            'universities', University, Campus, UniversityRanking, UniversityProgram, UniversityFaculty,
+            UniversityResearch, UniversityPartnership, UniversityGallery, Feed
+        )
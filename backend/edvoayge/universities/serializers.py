@@ -3,7 +3,10 @@ University serializers for EdVoyage API.
 Handles data serialization for university-related endpoints.
 """
 
+from django.db.models import Prefetch
 from rest_framework import serializers
+from edvoayge.images import ImageVariantsField
+from edvoayge.serializers import FieldSelectionMixin
 from .models import (
     University, Campus, UniversityRanking, UniversityProgram,
     UniversityFaculty, UniversityResearch, UniversityPartnership, UniversityGallery , Feed
@@ -19,6 +22,7 @@ class FeedSerializer(serializers.ModelSerializer):
     university_name = serializers.CharField(source="university.name", read_only=True)
     time_ago = serializers.ReadOnlyField()
     profile_image_url = serializers.SerializerMethodField()
+    profile_image_variants = ImageVariantsField(source="profile_image")
 
     class Meta:
         model = Feed
@@ -28,6 +32,7 @@ class FeedSerializer(serializers.ModelSerializer):
             "university_name",
             "user_name",
             "profile_image_url",
+            "profile_image_variants",
             "title",
             "description",
             "created_at",
@@ -52,13 +57,21 @@ class UniversityGallerySerializer(serializers.ModelSerializer):
     image4_url = serializers.SerializerMethodField()
     image5_url = serializers.SerializerMethodField()
     image6_url = serializers.SerializerMethodField()
+    # Resized copies of each image keyed by size name
+    image1_variants = ImageVariantsField(source='image1')
+    image2_variants = ImageVariantsField(source='image2')
+    image3_variants = ImageVariantsField(source='image3')
+    image4_variants = ImageVariantsField(source='image4')
+    image5_variants = ImageVariantsField(source='image5')
+    image6_variants = ImageVariantsField(source='image6')
     
     class Meta:
         model = UniversityGallery
         fields = [
             'id', 'university_name', 'image1', 'image1_url', 'image2', 'image2_url',
             'image3', 'image3_url', 'image4', 'image4_url', 'image5', 'image5_url',
-            'image6', 'image6_url', 'created_at', 'updated_at'
+            'image6', 'image6_url', 'image1_variants', 'image2_variants', 'image3_variants',
+            'image4_variants', 'image5_variants', 'image6_variants', 'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'university_name', 'image1_url', 'image2_url', 'image3_url',
@@ -257,8 +270,30 @@ class UniversityPartnershipSerializer(serializers.ModelSerializer):
         return data
 
 
-class UniversitySerializer(serializers.ModelSerializer):
-    """Serializer for university information."""
+def recent_feeds_prefetch():
+    """Latest feeds of every university in one windowed query"""
+    return Prefetch(
+        'feeds',
+        queryset=Feed.objects.order_by('-created_at')[:UniversitySerializer.FEED_LIMIT],
+        to_attr='recent_feeds',
+    )
+
+
+class UniversitySerializer(FieldSelectionMixin, serializers.ModelSerializer):
+    """
+    Serializer for university information.
+
+    Nested relations are only rendered when expanded (``?expand=``); list
+    endpoints render ``LIST_FIELDS`` unless ``?fields=`` says otherwise.
+    """
+
+    FEED_LIMIT = 5
+
+    # Compact representation for list screens
+    LIST_FIELDS = [
+        'id', 'name', 'short_name', 'slug', 'university_type', 'country', 'state', 'city',
+        'logo_url', 'logo_variants', 'total_students', 'is_featured', 'is_verified',
+    ]
     
     campuses = CampusSerializer(many=True, read_only=True)
     rankings = UniversityRankingSerializer(many=True, read_only=True)
@@ -272,6 +307,8 @@ class UniversitySerializer(serializers.ModelSerializer):
     international_student_percentage = serializers.ReadOnlyField()
     logo_url = serializers.SerializerMethodField()
     banner_image_url = serializers.SerializerMethodField()
+    logo_variants = ImageVariantsField(source='logo')
+    banner_image_variants = ImageVariantsField(source='banner_image')
     
     class Meta:
         model = University
@@ -279,7 +316,8 @@ class UniversitySerializer(serializers.ModelSerializer):
             'id', 'name', 'short_name', 'slug', 'description', 'mission_statement',
             'vision_statement', 'university_type', 'founded_year', 'accreditation',
             'website', 'email', 'phone', 'country', 'state', 'city', 'address',
-            'postal_code', 'logo', 'logo_url', 'banner_image', 'banner_image_url', 'gallery', 'total_students',
+            'postal_code', 'logo', 'logo_url', 'logo_variants', 'banner_image', 'banner_image_url',
+            'banner_image_variants', 'gallery', 'total_students',
             'international_students', 'faculty_count', 'is_active', 'is_featured',
             'is_verified', 'age', 'international_student_percentage', 'campuses',
             'rankings', 'programs', 'faculties', 'research', 'partnerships',
@@ -290,6 +328,19 @@ class UniversitySerializer(serializers.ModelSerializer):
             'rankings', 'programs', 'faculties', 'research', 'partnerships',
             'gallery', 'feed', 'created_at', 'updated_at'
         ]
+        expandable_fields = [
+            'campuses', 'rankings', 'programs', 'faculties', 'research', 'partnerships', 'gallery', 'feed'
+        ]
+        prefetch_fields = {
+            'campuses': 'campuses',
+            'rankings': 'rankings',
+            'programs': 'programs',
+            'faculties': 'faculties',
+            'research': 'research',
+            'partnerships': 'partnerships',
+            'feed': recent_feeds_prefetch,
+        }
+        select_fields = {'gallery': 'gallery'}
     
     def validate_founded_year(self, value):
         """Validate founded year is reasonable."""
@@ -307,7 +358,9 @@ class UniversitySerializer(serializers.ModelSerializer):
 
     def get_feed(self, obj):
         """Get feeds directly linked to this university."""
-        feeds = obj.feeds.all().order_by("-created_at")[:5]
+        feeds = getattr(obj, 'recent_feeds', None)
+        if feeds is None:
+            feeds = obj.feeds.all().order_by("-created_at")[:self.FEED_LIMIT]
         return FeedSerializer(feeds, many=True, context=self.context).data
 
     def get_logo_url(self, obj):
@@ -516,4 +569,5 @@ class UniversityComparisonSerializer(serializers.Serializer):
     comparison_data = serializers.DictField()
     ranking_comparison = serializers.ListField()
     program_comparison = serializers.ListField()
-    cost_comparison = serializers.ListField() 
\ No newline at end of file
+    cost_comparison = serializers.ListField()
+    matrix = serializers.DictField() 
\ No newline at end of file
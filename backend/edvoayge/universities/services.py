@@ -0,0 +1,268 @@
+"""
+University services.
+
+``UniversityComparisonService`` compares N universities side by side. All the
+data is gathered in a fixed number of grouped queries (universities,
+rankings, program counts, course counts and tuition statistics), whatever N
+is, and the comparison matrix is then built a metric row at a time across
+every university column.
+"""
+
+import logging
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Avg, Count, F, Max, Min
+from courses.models import Course
+from .models import University, UniversityProgram, UniversityRanking
+from .serializers import UniversitySerializer
+
+logger = logging.getLogger(__name__)
+
+
+class UniversityComparisonService:
+    """
+    Service class for comparing universities.
+    """
+
+    # Direction of a metric: 1 higher is better, -1 lower is better,
+    # 0 informational only (not scored)
+    STUDENT_METRICS = [
+        ('total_students', 'Total students', 0),
+        ('international_students', 'International students', 0),
+        ('international_student_percentage', 'International students (%)', 1),
+        ('faculty_count', 'Faculty', 1),
+        ('students_per_faculty', 'Students per faculty member', -1),
+        ('age', 'Age (years)', 0),
+    ]
+
+    FEE_COMPONENTS = [
+        'tuition_fee', 'accommodation_fee', 'meal_plan_fee', 'transportation_fee',
+        'health_insurance_fee', 'books_materials_fee', 'other_fees',
+    ]
+
+    @staticmethod
+    def max_universities():
+        return getattr(settings, 'UNIVERSITY_COMPARE_MAX', 10)
+
+    @staticmethod
+    def _round(value):
+        if value is None:
+            return None
+        return Decimal(value).quantize(Decimal('0.01'))
+
+    @classmethod
+    def load(cls, university_ids):
+        """
+        Fetch everything a comparison needs.
+
+        Args:
+            university_ids (list): University ids, in display order
+
+        Returns:
+            dict: Universities and grouped ranking, program and course rows
+
+        Raises:
+            University.DoesNotExist: If any id is unknown
+        """
+        universities = {university.id: university for university in University.objects.filter(id__in=university_ids)}
+        missing = [pk for pk in university_ids if pk not in universities]
+        if missing:
+            raise University.DoesNotExist(f"Universities not found: {missing}")
+
+        rankings = UniversityRanking.objects.filter(university_id__in=university_ids).order_by(
+            'university_id', 'ranking_type', '-year', 'rank'
+        ).values('university_id', 'ranking_type', 'ranking_source', 'rank', 'total_institutions', 'score', 'year')
+
+        programs = UniversityProgram.objects.filter(
+            university_id__in=university_ids, is_active=True
+        ).values('university_id', 'program_level').annotate(count=Count('id')).order_by()
+
+        courses = Course.objects.filter(
+            university_id__in=university_ids, status='active'
+        ).values('university_id', 'level').annotate(count=Count('id')).order_by()
+
+        total_fees = sum((F(f'fee_structure__{name}') for name in cls.FEE_COMPONENTS[1:]),
+                         F('fee_structure__tuition_fee'))
+        tuition = Course.objects.filter(
+            university_id__in=university_ids, status='active'
+        ).values('university_id', 'currency').annotate(
+            courses=Count('id'),
+            min_tuition=Min('tuition_fee'),
+            max_tuition=Max('tuition_fee'),
+            avg_tuition=Avg('tuition_fee'),
+            avg_total_fees=Avg(total_fees),
+        ).order_by()
+
+        return {
+            'universities': [universities[pk] for pk in university_ids],
+            'rankings': list(rankings),
+            'programs': list(programs),
+            'courses': list(courses),
+            'tuition': list(tuition),
+        }
+
+    @staticmethod
+    def student_metrics(university):
+        students, faculty = university.total_students, university.faculty_count
+        percentage = university.international_student_percentage
+        return {
+            'total_students': students,
+            'international_students': university.international_students,
+            'international_student_percentage': round(percentage, 2) if percentage is not None else None,
+            'faculty_count': faculty,
+            'students_per_faculty': round(students / faculty, 2) if students and faculty else None,
+            'age': university.age,
+        }
+
+    @staticmethod
+    def score_row(values, direction):
+        """
+        Normalize one metric across universities to 0..1, 1 being the best.
+
+        Returns:
+            list: Score per university, None where the value is missing
+        """
+        present = [float(value) for value in values if value is not None]
+        if not direction or not present:
+            return [None] * len(values)
+        low, high = min(present), max(present)
+        spread = high - low
+        scores = []
+        for value in values:
+            if value is None:
+                scores.append(None)
+            elif not spread:
+                scores.append(1.0)
+            elif direction > 0:
+                scores.append(round((float(value) - low) / spread, 4))
+            else:
+                scores.append(round((high - float(value)) / spread, 4))
+        return scores
+
+    @classmethod
+    def build_matrix(cls, ids, columns):
+        """
+        Comparison matrix from per-university metric columns.
+
+        Args:
+            ids (list): University ids, one per column
+            columns (list): ``(metric, label, direction, values)`` tuples,
+                ``values`` holding one entry per university
+
+        Returns:
+            dict: ``universities`` (column ids), ``rows`` and per-university
+            ``overall_scores``
+        """
+        rows = []
+        totals, counts = [0.0] * len(ids), [0] * len(ids)
+        for metric, label, direction, values in columns:
+            scores = cls.score_row(values, direction)
+            for index, score in enumerate(scores):
+                if score is not None:
+                    totals[index] += score
+                    counts[index] += 1
+            rows.append({
+                'metric': metric,
+                'label': label,
+                'direction': direction,
+                'values': values,
+                'scores': scores,
+                'best': [pk for pk, score in zip(ids, scores) if score == 1.0],
+            })
+        return {
+            'universities': ids,
+            'rows': rows,
+            'overall_scores': [round(total / count, 4) if count else None for total, count in zip(totals, counts)],
+        }
+
+    @classmethod
+    def compare(cls, university_ids, context=None):
+        """
+        Compare universities.
+
+        Args:
+            university_ids (list): 2 to ``UNIVERSITY_COMPARE_MAX`` ids
+            context (dict, optional): Serializer context, for absolute URLs
+
+        Returns:
+            dict: Compact university data, ranking/program/cost comparisons
+            and the scored comparison matrix
+        """
+        ids = list(dict.fromkeys(int(pk) for pk in university_ids))
+        data = cls.load(ids)
+        universities = data['universities']
+        names = {university.id: university.name for university in universities}
+
+        latest_rankings = {pk: {} for pk in ids}
+        for row in data['rankings']:
+            latest_rankings[row['university_id']].setdefault(row['ranking_type'], row)
+
+        programs_by_level = {pk: {} for pk in ids}
+        for row in data['programs']:
+            programs_by_level[row['university_id']][row['program_level']] = row['count']
+        courses_by_level = {pk: {} for pk in ids}
+        for row in data['courses']:
+            courses_by_level[row['university_id']][row['level']] = row['count']
+
+        tuition = {pk: {} for pk in ids}
+        for row in data['tuition']:
+            tuition[row['university_id']][row['currency']] = {
+                'courses': row['courses'],
+                'min_tuition': cls._round(row['min_tuition']),
+                'max_tuition': cls._round(row['max_tuition']),
+                'avg_tuition': cls._round(row['avg_tuition']),
+                'avg_total_fees': cls._round(row['avg_total_fees']),
+            }
+
+        # One column per metric, one value per university
+        columns = []
+        students = [cls.student_metrics(university) for university in universities]
+        for metric, label, direction in cls.STUDENT_METRICS:
+            columns.append((metric, label, direction, [values[metric] for values in students]))
+
+        ranking_labels = dict(UniversityRanking.RANKING_TYPE_CHOICES)
+        for ranking_type, label in ranking_labels.items():
+            ranks = [latest_rankings[pk].get(ranking_type, {}).get('rank') for pk in ids]
+            if any(rank is not None for rank in ranks):
+                columns.append((f'rank_{ranking_type}', label, -1, ranks))
+
+        columns.append(('programs', 'Active programs', 1, [sum(programs_by_level[pk].values()) for pk in ids]))
+        columns.append(('courses', 'Active courses', 1, [sum(courses_by_level[pk].values()) for pk in ids]))
+
+        # Fees are only comparable within a currency
+        currencies = sorted({currency for per_currency in tuition.values() for currency in per_currency})
+        for currency in currencies:
+            for field, label in (('avg_tuition', 'Average tuition'), ('avg_total_fees', 'Average total fees')):
+                values = [tuition[pk].get(currency, {}).get(field) for pk in ids]
+                columns.append((f'{field}_{currency.lower()}', f'{label} ({currency})', -1, values))
+
+        matrix = cls.build_matrix(ids, columns)
+
+        return {
+            'universities': UniversitySerializer(
+                universities, many=True, fields=UniversitySerializer.LIST_FIELDS, context=context or {}
+            ).data,
+            'comparison_data': {
+                'total_count': len(universities),
+                'countries': sorted({university.country for university in universities}),
+                'types': sorted({university.university_type for university in universities}),
+            },
+            'ranking_comparison': [
+                {'university_id': pk, 'university_name': names[pk], 'rankings': list(latest_rankings[pk].values())}
+                for pk in ids
+            ],
+            'program_comparison': [
+                {
+                    'university_id': pk,
+                    'university_name': names[pk],
+                    'programs_by_level': programs_by_level[pk],
+                    'courses_by_level': courses_by_level[pk],
+                }
+                for pk in ids
+            ],
+            'cost_comparison': [
+                {'university_id': pk, 'university_name': names[pk], 'tuition': tuition[pk]}
+                for pk in ids
+            ],
+            'matrix': matrix,
+        }
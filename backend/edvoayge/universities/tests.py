@@ -4,6 +4,7 @@ Comprehensive test suite for university models, serializers, and views.
 """
 
 import logging
+from decimal import Decimal
 from django.test import TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
@@ -12,8 +13,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from .models import (
     University, Campus, UniversityRanking, UniversityProgram,
-    UniversityFaculty, UniversityResearch, UniversityPartnership
+    UniversityFaculty, UniversityResearch, UniversityPartnership, Feed
 )
+from courses.models import Course, FeeStructure
 from .serializers import (
     UniversitySerializer, UniversityCreateSerializer, CampusSerializer,
     UniversityRankingSerializer, UniversityProgramSerializer
@@ -595,6 +597,157 @@ class UniversityPerformanceTest(TestCase):
         self.assertLess(end_time - start_time, 1.0)  # Should complete within 1 second
 
 
+class UniversityFieldSelectionTest(APITestCase):
+    """Test cases for ?fields= / ?expand= and the compact list representation."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.url = '/api/v1/universities/universities/'
+        for n in range(3):
+            university = University.objects.create(
+                name=f'University {n}', short_name=f'U{n}', slug=f'university-{n}',
+                description='A test university', university_type='public',
+                founded_year=1950, country='Test Country', city='Test City',
+            )
+            Campus.objects.create(university=university, name='Main', city='Test City', country='Test Country')
+            for m in range(UniversitySerializer.FEED_LIMIT + 2):
+                Feed.objects.create(university=university, user_name='student', title=f'Post {m}', description='Hi')
+        self.university = university
+
+    def test_list_is_compact(self):
+        """Test the list renders only LIST_FIELDS."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), set(UniversitySerializer.LIST_FIELDS))
+
+    def test_fields_and_expand(self):
+        """Test clients can narrow fields and opt into nested relations."""
+        narrow = self.client.get(self.url, {'fields': 'id,name'}).data['results'][0]
+        self.assertEqual(set(narrow), {'id', 'name'})
+
+        expanded = self.client.get(self.url, {'expand': 'campuses,feed'}).data['results'][0]
+        self.assertEqual(len(expanded['campuses']), 1)
+        self.assertEqual(len(expanded['feed']), UniversitySerializer.FEED_LIMIT)
+        self.assertNotIn('rankings', expanded)
+
+    def test_detail_expands_everything(self):
+        """Test the detail view keeps the full representation."""
+        data = self.client.get(f'{self.url}{self.university.pk}/').data['data']
+        for name in UniversitySerializer.expandable_fields():
+            self.assertIn(name, data)
+        self.assertEqual(data['feed'][0]['title'], f'Post {UniversitySerializer.FEED_LIMIT + 1}')
+
+    def test_expanded_list_query_count_is_constant(self):
+        """Test expanded relations are prefetched rather than queried per row."""
+        with self.assertNumQueries(4):  # count, page, campuses, feeds
+            self.client.get(self.url, {'expand': 'campuses,feed'})
+
+
+class UniversityResponseCacheTest(APITestCase):
+    """Test cases for cached, ETag-validated catalogue responses."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.url = '/api/v1/universities/universities/'
+        self.university = University.objects.create(
+            name='Cached University', short_name='CU', slug='cached-university',
+            description='A test university', university_type='public',
+            founded_year=1950, country='Test Country', city='Test City',
+        )
+
+    def test_repeat_request_is_served_from_cache(self):
+        """Test the second request skips the database and a matching ETag gets a 304."""
+        first = self.client.get(self.url, {'page': 1, 'country': 'Test Country'})
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            again = self.client.get(self.url, {'country': 'Test Country', 'page': 1, 'search': ''})
+        self.assertEqual(again['X-Cache'], 'HIT')
+        self.assertEqual(again.content, first.content)
+        self.assertEqual(again['ETag'], first['ETag'])
+
+        not_modified = self.client.get(self.url, {'page': 1, 'country': 'Test Country'},
+                                       HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_changes_invalidate_dependent_responses(self):
+        """Test saving a related model refreshes the list and the detail view."""
+        detail_url = f'{self.url}{self.university.pk}/'
+        self.client.get(self.url)
+        before = self.client.get(detail_url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Campus.objects.create(university=self.university, name='North', city='Test City', country='Test Country')
+            University.objects.create(name='Second University', slug='second-university', description='Another',
+                                      university_type='private', country='Test Country', city='Test City')
+
+        listing = self.client.get(self.url)
+        self.assertEqual(listing['X-Cache'], 'MISS')
+        self.assertEqual(listing.data['count'], 2)
+        after = self.client.get(detail_url)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(len(after.data['data']['campuses']), 1)
+
+
+class UniversityComparisonTest(APITestCase):
+    """Test cases for the university comparison engine."""
+
+    def setUp(self):
+        """Set up test data."""
+        self.url = '/api/v1/universities/universities/compare/'
+        self.universities = []
+        for n in range(10):
+            university = University.objects.create(
+                name=f'University {n}', slug=f'compare-{n}', description='A test university',
+                university_type='public', country='Test Country', city='Test City',
+                total_students=1000 * (n + 1), international_students=100, faculty_count=100,
+            )
+            UniversityRanking.objects.create(university=university, ranking_type='world', ranking_source='QS',
+                                             rank=100 - n, year=2024)
+            UniversityRanking.objects.create(university=university, ranking_type='world', ranking_source='QS',
+                                             rank=500, year=2020)
+            UniversityProgram.objects.create(university=university, name='Medicine', program_level='undergraduate',
+                                             program_type='full_time', duration_years=5)
+            for fee in (1000 * (n + 1), 3000 * (n + 1)):
+                course = Course.objects.create(name='MBBS', code=f'MB-{n}-{fee}', description='Medicine',
+                                               university=university, level='undergraduate', tuition_fee=fee)
+                FeeStructure.objects.create(course=course, tuition_fee=fee, accommodation_fee=500)
+            self.universities.append(university)
+
+    def compare(self, universities):
+        return self.client.post(self.url, {'university_ids': [u.id for u in universities]}, format='json')
+
+    def test_matrix_scores_each_metric(self):
+        """Test rankings, programs and tuition are compared and the best is marked."""
+        first, last = self.universities[0], self.universities[-1]
+        response = self.compare([first, last])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data['data']
+
+        rows = {row['metric']: row for row in data['matrix']['rows']}
+        self.assertEqual(rows['rank_world']['values'], [100, 91])
+        self.assertEqual(rows['rank_world']['best'], [last.id])
+        self.assertEqual(rows['avg_tuition_usd']['values'], [Decimal('2000.00'), Decimal('20000.00')])
+        self.assertEqual(rows['avg_tuition_usd']['best'], [first.id])
+        self.assertEqual(rows['avg_total_fees_usd']['values'][0], Decimal('2500.00'))
+        self.assertEqual(rows['programs']['scores'], [1.0, 1.0])
+        self.assertEqual(data['program_comparison'][0]['courses_by_level'], {'undergraduate': 2})
+        self.assertEqual(data['ranking_comparison'][0]['rankings'][0]['year'], 2024)
+
+    def test_query_count_does_not_grow(self):
+        """Test comparing ten universities costs the same queries as two."""
+        with self.assertNumQueries(5):
+            self.assertEqual(self.compare(self.universities[:2]).status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(5):
+            self.assertEqual(self.compare(self.universities).status_code, status.HTTP_200_OK)
+
+    def test_validation(self):
+        """Test too few and unknown universities are rejected."""
+        self.assertEqual(self.compare(self.universities[:1]).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'university_ids': [self.universities[0].id, 999999]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
 if __name__ == '__main__':
     # Run tests with verbose output
     import django
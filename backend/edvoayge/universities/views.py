@@ -15,6 +15,9 @@ from .models import Feed
 from .serializers import FeedSerializer
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
+from edvoayge.response_cache import cached_response
+from edvoayge.serializers import requested_fields
+from .services import UniversityComparisonService
 from .models import (
     University, Campus, UniversityRanking, UniversityProgram,
     UniversityFaculty, UniversityResearch, UniversityPartnership, UniversityGallery
@@ -50,9 +53,8 @@ class UniversityViewSet(viewsets.ModelViewSet):
     ViewSet for university management.
     Provides CRUD operations for universities with search and filtering.
     """
-    queryset = University.objects.select_related('gallery').prefetch_related(
-        'campuses', 'rankings', 'programs', 'faculties', 'research', 'partnerships'
-    )
+    # Relations are added per request by plan_queryset()
+    queryset = University.objects.all()
     serializer_class = UniversitySerializer
     pagination_class = UniversityPagination
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -77,6 +79,40 @@ class UniversityViewSet(viewsets.ModelViewSet):
             return UniversityUpdateSerializer
         return UniversitySerializer
 
+    def get_field_selection(self):
+        """
+        Fields and expansions to render, from ``?fields=`` and ``?expand=``.
+
+        Lists default to the compact ``LIST_FIELDS``; the detail view
+        expands every relation unless the client selects fields itself.
+        """
+        fields, expand = requested_fields(self.request)
+        if self.action in ('list', 'search') and not fields:
+            fields = UniversitySerializer.LIST_FIELDS
+        elif self.action == 'retrieve' and not fields and not expand:
+            expand = '__all__'
+        return fields, expand
+
+    def get_serializer(self, *args, **kwargs):
+        """Pass the field selection to the university serializer."""
+        serializer_class = self.get_serializer_class()
+        if issubclass(serializer_class, UniversitySerializer):
+            fields, expand = self.get_field_selection()
+            kwargs.setdefault('fields', fields)
+            kwargs.setdefault('expand', expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def plan_queryset(self, queryset):
+        """Join and prefetch only the relations the selected fields render."""
+        if not issubclass(self.get_serializer_class(), UniversitySerializer):
+            return queryset
+        select, prefetch = UniversitySerializer.prefetch_plan(*self.get_field_selection())
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        return queryset
+
     def get_queryset(self):
         """Filter queryset based on request parameters."""
         queryset = super().get_queryset()
@@ -85,14 +121,14 @@ class UniversityViewSet(viewsets.ModelViewSet):
         if self.action == 'list':
             queryset = queryset.filter(is_active=True)
         
-        return queryset
+        return self.plan_queryset(queryset)
 
+    @cached_response('universities')
     def list(self, request, *args, **kwargs):
         """List universities with enhanced filtering."""
         print("Entering UniversityListView") if hasattr(request, 'user') else None
         try:
             response = super().list(request, *args, **kwargs)
-            print(f"[DEBUG] Response data: {response.data}")
             print(f"University list returned {len(response.data['results'])} universities") if hasattr(request, 'user') else None
             return response
         except Exception as e:
@@ -102,6 +138,7 @@ class UniversityViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @cached_response('universities')
     def retrieve(self, request, *args, **kwargs):
         """Retrieve a specific university with all related data including gallery."""
         print(f"Entering UniversityRetrieveView for university ID: {kwargs.get('pk')}") if hasattr(request, 'user') else None
@@ -234,12 +271,13 @@ class UniversityViewSet(viewsets.ModelViewSet):
                 queryset = queryset.filter(is_verified=is_verified)
             
             # Paginate results
+            queryset = self.plan_queryset(queryset)
             page = self.paginate_queryset(queryset)
             if page is not None:
-                serializer = UniversitySerializer(page, many=True)
+                serializer = self.get_serializer(page, many=True)
                 return self.get_paginated_response(serializer.data)
             
-            serializer = UniversitySerializer(queryset, many=True)
+            serializer = self.get_serializer(queryset, many=True)
             return Response({
                 'success': True,
                 'data': serializer.data,
@@ -311,56 +349,27 @@ class UniversityViewSet(viewsets.ModelViewSet):
         print("Entering UniversityCompareView") if hasattr(request, 'user') else None
         try:
             university_ids = request.data.get('university_ids', [])
-            if len(university_ids) < 2 or len(university_ids) > 5:
+            max_count = UniversityComparisonService.max_universities()
+            if not isinstance(university_ids, list) or not 2 <= len(set(map(str, university_ids))) <= max_count:
                 return Response(
-                    {'success': False, 'message': 'Please select 2-5 universities to compare'},
+                    {'success': False, 'message': f'Please select 2-{max_count} universities to compare'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            
-            universities = University.objects.filter(id__in=university_ids)
-            if len(universities) != len(university_ids):
+
+            try:
+                data = UniversityComparisonService.compare(university_ids, context=self.get_serializer_context())
+            except (TypeError, ValueError):
+                return Response(
+                    {'success': False, 'message': 'University ids must be integers'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            except University.DoesNotExist:
                 return Response(
                     {'success': False, 'message': 'Some universities not found'},
                     status=status.HTTP_404_NOT_FOUND
                 )
-            
-            # Prepare comparison data
-            comparison_data = {
-                'total_count': len(universities),
-                'countries': list(set(uni.country for uni in universities)),
-                'types': list(set(uni.university_type for uni in universities)),
-            }
-            
-            # Ranking comparison
-            ranking_comparison = []
-            for university in universities:
-                rankings = university.rankings.all()
-                ranking_data = {
-                    'university_id': university.id,
-                    'university_name': university.name,
-                    'rankings': UniversityRankingSerializer(rankings, many=True).data
-                }
-                ranking_comparison.append(ranking_data)
-            
-            # Program comparison
-            program_comparison = []
-            for university in universities:
-                programs = university.programs.all()
-                program_data = {
-                    'university_id': university.id,
-                    'university_name': university.name,
-                    'programs': UniversityProgramSerializer(programs, many=True).data
-                }
-                program_comparison.append(program_data)
-            
-            data = {
-                'universities': UniversitySerializer(universities, many=True).data,
-                'comparison_data': comparison_data,
-                'ranking_comparison': ranking_comparison,
-                'program_comparison': program_comparison,
-            }
-            
-            print(f"University comparison completed for {len(universities)} universities") if hasattr(request, 'user') else None
+
+            print(f"University comparison completed for {len(data['universities'])} universities") if hasattr(request, 'user') else None
             return Response(
                 {'success': True, 'data': data, 'message': 'Comparison completed successfully'}
             )
@@ -10,7 +10,7 @@ from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
 from .models import (
-    UserProfile, UserSession, OTPVerification, UserActivity
+    UserProfile, UserSession, OTPVerification, UserActivity, OutboundEmail
 )
 
 
@@ -280,6 +280,39 @@ class UserActivityAdmin(admin.ModelAdmin):
     clear_old_activities.short_description = "Clear activities older than 30 days"
 
 
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    """Admin for OutboundEmail model."""
+    
+    list_display = [
+        'to_email', 'subject', 'category', 'status', 'attempts',
+        'next_attempt_at', 'sent_at', 'created_at'
+    ]
+    list_filter = [
+        'status', 'category', 'created_at'
+    ]
+    search_fields = [
+        'to_email', 'subject'
+    ]
+    readonly_fields = [
+        'id', 'attempts', 'claim_token', 'claimed_at', 'last_error',
+        'sent_at', 'created_at', 'updated_at'
+    ]
+    
+    list_per_page = 50
+    ordering = ['-created_at']
+    
+    actions = ['retry_emails']
+    
+    def retry_emails(self, request, queryset):
+        """Requeue selected failed emails."""
+        updated = queryset.filter(status='failed').update(
+            status='queued', attempts=0, next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{updated} emails requeued successfully.')
+    retry_emails.short_description = "Retry selected failed emails"
+
+
 # Extend User admin
 class UserProfileInline(admin.StackedInline):
     """Inline admin for UserProfile."""
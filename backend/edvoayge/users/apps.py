@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from edvoayge.images import generate_on_upload
+        from .models import UserProfile
+        generate_on_upload(UserProfile, 'profile_picture', 'cover_photo')
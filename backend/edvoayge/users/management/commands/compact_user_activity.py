@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from users.services import ActivityLogService
+
+
+class Command(BaseCommand):
+    help = 'Compact old high-volume user activity and delete activity past its retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-compact', action='store_true', help='Only apply retention')
+
+    def handle(self, *args, **options):
+        if not options['no_compact']:
+            compacted = ActivityLogService.compact()
+            self.stdout.write(f'Compacted {compacted} activity record(s)')
+        purged = ActivityLogService.purge()
+        self.stdout.write(f'Purged {purged} activity record(s)')
@@ -0,0 +1,23 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from users.services import SessionService
+
+
+class Command(BaseCommand):
+    help = 'Expire idle user sessions and delete old ended sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows updated or deleted per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep running periodically')
+        parser.add_argument('--interval', type=int, default=900, help='Seconds between runs with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            expired = SessionService.expire_stale(batch_size=options['batch_size'])
+            deleted = SessionService.compact(batch_size=options['batch_size'])
+            self.stdout.write(f'Expired {expired} session(s), deleted {deleted} ended session(s)')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
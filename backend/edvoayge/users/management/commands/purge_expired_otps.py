@@ -0,0 +1,22 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from users.services import OTPService
+
+
+class Command(BaseCommand):
+    help = 'Delete OTP records that expired more than OTP_RETENTION_DAYS ago, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Rows deleted per batch')
+        parser.add_argument('--loop', action='store_true', help='Keep purging periodically')
+        parser.add_argument('--interval', type=int, default=3600, help='Seconds between purges with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            deleted = OTPService.purge_expired(batch_size=options['batch_size'])
+            self.stdout.write(f'Purged {deleted} expired OTP record(s)')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
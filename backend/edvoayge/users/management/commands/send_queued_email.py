@@ -0,0 +1,25 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from users.services import EmailQueue
+
+
+class Command(BaseCommand):
+    help = 'Send queued outbound email in batches, retrying failed messages with backoff'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Send what is due once and exit')
+        parser.add_argument(
+            '--max-sleep', type=int, default=30,
+            help='Longest time to sleep between checks, in seconds'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            processed = EmailQueue.drain()
+            if processed:
+                self.stdout.write(f'Processed {processed} email(s)')
+            if options['once']:
+                break
+            time.sleep(EmailQueue.seconds_until_next_due(max_sleep=options['max_sleep']))
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_outboundemail'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['contact', '-created_at'], name='users_otpve_contact_9ffa3e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['expires_at'], name='users_otpve_expires_4f8a2d_idx'),
+        ),
+    ]
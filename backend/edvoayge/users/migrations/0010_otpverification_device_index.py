@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 08:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0009_usersession_lifecycle'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='otpverification',
+            index=models.Index(fields=['device_id', '-created_at'], name='users_otpve_device__e6ae9c_idx'),
+        ),
+    ]
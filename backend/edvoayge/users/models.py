@@ -4,6 +4,7 @@ Handles user authentication, profiles, sessions, and biometric authentication.
 """
 
 import uuid
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -129,7 +130,8 @@ class UserSession(models.Model):
     status = models.CharField(max_length=20, choices=SESSION_STATUS_CHOICES, default='active')
     login_time = models.DateTimeField(auto_now_add=True, verbose_name="Login Time")
     logout_time = models.DateTimeField(null=True, blank=True, verbose_name="Logout Time")
-    last_activity = models.DateTimeField(auto_now=True, verbose_name="Last Activity")
+    # Touched at most every SESSION_TOUCH_INTERVAL_SECONDS by SessionService
+    last_activity = models.DateTimeField(default=timezone.now, verbose_name="Last Activity")
     
     # Security
     is_secure = models.BooleanField(default=False, verbose_name="Secure Connection")
@@ -143,6 +145,15 @@ class UserSession(models.Model):
         verbose_name = "User Session"
         verbose_name_plural = "User Sessions"
         ordering = ['-login_time']
+        indexes = [
+            # Only live sessions are looked up per request
+            models.Index(
+                fields=['session_key', 'device_id'],
+                condition=models.Q(is_active=True),
+                name='users_session_active_key_idx',
+            ),
+            models.Index(fields=['is_active', 'last_activity']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.device_type} ({self.session_key})"
@@ -161,9 +172,12 @@ class UserSession(models.Model):
             return self.logout_time - self.login_time
         return timezone.now() - self.login_time
     
-    def is_expired(self):
-        """Check if session is expired (24 hours)"""
-        return timezone.now() - self.last_activity > timedelta(hours=24)
+    def is_expired(self, now=None):
+        """Check if session is past its idle or absolute timeout"""
+        now = now or timezone.now()
+        idle = timedelta(hours=getattr(settings, 'SESSION_IDLE_TIMEOUT_HOURS', 24))
+        absolute = timedelta(days=getattr(settings, 'SESSION_ABSOLUTE_TIMEOUT_DAYS', 30))
+        return now - self.last_activity > idle or now - self.login_time > absolute
 
 
 class OTPVerification(models.Model):
@@ -205,13 +219,18 @@ class OTPVerification(models.Model):
         verbose_name = "OTP Verification"
         verbose_name_plural = "OTP Verifications"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['contact', '-created_at']),
+            models.Index(fields=['device_id', '-created_at']),
+            models.Index(fields=['expires_at']),
+        ]
     
     def __str__(self):
         return f"{self.contact} - {self.otp_type} ({self.otp_code})"
     
     def save(self, *args, **kwargs):
         print(f"🔍 DEBUG: Saving OTP verification - Contact: {self.contact}, Type: {self.otp_type}, Code: {self.otp_code}")
-        if not self.pk:
+        if not self.pk and not self.expires_at:
             # Set expiration time (15 minutes from creation)
             self.expires_at = timezone.now() + timedelta(minutes=15)
             print(f"🔍 DEBUG: Setting OTP expiration to: {self.expires_at}")
@@ -321,7 +340,8 @@ class UserActivity(models.Model):
         ('otp_blocked', 'OTP Blocked'),
     ]
     
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities')
+    # Null for failed logins with an unknown email
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='activities', null=True, blank=True)
     activity_type = models.CharField(max_length=20, choices=ACTIVITY_TYPE_CHOICES, verbose_name="Activity Type")
     
     # Activity Details
@@ -331,19 +351,79 @@ class UserActivity(models.Model):
     device_id = models.CharField(max_length=255, blank=True, verbose_name="Device ID")
     
     # Metadata
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the activity happens, not when the buffered row is written
+    created_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         verbose_name = "User Activity"
         verbose_name_plural = "User Activities"
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['activity_type', 'created_at']),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} - {self.activity_type} ({self.created_at})"
+        username = self.user.username if self.user else 'anonymous'
+        return f"{username} - {self.activity_type} ({self.created_at})"
     
     def save(self, *args, **kwargs):
+        username = self.user.username if self.user else 'anonymous'
         if self.pk:
-            print(f"Updating user activity: {self.user.username} - {self.activity_type}") if hasattr(self, '_meta') else None
+            print(f"Updating user activity: {username} - {self.activity_type}") if hasattr(self, '_meta') else None
         else:
-            print(f"Creating new user activity: {self.user.username} - {self.activity_type}") if hasattr(self, '_meta') else None
+            print(f"Creating new user activity: {username} - {self.activity_type}") if hasattr(self, '_meta') else None
         super().save(*args, **kwargs)
+
+
+class OutboundEmail(models.Model):
+    """
+    Queued outbound email, sent by the background mail sender.
+
+    The primary key is returned to API clients as the delivery handle.
+    """
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    CATEGORY_CHOICES = [
+        ('otp', 'OTP'),
+        ('transactional', 'Transactional'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    category = models.CharField(max_length=20, choices=CATEGORY_CHOICES, default='transactional', verbose_name="Category")
+    
+    # Message
+    to_email = models.EmailField(verbose_name="To Email")
+    from_email = models.CharField(max_length=255, blank=True, verbose_name="From Email")
+    subject = models.CharField(max_length=255, verbose_name="Subject")
+    body = models.TextField(blank=True, verbose_name="Body")
+    html_body = models.TextField(blank=True, verbose_name="HTML Body")
+    
+    # Delivery
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued', verbose_name="Status")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Attempts")
+    max_attempts = models.PositiveIntegerField(default=5, verbose_name="Max Attempts")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Next Attempt At")
+    claim_token = models.UUIDField(null=True, blank=True, verbose_name="Claim Token")
+    claimed_at = models.DateTimeField(null=True, blank=True, verbose_name="Claimed At")
+    last_error = models.TextField(blank=True, verbose_name="Last Error")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Sent At")
+    
+    # Metadata
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Outbound Email"
+        verbose_name_plural = "Outbound Emails"
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.to_email} - {self.subject} ({self.status})"
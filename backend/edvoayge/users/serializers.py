@@ -8,6 +8,7 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import validate_email
+from edvoayge.images import ImageVariantsField
 from .models import (
     UserProfile, UserSession, OTPVerification, 
     BiometricAuthentication, UserActivity
@@ -68,13 +69,16 @@ class UserProfileSerializer(serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
     profile_picture_url = serializers.SerializerMethodField()
     cover_photo_url = serializers.SerializerMethodField()
+    profile_picture_variants = ImageVariantsField(source='profile_picture')
+    cover_photo_variants = ImageVariantsField(source='cover_photo')
     
     class Meta:
         model = UserProfile
         fields = [
             'id', 'user', 'email', 'date_of_birth', 'gender', 'marital_status',
             'address', 'city', 'state', 'country', 'postal_code', 'bio',
-            'profile_picture', 'profile_picture_url', 'cover_photo', 'cover_photo_url',
+            'profile_picture', 'profile_picture_url', 'profile_picture_variants',
+            'cover_photo', 'cover_photo_url', 'cover_photo_variants',
             'email_notifications', 'push_notifications', 'sms_notifications', 
             'is_email_verified', 'is_profile_complete', 'last_active', 'created_at', 
             'updated_at', 'age', 'full_name'
@@ -1,8 +1,23 @@
+import atexit
+import hmac
 import logging
+import secrets
+import threading
+import time
+import uuid
+from collections import namedtuple
+from datetime import timedelta
+from django.core import mail
 from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.conf import settings
+from django.core.cache import cache
 from django.core.mail import EmailMessage
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from django.utils.crypto import get_random_string, salted_hmac
 from django.utils.html import strip_tags
 import traceback
 
@@ -14,6 +29,53 @@ class EmailService:
     Provides methods for sending OTP emails and other email notifications.
     """
     
+    @staticmethod
+    def render_otp_email(otp_code, user_name=None):
+        """
+        Render the OTP verification email.
+        
+        Args:
+            otp_code (str): The OTP code to send
+            user_name (str, optional): The user's name for personalization
+            
+        Returns:
+            tuple: (subject, plain text body, HTML body)
+        """
+        context = {
+            'otp_code': otp_code,
+            'user_name': user_name or 'User',
+            'app_name': 'EdVoyage'
+        }
+        html_message = render_to_string('emails/otp_email.html', context)
+        plain_message = strip_tags(html_message)
+        subject = f'EdVoyage OTP Verification - {otp_code}'
+        return subject, plain_message, html_message
+    
+    @staticmethod
+    def queue_otp_email(email_address, otp_code, user_name=None):
+        """
+        Queue the OTP verification email for the background sender.
+        
+        Returns as soon as the message is stored, so the request does not
+        wait on the SMTP server.
+        
+        Args:
+            email_address (str): The recipient's email address
+            otp_code (str): The OTP code to send
+            user_name (str, optional): The user's name for personalization
+            
+        Returns:
+            OutboundEmail: The queued message; its id is the delivery handle
+        """
+        subject, plain_message, html_message = EmailService.render_otp_email(otp_code, user_name)
+        return EmailQueue.enqueue(
+            to_email=email_address,
+            subject=subject,
+            body=plain_message,
+            html_body=html_message,
+            category='otp',
+        )
+    
     @staticmethod
     def send_otp_email(email_address, otp_code, user_name=None):
         """
@@ -31,25 +93,7 @@ class EmailService:
             print(f"EmailService: Starting OTP email send process for {email_address}")
             print(f"EmailService: OTP code to send: {otp_code}")
             
-            # Prepare email context
-            context = {
-                'otp_code': otp_code,
-                'user_name': user_name or 'User',
-                'app_name': 'EdVoyage'
-            }
-            
-            print(f"EmailService: Email context prepared: {context}")
-            
-            # Render HTML email template
-            html_message = render_to_string('emails/otp_email.html', context)
-            print(f"EmailService: HTML template rendered successfully")
-            
-            # Create plain text version
-            plain_message = strip_tags(html_message)
-            print(f"EmailService: Plain text version created")
-            
-            # Email subject
-            subject = f'EdVoyage OTP Verification - {otp_code}'
+            subject, plain_message, html_message = EmailService.render_otp_email(otp_code, user_name)
             print(f"EmailService: Email subject: {subject}")
             
             # Send email
@@ -136,4 +180,825 @@ class EmailService:
         }
         
         print(f"EmailService: Email configuration status: {config_status}")
-        return config_status 
\ No newline at end of file
+        return config_status
+
+
+class EmailQueue:
+    """
+    Service class for the outbound email queue.
+    
+    Messages are stored as OutboundEmail rows and sent by a background
+    sender thread (or the ``send_queued_email`` command) in batches over a
+    single SMTP connection. Failed messages are retried with exponential
+    backoff until ``max_attempts`` is reached.
+    """
+    
+    _wakeup = threading.Event()
+    _worker = None
+    _worker_lock = threading.Lock()
+    
+    @staticmethod
+    def get_connection():
+        """
+        Open a mail connection for a batch.
+        
+        ``EMAIL_QUEUE_BACKEND`` and ``EMAIL_QUEUE_CONNECTION_OPTIONS`` let the
+        queue target a different server than the rest of the app, e.g. a
+        local SMTP stand-in during development.
+        """
+        backend = getattr(settings, 'EMAIL_QUEUE_BACKEND', None)
+        options = getattr(settings, 'EMAIL_QUEUE_CONNECTION_OPTIONS', {})
+        return mail.get_connection(backend, fail_silently=False, **options)
+    
+    @classmethod
+    def enqueue(cls, to_email, subject, body='', html_body='', from_email=None, category='transactional'):
+        """
+        Store a message and wake the sender once the transaction commits.
+        
+        Args:
+            to_email (str): Recipient address
+            subject (str): Subject line
+            body (str): Plain text body
+            html_body (str, optional): HTML alternative
+            from_email (str, optional): Sender, defaults to EMAIL_HOST_USER
+            category (str): OutboundEmail category
+            
+        Returns:
+            OutboundEmail: The queued message
+        """
+        from .models import OutboundEmail
+        
+        email = OutboundEmail.objects.create(
+            to_email=to_email,
+            from_email=from_email or settings.EMAIL_HOST_USER,
+            subject=subject,
+            body=body,
+            html_body=html_body,
+            category=category,
+            max_attempts=getattr(settings, 'EMAIL_QUEUE_MAX_ATTEMPTS', 5),
+        )
+        logger.info(f"Queued {category} email {email.pk} to {to_email}")
+        
+        if getattr(settings, 'EMAIL_QUEUE_ASYNC', True):
+            transaction.on_commit(cls.wake)
+        else:
+            cls.send_batch(ids=[email.pk])
+            email.refresh_from_db()
+        return email
+    
+    @classmethod
+    def claim_batch(cls, limit=None, ids=None, now=None):
+        """
+        Claim due messages for this sender.
+        
+        Rows are claimed with a conditional update that stamps a fresh claim
+        token, so concurrent senders never pick up the same message. Messages
+        left in ``sending`` by a crashed sender are reclaimed after
+        ``EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS``.
+        
+        Returns:
+            list: Claimed OutboundEmail rows
+        """
+        from .models import OutboundEmail
+        
+        now = now or timezone.now()
+        limit = limit or getattr(settings, 'EMAIL_QUEUE_BATCH_SIZE', 50)
+        stale = now - timedelta(seconds=getattr(settings, 'EMAIL_QUEUE_CLAIM_TIMEOUT_SECONDS', 300))
+        due = OutboundEmail.objects.filter(
+            Q(status='queued', next_attempt_at__lte=now) | Q(status='sending', claimed_at__lt=stale)
+        )
+        if ids is not None:
+            due = due.filter(pk__in=ids)
+        due_ids = list(due.order_by('next_attempt_at').values_list('pk', flat=True)[:limit])
+        if not due_ids:
+            return []
+        
+        token = uuid.uuid4()
+        due.filter(pk__in=due_ids).update(status='sending', claim_token=token, claimed_at=now)
+        return list(OutboundEmail.objects.filter(claim_token=token))
+    
+    @staticmethod
+    def _build_message(email, connection):
+        message = mail.EmailMultiAlternatives(
+            subject=email.subject,
+            body=email.body,
+            from_email=email.from_email or settings.EMAIL_HOST_USER,
+            to=[email.to_email],
+            connection=connection,
+        )
+        if email.html_body:
+            message.attach_alternative(email.html_body, 'text/html')
+        return message
+    
+    @classmethod
+    def send_batch(cls, limit=None, ids=None):
+        """
+        Claim one batch of due messages and send it over one connection.
+        
+        Args:
+            limit (int, optional): Maximum messages to send
+            ids (list, optional): Restrict the batch to these messages
+            
+        Returns:
+            int: Number of messages claimed
+        """
+        emails = cls.claim_batch(limit=limit, ids=ids)
+        if not emails:
+            return 0
+        
+        backoff = getattr(settings, 'EMAIL_QUEUE_RETRY_BACKOFF_SECONDS', 30)
+        mail_connection = None
+        try:
+            mail_connection = cls.get_connection()
+            mail_connection.open()
+            for email in emails:
+                email.attempts += 1
+                try:
+                    if not cls._build_message(email, mail_connection).send():
+                        raise RuntimeError('Mail backend did not accept the message')
+                except Exception as e:
+                    email.last_error = str(e)
+                    if email.attempts >= email.max_attempts:
+                        email.status = 'failed'
+                        logger.error(f"Giving up on email {email.pk} to {email.to_email}: {e}")
+                    else:
+                        email.status = 'queued'
+                        email.next_attempt_at = timezone.now() + timedelta(
+                            seconds=backoff * 2 ** (email.attempts - 1)
+                        )
+                        logger.warning(f"Email {email.pk} to {email.to_email} failed, will retry: {e}")
+                    # A failed SMTP exchange can leave the connection unusable;
+                    # the next send reopens it.
+                    mail_connection.close()
+                else:
+                    email.status = 'sent'
+                    email.sent_at = timezone.now()
+                    email.last_error = ''
+        except Exception as e:
+            # Could not connect at all: put the whole batch back without
+            # spending an attempt on messages that were never tried.
+            logger.error(f"Error opening mail connection: {e}")
+            for email in emails:
+                if email.status == 'sending':
+                    email.status = 'queued'
+                    email.last_error = str(e)
+                    email.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+        finally:
+            if mail_connection is not None:
+                mail_connection.close()
+        
+        from .models import OutboundEmail
+        now = timezone.now()
+        for email in emails:
+            email.claim_token = None
+            email.updated_at = now
+        OutboundEmail.objects.bulk_update(
+            emails,
+            ['status', 'attempts', 'next_attempt_at', 'claim_token', 'last_error', 'sent_at', 'updated_at']
+        )
+        logger.info(
+            f"Email batch: {sum(e.status == 'sent' for e in emails)} sent, "
+            f"{sum(e.status == 'queued' for e in emails)} requeued, "
+            f"{sum(e.status == 'failed' for e in emails)} failed"
+        )
+        return len(emails)
+    
+    @classmethod
+    def drain(cls):
+        """
+        Send batches until nothing is due.
+        
+        Returns:
+            int: Number of messages processed
+        """
+        processed = 0
+        while True:
+            claimed = cls.send_batch()
+            if not claimed:
+                return processed
+            processed += claimed
+    
+    @classmethod
+    def seconds_until_next_due(cls, max_sleep):
+        """Seconds until the next queued message is due, capped at ``max_sleep``"""
+        from .models import OutboundEmail
+        
+        next_attempt = OutboundEmail.objects.filter(status='queued').order_by(
+            'next_attempt_at'
+        ).values_list('next_attempt_at', flat=True).first()
+        if next_attempt is None:
+            return max_sleep
+        return min(max_sleep, max(0, (next_attempt - timezone.now()).total_seconds()))
+    
+    @classmethod
+    def _run_worker(cls):
+        poll = getattr(settings, 'EMAIL_QUEUE_POLL_SECONDS', 30)
+        while True:
+            cls._wakeup.clear()
+            try:
+                cls.drain()
+                timeout = cls.seconds_until_next_due(poll)
+            except Exception as e:
+                logger.error(f"Error in background email sender: {e}")
+                timeout = poll
+            finally:
+                connection.close()
+            cls._wakeup.wait(timeout)
+    
+    @classmethod
+    def wake(cls):
+        """Start the in-process sender thread if needed and wake it up"""
+        with cls._worker_lock:
+            if cls._worker is None or not cls._worker.is_alive():
+                cls._worker = threading.Thread(target=cls._run_worker, name='email-queue-sender', daemon=True)
+                cls._worker.start()
+        cls._wakeup.set()
+
+
+class OTPRateLimitError(Exception):
+    """Raised when a contact or device may not request another OTP yet"""
+    
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = int(retry_after) + 1
+        self.blocked_until = timezone.now() + timedelta(seconds=self.retry_after)
+
+
+OTPResult = namedtuple('OTPResult', ['status', 'record_id', 'retry_after'])
+
+
+class OTPService:
+    """
+    Service class for issuing and verifying OTP codes.
+    
+    Live codes and blocks are kept in the cache, so verifying a code never
+    scans OTPVerification. Send limits are counted on the OTPVerification
+    rows created within the send window, so they hold across workers rather
+    than per process. The state of a code is
+    decided by its OTPVerification row, though: it is verified or consumed
+    by a compare-and-set on the open row and wrong attempts are counted
+    there with ``F()``, so a code cannot be replayed, nor guessed more than
+    ``max_attempts`` times, through workers whose (per-process) cache still
+    holds it. Blocks are recorded on the row too and checked before a new
+    code is issued. Old rows are removed by ``purge_expired``. A verify that
+    misses the cache (for example after a restart) falls back to one
+    indexed lookup.
+    """
+    
+    CACHE_PREFIX = 'users:otp'
+    _lock = threading.Lock()
+    
+    @classmethod
+    def _key(cls, *parts):
+        return ':'.join([cls.CACHE_PREFIX] + [str(part).lower() for part in parts])
+    
+    @staticmethod
+    def _hash(contact, code):
+        return salted_hmac('users.OTPService', f'{contact.lower()}:{code}').hexdigest()
+    
+    @staticmethod
+    def generate_code():
+        """Generate a random 6-digit code"""
+        return f'{secrets.randbelow(1000000):06d}'
+    
+    @staticmethod
+    def _send_retry_after(sends, limit, window, now):
+        """
+        Check a send limit against the OTP rows created within the window.
+        
+        Args:
+            sends (QuerySet): OTPVerification rows for the contact or device
+            limit (int): Sends allowed per window
+            window (int): Window length in seconds
+            now (datetime): Current time
+            
+        Returns:
+            float: 0 if another send is allowed, otherwise seconds until it would be
+        """
+        recent = list(
+            sends.filter(created_at__gt=now - timedelta(seconds=window))
+            .order_by('-created_at').values_list('created_at', flat=True)[:limit]
+        )
+        if len(recent) < limit:
+            return 0
+        return (recent[-1] + timedelta(seconds=window) - now).total_seconds()
+    
+    @classmethod
+    def block_remaining(cls, contact, device_id='', check_database=False):
+        """
+        Seconds left on a block for this contact and device, or 0.
+        
+        With ``check_database``, blocks recorded by other processes are found too.
+        """
+        from .models import OTPVerification
+        
+        blocked_until = cache.get(cls._key('block', contact, device_id))
+        if not blocked_until and check_database:
+            blocked = OTPVerification.objects.filter(
+                contact=contact, device_id=device_id, is_blocked=True, blocked_until__gt=timezone.now()
+            ).aggregate(until=Max('blocked_until'))['until']
+            blocked_until = blocked.timestamp() if blocked else None
+        return max(0, blocked_until - time.time()) if blocked_until else 0
+    
+    @classmethod
+    def issue(cls, contact, otp_type, device_id='', device_type=''):
+        """
+        Issue a new code for a contact, replacing any live code.
+        
+        Args:
+            contact (str): Email address
+            otp_type (str): OTPVerification type
+            device_id (str, optional): Requesting device
+            device_type (str, optional): Requesting device type
+            
+        Returns:
+            tuple: (OTPVerification audit record, code)
+            
+        Raises:
+            OTPRateLimitError: If the device is blocked or a send limit is hit
+        """
+        from .models import OTPVerification
+        
+        remaining = cls.block_remaining(contact, device_id, check_database=True)
+        if remaining:
+            raise OTPRateLimitError('Device blocked due to multiple failed attempts', remaining)
+        
+        window = getattr(settings, 'OTP_SEND_WINDOW_SECONDS', 900)
+        sent_at = timezone.now()
+        retry_after = cls._send_retry_after(
+            OTPVerification.objects.filter(contact=contact), getattr(settings, 'OTP_SEND_LIMIT', 5), window, sent_at
+        )
+        if not retry_after and device_id:
+            retry_after = cls._send_retry_after(
+                OTPVerification.objects.filter(device_id=device_id),
+                getattr(settings, 'OTP_DEVICE_SEND_LIMIT', 10), window, sent_at
+            )
+        if retry_after:
+            raise OTPRateLimitError('Too many OTP requests', retry_after)
+        
+        now = time.time()
+        
+        code = cls.generate_code()
+        ttl = getattr(settings, 'OTP_EXPIRY_MINUTES', 15) * 60
+        # Earlier codes stop working everywhere, not only in this process's cache
+        OTPVerification.objects.filter(contact=contact, is_verified=False, is_expired=False).update(is_expired=True)
+        record = OTPVerification.objects.create(
+            otp_type=otp_type,
+            contact=contact,
+            otp_code=code,
+            device_id=device_id,
+            device_type=device_type,
+            expires_at=timezone.now() + timedelta(seconds=ttl),
+        )
+        cache.set(cls._key('code', contact), {
+            'record_id': record.pk,
+            'code_hash': cls._hash(contact, code),
+            'otp_type': otp_type,
+            'expires_at': now + ttl,
+            'attempts': 0,
+            'max_attempts': record.max_attempts,
+        }, timeout=ttl)
+        logger.info(f"Issued {otp_type} OTP {record.pk} for {contact}")
+        return record, code
+    
+    @classmethod
+    def _load_entry(cls, contact):
+        """Rebuild the live entry for a contact from its latest open audit row"""
+        from .models import OTPVerification
+        
+        record = OTPVerification.objects.filter(
+            contact=contact, is_verified=False, is_expired=False, expires_at__gt=timezone.now()
+        ).order_by('-created_at').first()
+        if record is None or record.failed_attempts >= record.max_attempts:
+            return None
+        return {
+            'record_id': record.pk,
+            'code_hash': cls._hash(contact, record.otp_code),
+            'otp_type': record.otp_type,
+            'expires_at': record.expires_at.timestamp(),
+            'attempts': record.failed_attempts,
+            'max_attempts': record.max_attempts,
+        }
+    
+    @classmethod
+    def verify(cls, contact, code, device_id='', otp_type=None):
+        """
+        Verify a code for a contact.
+        
+        A wrong code counts against the live code; after ``max_attempts``
+        the code is discarded and the device is blocked for
+        ``OTP_BLOCK_MINUTES``.
+        
+        Returns:
+            OTPResult: ``status`` is ``verified``, ``invalid`` or ``blocked``
+        """
+        from .models import OTPVerification
+        
+        remaining = cls.block_remaining(contact, device_id)
+        if remaining:
+            return OTPResult('blocked', None, int(remaining) + 1)
+        
+        key = cls._key('code', contact)
+        with cls._lock:
+            entry = cache.get(key) or cls._load_entry(contact)
+            now = time.time()
+            if entry is None or entry['expires_at'] <= now or (otp_type and entry['otp_type'] != otp_type):
+                return OTPResult('invalid', None, 0)
+            
+            open_record = OTPVerification.objects.filter(pk=entry['record_id'], is_verified=False, is_expired=False)
+            if hmac.compare_digest(entry['code_hash'], cls._hash(contact, str(code))):
+                cache.delete(key)
+                # Only the first verify of an open code succeeds, whichever worker cached it
+                if not open_record.update(is_verified=True, verified_at=timezone.now()):
+                    return OTPResult('invalid', None, 0)
+                logger.info(f"Verified OTP {entry['record_id']} for {contact}")
+                return OTPResult('verified', entry['record_id'], 0)
+            
+            # Attempts are counted on the row, so every worker shares the limit
+            if not open_record.update(failed_attempts=F('failed_attempts') + 1):
+                cache.delete(key)
+                return OTPResult('invalid', None, 0)
+            entry['attempts'] = OTPVerification.objects.filter(pk=entry['record_id']).values_list(
+                'failed_attempts', flat=True
+            ).first()
+            if entry['attempts'] < entry['max_attempts']:
+                cache.set(key, entry, timeout=entry['expires_at'] - now)
+                return OTPResult('invalid', entry['record_id'], 0)
+            
+            block_seconds = getattr(settings, 'OTP_BLOCK_MINUTES', 5) * 60
+            cache.delete(key)
+            cache.set(cls._key('block', contact, device_id), now + block_seconds, timeout=block_seconds)
+        
+        OTPVerification.objects.filter(pk=entry['record_id']).update(
+            is_expired=True,
+            is_blocked=True,
+            blocked_until=timezone.now() + timedelta(seconds=block_seconds),
+        )
+        logger.warning(f"Blocked OTP verification for {contact} on device '{device_id}'")
+        return OTPResult('blocked', entry['record_id'], block_seconds)
+    
+    @classmethod
+    def discard(cls, record):
+        """Forget a live code, e.g. when its email could not be sent"""
+        entry = cache.get(cls._key('code', record.contact))
+        if entry and entry['record_id'] == record.pk:
+            cache.delete(cls._key('code', record.contact))
+        record.delete()
+    
+    @classmethod
+    def purge_expired(cls, batch_size=None, now=None):
+        """
+        Delete OTP rows that expired more than ``OTP_RETENTION_DAYS`` ago.
+        
+        Rows are deleted in primary-key batches so each delete stays short.
+        
+        Returns:
+            int: Number of rows deleted
+        """
+        from .models import OTPVerification
+        
+        batch_size = batch_size or getattr(settings, 'OTP_PURGE_BATCH_SIZE', 1000)
+        cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'OTP_RETENTION_DAYS', 7))
+        deleted = 0
+        while True:
+            ids = list(
+                OTPVerification.objects.filter(expires_at__lt=cutoff)
+                .order_by('expires_at').values_list('pk', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            count, _ = OTPVerification.objects.filter(pk__in=ids).delete()
+            deleted += count
+        if deleted:
+            logger.info(f"Purged {deleted} expired OTP records")
+        return deleted
+
+
+class ActivityLogService:
+    """
+    Service class for the buffered UserActivity audit log.
+    
+    ``record`` only appends to an in-process buffer; a background writer
+    flushes the buffer with ``bulk_create`` every
+    ``ACTIVITY_LOG_FLUSH_SECONDS`` or as soon as ``ACTIVITY_LOG_BATCH_SIZE``
+    records are waiting. When the buffer reaches ``ACTIVITY_LOG_MAX_BUFFER``
+    the caller flushes inline, so bursts are slowed down rather than dropped.
+    """
+    
+    _buffer = []
+    _buffer_lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _writer = None
+    _writer_lock = threading.Lock()
+    
+    @classmethod
+    def record(cls, user, activity_type, description='', ip_address=None, user_agent='', device_id=''):
+        """
+        Record a user activity.
+        
+        Args:
+            user (User): The user, or None for failed logins
+            activity_type (str): UserActivity activity type
+            description (str, optional): Details
+            ip_address (str, optional): Client IP address
+            user_agent (str, optional): Client user agent
+            device_id (str, optional): Client device id
+        """
+        from .models import UserActivity
+        
+        activity = UserActivity(
+            user=user,
+            activity_type=activity_type,
+            description=description,
+            ip_address=ip_address or None,
+            user_agent=user_agent or '',
+            device_id=device_id or '',
+            created_at=timezone.now(),
+        )
+        if not getattr(settings, 'ACTIVITY_LOG_ASYNC', True):
+            cls._write([activity])
+            return
+        
+        with cls._buffer_lock:
+            cls._buffer.append(activity)
+            pending = len(cls._buffer)
+        
+        if pending >= getattr(settings, 'ACTIVITY_LOG_MAX_BUFFER', 10000):
+            logger.warning(f"Activity buffer full ({pending} records), flushing inline")
+            cls.flush()
+        else:
+            cls._ensure_writer()
+            if pending >= getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 200):
+                cls._wakeup.set()
+    
+    @staticmethod
+    def _write(activities):
+        from .models import UserActivity
+        
+        try:
+            UserActivity.objects.bulk_create(activities)
+        except Exception as e:
+            logger.error(f"Error writing {len(activities)} activity records: {e}")
+    
+    @classmethod
+    def flush(cls):
+        """
+        Write all buffered records.
+        
+        Returns:
+            int: Number of records written
+        """
+        with cls._flush_lock:
+            with cls._buffer_lock:
+                activities, cls._buffer[:] = list(cls._buffer), []
+            batch_size = getattr(settings, 'ACTIVITY_LOG_BATCH_SIZE', 200)
+            for start in range(0, len(activities), batch_size):
+                cls._write(activities[start:start + batch_size])
+        return len(activities)
+    
+    @classmethod
+    def _run_writer(cls):
+        while True:
+            cls._wakeup.wait(getattr(settings, 'ACTIVITY_LOG_FLUSH_SECONDS', 2))
+            cls._wakeup.clear()
+            try:
+                cls.flush()
+            finally:
+                connection.close()
+    
+    @classmethod
+    def _ensure_writer(cls):
+        with cls._writer_lock:
+            if cls._writer is None or not cls._writer.is_alive():
+                cls._writer = threading.Thread(target=cls._run_writer, name='activity-log-writer', daemon=True)
+                cls._writer.start()
+    
+    @classmethod
+    def purge(cls, now=None, batch_size=1000):
+        """
+        Delete activity older than its retention period.
+        
+        ``ACTIVITY_LOG_RETENTION_DAYS`` maps activity types to days, with
+        ``default`` used for types that are not listed.
+        
+        Returns:
+            int: Number of rows deleted
+        """
+        from .models import UserActivity
+        
+        now = now or timezone.now()
+        retention = dict(getattr(settings, 'ACTIVITY_LOG_RETENTION_DAYS', {'default': 365}))
+        default_days = retention.pop('default', 365)
+        
+        filters = [
+            Q(activity_type=activity_type, created_at__lt=now - timedelta(days=days))
+            for activity_type, days in retention.items()
+        ]
+        filters.append(
+            ~Q(activity_type__in=list(retention)) & Q(created_at__lt=now - timedelta(days=default_days))
+        )
+        
+        deleted = 0
+        for condition in filters:
+            while True:
+                ids = list(UserActivity.objects.filter(condition).values_list('pk', flat=True)[:batch_size])
+                if not ids:
+                    break
+                deleted += UserActivity.objects.filter(pk__in=ids).delete()[0]
+        if deleted:
+            logger.info(f"Purged {deleted} old activity records")
+        return deleted
+    
+    @classmethod
+    def compact(cls, now=None):
+        """
+        Collapse old high-volume activity into one row per day.
+        
+        Rows of the ``ACTIVITY_LOG_COMPACT_TYPES`` types older than
+        ``ACTIVITY_LOG_COMPACT_AFTER_DAYS`` are grouped by type, user, IP
+        address and day; the latest row of each group is kept with the
+        group's count in its description and the rest are deleted. The
+        cutoff is aligned to midnight so each day is compacted exactly once.
+        
+        Returns:
+            int: Number of rows deleted
+        """
+        from .models import UserActivity
+        
+        types = getattr(settings, 'ACTIVITY_LOG_COMPACT_TYPES', ['failed_login'])
+        days = getattr(settings, 'ACTIVITY_LOG_COMPACT_AFTER_DAYS', 7)
+        cutoff = timezone.localtime(now or timezone.now()).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        ) - timedelta(days=days)
+        old = UserActivity.objects.filter(activity_type__in=types, created_at__lt=cutoff)
+        groups = (
+            old.annotate(day=TruncDate('created_at'))
+            .values('activity_type', 'user_id', 'ip_address', 'day')
+            .annotate(count=Count('id'), keep_id=Max('id'))
+            .filter(count__gt=1)
+            .order_by()
+        )
+        
+        deleted = 0
+        for group in list(groups):
+            with transaction.atomic():
+                same_group = old.annotate(day=TruncDate('created_at')).filter(
+                    activity_type=group['activity_type'],
+                    user_id=group['user_id'],
+                    ip_address=group['ip_address'],
+                    day=group['day'],
+                )
+                deleted += same_group.exclude(pk=group['keep_id']).delete()[0]
+                UserActivity.objects.filter(pk=group['keep_id']).update(
+                    description=f"{group['count']} {group['activity_type']} events on {group['day']} (compacted)"
+                )
+        if deleted:
+            logger.info(f"Compacted {deleted} activity records")
+        return deleted
+
+
+atexit.register(ActivityLogService.flush)
+
+
+class SessionService:
+    """
+    Service class for the UserSession lifecycle.
+    
+    Sessions expire after ``SESSION_IDLE_TIMEOUT_HOURS`` without activity or
+    ``SESSION_ABSOLUTE_TIMEOUT_DAYS`` after login, and a user keeps at most
+    ``SESSION_MAX_PER_USER`` active sessions. ``last_activity`` is written at
+    most once per ``SESSION_TOUCH_INTERVAL_SECONDS`` rather than on every
+    request. ``expire_stale`` and ``compact`` are run periodically by the
+    ``maintain_user_sessions`` command.
+    """
+    
+    @staticmethod
+    def _end(queryset, status, now=None):
+        return queryset.update(
+            status=status, is_active=False, logout_time=now or timezone.now(), updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def create(cls, user, device_id='', device_type='', ip_address=None, user_agent=''):
+        """
+        Start a session, ending the user's previous session on the device
+        and any sessions beyond the per-user cap.
+        
+        Returns:
+            UserSession: The new session
+        """
+        from .models import UserSession
+        
+        active = UserSession.objects.filter(user=user, is_active=True)
+        if device_id:
+            cls._end(active.filter(device_id=device_id), 'terminated')
+        
+        session = UserSession.objects.create(
+            user=user,
+            session_key=get_random_string(40),
+            device_id=device_id,
+            device_type=device_type,
+            ip_address=ip_address,
+            user_agent=user_agent,
+        )
+        
+        max_sessions = getattr(settings, 'SESSION_MAX_PER_USER', 5)
+        if max_sessions:
+            keep = active.order_by('-login_time', '-pk').values_list('pk', flat=True)[:max_sessions]
+            evicted = cls._end(active.exclude(pk__in=list(keep)), 'terminated')
+            if evicted:
+                logger.info(f"Ended {evicted} session(s) over the limit for user {user.pk}")
+        return session
+    
+    @classmethod
+    def authenticate(cls, session_key, device_id, now=None):
+        """
+        Look up a live session and refresh its activity time.
+        
+        Expired sessions are ended on sight. ``last_activity`` is only
+        written when it is older than the touch interval.
+        
+        Returns:
+            UserSession: The session, or None
+        """
+        from .models import UserSession
+        
+        now = now or timezone.now()
+        session = UserSession.objects.select_related('user').filter(
+            session_key=session_key, device_id=device_id, is_active=True
+        ).first()
+        if session is None:
+            return None
+        
+        if session.is_expired(now):
+            cls._end(UserSession.objects.filter(pk=session.pk), 'expired', now)
+            return None
+        
+        touch_interval = timedelta(seconds=getattr(settings, 'SESSION_TOUCH_INTERVAL_SECONDS', 300))
+        if now - session.last_activity >= touch_interval:
+            UserSession.objects.filter(pk=session.pk, last_activity=session.last_activity).update(last_activity=now)
+            session.last_activity = now
+        return session
+    
+    @classmethod
+    def terminate(cls, session):
+        """End a session on logout"""
+        from .models import UserSession
+        
+        now = timezone.now()
+        cls._end(UserSession.objects.filter(pk=session.pk), 'terminated', now)
+        session.status, session.is_active, session.logout_time = 'terminated', False, now
+    
+    @classmethod
+    def expire_stale(cls, now=None, batch_size=1000):
+        """
+        Mark active sessions past their idle or absolute timeout as expired.
+        
+        Rows ended by older code that only changed ``status`` are
+        deactivated as well.
+        
+        Returns:
+            int: Number of sessions expired
+        """
+        from .models import UserSession
+        
+        now = now or timezone.now()
+        stale = UserSession.objects.filter(is_active=True).filter(
+            ~Q(status='active') |
+            Q(last_activity__lt=now - timedelta(hours=getattr(settings, 'SESSION_IDLE_TIMEOUT_HOURS', 24))) |
+            Q(login_time__lt=now - timedelta(days=getattr(settings, 'SESSION_ABSOLUTE_TIMEOUT_DAYS', 30)))
+        )
+        expired = 0
+        while True:
+            ids = list(stale.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            expired += cls._end(UserSession.objects.filter(pk__in=ids), 'expired', now)
+        if expired:
+            logger.info(f"Expired {expired} idle sessions")
+        return expired
+    
+    @classmethod
+    def compact(cls, now=None, batch_size=1000):
+        """
+        Delete ended sessions older than ``SESSION_RETENTION_DAYS``.
+        
+        Returns:
+            int: Number of sessions deleted
+        """
+        from .models import UserSession
+        
+        cutoff = (now or timezone.now()) - timedelta(days=getattr(settings, 'SESSION_RETENTION_DAYS', 30))
+        dead = UserSession.objects.filter(is_active=False).filter(
+            Q(logout_time__lt=cutoff) | Q(logout_time__isnull=True, last_activity__lt=cutoff)
+        )
+        deleted = 0
+        while True:
+            ids = list(dead.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            deleted += UserSession.objects.filter(pk__in=ids).delete()[0]
+        if deleted:
+            logger.info(f"Deleted {deleted} ended sessions")
+        return deleted
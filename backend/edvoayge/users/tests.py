@@ -4,7 +4,12 @@ Comprehensive test suite for user models, serializers, and views.
 """
 
 import logging
-from django.test import TestCase, Client
+from smtplib import SMTPException
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import TestCase, Client, override_settings
 from django.contrib.auth.models import User
 from django.urls import reverse
 from django.utils import timezone
@@ -14,8 +19,9 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import timedelta
 from .models import (
     UserProfile, UserSession, OTPVerification, 
-    BiometricAuthentication, UserActivity
+    BiometricAuthentication, UserActivity, OutboundEmail
 )
+from .services import EmailQueue, OTPService, OTPRateLimitError, ActivityLogService, SessionService
 from .serializers import (
     UserSerializer, UserCreateSerializer, UserProfileSerializer,
     OTPVerificationSerializer, BiometricAuthenticationSerializer
@@ -539,6 +545,296 @@ class UserPerformanceTest(TestCase):
         self.assertLess(end_time - start_time, 1.0)  # Should complete within 1 second
 
 
+class FailingEmailBackend(BaseEmailBackend):
+    """Mail backend that rejects every message."""
+    
+    def send_messages(self, email_messages):
+        raise SMTPException('Service unavailable')
+
+
+@override_settings(EMAIL_QUEUE_ASYNC=False, EMAIL_QUEUE_RETRY_BACKOFF_SECONDS=10, EMAIL_QUEUE_MAX_ATTEMPTS=2)
+class EmailQueueTest(APITestCase):
+    """Test cases for the outbound email queue."""
+    
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+    
+    def test_enqueue_sends_and_marks_sent(self):
+        """Test queued mail is delivered and marked sent."""
+        email = EmailQueue.enqueue('student@example.com', 'Welcome', 'Hello')
+        
+        self.assertEqual(email.status, 'sent')
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['student@example.com'])
+    
+    @override_settings(EMAIL_QUEUE_BACKEND='users.tests.FailingEmailBackend')
+    def test_failures_back_off_then_fail(self):
+        """Test failed mail is retried with backoff until max attempts."""
+        email = EmailQueue.enqueue('student@example.com', 'Welcome', 'Hello')
+        
+        self.assertEqual(email.status, 'queued')
+        self.assertEqual(email.last_error, 'Service unavailable')
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=5))
+        self.assertEqual(EmailQueue.send_batch(), 0)  # not due yet
+        
+        OutboundEmail.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+        EmailQueue.send_batch()
+        email.refresh_from_db()
+        self.assertEqual(email.status, 'failed')
+        self.assertEqual(email.attempts, 2)
+    
+    def test_claim_is_exclusive(self):
+        """Test a message is claimed by only one sender."""
+        email = OutboundEmail.objects.create(to_email='student@example.com', subject='Welcome')
+        
+        self.assertEqual([e.pk for e in EmailQueue.claim_batch()], [email.pk])
+        self.assertEqual(EmailQueue.claim_batch(), [])
+    
+    def test_send_otp_returns_delivery_handle(self):
+        """Test the OTP endpoint returns a delivery id that can be polled."""
+        response = self.client.post('/api/v1/users/api/auth/send-otp/', {
+            'contact': 'student@example.com', 'device_id': 'device-1'
+        }, format='json')
+        
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertTrue(response.data['email_queued'])
+        self.assertNotIn('email_sent', response.data)
+        self.assertEqual(len(mail.outbox), 1)
+        
+        response = self.client.get('/api/v1/users/otp/delivery-status/', {
+            'delivery_id': response.data['delivery_id'], 'contact': 'student@example.com'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'sent')
+
+
+@override_settings(OTP_SEND_LIMIT=2, OTP_BLOCK_MINUTES=5, OTP_RETENTION_DAYS=1)
+class OTPServiceTest(TestCase):
+    """Test cases for OTP issuing, verification and purging."""
+    
+    def setUp(self):
+        """Set up test data."""
+        cache.clear()
+        self.contact = 'student@example.com'
+    
+    def test_issue_and_verify(self):
+        """Test an issued code verifies once without querying OTP rows."""
+        record, code = OTPService.issue(self.contact, 'register', 'device-1')
+        
+        with self.assertNumQueries(1):  # only the audit update
+            result = OTPService.verify(self.contact, code, 'device-1')
+        self.assertEqual(result.status, 'verified')
+        record.refresh_from_db()
+        self.assertTrue(record.is_verified)
+        self.assertEqual(OTPService.verify(self.contact, code, 'device-1').status, 'invalid')
+    
+    def test_wrong_codes_block_device(self):
+        """Test max_attempts wrong codes discard the code and block the device."""
+        record, code = OTPService.issue(self.contact, 'register', 'device-1')
+        wrong = '000000' if code != '000000' else '111111'
+        
+        results = [OTPService.verify(self.contact, wrong, 'device-1').status for _ in range(record.max_attempts)]
+        
+        self.assertEqual(results[-1], 'blocked')
+        self.assertEqual(OTPService.verify(self.contact, code, 'device-1').status, 'blocked')
+        with self.assertRaises(OTPRateLimitError):
+            OTPService.issue(self.contact, 'register', 'device-1')
+        record.refresh_from_db()
+        self.assertTrue(record.is_blocked)
+        self.assertEqual(record.failed_attempts, record.max_attempts)
+    
+    def test_code_is_not_replayed_through_another_workers_cache(self):
+        """Test a verified code fails in a process whose cache still holds it."""
+        record, code = OTPService.issue(self.contact, 'register', 'device-1')
+        stale_entry = cache.get(OTPService._key('code', self.contact))
+        
+        self.assertEqual(OTPService.verify(self.contact, code, 'device-1').status, 'verified')
+        cache.set(OTPService._key('code', self.contact), stale_entry)
+        self.assertEqual(OTPService.verify(self.contact, code, 'device-1').status, 'invalid')
+    
+    def test_attempts_are_shared_between_workers(self):
+        """Test wrong attempts count on the row, not in one process's cache."""
+        record, code = OTPService.issue(self.contact, 'register', 'device-1')
+        fresh_entry = cache.get(OTPService._key('code', self.contact))
+        wrong = '000000' if code != '000000' else '111111'
+        
+        results = []
+        for _ in range(record.max_attempts):
+            cache.set(OTPService._key('code', self.contact), fresh_entry)  # each attempt on a new worker
+            results.append(OTPService.verify(self.contact, wrong, 'device-1').status)
+        self.assertEqual(results[-1], 'blocked')
+        
+        cache.clear()  # the block is still found when issuing from another worker
+        with self.assertRaises(OTPRateLimitError):
+            OTPService.issue(self.contact, 'register', 'device-1')
+    
+    def test_send_limit_sliding_window(self):
+        """Test a contact cannot request more codes than the window allows."""
+        OTPService.issue(self.contact, 'register')
+        OTPService.issue(self.contact, 'register')
+        
+        with self.assertRaises(OTPRateLimitError) as context:
+            OTPService.issue(self.contact, 'register')
+        self.assertGreater(context.exception.retry_after, 0)
+    
+    def test_send_limit_is_shared_between_workers(self):
+        """Test sends are counted on the rows, not in one process's cache."""
+        OTPService.issue(self.contact, 'register')
+        cache.clear()  # the next send comes through another worker
+        OTPService.issue(self.contact, 'register')
+        cache.clear()
+        
+        with self.assertRaises(OTPRateLimitError):
+            OTPService.issue(self.contact, 'register')
+        
+        OTPVerification.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        OTPService.issue(self.contact, 'register')  # older sends fall out of the window
+    
+    @override_settings(OTP_SEND_LIMIT=5, OTP_DEVICE_SEND_LIMIT=2)
+    def test_device_send_limit(self):
+        """Test one device cannot request codes for many contacts."""
+        OTPService.issue('first@example.com', 'register', 'device-1')
+        OTPService.issue('second@example.com', 'register', 'device-1')
+        
+        with self.assertRaises(OTPRateLimitError):
+            OTPService.issue('third@example.com', 'register', 'device-1')
+        OTPService.issue('third@example.com', 'register', 'device-2')
+    
+    def test_verify_falls_back_to_database(self):
+        """Test a code still verifies after the cache is lost."""
+        OTPService.issue(self.contact, 'register')
+        latest, code = OTPService.issue(self.contact, 'register')
+        cache.clear()
+        
+        self.assertEqual(OTPService.verify(self.contact, code).record_id, latest.pk)
+    
+    def test_purge_expired_in_batches(self):
+        """Test rows past retention are purged and recent rows kept."""
+        old = timezone.now() - timedelta(days=2)
+        for i in range(5):
+            OTPVerification.objects.create(
+                otp_type='register', contact=self.contact, otp_code='123456', expires_at=old
+            )
+        OTPVerification.objects.update(created_at=old)
+        recent, _ = OTPService.issue(self.contact, 'register')
+        
+        self.assertEqual(OTPService.purge_expired(batch_size=2), 5)
+        self.assertEqual(list(OTPVerification.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+@override_settings(ACTIVITY_LOG_ASYNC=True, ACTIVITY_LOG_BATCH_SIZE=2, ACTIVITY_LOG_MAX_BUFFER=10)
+@mock.patch.object(ActivityLogService, '_ensure_writer')
+class ActivityLogServiceTest(TestCase):
+    """Test cases for the buffered activity log."""
+    
+    def setUp(self):
+        """Set up test data."""
+        ActivityLogService._buffer[:] = []
+        self.user = User.objects.create_user(username='student', email='student@example.com')
+    
+    def test_record_is_buffered_until_flush(self, ensure_writer):
+        """Test records are written in batches with their original time."""
+        before = timezone.now()
+        for _ in range(3):
+            ActivityLogService.record(self.user, 'login', ip_address='10.0.0.1')
+        self.assertEqual(UserActivity.objects.count(), 0)
+        
+        self.assertEqual(ActivityLogService.flush(), 3)
+        self.assertEqual(UserActivity.objects.count(), 3)
+        self.assertLess(UserActivity.objects.earliest('created_at').created_at - before, timedelta(seconds=1))
+        ensure_writer.assert_called()
+    
+    @override_settings(ACTIVITY_LOG_MAX_BUFFER=2)
+    def test_full_buffer_flushes_inline(self, ensure_writer):
+        """Test a full buffer is flushed by the caller instead of growing."""
+        ActivityLogService.record(None, 'failed_login', 'Failed login attempt')
+        ActivityLogService.record(None, 'failed_login', 'Failed login attempt')
+        
+        self.assertEqual(UserActivity.objects.filter(user__isnull=True).count(), 2)
+        self.assertEqual(ActivityLogService._buffer, [])
+    
+    def test_compact_and_purge(self, ensure_writer):
+        """Test old failed logins are collapsed and expired rows deleted."""
+        old = timezone.now() - timedelta(days=10)
+        for ip in ['10.0.0.1', '10.0.0.1', '10.0.0.1', '10.0.0.2']:
+            UserActivity.objects.create(user=None, activity_type='failed_login', ip_address=ip, created_at=old)
+        UserActivity.objects.create(user=self.user, activity_type='login', created_at=timezone.now() - timedelta(days=400))
+        
+        self.assertEqual(ActivityLogService.compact(), 2)
+        compacted = UserActivity.objects.get(ip_address='10.0.0.1')
+        self.assertTrue(compacted.description.startswith('3 failed_login events'))
+        
+        self.assertEqual(ActivityLogService.purge(), 1)
+        self.assertEqual(UserActivity.objects.count(), 2)
+
+
+@override_settings(SESSION_MAX_PER_USER=2, SESSION_IDLE_TIMEOUT_HOURS=1, SESSION_TOUCH_INTERVAL_SECONDS=300)
+class SessionServiceTest(TestCase):
+    """Test cases for the session lifecycle."""
+    
+    def setUp(self):
+        """Set up test data."""
+        self.user = User.objects.create_user(username='student', email='student@example.com')
+    
+    def test_cap_and_device_replacement(self):
+        """Test logins end the device's old session and sessions over the cap."""
+        first = SessionService.create(self.user, device_id='phone')
+        SessionService.create(self.user, device_id='tablet')
+        SessionService.create(self.user, device_id='laptop')
+        replaced = SessionService.create(self.user, device_id='laptop')
+        
+        active = UserSession.objects.filter(user=self.user, is_active=True)
+        self.assertEqual(set(active.values_list('device_id', flat=True)), {'tablet', 'laptop'})
+        self.assertEqual(active.get(device_id='laptop').pk, replaced.pk)
+        self.assertIsNone(SessionService.authenticate(first.session_key, 'phone'))
+    
+    def test_shared_device_keeps_other_users_sessions(self):
+        """Test a login only ends the same user's session on the device."""
+        other = User.objects.create_user(username='sibling', email='sibling@example.com')
+        theirs = SessionService.create(other, device_id='family-tablet')
+        SessionService.create(self.user, device_id='family-tablet')
+    
+        self.assertIsNotNone(SessionService.authenticate(theirs.session_key, 'family-tablet'))
+    
+    def test_activity_is_touched_coarsely(self):
+        """Test last_activity is only written once per touch interval."""
+        session = SessionService.create(self.user, device_id='phone')
+        now = session.last_activity + timedelta(seconds=60)
+        
+        with self.assertNumQueries(1):
+            SessionService.authenticate(session.session_key, 'phone', now=now)
+        
+        later = session.last_activity + timedelta(minutes=10)
+        SessionService.authenticate(session.session_key, 'phone', now=later)
+        session.refresh_from_db()
+        self.assertEqual(session.last_activity, later)
+    
+    def test_idle_session_expires(self):
+        """Test idle sessions are rejected and ended."""
+        session = SessionService.create(self.user, device_id='phone')
+        
+        self.assertIsNone(SessionService.authenticate(
+            session.session_key, 'phone', now=timezone.now() + timedelta(hours=2)
+        ))
+        session.refresh_from_db()
+        self.assertEqual(session.status, 'expired')
+        self.assertFalse(session.is_active)
+    
+    def test_expire_and_compact(self):
+        """Test the batch job expires idle sessions and deletes old ended ones."""
+        idle = SessionService.create(self.user, device_id='phone')
+        UserSession.objects.filter(pk=idle.pk).update(last_activity=timezone.now() - timedelta(hours=3))
+        old = SessionService.create(self.user, device_id='tablet')
+        SessionService.terminate(old)
+        UserSession.objects.filter(pk=old.pk).update(logout_time=timezone.now() - timedelta(days=60))
+        
+        self.assertEqual(SessionService.expire_stale(batch_size=1), 1)
+        self.assertEqual(SessionService.compact(), 1)
+        self.assertEqual(list(UserSession.objects.values_list('status', flat=True)), ['expired'])
+
+
 if __name__ == '__main__':
     # Run tests with verbose output
     import django
@@ -21,10 +21,10 @@ from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.hashers import make_password
-from django.utils.crypto import get_random_string
+from django.core.exceptions import ValidationError
 from .models import (
     UserProfile, UserSession, OTPVerification, 
-    UserActivity
+    UserActivity, OutboundEmail
 )
 from .serializers import (
     UserSerializer, UserMinimalSerializer, UserCreateSerializer, UserUpdateSerializer,
@@ -33,7 +33,9 @@ from .serializers import (
     UserActivitySerializer, LoginSerializer, PasswordChangeSerializer,
     PasswordResetRequestSerializer, PasswordResetConfirmSerializer, UserStatsSerializer
 )
-from .services import EmailService
+from .services import (
+    EmailService, OTPService, OTPRateLimitError, ActivityLogService, SessionService
+)
 from rest_framework.views import APIView
 from rest_framework import status
 import random
@@ -139,21 +141,20 @@ class UserViewSet(viewsets.ModelViewSet):
             
             if user is not None:
                 # Create session
-                session_key = get_random_string(40)
                 device_id = request.data.get('device_id', '')
                 device_type = request.data.get('device_type', 'mobile')
                 
-                session = UserSession.objects.create(
+                session = SessionService.create(
                     user=user,
-                    session_key=session_key,
                     device_id=device_id,
                     device_type=device_type,
                     ip_address=self.get_client_ip(request),
                     user_agent=request.META.get('HTTP_USER_AGENT', '')
                 )
+                session_key = session.session_key
                 
                 # Record activity
-                UserActivity.objects.create(
+                ActivityLogService.record(
                     user=user,
                     activity_type='login',
                     description=f'Login from {device_type} device',
@@ -177,7 +178,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 })
             else:
                 # Record failed login
-                UserActivity.objects.create(
+                ActivityLogService.record(
                     user=None,
                     activity_type='failed_login',
                     description=f'Failed login attempt for email: {email}',
@@ -210,16 +211,14 @@ class UserViewSet(viewsets.ModelViewSet):
                     session = UserSession.objects.get(
                         session_key=session_key,
                         device_id=device_id,
-                        status='active'
+                        is_active=True
                     )
                     
                     # Terminate session
-                    session.status = 'terminated'
-                    session.logout_time = timezone.now()
-                    session.save()
+                    SessionService.terminate(session)
                     
                     # Record activity
-                    UserActivity.objects.create(
+                    ActivityLogService.record(
                         user=session.user,
                         activity_type='logout',
                         description=f'Logout from {session.device_type} device',
@@ -269,7 +268,7 @@ class UserViewSet(viewsets.ModelViewSet):
                 user.save()
                 
                 # Record activity
-                UserActivity.objects.create(
+                ActivityLogService.record(
                     user=user,
                     activity_type='password_change',
                     description='Password changed successfully',
@@ -598,17 +597,6 @@ class OTPVerificationViewSet(viewsets.ModelViewSet):
     queryset = OTPVerification.objects.select_related('user')
     serializer_class = OTPVerificationSerializer
     pagination_class = UserPagination
-    otp=None
-
-    @classmethod
-    def generate_otp(cls):
-        cls.otp = str(random.randint(100000, 999999))  # 6-digit OTP
-        print("The generated OTP is",cls.otp)
-        return cls.otp
-
-    @classmethod
-    def verify_otp_code(cls, user_input):
-        return cls.otp == user_input
 
     def get_queryset(self):
         """Filter OTP verifications by current user."""
@@ -629,63 +617,44 @@ class OTPVerificationViewSet(viewsets.ModelViewSet):
             
             print(f"🔍 DEBUG: OTP creation request - Email: {contact}, Type: {otp_type}, Device: {device_id}")
             
-            # Check if device is blocked for this email
-            existing_otp = OTPVerification.objects.filter(
-                contact=contact,
-                device_id=device_id,
-                is_blocked=True
-            ).first()
-            
-            if existing_otp and existing_otp.is_blocked_for_device(device_id):
-                remaining_time = (existing_otp.blocked_until - timezone.now()).seconds
-                print(f"🔍 DEBUG: Device blocked for email {contact} - Remaining time: {remaining_time} seconds")
+            try:
+                otp, otp_code = OTPService.issue(contact, otp_type, device_id, device_type)
+            except OTPRateLimitError as e:
+                print(f"🔍 DEBUG: OTP request limited for email {contact} - Remaining time: {e.retry_after} seconds")
                 return Response({
                     'success': False,
-                    'message': f'Device blocked for 5 minutes due to multiple failed attempts. Remaining time: {remaining_time} seconds',
-                    'blocked_until': existing_otp.blocked_until.isoformat(),
-                    'remaining_time': remaining_time
+                    'message': f'{e}. Remaining time: {e.retry_after} seconds',
+                    'blocked_until': e.blocked_until.isoformat(),
+                    'remaining_time': e.retry_after
                 }, status=status.HTTP_429_TOO_MANY_REQUESTS)
             
-            # Generate 6-digit OTP for ALL users (new and existing)
-            otp_code = self.generate_otp()
-            print("The otp is",otp_code)
-            
-            print(f"🔍 DEBUG: Generated OTP: {otp_code} for email: {contact} | Type: {otp_type}")
-            from datetime import timedelta
-            # Create OTP record
-            otp = OTPVerification.objects.create(
-                otp_type=otp_type,
-                contact=contact,
-                otp_code=otp_code,
-                device_id=device_id,
-                device_type=device_type,
-                expires_at=timezone.now() + timedelta(minutes=5)
-            )
-            
             print(f"🔍 DEBUG: OTP created successfully for email: {contact} | Type: {otp_type} | ID: {otp.pk}")
             
-            # Send OTP via email
-            print(f"🔍 DEBUG: Attempting to send OTP {otp_code} to email: {contact}")
-            email_sent = EmailService.send_otp_email(contact, otp_code)
+            # Queue OTP email; the background sender delivers it
+            print(f"🔍 DEBUG: Queueing OTP {otp.pk} for email: {contact}")
+            delivery = EmailService.queue_otp_email(contact, otp_code)
             
-            if email_sent:
-                print(f"🔍 DEBUG: ✅ Email sent successfully to {contact}")
-                return Response({
-                    'success': True,
-                    'data': OTPVerificationSerializer(otp).data,
-                    'message': f'OTP sent to {contact}',
-                    'email_sent': True,
-                    'user_exists': False  # Always false to force OTP verification
-                }, status=status.HTTP_201_CREATED)
-            else:
+            if delivery.status == 'failed':
                 print(f"🔍 DEBUG: ❌ Failed to send email to {contact}")
                 # Delete the OTP record if email failed
-                otp.delete()
+                OTPService.discard(otp)
                 return Response({
                     'success': False,
                     'message': 'Failed to send OTP email. Please try again.',
-                    'email_sent': False
+                    'email_queued': False,
+                    'delivery_id': str(delivery.pk)
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+            
+            print(f"🔍 DEBUG: ✅ Email queued for {contact} - Delivery: {delivery.pk}")
+            return Response({
+                'success': True,
+                'data': OTPVerificationSerializer(otp).data,
+                'message': f'OTP sent to {contact}',
+                'email_queued': True,
+                'delivery_id': str(delivery.pk),
+                'delivery_status': delivery.status,
+                'user_exists': False  # Always false to force OTP verification
+            }, status=status.HTTP_201_CREATED)
         except Exception as e:
             import traceback
             print(f"❌ DEBUG: Error creating OTP: {e}")
@@ -709,11 +678,23 @@ class OTPVerificationViewSet(viewsets.ModelViewSet):
                 {'success': False, 'message': 'otp_code and contact are required'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        print("The values are:")
-        print(f"OTP Code: {otp_code}")
-        print(f"Contact: {contact}")
-       
-        if not self.verify_otp_code(otp_code):
+        print(f"🔍 DEBUG: Verifying OTP for contact: {contact}")
+        
+        result = OTPService.verify(
+            contact, otp_code,
+            device_id=request.data.get('device_id', ''),
+            otp_type=request.data.get('otp_type')
+        )
+        if result.status == 'blocked':
+            return Response(
+                {
+                    'success': False,
+                    'message': 'Too many failed attempts. Please try again later.',
+                    'remaining_time': result.retry_after
+                },
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+        if result.status != 'verified':
             return Response(
                 {'success': False, 'message': 'Invalid or expired OTP'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -723,6 +704,38 @@ class OTPVerificationViewSet(viewsets.ModelViewSet):
             {'success': True, 'message': 'OTP verified successfully'},
             status=status.HTTP_200_OK
         )
+    
+    @action(detail=False, methods=['get'], url_path='delivery-status', permission_classes=[AllowAny])
+    def delivery_status(self, request):
+        """
+        Get the delivery status of a queued OTP email.
+        
+        The delivery id is the ``delivery_id`` returned when the OTP was
+        requested; ``contact`` must match the address it was sent to.
+        """
+        delivery_id = request.query_params.get('delivery_id')
+        contact = request.query_params.get('contact')
+        if not delivery_id or not contact:
+            return Response(
+                {'success': False, 'message': 'delivery_id and contact are required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            delivery = OutboundEmail.objects.get(pk=delivery_id, to_email=contact, category='otp')
+        except (OutboundEmail.DoesNotExist, ValueError, ValidationError):
+            return Response(
+                {'success': False, 'message': 'Delivery not found'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        return Response({
+            'success': True,
+            'delivery_id': str(delivery.pk),
+            'status': delivery.status,
+            'attempts': delivery.attempts,
+            'sent_at': delivery.sent_at,
+        }, status=status.HTTP_200_OK)
    
     def get_client_ip(self, request):
         """Get client IP address."""
@@ -757,36 +770,19 @@ class UserSessionViewSet(viewsets.ModelViewSet):
                     'message': 'Session key and device ID required'
                 }, status=status.HTTP_400_BAD_REQUEST)
             
-            try:
-                session = UserSession.objects.get(
-                    session_key=session_key,
-                    device_id=device_id,
-                    status='active'
-                )
-                
-                if session.is_expired():
-                    session.status = 'expired'
-                    session.save()
-                    return Response({
-                        'success': False,
-                        'message': 'Session expired'
-                    }, status=status.HTTP_401_UNAUTHORIZED)
-                
-                # Update last activity
-                session.last_activity = timezone.now()
-                session.save()
-                
-                return Response({
-                    'success': True,
-                    'user_id': session.user.id,
-                    'user_data': UserMinimalSerializer(session.user).data
-                })
-                
-            except UserSession.DoesNotExist:
+            # Expired sessions are ended by the lookup
+            session = SessionService.authenticate(session_key, device_id)
+            if session is None:
                 return Response({
                     'success': False,
-                    'message': 'Invalid session'
+                    'message': 'Invalid or expired session'
                 }, status=status.HTTP_401_UNAUTHORIZED)
+            
+            return Response({
+                'success': True,
+                'user_id': session.user.id,
+                'user_data': UserMinimalSerializer(session.user).data
+            })
                 
         except Exception as e:
             logger.error(f"Error validating session: {e}")
@@ -814,12 +810,10 @@ class UserSessionViewSet(viewsets.ModelViewSet):
                     device_id=device_id
                 )
                 
-                session.status = 'terminated'
-                session.logout_time = timezone.now()
-                session.save()
+                SessionService.terminate(session)
                 
                 # Record activity
-                UserActivity.objects.create(
+                ActivityLogService.record(
                     user=session.user,
                     activity_type='logout',
                     description=f'Logout from {session.device_type} device',
@@ -889,33 +883,19 @@ class SendOTPView(APIView):
             if existing_user:
                 print(f"🔍 DEBUG: User already exists with email: {contact}")
                 
-                # Check if session already exists for this device
-                existing_session = UserSession.objects.filter(device_id=device_id).first()
-                if existing_session:
-                    print(f"🔍 DEBUG: Session already exists for device: {device_id}")
-                    # Update existing session
-                    existing_session.user = existing_user.user
-                    existing_session.session_key = get_random_string(40)
-                    existing_session.login_time = timezone.now()
-                    existing_session.status = 'active'
-                    existing_session.save()
-                    session_key = existing_session.session_key
-                    print(f"🔍 DEBUG: Updated existing session - User: {existing_user.user.username}, Session: {session_key}")
-                else:
-                    # Create new session for existing user
-                    session_key = get_random_string(40)
-                    session = UserSession.objects.create(
-                        user=existing_user.user,
-                        session_key=session_key,
-                        device_id=device_id,
-                        device_type=device_type,
-                        ip_address=self.get_client_ip(request),
-                        user_agent=request.META.get('HTTP_USER_AGENT', '')
-                    )
-                    print(f"🔍 DEBUG: Created new session for existing user - User: {existing_user.user.username}, Session: {session_key}")
+                # Start a session; any previous session on this device is ended
+                session = SessionService.create(
+                    user=existing_user.user,
+                    device_id=device_id,
+                    device_type=device_type,
+                    ip_address=self.get_client_ip(request),
+                    user_agent=request.META.get('HTTP_USER_AGENT', '')
+                )
+                session_key = session.session_key
+                print(f"🔍 DEBUG: Created session for existing user - User: {existing_user.user.username}, Session: {session_key}")
                 
                 # Record login activity
-                UserActivity.objects.create(
+                ActivityLogService.record(
                     user=existing_user.user,
                     activity_type='login',
                     description=f'Direct login for existing user {contact}',
@@ -936,41 +916,43 @@ class SendOTPView(APIView):
             print(f"🔍 DEBUG: Email validation passed: {contact}")
             
             # Generate 6-digit OTP
-            otp_code = ''.join(random.choices(string.digits, k=6))
-            print(f"🔍 DEBUG: Generated OTP: {otp_code} for email: {contact}")
-            
-            # Create OTP record
-            otp = OTPVerification.objects.create(
-                otp_type=otp_type,
-                contact=contact,
-                otp_code=otp_code,
-                device_id=device_id,
-                device_type=device_type
-            )
+            try:
+                otp, otp_code = OTPService.issue(contact, otp_type, device_id, device_type)
+            except OTPRateLimitError as e:
+                print(f"🔍 DEBUG: OTP request limited for email {contact} - Remaining time: {e.retry_after} seconds")
+                return Response({
+                    'success': False,
+                    'message': f'{e}. Remaining time: {e.retry_after} seconds',
+                    'remaining_time': e.retry_after
+                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+            print(f"🔍 DEBUG: Generated OTP {otp.pk} for email: {contact}")
             
-            print(f"🔍 DEBUG: OTP record created - ID: {otp.pk}, Email: {contact}, OTP: {otp_code}")
+            print(f"🔍 DEBUG: OTP record created - ID: {otp.pk}, Email: {contact}")
             
-            # Send OTP via email
-            print(f"🔍 DEBUG: Attempting to send OTP {otp_code} to email: {contact}")
-            email_sent = EmailService.send_otp_email(contact, otp_code)
+            # Queue OTP email; the background sender delivers it
+            print(f"🔍 DEBUG: Queueing OTP {otp.pk} for email: {contact}")
+            delivery = EmailService.queue_otp_email(contact, otp_code)
             
-            if email_sent:
-                print(f"🔍 DEBUG: ✅ Email sent successfully to {contact}")
-                return Response({
-                    'success': True,
-                    'message': f'OTP sent to {contact}',
-                    'email_sent': True
-                }, status=status.HTTP_201_CREATED)
-            else:
+            if delivery.status == 'failed':
                 print(f"🔍 DEBUG: ❌ Failed to send email to {contact}")
                 # Delete the OTP record if email failed
-                otp.delete()
+                OTPService.discard(otp)
                 return Response({
                     'success': False,
                     'message': 'Failed to send OTP email. Please try again.',
-                    'email_sent': False
+                    'email_queued': False,
+                    'delivery_id': str(delivery.pk)
                 }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
             
+            print(f"🔍 DEBUG: ✅ Email queued for {contact} - Delivery: {delivery.pk}")
+            return Response({
+                'success': True,
+                'message': f'OTP sent to {contact}',
+                'email_queued': True,
+                'delivery_id': str(delivery.pk),
+                'delivery_status': delivery.status
+            }, status=status.HTTP_201_CREATED)
+            
         except Exception as e:
             print(f"❌ DEBUG: Error sending OTP: {e}")
             import traceback